@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Pattern, Tuple, Union
+
+from starlette.responses import Response
+
+# Jedna warstwa ASGI zamiast stosu @app.middleware("http").
+#
+# Dawne middleware compat rejestruja sie jako warstwy w CompatRegistry. Kolejnosc jak przy
+# @app.middleware: pozniej zarejestrowana = bardziej zewnetrzna. Dla pasujacego requestu:
+#   - on_request(ctx) od zewnatrz do srodka; zwrocona Response konczy lancuch (short-circuit),
+#   - on_response(ctx, status, payload) od srodka na zewnatrz, tylko dla warstw, przez ktore request przeszedl.
+# Body requestu czytane i parsowane raz (ctx.json), serializowane ponownie tylko po ctx.set_json.
+# Odpowiedz buforowana i parsowana raz, i tylko gdy jakas warstwa ma on_response dla tej sciezki
+# (i odpowiedz jest JSON); wszystko inne idzie strumieniem bez zmian.
+
+OnRequest = Callable[["CompatContext"], Awaitable[Optional[Response]]]
+OnResponse = Callable[["CompatContext", int, Any], Tuple[int, Any]]
+PathSpec = Union[str, Pattern[str]]
+
+_UNSET = object()
+
+
+def _norm_path(path: str) -> str:
+    return (path or "/").rstrip("/") or "/"
+
+
+class CompatContext:
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.scope = scope
+        self.method = str(scope.get("method") or "GET").upper()
+        self.path = _norm_path(scope.get("path") or "/")
+        self.match: Any = None
+        self.state: Dict[str, Any] = {}
+        self._body = body
+        self._json: Any = _UNSET
+        self._dirty = False
+
+    def json(self) -> Any:
+        """Parsed request body (cached); None when empty/invalid."""
+        if self._json is _UNSET:
+            try:
+                self._json = json.loads(self._body.decode("utf-8")) if self._body else None
+            except Exception:
+                self._json = None
+        return self._json
+
+    def set_json(self, obj: Any) -> None:
+        self._json = obj
+        self._dirty = True
+
+    def body(self) -> bytes:
+        if self._dirty:
+            self._body = json.dumps(self._json, ensure_ascii=False).encode("utf-8")
+            self._dirty = False
+        return self._body
+
+
+class CompatLayer:
+    __slots__ = ("name", "methods", "path", "on_request", "on_response")
+
+    def __init__(self, name: str, methods: Optional[set], path: PathSpec, on_request: Optional[OnRequest], on_response: Optional[OnResponse]):
+        self.name = name
+        self.methods = methods
+        self.path = path
+        self.on_request = on_request
+        self.on_response = on_response
+
+    def match(self, method: str, path: str) -> Any:
+        if self.methods is not None and method not in self.methods:
+            return None
+        if isinstance(self.path, str):
+            return True if path == self.path else None
+        return self.path.fullmatch(path)
+
+
+class CompatRegistry:
+    def __init__(self):
+        self._layers: List[CompatLayer] = []
+
+    def add(
+        self,
+        name: str,
+        path: PathSpec,
+        *,
+        methods: Optional[Union[str, List[str]]] = None,
+        on_request: Optional[OnRequest] = None,
+        on_response: Optional[OnResponse] = None,
+    ) -> CompatLayer:
+        if isinstance(methods, str):
+            methods = [methods]
+        ms = {m.upper() for m in methods} if methods else None
+        if isinstance(path, str):
+            path = _norm_path(path)
+        layer = CompatLayer(name, ms, path, on_request, on_response)
+        self._layers = [x for x in self._layers if x.name != name]
+        self._layers.insert(0, layer)
+        return layer
+
+    def request(self, path: PathSpec, *, methods: Optional[Union[str, List[str]]] = None, name: Optional[str] = None):
+        def deco(fn: OnRequest) -> OnRequest:
+            self.add(name or fn.__name__, path, methods=methods, on_request=fn)
+            return fn
+        return deco
+
+    def response(self, path: PathSpec, *, methods: Optional[Union[str, List[str]]] = None, name: Optional[str] = None):
+        def deco(fn: OnResponse) -> OnResponse:
+            self.add(name or fn.__name__, path, methods=methods, on_response=fn)
+            return fn
+        return deco
+
+    def layers_for(self, method: str, path: str) -> List[Tuple[CompatLayer, Any]]:
+        out = []
+        for layer in self._layers:
+            m = layer.match(method, path)
+            if m is not None:
+                out.append((layer, m))
+        return out
+
+    def names(self) -> List[str]:
+        return [x.name for x in self._layers]
+
+
+class CompatDispatch:
+    def __init__(self, app, registry: CompatRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = str(scope.get("method") or "GET").upper()
+        layers = self.registry.layers_for(method, _norm_path(scope.get("path") or "/"))
+        if not layers:
+            await self.app(scope, receive, send)
+            return
+
+        consumed = any(layer.on_request is not None for layer, _ in layers)
+        body = await _read_body(receive) if consumed else b""
+        ctx = CompatContext(scope, body)
+
+        entered: List[Tuple[CompatLayer, Any]] = []
+        short: Optional[Response] = None
+        for layer, m in layers:
+            if layer.on_request is not None:
+                ctx.match = m
+                short = await layer.on_request(ctx)
+                if short is not None:
+                    break
+            entered.append((layer, m))
+        post = [(layer, m) for layer, m in reversed(entered) if layer.on_response is not None]
+
+        if short is not None:
+            raw = getattr(short, "body", None)
+            if not post or not isinstance(raw, (bytes, bytearray)) or not _is_json(short.raw_headers):
+                await short(scope, receive, send)
+                return
+            await _finish(ctx, post, short.status_code, short.raw_headers, bytes(raw), send)
+            return
+
+        if consumed:
+            sent = False
+
+            async def replay():
+                nonlocal sent
+                if not sent:
+                    sent = True
+                    return {"type": "http.request", "body": ctx.body(), "more_body": False}
+                return await receive()
+
+            downstream_receive = replay
+        else:
+            downstream_receive = receive
+
+        if not post:
+            await self.app(scope, downstream_receive, send)
+            return
+
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def capture(message):
+            nonlocal passthrough
+            if message["type"] == "http.response.start":
+                if not _is_json(message.get("headers") or []):
+                    passthrough = True
+                    await send(message)
+                    return
+                start.update(message)
+                return
+            if message["type"] == "http.response.body" and not passthrough:
+                chunks.append(message.get("body", b""))
+                return
+            await send(message)
+
+        await self.app(scope, downstream_receive, capture)
+        if passthrough or not start:
+            return
+        await _finish(ctx, post, int(start["status"]), start.get("headers") or [], b"".join(chunks), send)
+
+
+async def _read_body(receive) -> bytes:
+    parts = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        parts.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(parts)
+
+
+def _is_json(raw_headers) -> bool:
+    for k, v in raw_headers:
+        if k.lower() == b"content-type":
+            return b"application/json" in v.lower()
+    return False
+
+
+async def _finish(ctx: CompatContext, post: List[Tuple[CompatLayer, Any]], status: int, raw_headers, raw: bytes, send) -> None:
+    try:
+        payload = json.loads(raw.decode("utf-8"))
+    except Exception:
+        payload = _UNSET
+
+    if payload is not _UNSET:
+        for layer, m in post:
+            ctx.match = m
+            try:
+                status, payload = layer.on_response(ctx, status, payload)
+            except Exception:
+                # compat best-effort: warstwa nie moze wywrocic odpowiedzi
+                continue
+        raw = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    headers = [(k, v) for k, v in raw_headers if k.lower() not in (b"content-length", b"content-type")]
+    headers.append((b"content-type", b"application/json"))
+    headers.append((b"content-length", str(len(raw)).encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": raw, "more_body": False})
+
+
+def install_dispatch(app) -> CompatRegistry:
+    """Returns the app's compat registry, adding the dispatch layer on first use."""
+    reg = getattr(app.state, "compat_dispatch", None)
+    if reg is None:
+        reg = CompatRegistry()
+        app.state.compat_dispatch = reg
+        app.add_middleware(CompatDispatch, registry=reg)
+    return reg
@@ -5,6 +5,7 @@ from typing import Any, Dict, Optional
 
 from app.canon_store import load_canon, patch_canon
 from app.canon_check import canon_check
+from app.canon_index import get_compiled_canon
 
 router = APIRouter()
 
@@ -61,8 +62,8 @@ def canon_check_ep(
     text = str(payload.get("text") or "")
     scene_ref = str(payload.get("scene_ref") or "")
 
-    canon = load_canon(run_dir=None, book_id=bid)
-    res = canon_check(text, canon, scene_ref=scene_ref)
+    cc = get_compiled_canon(bid)
+    res = canon_check(text, cc.canon, scene_ref=scene_ref, compiled=cc)
 
     # testy zwykle oczekują {ok, issues, scene_ref}
     return {"ok": True, "book_id": bid, "result": res}
@@ -3,7 +3,10 @@ from __future__ import annotations
 import re
 from typing import Any, Dict, List, Optional
 
+from app.canon_index import CompiledCanon
+
 _NUM = re.compile(r"(\d+(?:[.,]\d+)?)")
+_TX_ID = re.compile(r"\btx_[a-zA-Z0-9]+\b")
 _YEAR = re.compile(r"\b(19\d{2}|20\d{2})\b")
 _UNTIL_YEAR_PL = re.compile(r"\bdo\s+(19\d{2}|20\d{2})\s+roku\b", re.IGNORECASE)
 _UNTIL_YEAR_EN = re.compile(r"\buntil\s+(19\d{2}|20\d{2})\b", re.IGNORECASE)
@@ -23,12 +26,8 @@ def _to_float(x: Any) -> Optional[float]:
         return None
 
 
-def _find_amount_near(text: str, token: str, window: int = 40) -> Optional[float]:
-    t = text or ""
-    idx = t.lower().find(token.lower())
-    if idx < 0:
-        return None
-    frag = t[idx : idx + max(10, window)]
+def _amount_at(text: str, idx: int, window: int = 40) -> Optional[float]:
+    frag = text[idx : idx + max(10, window)]
     m = _NUM.search(frag)
     if not m:
         return None
@@ -106,9 +105,13 @@ def _canon_expected_narration(canon: Dict[str, Any]) -> Optional[str]:
     return None
 
 
-def canon_check(text: str, canon: Dict[str, Any], scene_ref: str = "") -> Dict[str, Any]:
+def canon_check(text: str, canon: Dict[str, Any], scene_ref: str = "", compiled: Optional[CompiledCanon] = None) -> Dict[str, Any]:
+    """`compiled` is the CompiledCanon of `canon` (app.canon_index.get_compiled_canon); built ad hoc when absent."""
     issues: List[Dict[str, Any]] = []
     t = text or ""
+    cc = compiled if compiled is not None else CompiledCanon(canon=canon)
+    # pierwsze wystapienie kazdego id z ledgera: jedno przejscie automatu zamiast lower()+find na transakcje
+    first = cc.first_ledger_offsets(t)
 
     # --- existing LEDGER checks (kept) ---
     ledger = canon.get("ledger") or []
@@ -121,11 +124,12 @@ def canon_check(text: str, canon: Dict[str, Any], scene_ref: str = "") -> Dict[s
         txid = str(tx.get("id") or "").strip()
         if not txid:
             continue
-        if txid.lower() not in t.lower():
+        idx = first.get(txid)
+        if idx is None:
             continue
 
         expected = _to_float(tx.get("amount"))
-        found = _find_amount_near(t, txid, window=60)
+        found = _amount_at(t, idx, window=60)
         if expected is None or found is None:
             continue
         if abs(expected - found) > 1e-9:
@@ -139,10 +143,9 @@ def canon_check(text: str, canon: Dict[str, Any], scene_ref: str = "") -> Dict[s
                 }
             )
 
-    known_ids = {str(x.get("id")) for x in ledger if isinstance(x, dict) and x.get("id")}
-    mentioned = set(re.findall(r"\btx_[a-zA-Z0-9]+\b", t))
+    mentioned = set(_TX_ID.findall(t))
     for mid in sorted(mentioned):
-        if mid not in known_ids:
+        if mid not in cc.ledger_ids:
             issues.append({"type": "ledger_unknown_tx", "tx_id": mid, "scene_ref": scene_ref})
 
     # --- NEW P0 checks for timeline / decisions ---
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.canon_store import canon_default
+
+# Skompilowany kanon ksiazki dla CONTINUITY, CANON_CHECK i /canon/check.
+#
+# Z books/<book>/book_bible.json (postacie + aliasy, continuity_rules) i books/<book>/canon.json (ledger,
+# character_facts, timeline, decisions) budujemy raz automat Aho-Corasick po nazwach, aliasach i id transakcji;
+# wszystkie wzmianki w tekscie (z offsetami) to jedno liniowe przejscie, niezaleznie od rozmiaru kanonu.
+# Obiekt jest trzymany per ksiazka i przebudowywany, gdy zmieni sie (mtime_ns, size) ktoregos z plikow
+# (save_canon dodatkowo uniewaznia wpis od razu).
+#
+# Dopasowanie bez rozrozniania wielkosci liter; nazwy i aliasy tylko jako cale slowa, id z ledgera jako
+# podciag (tak jak dotychczasowe `txid.lower() in text.lower()`).
+
+KIND_NAME = "name"
+KIND_LEDGER = "ledger"
+
+
+def _fold(s: str) -> str:
+    # lower() znak po znaku z zachowaniem dlugosci, zeby offsety w tekscie i w kopii lower byly te same
+    low = s.lower()
+    if len(low) == len(s):
+        return low
+    return "".join((c.lower() or c)[0] for c in s)
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """Case-insensitive multi-pattern matcher: every (overlapping) occurrence in one pass over the text."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        # patterns: (tekst wzorca, wartosc zwracana przy trafieniu); ten sam tekst moze miec kilka wartosci
+        delta: List[Dict[str, int]] = [{}]
+        out: List[List[Tuple[int, Any]]] = [[]]
+        for pat, value in patterns:
+            p = _fold(pat)
+            if not p:
+                continue
+            s = 0
+            for ch in p:
+                nxt = delta[s].get(ch)
+                if nxt is None:
+                    nxt = len(delta)
+                    delta[s][ch] = nxt
+                    delta.append({})
+                    out.append([])
+                s = nxt
+            out[s].append((len(p), value))
+
+        # BFS po trie: przejscia fail wtapiamy w delta (pelny DFA), wiec skan to jeden slownik na znak
+        fail = [0] * len(delta)
+        queue = deque(delta[0].values())
+        while queue:
+            s = queue.popleft()
+            f = fail[s]
+            if out[f]:
+                out[s] = out[s] + out[f]
+            for ch, t in list(delta[s].items()):
+                fail[t] = delta[f].get(ch, 0)
+                queue.append(t)
+            for ch, t in delta[f].items():
+                delta[s].setdefault(ch, t)
+        self._delta = delta
+        self._out = out
+        self.size = len(delta)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Yields (start, end, value) ordered by end offset."""
+        delta, out = self._delta, self._out
+        s = 0
+        for i, ch in enumerate(_fold(text or "")):
+            s = delta[s].get(ch, 0)
+            if out[s]:
+                end = i + 1
+                for n, value in out[s]:
+                    yield end - n, end, value
+
+
+def _stamp(p: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = p.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_json(p: Path) -> Any:
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+class CompiledCanon:
+    def __init__(self, canon: Optional[Dict[str, Any]] = None, bible: Optional[Dict[str, Any]] = None):
+        self.canon: Dict[str, Any] = canon if isinstance(canon, dict) else canon_default()
+        self.bible: Dict[str, Any] = bible if isinstance(bible, dict) else {}
+
+        rules = self.bible.get("continuity_rules")
+        self.rules: Dict[str, Any] = rules if isinstance(rules, dict) else {}
+
+        # nazwa/alias (lower) -> nazwa kanoniczna postaci
+        self.names: Dict[str, str] = {}
+        bc = self.bible.get("canon")
+        chars = bc.get("characters") if isinstance(bc, dict) else None
+        for ch in chars if isinstance(chars, list) else []:
+            if not isinstance(ch, dict):
+                continue
+            n = str(ch.get("name") or "").strip()
+            forms = [n] + [str(a or "").strip() for a in (ch.get("aliases") if isinstance(ch.get("aliases"), list) else [])]
+            for f in forms:
+                if f:
+                    self.names.setdefault(f.lower(), n or f)
+        # nazwy z bible = `known` dla CONTINUITY; character_facts z canon.json tylko do wzmianek
+        self.known = frozenset(self.names)
+        facts = self.canon.get("character_facts")
+        for n in facts if isinstance(facts, dict) else []:
+            n = str(n or "").strip()
+            if n:
+                self.names.setdefault(n.lower(), n)
+
+        ledger = self.canon.get("ledger")
+        self.ledger: List[Dict[str, Any]] = [tx for tx in ledger if isinstance(tx, dict)] if isinstance(ledger, list) else []
+        self.ledger_ids = frozenset(str(tx.get("id")) for tx in self.ledger if tx.get("id"))
+
+        patterns: List[Tuple[str, Tuple[str, str]]] = [(low, (KIND_NAME, name)) for low, name in self.names.items()]
+        for txid in sorted({str(tx.get("id") or "").strip() for tx in self.ledger} - {""}):
+            patterns.append((txid, (KIND_LEDGER, txid)))
+        self.automaton = AhoCorasick(patterns)
+
+    def mentions(self, text: str) -> List[Dict[str, Any]]:
+        """All canon mentions in `text`: {"kind", "key", "start", "end"} ordered by offset."""
+        t = text or ""
+        n = len(t)
+        found: List[Dict[str, Any]] = []
+        for start, end, (kind, key) in self.automaton.iter_matches(t):
+            if kind == KIND_NAME and ((start > 0 and _is_word(t[start - 1])) or (end < n and _is_word(t[end]))):
+                continue
+            found.append({"kind": kind, "key": key, "start": start, "end": end})
+        found.sort(key=lambda m: (m["start"], -m["end"]))
+        return found
+
+    def first_ledger_offsets(self, text: str) -> Dict[str, int]:
+        """tx id -> offset of its first case-insensitive occurrence, for ids mentioned in `text`."""
+        first: Dict[str, int] = {}
+        for m in self.mentions(text):
+            if m["kind"] == KIND_LEDGER and m["key"] not in first:
+                first[m["key"]] = m["start"]
+        return first
+
+    def name_counts(self, text: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for m in self.mentions(text):
+            if m["kind"] == KIND_NAME:
+                counts[m["key"]] = counts.get(m["key"], 0) + 1
+        return counts
+
+
+def _project_root() -> Path:
+    return Path(__file__).resolve().parents[1]
+
+
+def _book_dir(book_id: str) -> Path:
+    bid = (book_id or "default").strip() or "default"
+    return _project_root() / "books" / bid
+
+
+_COMPILED: Dict[str, Tuple[Tuple[Any, Any], CompiledCanon]] = {}
+_COMPILED_LOCK = threading.Lock()
+
+
+def get_compiled_canon(book_id: str) -> CompiledCanon:
+    """Compiled canon of a book; rebuilt only when book_bible.json or canon.json changed on disk."""
+    d = _book_dir(book_id)
+    bible_p, canon_p = d / "book_bible.json", d / "canon.json"
+    stamp = (_stamp(bible_p), _stamp(canon_p))
+    key = str(d)
+    with _COMPILED_LOCK:
+        hit = _COMPILED.get(key)
+        if hit is not None and hit[0] == stamp:
+            return hit[1]
+    cc = CompiledCanon(
+        canon=_read_json(canon_p) if stamp[1] is not None else None,
+        bible=_read_json(bible_p) if stamp[0] is not None else None,
+    )
+    with _COMPILED_LOCK:
+        _COMPILED[key] = (stamp, cc)
+    return cc
+
+
+def invalidate_compiled_canon(book_id: Optional[str] = None) -> None:
+    with _COMPILED_LOCK:
+        if book_id is None:
+            _COMPILED.clear()
+        else:
+            _COMPILED.pop(str(_book_dir(book_id)), None)
+
+
+def reset_compiled_canons() -> None:
+    invalidate_compiled_canon(None)
@@ -72,6 +72,10 @@ def save_canon(run_dir: Optional[Path], canon: Dict[str, Any], book_id: Optional
         p2 = book_canon_path(book_id)
         p2.write_text(json.dumps(canon, ensure_ascii=False, indent=2), encoding="utf-8")
 
+        from app.canon_index import invalidate_compiled_canon
+
+        invalidate_compiled_canon(book_id)
+
 
 def _merge(dst: Any, patch: Any) -> Any:
     # dict: merge recursively; list: REPLACE (żeby testy nie kumulowały danych)
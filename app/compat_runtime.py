@@ -4,8 +4,6 @@ import json
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional
 
-from starlette.responses import JSONResponse, Response
-
 
 def _to_list(v: Any) -> List[str]:
     if v is None:
@@ -120,7 +118,10 @@ def _patch_artifact_files(paths: Iterable[str], default_mode: Optional[str] = No
 
             txt = path.read_text(encoding="utf-8")
             data = json.loads(txt)
-            fixed = normalize_artifact_record(data, default_mode=default_mode)
+            fixed = normalize_artifact_record(json.loads(txt), default_mode=default_mode)
+            if fixed == data:
+                # artefakty z execute_stub sa juz znormalizowane przed zapisem
+                continue
 
             path.write_text(
                 json.dumps(fixed, ensure_ascii=False, indent=2),
@@ -148,20 +149,20 @@ def _extract_detail_from_body(body_text: str) -> str:
     return detail
 
 
-def _response_from_bytes(
-    body_bytes: bytes,
-    status_code: int,
-    headers: Dict[str, str],
-    media_type: Optional[str] = None,
-) -> Response:
-    h = dict(headers or {})
-    h.pop("content-length", None)
-    return Response(
-        content=body_bytes,
-        status_code=status_code,
-        headers=h,
-        media_type=media_type,
-    )
+def _compat_runtime_response(ctx, status: int, payload: Any):
+    # 500 -> 422 mapping for TEAM override validation
+    if status >= 500:
+        body_text = json.dumps(payload, ensure_ascii=False)
+        if "TEAM_OVERRIDE_NOT_ALLOWED" in body_text:
+            return 422, {"detail": _extract_detail_from_body(body_text)}
+
+    # Normalize successful JSON payload
+    if isinstance(payload, dict):
+        payload = normalize_step_payload(payload)
+        mode_hint = str(payload.get("mode") or "").upper() or None
+        _patch_artifact_files(payload.get("artifact_paths") or payload.get("artifacts") or [], default_mode=mode_hint)
+
+    return status, payload
 
 
 def install_compat_runtime(app) -> None:
@@ -169,64 +170,9 @@ def install_compat_runtime(app) -> None:
         return
     app.state._compat_runtime_installed = True
 
-    @app.middleware("http")
-    async def _compat_runtime_middleware(request, call_next):
-        response = await call_next(request)
-
-        if request.url.path != "/agent/step":
-            return response
-
-        # Read streamed body safely
-        body = b""
-        try:
-            async for chunk in response.body_iterator:
-                body += chunk
-        except Exception:
-            # fallback for non-streaming responses
-            try:
-                body = response.body or b""
-            except Exception:
-                body = b""
-
-        body_text = body.decode("utf-8", errors="ignore")
-
-        # 500 -> 422 mapping for TEAM override validation
-        if response.status_code >= 500 and "TEAM_OVERRIDE_NOT_ALLOWED" in body_text:
-            detail = _extract_detail_from_body(body_text)
-            return JSONResponse(
-                status_code=422,
-                content={"detail": detail},
-                headers={k: v for k, v in response.headers.items() if k.lower() != "content-length"},
-            )
-
-        # Normalize successful JSON payload
-        try:
-            payload = json.loads(body_text)
-        except Exception:
-            return _response_from_bytes(
-                body_bytes=body,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.media_type,
-            )
-
-        if isinstance(payload, dict):
-            payload = normalize_step_payload(payload)
-            mode_hint = str(payload.get("mode") or "").upper() or None
-            _patch_artifact_files(payload.get("artifact_paths") or payload.get("artifacts") or [], default_mode=mode_hint)
-
-            return JSONResponse(
-                status_code=response.status_code,
-                content=payload,
-                headers={k: v for k, v in response.headers.items() if k.lower() != "content-length"},
-            )
+    from app.asgi_dispatch import install_dispatch
 
-        return _response_from_bytes(
-            body_bytes=body,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.media_type,
-        )
+    install_dispatch(app).add("_compat_runtime_middleware", "/agent/step", on_response=_compat_runtime_response)
 
 
 # aliasy pod różne importy historyczne
@@ -2,7 +2,10 @@ from __future__ import annotations
 
 from pathlib import Path
 import json
-from typing import Any, Dict, List
+import os
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 
 try:
     import yaml  # type: ignore
@@ -23,6 +26,8 @@ APP_MODES_JSON = APP_DIR / "modes.json"
 APP_PRESETS_JSON = APP_DIR / "presets.json"
 
 CFG_KERNEL_YAML = CONFIG_DIR / "kernel.yaml"
+CFG_MODE_TEAM_MAP_JSON = CONFIG_DIR / "mode_team_map.json"
+CFG_POLICIES_JSON = CONFIG_DIR / "policies.json"
 
 
 def _load_json(path: Path) -> Any:
@@ -151,3 +156,125 @@ def validate_all() -> Dict[str, Any]:
         }
     except Exception as e:
         return {"ok": False, "errors": [f"{type(e).__name__}: {e}"]}
+
+
+# --- snapshot configu dla sciezki kroku ---------------------------------------------------------
+# Jedna, niezmienna migawka modes/presets/mode_team_map/policies. Budowana raz i podmieniana
+# w calosci, gdy zmieni sie mtime/size ktoregos z plikow. Zepsuty plik przy przeladowaniu
+# nie wywraca runtime: zostaje poprzednia migawka, a blad trafia do reload_errors.
+# stat plikow najwyzej raz na CONFIG_SNAPSHOT_CHECK_S sekund (0 = przy kazdym wywolaniu).
+
+SNAPSHOT_CHECK_S = float(os.getenv("CONFIG_SNAPSHOT_CHECK_S", "1.0"))
+
+def _snapshot_files() -> Tuple[Path, ...]:
+    return (APP_MODES_JSON, APP_PRESETS_JSON, CFG_MODE_TEAM_MAP_JSON, CFG_POLICIES_JSON)
+
+
+def _file_sig(path: Path) -> Tuple[int, int]:
+    try:
+        st = path.stat()
+    except OSError:
+        return (-1, -1)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_json_tolerant(path: Path) -> Any:
+    # mode_team_map/policies: brak pliku lub zly JSON = pusta mapa (jak dotychczasowe czytniki)
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+class ConfigSnapshot:
+    """Validated view of the step config with O(1) lookups (mode->team, team->policy, preset->steps)."""
+
+    def __init__(self, modes: Dict[str, Any], presets: Dict[str, Any], mode_team: Any, policies: Any, sig: Tuple[Any, ...]):
+        self.sig = sig
+        self.modes = modes
+        self.presets = presets
+        self.mode_ids: FrozenSet[str] = frozenset(str(m["id"]) for m in modes["modes"])
+        self.preset_by_id: Dict[str, Dict[str, Any]] = {str(p["id"]): p for p in presets["presets"]}
+        self.preset_modes: Dict[str, Tuple[str, ...]] = {
+            pid: tuple(str(x).upper() for x in (p.get("modes") or [])) for pid, p in self.preset_by_id.items()
+        }
+        self.mode_team: Dict[str, Any] = mode_team if isinstance(mode_team, dict) else {}
+
+        teams: Any = {}
+        if isinstance(policies, dict) and isinstance(policies.get("teams"), dict):
+            teams = policies["teams"]
+        elif isinstance(policies, dict):
+            # fallback: plaska mapa
+            teams = policies
+        self.team_policy: Dict[str, Any] = teams
+
+    def team_for_mode(self, mode_id: str) -> Optional[str]:
+        return self.mode_team.get(mode_id)
+
+    def policy_for_team(self, team_id: str) -> Dict[str, Any]:
+        pol = self.team_policy.get(team_id)
+        return pol if isinstance(pol, dict) else {}
+
+    def preset(self, preset_id: str) -> Optional[Dict[str, Any]]:
+        return self.preset_by_id.get(str(preset_id))
+
+    def preset_steps(self, preset_id: str) -> Optional[List[Dict[str, Any]]]:
+        p = self.preset_by_id.get(str(preset_id))
+        steps = p.get("steps") if isinstance(p, dict) else None
+        if isinstance(steps, list) and all(isinstance(x, dict) and x.get("mode") for x in steps):
+            return steps
+        return None
+
+
+_SNAPSHOT: Optional[ConfigSnapshot] = None
+_SNAPSHOT_CHECKED = 0.0
+_SNAPSHOT_LOCK = threading.Lock()
+reload_errors: List[str] = []
+
+
+def _build_snapshot(sig: Tuple[Any, ...]) -> ConfigSnapshot:
+    return ConfigSnapshot(
+        modes=load_modes(),
+        presets=load_presets(),
+        mode_team=_load_json_tolerant(CFG_MODE_TEAM_MAP_JSON),
+        policies=_load_json_tolerant(CFG_POLICIES_JSON),
+        sig=sig,
+    )
+
+
+def get_snapshot() -> ConfigSnapshot:
+    """
+    Current config snapshot; rebuilt atomically when any source file changes.
+    First load raises ConfigError on invalid modes/presets; later reload errors keep the last good snapshot.
+    """
+    global _SNAPSHOT, _SNAPSHOT_CHECKED
+    snap = _SNAPSHOT
+    now = time.monotonic()
+    if snap is not None and now - _SNAPSHOT_CHECKED < SNAPSHOT_CHECK_S:
+        return snap
+    sig = tuple(_file_sig(p) for p in _snapshot_files())
+    _SNAPSHOT_CHECKED = now
+    if snap is not None and snap.sig == sig:
+        return snap
+    with _SNAPSHOT_LOCK:
+        snap = _SNAPSHOT
+        if snap is not None and snap.sig == sig:
+            return snap
+        try:
+            new = _build_snapshot(sig)
+        except ConfigError as e:
+            if snap is None:
+                raise
+            reload_errors.append(f"{type(e).__name__}: {e}")
+            del reload_errors[:-20]
+            # nie probujemy w kolko przy kazdym kroku: zapamietujemy sygnature zepsutego stanu
+            snap.sig = sig
+            return snap
+        _SNAPSHOT = new
+        return new
+
+
+def reset_snapshot() -> None:
+    global _SNAPSHOT
+    with _SNAPSHOT_LOCK:
+        _SNAPSHOT = None
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from starlette.responses import Response
+
+# Warunkowy GET (ETag / If-None-Match / If-Modified-Since) dla endpointow czytajacych pliki.
+#
+# ETag pliku = inode + rozmiar + mtime_ns, czyli sam stat() bez czytania tresci. Zapisy w repo ida
+# przez tmp+rename albo append, wiec kazda zmiana zmienia przynajmniej jedno z trzech.
+# Endpoint liczy ETag przed odczytem: klient z aktualna kopia kosztuje stat() i pusta odpowiedz 304.
+# Dane trzymane w pamieci (nie pliki) dostaja ETag z hasha serializowanego JSON.
+# Last-Modified ma rozdzielczosc 1 s: dla pliku zmienionego w biezacej sekundzie go nie wysylamy,
+# bo kolejny zapis w tej samej sekundzie mialby ten sam znacznik (klient dostalby potem stale 304).
+
+
+def stat_etag(st: Optional[os.stat_result]) -> str:
+    if st is None:
+        return '"0"'
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def path_stat(path: Any) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def path_etag(path: Any) -> str:
+    return stat_etag(path_stat(path))
+
+
+def combine_etags(tags: Iterable[str], variant: str = "") -> str:
+    """One strong ETag for a response built from several files (and query variant)."""
+    raw = "|".join(tags) + "#" + variant
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def json_etag(obj: Any) -> str:
+    raw = json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def _etag_listed(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match porownuje slabo (RFC 9110 13.1.2): W/"x" pasuje do "x"
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def is_not_modified(headers: Mapping[str, str], etag: str, mtime: Optional[float] = None) -> bool:
+    inm = headers.get("if-none-match")
+    if inm is not None:
+        return _etag_listed(inm, etag)  # If-Modified-Since ignorowane, gdy jest If-None-Match
+    ims = headers.get("if-modified-since")
+    if not ims or mtime is None:
+        return False
+    if _too_fresh(mtime):
+        return False
+    try:
+        # zmieniony, gdy mtime >= ims + 1 (ims to pelne sekundy z naszego Last-Modified)
+        return mtime < parsedate_to_datetime(ims).timestamp() + 1.0
+    except (TypeError, ValueError, IndexError):
+        return False
+
+
+def _too_fresh(mtime: float) -> bool:
+    return time.time() - mtime < 1.0
+
+
+def cache_headers(etag: str, mtime: Optional[float] = None) -> Dict[str, str]:
+    h = {"ETag": etag, "Cache-Control": "no-cache"}
+    if mtime is not None and not _too_fresh(mtime):
+        h["Last-Modified"] = formatdate(mtime, usegmt=True)
+    return h
+
+
+def not_modified(headers: Mapping[str, str], etag: str, mtime: Optional[float] = None) -> Optional[Response]:
+    """304 response when the client's copy is current, else None."""
+    if is_not_modified(headers, etag, mtime):
+        return Response(status_code=304, headers=cache_headers(etag, mtime))
+    return None
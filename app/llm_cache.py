@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Cache odpowiedzi LLM dla deterministycznych wywolan (polityka deterministic albo temperature == 0).
+#
+# Klucz = sha256(kind, model, temperature, max_tokens, sha1(system), user). Wpis to jeden plik JSON
+# <dir>/<k[:2]>/<k>.json (zapis atomowy), wiec cache przezywa restart i resume runu. Rozmiar ograniczony
+# LRU po bajtach (LLM_CACHE_MAX_MB); kolejnosc LRU odtwarzana z mtime przy starcie, trafienie robi touch.
+#   LLM_CACHE=0          wylacza cache
+#   LLM_CACHE_DIR        domyslnie <root>/cache/llm
+#   LLM_CACHE_MAX_MB     domyslnie 256
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _sha1(s: str) -> str:
+    return hashlib.sha1(s.encode("utf-8")).hexdigest()
+
+
+def cache_key(kind: str, model: str, temperature: Any, max_tokens: Any, system: str, user: str) -> str:
+    raw = json.dumps(
+        [kind, str(model or ""), temperature, max_tokens, _sha1(system or ""), user or ""],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_deterministic(temperature: Any, policy: Optional[Dict[str, Any]] = None) -> bool:
+    if isinstance(policy, dict) and policy.get("deterministic"):
+        return True
+    try:
+        return float(temperature) == 0.0
+    except Exception:
+        return False
+
+
+class LLMResponseCache:
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root or os.getenv("LLM_CACHE_DIR") or (ROOT / "cache" / "llm"))
+        self.max_bytes = int(max_bytes if max_bytes is not None else float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> size, od najstarszego
+        self._bytes = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> None:
+        if self._loaded:
+            return
+        entries = []
+        if self.root.exists():
+            for p in self.root.glob("*/*.json"):
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, p.stem, st.st_size))
+        entries.sort()
+        for _, key, size in entries:
+            self._index[key] = size
+            self._bytes += size
+        self._loaded = True
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            p = self._path(key)
+            try:
+                doc = json.loads(p.read_text(encoding="utf-8"))
+            except Exception:
+                self._bytes -= self._index.pop(key, 0)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(p, None)
+        except OSError:
+            pass
+        return doc if isinstance(doc, dict) else None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        p = self._path(key)
+        with self._lock:
+            self._load_index()
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, p)
+            self._bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self.stores += 1
+            while self._bytes > self.max_bytes and len(self._index) > 1:
+                old, size = self._index.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                try:
+                    self._path(old).unlink()
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                try:
+                    self._path(key).unlink()
+                except OSError:
+                    pass
+            self._index.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load_index()
+            total = self.hits + self.misses
+            return {
+                "enabled": cache_enabled(),
+                "dir": str(self.root),
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+def cache_enabled() -> bool:
+    return os.getenv("LLM_CACHE", "1") != "0"
+
+
+_CACHE: Optional[LLMResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache() -> LLMResponseCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = LLMResponseCache()
+        return _CACHE
+
+
+def reset_cache(**kwargs: Any) -> LLMResponseCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = LLMResponseCache(**kwargs)
+        return _CACHE
+
+
+def cacheable(temperature: Any, policy: Optional[Dict[str, Any]] = None) -> bool:
+    """True when cached_call()/cached_stream() go through the cache (else the call bypasses it)."""
+    return cache_enabled() and is_deterministic(temperature, policy)
+
+
+def cached_call(kind: str, model: str, temperature: Any, max_tokens: Any, system: str, user: str, call, *, policy: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Runs call() -> dict, going through the cache when the call is deterministic.
+    The returned dict gets "cached": True on a hit.
+    """
+    if not cacheable(temperature, policy):
+        return call()
+    cache = get_cache()
+    key = cache_key(kind, model, temperature, max_tokens, system, user)
+    hit = cache.get(key)
+    if hit is not None and "value" in hit:
+        out = dict(hit["value"])
+        out["cached"] = True
+        return out
+    value = call()
+    cache.put(key, {"value": value, "created": time.time(), "model": model})
+    return value
+
+
+def cached_stream(kind: str, model: str, temperature: Any, max_tokens: Any, system: str, user: str, open_stream, to_value, *, policy: Optional[Dict[str, Any]] = None):
+    """
+    Streaming counterpart of cached_call(): open_stream() -> app.llm_http.LLMStream.
+    A deterministic hit is replayed as a single delta; a miss is stored (to_value(stream)) once the stream completes.
+    """
+    from app.llm_http import LLMStream
+
+    if not cacheable(temperature, policy):
+        return open_stream()
+    cache = get_cache()
+    key = cache_key(kind, model, temperature, max_tokens, system, user)
+    hit = cache.get(key)
+    if hit is not None and "value" in hit:
+        value = hit["value"]
+        return LLMStream.of_text(str(value.get("text") or ""), str(value.get("model") or value.get("effective_model") or model))
+
+    stream = open_stream()
+    stream.on_complete = lambda st: cache.put(key, {"value": to_value(st), "created": time.time(), "model": model})
+    return stream
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Lokalny fake provider (OpenAI-compatible) do testow i benchmarkow warstwy app.llm_http.
+#
+#   python -m app.llm_fake_provider --port 8765
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake ...
+#
+# Obsluguje POST /v1/chat/completions i /v1/responses (HTTP/1.1 keep-alive). Zwraca deterministyczny
+# tekst "[fake:<model>] <ostatni prompt>". fail_next() kolejkuje odpowiedzi bledow (np. 429 z Retry-After).
+# "stream": true = ten sam tekst jako SSE (chunked), po slowie na event, co stream_delay_s sekund.
+
+
+class FakeLLMProvider:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *, delay_s: float = 0.0, stream_delay_s: float = 0.0):
+        self.delay_s = delay_s
+        self.stream_delay_s = stream_delay_s
+        self.requests: List[Dict[str, Any]] = []
+        self.connections = 0
+        self.stream_events_sent = 0
+        self.peak_inflight: Dict[str, int] = {}
+        self._inflight: Dict[str, int] = {}
+        self._failures: Deque[Tuple[int, Optional[str]]] = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def fail_next(self, status: int, count: int = 1, retry_after: Optional[str] = None) -> None:
+        with self._lock:
+            for _ in range(count):
+                self._failures.append((status, retry_after))
+
+    def start(self) -> "FakeLLMProvider":
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, name="fake-llm-provider", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeLLMProvider":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def _reply(self, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, str], Dict[str, Any]]:
+        model = str(body.get("model") or "")
+        with self._lock:
+            self.requests.append({"path": path, "body": body})
+            failure = self._failures.popleft() if self._failures else None
+            n = self._inflight.get(model, 0) + 1
+            self._inflight[model] = n
+            self.peak_inflight[model] = max(self.peak_inflight.get(model, 0), n)
+        try:
+            if self.delay_s:
+                time.sleep(self.delay_s)
+            if failure is not None:
+                status, retry_after = failure
+                headers = {"Retry-After": retry_after} if retry_after is not None else {}
+                return status, headers, {"error": {"message": f"fake failure {status}", "type": "fake"}}
+
+            if path.endswith("/chat/completions"):
+                msgs = body.get("messages") or []
+                prompt = str(msgs[-1].get("content") if msgs and isinstance(msgs[-1], dict) else "")
+                text = f"[fake:{model}] {prompt[:200]}"
+                return 200, {}, {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split()), "total_tokens": 0},
+                }
+            if path.endswith("/responses"):
+                prompt = str(body.get("input") or "")
+                text = f"[fake:{model}] {prompt[:200]}"
+                return 200, {}, {
+                    "id": "resp-fake",
+                    "object": "response",
+                    "model": model,
+                    "output": [{"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": text}]}],
+                    "usage": {"input_tokens": len(prompt.split()), "output_tokens": len(text.split()), "total_tokens": 0},
+                }
+            return 404, {}, {"error": {"message": f"unknown path {path}"}}
+        finally:
+            with self._lock:
+                self._inflight[model] -= 1
+
+    def _stream_events(self, path: str, payload: Dict[str, Any]):
+        model = payload.get("model")
+        if path.endswith("/chat/completions"):
+            text = payload["choices"][0]["message"]["content"]
+            for d in re.findall(r"\S+\s*|\s+", text):
+                yield {"id": payload["id"], "object": "chat.completion.chunk", "model": model, "choices": [{"index": 0, "delta": {"content": d}}]}
+            yield {"id": payload["id"], "object": "chat.completion.chunk", "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            return
+        text = payload["output"][0]["content"][0]["text"]
+        yield {"type": "response.created", "response": {"id": payload["id"], "model": model}}
+        for d in re.findall(r"\S+\s*|\s+", text):
+            yield {"type": "response.output_text.delta", "delta": d}
+        yield {"type": "response.completed", "response": {"id": payload["id"], "model": model, "usage": payload.get("usage")}}
+
+    def _handler_class(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # naglowki i body ida osobnymi write(); bez tego +40ms na keep-alive
+
+            def setup(self):
+                super().setup()
+                with provider._lock:
+                    provider.connections += 1
+
+            def log_message(self, format, *args):
+                return
+
+            def do_POST(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n) if n else b""
+                try:
+                    body = json.loads(raw.decode("utf-8")) if raw else {}
+                except Exception:
+                    body = {}
+                body = body if isinstance(body, dict) else {}
+                status, headers, payload = provider._reply(self.path, body)
+                if body.get("stream") and status == 200:
+                    self._send_stream(provider._stream_events(self.path, payload))
+                    return
+                out = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _send_stream(self, events):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def chunk(data: bytes) -> None:
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+
+                try:
+                    for ev in events:
+                        if provider.stream_delay_s:
+                            time.sleep(provider.stream_delay_s)
+                        chunk(f"data: {json.dumps(ev)}\n\n".encode("utf-8"))
+                        with provider._lock:
+                            provider.stream_events_sent += 1
+                    chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # klient przerwal stream
+                    self.close_connection = True
+
+        return Handler
+
+
+def main() -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay", type=float, default=0.0)
+    args = ap.parse_args()
+    p = FakeLLMProvider(args.host, args.port, delay_s=args.delay)
+    print(f"fake LLM provider on {p.base_url}")
+    try:
+        p._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        p._server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,632 @@
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import http.client
+import json
+import os
+import random
+import socket
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Wspolna warstwa HTTP do providera LLM (OpenAI-compatible), uzywana przez llm_client.generate_text
+# i team_runner._openai_chat:
+#   - keep-alive: pula polaczen http.client per host (bez handshake TLS przy kazdym wywolaniu),
+#   - limit rownoleglych wywolan per model (LLM_MAX_CONCURRENCY_PER_MODEL),
+#   - retry z wykladniczym backoffem na 429/5xx i bledach nawiazania polaczenia, z respektowaniem Retry-After;
+#     timeout odczytu / zerwanie po wyslaniu requestu NIE jest ponawiane (provider mogl juz przyjac
+#     i policzyc wywolanie), wyjatek idzie od razu do wywolujacego,
+#   - API sync (chat/responses) i async (achat/aresponses; wywolanie w watku, wspolne limity),
+#   - streaming SSE (chat_stream/responses_stream -> LLMStream: iterator delt tekstu, takze `async for`);
+#     retry tylko przed pierwszym bajtem odpowiedzi, time-to-first-token w stream_metrics().
+# Tylko stdlib; fake provider do testow: app/llm_fake_provider.py.
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class LLMHttpError(Exception):
+    def __init__(self, status: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}: {body[:400]}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+    except Exception:
+        return None
+    if dt is None:
+        return None
+    return max(0.0, dt.timestamp() - time.time())
+
+
+class _ConnectError(Exception):
+    """Connect-phase failure: no request bytes reached the provider, so a retry is safe."""
+
+    def __init__(self, error: OSError):
+        super().__init__(str(error))
+        self.error = error
+
+
+class _ConnectionPool:
+    """LIFO pool of idle keep-alive connections for one scheme://host:port."""
+
+    def __init__(self, scheme: str, host: str, port: Optional[int], timeout: float, maxsize: int):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def get(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+            self.opened += 1
+        if self.scheme == "https":
+            conn: http.client.HTTPConnection = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn, False
+
+    def put(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for c in idle:
+            c.close()
+
+
+class LLMHttpClient:
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        *,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        pool_size: Optional[int] = None,
+        max_concurrency_per_model: Optional[int] = None,
+    ):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout if timeout is not None else _env_float("LLM_TIMEOUT_S", 60.0)
+        self.max_retries = max_retries if max_retries is not None else _env_int("LLM_MAX_RETRIES", 4)
+        self.backoff_base = backoff_base if backoff_base is not None else _env_float("LLM_BACKOFF_BASE_S", 0.5)
+        self.backoff_max = backoff_max if backoff_max is not None else _env_float("LLM_BACKOFF_MAX_S", 30.0)
+        self.max_concurrency_per_model = max(
+            1, max_concurrency_per_model if max_concurrency_per_model is not None else _env_int("LLM_MAX_CONCURRENCY_PER_MODEL", 4)
+        )
+        self.sleep = time.sleep  # podmieniane w testach
+
+        u = urlsplit(self.base_url)
+        if u.scheme not in ("http", "https") or not u.hostname:
+            raise ValueError(f"Invalid LLM base_url: {self.base_url}")
+        self._prefix = u.path.rstrip("/")
+        self._pool = _ConnectionPool(u.scheme, u.hostname, u.port, self.timeout, pool_size if pool_size is not None else _env_int("LLM_POOL_SIZE", 8))
+        self._model_sems: Dict[str, threading.BoundedSemaphore] = {}
+        self._sems_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "streams": 0}
+
+    @property
+    def connections_opened(self) -> int:
+        return self._pool.opened
+
+    def close(self) -> None:
+        self._pool.close()
+
+    def _model_sem(self, model: str) -> threading.BoundedSemaphore:
+        with self._sems_lock:
+            sem = self._model_sems.get(model)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.max_concurrency_per_model)
+                self._model_sems[model] = sem
+            return sem
+
+    @staticmethod
+    def _connect(conn: http.client.HTTPConnection) -> None:
+        # jawny connect() oddziela faze polaczenia (bezpieczny retry) od wysylki i odczytu (bez retry)
+        if conn.sock is not None:
+            return
+        try:
+            conn.connect()
+        except OSError as e:
+            raise _ConnectError(e) from e
+
+    def _send_once(self, path: str, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+
+        # polaczenie z puli moglo zostac zamkniete po stronie serwera: wtedy jedna proba na swiezym
+        for fresh_retry in (False, True):
+            conn, reused = self._pool.get()
+            try:
+                self._connect(conn)
+                conn.request("POST", self._prefix + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, http.client.BadStatusLine):
+                conn.close()
+                if reused and not fresh_retry:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._pool.put(conn)
+            return resp.status, {k.lower(): v for k, v in resp.getheaders()}, data
+        raise RuntimeError("unreachable")
+
+    def _open_stream(self, path: str, body: bytes) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        headers = {"Content-Type": "application/json", "Accept": "text/event-stream", "Connection": "keep-alive"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        for fresh_retry in (False, True):
+            conn, reused = self._pool.get()
+            try:
+                self._connect(conn)
+                conn.request("POST", self._prefix + path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, http.client.BadStatusLine):
+                conn.close()
+                if reused and not fresh_retry:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+        raise RuntimeError("unreachable")
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        d = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return d * (0.5 + random.random() / 2)
+
+    def post_json(self, path: str, payload: Dict[str, Any], *, model: Optional[str] = None) -> Dict[str, Any]:
+        """POST JSON with keep-alive, per-model concurrency limit and retry on 429/5xx/connect errors."""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        sem = self._model_sem(str(model or payload.get("model") or ""))
+        attempt = 0
+        while True:
+            retry_after: Optional[float] = None
+            with sem:
+                self.stats["requests"] += 1
+                try:
+                    status, headers, data = self._send_once(path, body)
+                except _ConnectError as e:
+                    if attempt >= self.max_retries:
+                        raise e.error
+                else:
+                    if status < 400:
+                        try:
+                            return json.loads(data.decode("utf-8"))
+                        except Exception as e:
+                            raise LLMHttpError(status, f"invalid JSON body: {e}") from e
+                    retry_after = _parse_retry_after(headers.get("retry-after"))
+                    if status not in RETRY_STATUSES or attempt >= self.max_retries:
+                        raise LLMHttpError(status, data.decode("utf-8", errors="replace"), retry_after)
+            # backoff poza semaforem, zeby nie blokowac innych wywolan tego modelu
+            self.stats["retries"] += 1
+            self.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    def post_stream(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        *,
+        model: Optional[str] = None,
+        abort: Optional["_StreamAbort"] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        POST with "stream": true; yields parsed SSE `data:` events until [DONE].
+        Retries like post_json(), but only until the response starts; the model slot is held for the whole stream.
+        `abort` (set by LLMStream.close() from another thread) interrupts a blocked read; the connection is dropped.
+        """
+        body = json.dumps({**payload, "stream": True}, ensure_ascii=False).encode("utf-8")
+        sem = self._model_sem(str(model or payload.get("model") or ""))
+        attempt = 0
+        while True:
+            retry_after: Optional[float] = None
+            with sem:
+                self.stats["requests"] += 1
+                try:
+                    conn, resp = self._open_stream(path, body)
+                except _ConnectError as e:
+                    if attempt >= self.max_retries:
+                        raise e.error
+                else:
+                    if resp.status < 400:
+                        self.stats["streams"] += 1
+                        if abort is not None:
+                            abort.attach(conn)
+                        yield from self._iter_sse(conn, resp, abort)
+                        return
+                    data = resp.read()
+                    headers = {k.lower(): v for k, v in resp.getheaders()}
+                    if resp.will_close:
+                        conn.close()
+                    else:
+                        self._pool.put(conn)
+                    retry_after = _parse_retry_after(headers.get("retry-after"))
+                    if resp.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                        raise LLMHttpError(resp.status, data.decode("utf-8", errors="replace"), retry_after)
+            self.stats["retries"] += 1
+            self.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    def _iter_sse(
+        self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse, abort: Optional["_StreamAbort"] = None
+    ) -> Iterator[Dict[str, Any]]:
+        done = False
+        try:
+            data_lines: List[str] = []
+            while True:
+                raw = resp.readline()
+                if not raw:
+                    done = True
+                    break
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].lstrip())
+                    continue
+                if line or not data_lines:
+                    continue  # event:/id:/komentarz albo pusta linia bez danych
+                data, data_lines = "\n".join(data_lines), []
+                if data == "[DONE]":
+                    resp.read()
+                    done = True
+                    break
+                try:
+                    ev = json.loads(data)
+                except ValueError:
+                    continue
+                if isinstance(ev, dict):
+                    yield ev
+        finally:
+            # przerwany stream (konsument przestal czytac / blad / abort): polaczenia nie oddajemy do puli
+            if done and not resp.will_close and not (abort is not None and abort.is_set()):
+                self._pool.put(conn)
+            else:
+                conn.close()
+
+    def chat_stream(self, model: str, messages: List[Dict[str, Any]], **params: Any) -> "LLMStream":
+        payload: Dict[str, Any] = {"model": model, "messages": messages}
+        payload.update({k: v for k, v in params.items() if v is not None})
+        return self._stream("/chat/completions", payload, model)
+
+    def responses_stream(self, model: str, input: Any, **params: Any) -> "LLMStream":
+        payload: Dict[str, Any] = {"model": model, "input": input}
+        payload.update({k: v for k, v in params.items() if v is not None})
+        return self._stream("/responses", payload, model)
+
+    def _stream(self, path: str, payload: Dict[str, Any], model: str) -> "LLMStream":
+        abort = _StreamAbort()
+        return LLMStream(self.post_stream(path, payload, model=model, abort=abort), model, abort=abort)
+
+    def chat(self, model: str, messages: List[Dict[str, Any]], **params: Any) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"model": model, "messages": messages}
+        payload.update({k: v for k, v in params.items() if v is not None})
+        return self.post_json("/chat/completions", payload, model=model)
+
+    def responses(self, model: str, input: Any, **params: Any) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"model": model, "input": input}
+        payload.update({k: v for k, v in params.items() if v is not None})
+        return self.post_json("/responses", payload, model=model)
+
+    async def achat(self, model: str, messages: List[Dict[str, Any]], **params: Any) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.chat, model, messages, **params)
+
+    async def aresponses(self, model: str, input: Any, **params: Any) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.responses, model, input, **params)
+
+
+class _StreamAbort:
+    """Cross-thread abort of one SSE response: shutdown() wakes a reader blocked in readline()."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def attach(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._conn = conn
+        if self._event.is_set():
+            self._shutdown()
+
+    def __call__(self) -> None:
+        self._event.set()
+        self._shutdown()
+
+    def _shutdown(self) -> None:
+        with self._lock:
+            sock = self._conn.sock if self._conn is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def stream_event_delta(ev: Dict[str, Any]) -> Optional[str]:
+    """Text delta from a Responses API stream event or a chat.completions chunk."""
+    if ev.get("type") == "response.output_text.delta":
+        d = ev.get("delta")
+        return d if isinstance(d, str) else None
+    try:
+        d = ev["choices"][0]["delta"].get("content")
+    except Exception:
+        return None
+    return d if isinstance(d, str) else None
+
+
+class _StreamMetrics:
+    """Rolling window of time-to-first-token / total stream times (ms)."""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._ttft: List[float] = []
+        self._total: List[float] = []
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.cached = 0
+
+    def record(self, ttft_ms: Optional[float], total_ms: float, cached: bool) -> None:
+        with self._lock:
+            self.streams += 1
+            if cached:
+                self.cached += 1
+                return
+            if ttft_ms is not None:
+                self._ttft = (self._ttft + [ttft_ms])[-self.window:]
+            self._total = (self._total + [total_ms])[-self.window:]
+
+    @staticmethod
+    def _pct(vals: List[float], q: float) -> Optional[float]:
+        if not vals:
+            return None
+        s = sorted(vals)
+        return round(s[min(len(s) - 1, int(q * len(s)))], 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "streams": self.streams,
+                "cached": self.cached,
+                "ttft_ms_p50": self._pct(self._ttft, 0.5),
+                "ttft_ms_p95": self._pct(self._ttft, 0.95),
+                "total_ms_p50": self._pct(self._total, 0.5),
+                "total_ms_p95": self._pct(self._total, 0.95),
+            }
+
+
+_STREAM_METRICS = _StreamMetrics()
+
+
+def stream_metrics() -> Dict[str, Any]:
+    return _STREAM_METRICS.snapshot()
+
+
+def reset_stream_metrics() -> None:
+    global _STREAM_METRICS
+    _STREAM_METRICS = _StreamMetrics()
+
+
+class LLMStream:
+    """
+    Iterator of text deltas over SSE events. After exhaustion: text, model, usage, ttft_ms, total_ms.
+    `async for` runs the blocking iteration in a thread. on_complete(stream) fires once, after the last delta.
+    close() stops the stream from any thread (upstream response closed, on_complete not called).
+    """
+
+    def __init__(
+        self,
+        events: Iterator[Dict[str, Any]],
+        model: str,
+        *,
+        extract: Callable[[Dict[str, Any]], Optional[str]] = stream_event_delta,
+        on_complete: Optional[Callable[["LLMStream"], None]] = None,
+        cached: bool = False,
+        abort: Optional[Callable[[], None]] = None,
+    ):
+        self._events = events
+        self._abort = abort
+        self.closed = False
+        self._extract = extract
+        self.on_complete = on_complete
+        self.model = model
+        self.usage: Optional[Dict[str, Any]] = None
+        self.cached = cached
+        self.parts: List[str] = []
+        self.ttft_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self.done = False
+        self._started = False
+
+    @classmethod
+    def of_text(cls, text: str, model: str, *, cached: bool = True) -> "LLMStream":
+        return cls(iter([{"type": "response.output_text.delta", "delta": text}] if text else []), model, cached=cached)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def __iter__(self) -> Iterator[str]:
+        if self._started:
+            raise RuntimeError("LLMStream can be iterated only once")
+        self._started = True
+        t0 = time.perf_counter()
+        try:
+            yield from self._iterate(t0)
+        finally:
+            # przerwane wczesniej (break konsumenta, close(), blad): zamykamy upstream od razu, nie przy GC
+            if not self.done:
+                self._close_events()
+
+    def _iterate(self, t0: float) -> Iterator[str]:
+        for ev in self._events:
+            if self.closed:
+                return
+            resp = ev.get("response") if isinstance(ev.get("response"), dict) else ev
+            if isinstance(resp.get("model"), str) and resp["model"]:
+                self.model = resp["model"]
+            if isinstance(resp.get("usage"), dict):
+                self.usage = resp["usage"]
+            d = self._extract(ev)
+            if not d:
+                continue
+            if self.ttft_ms is None:
+                self.ttft_ms = round((time.perf_counter() - t0) * 1000, 1)
+            self.parts.append(d)
+            yield d
+        if self.closed:
+            return  # EOF po abort(): strumien niepelny, bez on_complete
+        self.total_ms = round((time.perf_counter() - t0) * 1000, 1)
+        self.done = True
+        _STREAM_METRICS.record(self.ttft_ms, self.total_ms, self.cached)
+        if self.on_complete is not None:
+            self.on_complete(self)
+
+    def read(self) -> str:
+        for _ in self:
+            pass
+        return self.text
+
+    def _close_events(self) -> None:
+        close = getattr(self._events, "close", None)
+        if close is not None:
+            close()
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self._close_events()
+        except ValueError:
+            # generator czyta w innym watku (pump z __aiter__): przerywamy odczyt z gniazda,
+            # watek sam zamknie generator przy nastepnym evencie albo na bledzie odczytu
+            if self._abort is not None:
+                self._abort()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        q: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+
+        def pump() -> None:
+            try:
+                for d in self:
+                    if self.closed:
+                        break
+                    loop.call_soon_threadsafe(q.put_nowait, ("delta", d))
+                loop.call_soon_threadsafe(q.put_nowait, ("end", None))
+            except BaseException as e:  # noqa: BLE001 - przekazujemy do konsumenta
+                if not self.closed:
+                    loop.call_soon_threadsafe(q.put_nowait, ("error", e))
+
+        task = loop.run_in_executor(None, pump)
+        finished = False
+        try:
+            while True:
+                kind, val = await q.get()
+                if kind == "delta":
+                    yield val
+                elif kind == "error":
+                    finished = True
+                    raise val
+                else:
+                    finished = True
+                    break
+        finally:
+            # konsument przerwal (break, rozlaczony klient, anulowanie): zamykamy upstream zamiast doczytywac
+            if not finished:
+                self.close()
+            await asyncio.shield(task)
+
+
+def response_output_text(data: Dict[str, Any]) -> str:
+    """Text from a Responses API body (SDK's output_text) or a chat.completions body."""
+    if isinstance(data.get("output_text"), str):
+        return data["output_text"]
+    parts: List[str] = []
+    for item in data.get("output") or []:
+        if not isinstance(item, dict):
+            continue
+        for c in item.get("content") or []:
+            if isinstance(c, dict) and isinstance(c.get("text"), str):
+                parts.append(c["text"])
+    if parts:
+        return "".join(parts)
+    try:
+        return data["choices"][0]["message"]["content"] or ""
+    except Exception:
+        return ""
+
+
+_CLIENTS: Dict[Tuple[str, str], LLMHttpClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> LLMHttpClient:
+    """Process-wide client per (base_url, api_key); defaults from OPENAI_BASE_URL / OPENAI_API_KEY."""
+    base = (base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+    key = api_key if api_key is not None else (os.getenv("OPENAI_API_KEY") or "")
+    with _CLIENTS_LOCK:
+        c = _CLIENTS.get((base, key))
+        if c is None:
+            c = LLMHttpClient(base, key or None)
+            _CLIENTS[(base, key)] = c
+        return c
+
+
+def reset_clients() -> None:
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for c in clients:
+        c.close()
@@ -0,0 +1,616 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+# Jeden serwis lockow (ksiazki, worker, agent/run) zamiast osobnych plikow O_EXCL z petla sleep(0.2).
+#
+# W procesie: per nazwa holder + kolejka FIFO oczekujacych (threading.Event albo asyncio.Future); release
+# oddaje lock pierwszemu w kolejce od razu, bez pollingu i bez zwalniania locka systemowego.
+# Miedzy procesami: fcntl.flock na locks/<name>.lock (plik zostaje, zwalnia go jadro, takze po crashu);
+# bez fcntl (Windows, albo LOCKS_BACKEND=excl) plik tworzony przez O_EXCL i kasowany przy release.
+# Tylko przy konkurencji z innym procesem pierwszy oczekujacy odpytuje lock z backoffem POLL_MIN_S..POLL_MAX_S.
+#
+# Lease: opcjonalny ttl; wygasly lease (nieodnowiony) moze przejac nastepny chetny. keepalive=True odnawia
+# lease z watku w tle do release, wiec o "martwym" locku decyduje zycie wlasciciela, nie mtime pliku.
+# Plik locka w backendzie excl trzyma {pid, host, expires_at}: lock procesu, ktory nie zyje (ten sam host),
+# albo wygasly, jest przejmowany.
+#
+# Marker: opcjonalny (sciezka, tresc) zapisywany przy przejeciu i kasowany przy zwolnieniu, dla narzedzi,
+# ktore patrza na pliki (books/<book>/_active.lock, books/<book>/.lock).
+#
+# file_lock(path): krotka sekcja krytyczna na wspoldzielonym pliku (dopisywanie do logu/dziennika z wielu
+# procesow) - blokujacy flock na pliku obok danych; bez fcntl lock z tego serwisu nazwany hashem sciezki.
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+LOCKS_DIR = Path(os.getenv("LOCKS_DIR") or str(ROOT_DIR / "locks"))
+POLL_MIN_S = 0.005
+POLL_MAX_S = 0.1
+LEGACY_STALE_S = 3600
+
+_HOST = socket.gethostname()
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.\-]{0,127}$")
+_LEGACY_PID_RE = re.compile(r"pid=(\d+)")
+
+
+class LockError(RuntimeError):
+    pass
+
+
+class LockTimeout(LockError):
+    pass
+
+
+def default_backend() -> str:
+    b = (os.getenv("LOCKS_BACKEND") or "").strip().lower()
+    if b == "excl" or fcntl is None:
+        return "excl"
+    return "fcntl"
+
+
+def pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        import ctypes
+
+        k32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+        h = k32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not h:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(k32.GetExitCodeProcess(h, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            k32.CloseHandle(h)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _read_meta(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        raw = path.read_text(encoding="utf-8", errors="replace").strip()
+    except OSError:
+        return None
+    if not raw:
+        return None
+    try:
+        meta = json.loads(raw)
+        return meta if isinstance(meta, dict) else None
+    except Exception:
+        m = _LEGACY_PID_RE.search(raw)
+        return {"pid": int(m.group(1))} if m else None
+
+
+class Lease:
+    def __init__(self, mgr: "LockManager", name: str, owner: str, ttl: Optional[float], marker: Optional[Tuple[Path, str]]):
+        self.name = name
+        self.owner = owner
+        self.token = uuid.uuid4().hex
+        self.acquired_at = time.time()
+        self.ttl = ttl
+        self.expires_at = self.acquired_at + ttl if ttl else None
+        self.marker = marker
+        self._mgr = mgr
+        self._stop: Optional[threading.Event] = None
+
+    @property
+    def held(self) -> bool:
+        return self._mgr.holds(self)
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.expires_at is not None and (now if now is not None else time.time()) >= self.expires_at
+
+    def renew(self, ttl: Optional[float] = None) -> bool:
+        return self._mgr.renew(self, ttl)
+
+    def release(self) -> bool:
+        return self._mgr.release(self)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "owner": self.owner,
+            "pid": os.getpid(),
+            "host": _HOST,
+            "token": self.token,
+            "acquired_at": self.acquired_at,
+            "expires_at": self.expires_at,
+        }
+
+    def _keepalive(self) -> None:
+        stop = self._stop
+        interval = max(0.05, float(self.ttl or 0) / 3)
+        while stop is not None and not stop.wait(interval):
+            if not self.renew():
+                return
+
+    def __enter__(self) -> "Lease":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.release()
+
+    async def __aenter__(self) -> "Lease":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.release()
+
+
+class _Waiter:
+    __slots__ = ("owner", "ttl", "marker", "keepalive", "event", "loop", "future", "lease")
+
+    def __init__(self, owner: str, ttl: Optional[float], marker: Optional[Tuple[Path, str]], keepalive: bool):
+        self.owner = owner
+        self.ttl = ttl
+        self.marker = marker
+        self.keepalive = keepalive
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+        self.lease: Optional[Lease] = None
+
+
+class _Entry:
+    __slots__ = ("name", "path", "holder", "waiters", "fd")
+
+    def __init__(self, name: str, path: Path):
+        self.name = name
+        self.path = path
+        self.holder: Optional[Lease] = None
+        self.waiters: Deque[_Waiter] = deque()
+        self.fd: Optional[int] = None
+
+
+class LockManager:
+    def __init__(self, locks_dir: Optional[Path] = None, backend: Optional[str] = None):
+        self.locks_dir = Path(locks_dir) if locks_dir is not None else LOCKS_DIR
+        self.backend = backend or default_backend()
+        if self.backend == "fcntl" and fcntl is None:
+            self.backend = "excl"
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self.handovers = 0
+
+    def path(self, name: str) -> Path:
+        return self.locks_dir / f"{name}.lock"
+
+    def _entry(self, name: str) -> _Entry:
+        e = self._entries.get(name)
+        if e is None:
+            if not _NAME_RE.match(name or ""):
+                raise ValueError(f"invalid lock name: {name!r}")
+            e = _Entry(name, self.path(name))
+            self._entries[name] = e
+        return e
+
+    # --- lock systemowy ---
+
+    def _stale_file(self, path: Path) -> bool:
+        meta = _read_meta(path)
+        if meta is None:
+            # plik bez metadanych (swiezo tworzony albo obcy): tylko bardzo stary uznajemy za martwy
+            try:
+                return time.time() - path.stat().st_mtime > LEGACY_STALE_S
+            except OSError:
+                return False
+        exp = meta.get("expires_at")
+        if exp and time.time() >= float(exp):
+            return True
+        try:
+            pid = int(meta.get("pid") or 0)
+        except (TypeError, ValueError):
+            pid = 0
+        if pid and pid != os.getpid() and (meta.get("host") or _HOST) == _HOST:
+            return not pid_alive(pid)
+        return False
+
+    def _os_acquire(self, e: _Entry) -> bool:
+        if e.fd is not None:
+            return True
+        self.locks_dir.mkdir(parents=True, exist_ok=True)
+        if self.backend == "fcntl":
+            fd = os.open(str(e.path), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            e.fd = fd
+            return True
+        for _ in range(2):
+            try:
+                e.fd = os.open(str(e.path), os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o644)
+                return True
+            except FileExistsError:
+                if not self._stale_file(e.path):
+                    return False
+                try:
+                    e.path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    return False
+        return False
+
+    def _os_release(self, e: _Entry) -> None:
+        fd, e.fd = e.fd, None
+        if fd is None:
+            return
+        try:
+            if self.backend == "fcntl":
+                os.ftruncate(fd, 0)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+        if self.backend == "excl":
+            try:
+                e.path.unlink()
+            except OSError:
+                pass
+
+    def _write_meta(self, e: _Entry, lease: Lease) -> None:
+        if e.fd is None:
+            return
+        try:
+            os.lseek(e.fd, 0, os.SEEK_SET)
+            os.ftruncate(e.fd, 0)
+            os.write(e.fd, json.dumps(lease.info(), ensure_ascii=False).encode("utf-8"))
+        except OSError:
+            pass
+
+    def _external_holder(self, path: Path) -> Optional[Dict[str, Any]]:
+        # lock trzymany przez inny proces (dla nazw, ktorych ten proces nie trzyma)
+        if not path.exists():
+            return None
+        if self.backend == "fcntl":
+            try:
+                fd = os.open(str(path), os.O_RDONLY)
+            except OSError:
+                return None
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                return None
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+        elif self._stale_file(path):
+            return None
+        meta = _read_meta(path) or {}
+        meta.setdefault("name", path.stem)
+        meta["local"] = False
+        return meta
+
+    # --- przydzial ---
+
+    def _grant(self, e: _Entry, owner: str, ttl: Optional[float], marker: Optional[Tuple[Path, str]], keepalive: bool) -> Lease:
+        lease = Lease(self, e.name, owner, ttl, marker)
+        e.holder = lease
+        self._write_meta(e, lease)
+        if marker is not None:
+            try:
+                Path(marker[0]).parent.mkdir(parents=True, exist_ok=True)
+                Path(marker[0]).write_text(marker[1], encoding="utf-8")
+            except OSError:
+                pass
+        if keepalive and ttl:
+            lease._stop = threading.Event()
+            threading.Thread(target=lease._keepalive, name=f"lock-ka-{e.name[:16]}", daemon=True).start()
+        return lease
+
+    def _end(self, e: _Entry) -> None:
+        lease, e.holder = e.holder, None
+        if lease is None:
+            return
+        if lease._stop is not None:
+            lease._stop.set()
+        if lease.marker is not None:
+            try:
+                Path(lease.marker[0]).unlink()
+            except OSError:
+                pass
+
+    def _handover(self, e: _Entry) -> None:
+        # holder wlasnie zniknal: pierwszy oczekujacy dostaje lock od razu (lock systemowy zostaje w procesie)
+        if e.waiters:
+            w = e.waiters.popleft()
+            w.lease = self._grant(e, w.owner, w.ttl, w.marker, w.keepalive)
+            self.handovers += 1
+            if w.future is not None and w.loop is not None:
+                w.loop.call_soon_threadsafe(self._deliver, w)
+            elif w.event is not None:
+                w.event.set()
+            return
+        self._os_release(e)
+
+    def _gc(self, e: _Entry) -> None:
+        if e.holder is None and not e.waiters and e.fd is None and self._entries.get(e.name) is e:
+            del self._entries[e.name]
+
+    def _deliver(self, w: _Waiter) -> None:
+        if w.future is None or w.future.done():
+            if w.lease is not None:
+                self.release(w.lease)
+        else:
+            w.future.set_result(w.lease)
+
+    def _expire(self, e: _Entry) -> None:
+        if e.holder is not None and e.holder.expired():
+            self._end(e)
+            self._handover(e)
+
+    def _try_now(self, e: _Entry, w: _Waiter) -> Optional[Lease]:
+        self._expire(e)
+        if w.lease is not None:
+            return w.lease
+        head = not e.waiters or e.waiters[0] is w
+        if e.holder is None and head and self._os_acquire(e):
+            if e.waiters and e.waiters[0] is w:
+                e.waiters.popleft()
+            w.lease = self._grant(e, w.owner, w.ttl, w.marker, w.keepalive)
+            return w.lease
+        return None
+
+    def _wait_hint(self, e: _Entry, poll: float, deadline: Optional[float]) -> Optional[float]:
+        # holder w procesie bez ttl: czekamy na handover; inaczej do wygasniecia albo odpytanie locka systemowego
+        now = time.monotonic()
+        if e.holder is not None:
+            wait = None if e.holder.expires_at is None else max(0.0, e.holder.expires_at - time.time()) + 0.001
+        else:
+            wait = poll
+        if deadline is not None:
+            left = max(0.0, deadline - now)
+            wait = left if wait is None else min(wait, left)
+        return wait
+
+    def _start(self, name: str, w: _Waiter) -> Optional[Lease]:
+        with self._lock:
+            e = self._entry(name)
+            lease = self._try_now(e, w)
+            if lease is None:
+                e.waiters.append(w)
+            return lease
+
+    def _step(self, name: str, w: _Waiter, deadline: Optional[float]) -> Optional[Lease]:
+        with self._lock:
+            e = self._entry(name)
+            lease = self._try_now(e, w)
+            if lease is not None:
+                return lease
+            if deadline is not None and time.monotonic() >= deadline:
+                self._cancel(e, w)
+                raise LockTimeout(f"lock busy: {name}")
+            return None
+
+    def _cancel(self, e: _Entry, w: _Waiter) -> None:
+        try:
+            e.waiters.remove(w)
+        except ValueError:
+            pass
+        self._gc(e)
+
+    def _waiter_hint(self, name: str, poll: float, deadline: Optional[float]) -> Optional[float]:
+        with self._lock:
+            return self._wait_hint(self._entry(name), poll, deadline)
+
+    # --- API ---
+
+    def try_acquire(
+        self, name: str, owner: str = "", ttl: Optional[float] = None, marker: Optional[Tuple[Path, str]] = None, keepalive: bool = False
+    ) -> Optional[Lease]:
+        """Lease when the lock is free right now (and nobody is queued for it), else None."""
+        w = _Waiter(owner or self._default_owner(), ttl, marker, keepalive)
+        with self._lock:
+            e = self._entry(name)
+            lease = self._try_now(e, w)
+            self._gc(e)
+            return lease
+
+    def acquire(
+        self,
+        name: str,
+        owner: str = "",
+        timeout: Optional[float] = None,
+        ttl: Optional[float] = None,
+        marker: Optional[Tuple[Path, str]] = None,
+        keepalive: bool = False,
+    ) -> Lease:
+        """Blocking FIFO acquisition; raises LockTimeout after `timeout` seconds (None = wait forever)."""
+        w = _Waiter(owner or self._default_owner(), ttl, marker, keepalive)
+        w.event = threading.Event()
+        lease = self._start(name, w)
+        if lease is not None:
+            return lease
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll = POLL_MIN_S
+        while True:
+            if w.event.wait(self._waiter_hint(name, poll, deadline)) and w.lease is not None:
+                return w.lease
+            lease = self._step(name, w, deadline)
+            if lease is not None:
+                return lease
+            poll = min(POLL_MAX_S, poll * 2)
+
+    async def acquire_async(
+        self,
+        name: str,
+        owner: str = "",
+        timeout: Optional[float] = None,
+        ttl: Optional[float] = None,
+        marker: Optional[Tuple[Path, str]] = None,
+        keepalive: bool = False,
+    ) -> Lease:
+        """Like acquire(), but waits on the event loop instead of blocking a thread."""
+        loop = asyncio.get_running_loop()
+        w = _Waiter(owner or self._default_owner(), ttl, marker, keepalive)
+        w.loop = loop
+        w.future = loop.create_future()
+        lease = self._start(name, w)
+        if lease is not None:
+            return lease
+        deadline = None if timeout is None else time.monotonic() + timeout
+        poll = POLL_MIN_S
+        try:
+            while True:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(w.future), self._waiter_hint(name, poll, deadline))
+                except asyncio.TimeoutError:
+                    pass
+                lease = self._step(name, w, deadline)
+                if lease is not None:
+                    return lease
+                poll = min(POLL_MAX_S, poll * 2)
+        except asyncio.CancelledError:
+            with self._lock:
+                e = self._entries.get(name)
+                if e is not None:
+                    self._cancel(e, w)
+            w.future.cancel()
+            if w.lease is not None:
+                self.release(w.lease)
+            raise
+
+    def release(self, lease: Lease) -> bool:
+        with self._lock:
+            e = self._entries.get(lease.name)
+            if e is None or e.holder is not lease:
+                return False
+            self._end(e)
+            self._handover(e)
+            self._gc(e)
+            return True
+
+    def renew(self, lease: Lease, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            e = self._entries.get(lease.name)
+            if e is None or e.holder is not lease:
+                return False
+            if ttl is not None:
+                lease.ttl = ttl
+            lease.expires_at = time.time() + lease.ttl if lease.ttl else None
+            self._write_meta(e, lease)
+            return True
+
+    def holds(self, lease: Lease) -> bool:
+        with self._lock:
+            e = self._entries.get(lease.name)
+            return e is not None and e.holder is lease
+
+    def force_release(self, name: str) -> bool:
+        """Drops the current holder in this process (next waiter gets the lock)."""
+        with self._lock:
+            e = self._entries.get(name)
+            if e is None or e.holder is None:
+                return False
+            self._end(e)
+            self._handover(e)
+            self._gc(e)
+            return True
+
+    def holder(self, name: str) -> Optional[Dict[str, Any]]:
+        if not _NAME_RE.match(name or ""):
+            raise ValueError(f"invalid lock name: {name!r}")
+        with self._lock:
+            e = self._entries.get(name)
+            if e is not None:
+                self._expire(e)
+                self._gc(e)
+            if e is not None and e.holder is not None:
+                return dict(e.holder.info(), local=True, waiters=len(e.waiters))
+            if e is not None and e.fd is not None:
+                return None
+        return self._external_holder(self.path(name))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            for e in list(self._entries.values()):
+                self._expire(e)
+                self._gc(e)
+            for name, e in sorted(self._entries.items()):
+                row = dict(e.holder.info(), local=True) if e.holder is not None else {"name": name, "local": True, "owner": None}
+                row["waiters"] = len(e.waiters)
+                out.append(row)
+            local = set(self._entries)
+        try:
+            files = sorted(self.locks_dir.glob("*.lock"))
+        except OSError:
+            files = []
+        for p in files:
+            if p.stem in local:
+                continue
+            info = self._external_holder(p)
+            if info is not None:
+                out.append(info)
+        return out
+
+    @staticmethod
+    def _default_owner() -> str:
+        return f"{os.getpid()}:{threading.current_thread().name}"
+
+
+@contextmanager
+def file_lock(path: Path, timeout: Optional[float] = None) -> Iterator[None]:
+    """Exclusive cross-process lock on `path` (created if missing); not reentrant."""
+    if default_backend() == "fcntl":
+        fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # zamkniecie deskryptora zwalnia flock
+        return
+    name = "file_" + hashlib.blake2b(str(Path(path).resolve()).encode("utf-8"), digest_size=10).hexdigest()
+    lease = get_lock_manager().acquire(name, timeout=timeout, ttl=300, keepalive=True)
+    try:
+        yield
+    finally:
+        lease.release()
+
+
+_MANAGER: Optional[LockManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_lock_manager() -> LockManager:
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = LockManager()
+        return _MANAGER
+
+
+def reset_lock_manager(manager: Optional[LockManager] = None) -> None:
+    global _MANAGER
+    with _MANAGER_LOCK:
+        _MANAGER = manager
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException
+
+from .lock_manager import get_lock_manager
+
+router = APIRouter(prefix="/locks", tags=["locks"])
+
+
+@router.get("")
+def list_locks():
+    mgr = get_lock_manager()
+    return {
+        "backend": mgr.backend,
+        "locks_dir": str(mgr.locks_dir),
+        "handovers": mgr.handovers,
+        "locks": mgr.snapshot(),
+    }
+
+
+@router.get("/{name}")
+def get_lock(name: str):
+    try:
+        holder = get_lock_manager().holder(name)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if holder is None:
+        return {"name": name, "locked": False, "holder": None}
+    return {"name": name, "locked": True, "holder": holder}
@@ -146,313 +146,29 @@ def _p6_presets_payload():
 # === /P6_PRESETS_CANONICAL_HELPER ===
 
 
+import asyncio
 import inspect
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-def _fr_autodetect_and_apply(_locals: dict):
-    import json, time
-    from pathlib import Path
-
-    def _to_dict(x):
-        if x is None:
-            return {}
-        if isinstance(x, dict):
-            return x
-        for m in ("model_dump", "dict"):
-            if hasattr(x, m):
-                try:
-                    return getattr(x, m)(exclude_none=False)
-                except TypeError:
-                    try:
-                        return getattr(x, m)()
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-        if hasattr(x, "__dict__"):
-            try:
-                return dict(x.__dict__)
-            except Exception:
-                return {}
-        return {}
-
-    def _walk_has_force(o):
-        if isinstance(o, dict):
-            for k, v in o.items():
-                ks = str(k).lower()
-                if ks in ("force_reject","force_quality_reject","quality_force_reject"):
-                    if bool(v):
-                        return True
-                if ks == "force_decision" and str(v).upper() == "REJECT":
-                    return True
-                if _walk_has_force(v):
-                    return True
-            return False
-        if isinstance(o, list):
-            return any(_walk_has_force(x) for x in o)
-        return False
-
-    def _find_run_id_from_obj(v):
-        if isinstance(v, dict) and v.get("run_id"):
-            return str(v["run_id"])
-        if hasattr(v, "run_id"):
-            try:
-                rv = getattr(v, "run_id")
-                if rv:
-                    return str(rv)
-            except Exception:
-                pass
-        d = _to_dict(v)
-        if isinstance(d, dict) and d.get("run_id"):
-            return str(d["run_id"])
-        # JSONResponse fallback
-        if hasattr(v, "body"):
-            try:
-                b = getattr(v, "body")
-                if isinstance(b, (bytes, bytearray)):
-                    jd = json.loads(b.decode("utf-8", errors="ignore"))
-                    if isinstance(jd, dict) and jd.get("run_id"):
-                        return str(jd["run_id"])
-            except Exception:
-                pass
-        return None
-
-    # -------- force detection --------
-    force = False
-    blob = repr(_locals).lower()
-    if ("force_reject" in blob) or ("force_quality_reject" in blob) or ("quality_force_reject" in blob) or ("force_decision" in blob and "reject" in blob):
-        force = True
-    if "[force_reject]" in blob:
-        force = True
-
-    for v in _locals.values():
-        d = _to_dict(v)
-        if d and _walk_has_force(d):
-            force = True
-
-    # -------- run_id detection --------
-    run_id = None
-    for v in _locals.values():
-        rid = _find_run_id_from_obj(v)
-        if rid:
-            run_id = rid
-            break
-
-    root = Path(__file__).resolve().parents[1]
-    runs_root = root / "runs"
-    if not runs_root.exists():
-        return
-
-    candidate_dirs = []
-    if run_id:
-        d = runs_root / str(run_id)
-        if d.exists():
-            candidate_dirs.append(d)
-
-    # fallback: latest runs (gdy run_id nieosiągalny w locals)
-    if not candidate_dirs:
-        all_runs = [x for x in runs_root.glob("run_*") if x.is_dir()]
-        all_runs.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-        candidate_dirs.extend(all_runs[:5])
-
-    def _apply_on_run(run_dir: Path):
-        steps_dir = run_dir / "steps"
-        if not steps_dir.exists():
-            return False
-
-        # poczekaj chwilę na QUALITY
-        qfiles = []
-        for _ in range(40):  # do ~10s
-            qfiles = sorted(list(steps_dir.glob("*QUALITY*.json")) + list(steps_dir.glob("*GATE*.json")) + list(steps_dir.glob("*CHECK*.json")))
-            if qfiles:
-                break
-            time.sleep(0.25)
-        if not qfiles:
-            return False
-
-        # dodatkowa detekcja force z plików runu
-        local_force = force
-        if not local_force:
-            joined = ""
-            for sf in sorted(steps_dir.glob("*.json")):
-                try:
-                    joined += "\n" + sf.read_text(encoding="utf-8", errors="ignore")
-                except Exception:
-                    pass
-            lj = joined.lower()
-            if ("force_reject" in lj) or ("force_quality_reject" in lj) or ("quality_force_reject" in lj) or ('"force_decision":"reject"' in lj) or ('"force_decision": "reject"' in lj) or ("[force_reject]" in lj):
-                local_force = True
-
-        if not local_force:
-            return False
-
-        reason = "FORCE_REJECT: request flag/marker active"
-        changed = False
-
-        for qf in qfiles:
-            try:
-                j = json.loads(qf.read_text(encoding="utf-8"))
-                if not isinstance(j, dict):
-                    continue
-
-                result = j.get("result")
-                if not isinstance(result, dict):
-                    result = {}
-                    j["result"] = result
-
-                payload = _p15_hardfail_quality_payload(result).get("payload")
-                if not isinstance(payload, dict):
-                    payload = {}
-                    result["payload"] = payload
-
-                payload["DECISION"] = "REJECT"
-
-                reasons = payload.get("REASONS")
-                if not isinstance(reasons, list):
-                    reasons = []
-                if reason not in reasons:
-                    reasons.append(reason)
-                payload["REASONS"] = reasons
-
-                flags = payload.get("FLAGS")
-                if not isinstance(flags, dict):
-                    flags = {}
-                flags["force_reject"] = True
-                payload["FLAGS"] = flags
-
-                # pola znormalizowane
-                j["decision"] = "REJECT"
-                j["revision_reason"] = reason
-                j["flags"] = flags
-
-                qf.write_text(json.dumps(j, ensure_ascii=False, indent=2), encoding="utf-8")
-                changed = True
-            except Exception:
-                continue
-
-        return changed
-
-    for cd in candidate_dirs:
-        if _apply_on_run(cd):
-            return
-def _force_reject_apply_if_needed(_locals: dict):
-    import json
-    from pathlib import Path
-
-    def _to_dict(x):
-        if x is None:
-            return {}
-        if isinstance(x, dict):
-            return x
-        for m in ("model_dump", "dict"):
-            if hasattr(x, m):
-                try:
-                    return getattr(x, m)(exclude_none=False)
-                except TypeError:
-                    try:
-                        return getattr(x, m)()
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-        if hasattr(x, "__dict__"):
-            try:
-                return dict(x.__dict__)
-            except Exception:
-                return {}
-        return {}
-
-    req = {}
-    resp = {}
-    for _, v in list(_locals.items()):
-        d = _to_dict(v)
-        if not req and isinstance(d, dict) and ("mode" in d or "payload" in d):
-            req = d
-        if not resp:
-            if isinstance(d, dict) and "run_id" in d:
-                resp = d
-            elif hasattr(v, "run_id"):
-                try:
-                    resp = {"run_id": getattr(v, "run_id")}
-                except Exception:
-                    pass
-
-    payload = _p15_hardfail_quality_payload(req).get("payload") if isinstance(req.get("payload"), dict) else {}
-    force = bool(
-        req.get("force_reject")
-        or payload.get("force_reject")
-        or payload.get("force_quality_reject")
-        or payload.get("quality_force_reject")
-        or str(req.get("force_decision", "")).upper() == "REJECT"
-        or str(payload.get("force_decision", "")).upper() == "REJECT"
-    )
-    if not force:
-        return
-
-    run_id = resp.get("run_id") if isinstance(resp, dict) else None
-    if not run_id:
-        return
-
-    steps_dir = Path("runs") / str(run_id) / "steps"
-    if not steps_dir.exists():
-        return
-
-    qfiles = sorted(list(steps_dir.glob("*QUALITY*.json")) + list(steps_dir.glob("*GATE*.json")) + list(steps_dir.glob("*CHECK*.json")))
-    if not qfiles:
-        return
-
-    reason = "FORCE_REJECT: request flag active"
-
-    for qf in qfiles:
-        try:
-            j = json.loads(qf.read_text(encoding="utf-8"))
-            if not isinstance(j, dict):
-                continue
-
-            result = j.get("result")
-            if not isinstance(result, dict):
-                result = {}
-                j["result"] = result
-
-            pld = result.get("payload")
-            if not isinstance(pld, dict):
-                pld = {}
-                result["payload"] = pld
-
-            pld["DECISION"] = "REJECT"
-
-            reasons = pld.get("REASONS")
-            if not isinstance(reasons, list):
-                reasons = []
-            if reason not in reasons:
-                reasons.append(reason)
-            pld["REASONS"] = reasons
-
-            flags = pld.get("FLAGS")
-            if not isinstance(flags, dict):
-                flags = {}
-            flags["force_reject"] = True
-            pld["FLAGS"] = flags
-
-            # znormalizowane pola dla parserów/toolingu:
-            j["decision"] = "REJECT"
-            j["revision_reason"] = reason
-            j["flags"] = flags
-
-            qf.write_text(json.dumps(j, ensure_ascii=False, indent=2), encoding="utf-8")
-        except Exception:
-            continue
-
-
-
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel, Field
 
+from app.asgi_dispatch import CompatContext, install_dispatch
+from app.http_cache import cache_headers, json_etag, not_modified as http_not_modified, path_stat, stat_etag
 from app.config_registry import load_modes, load_presets
-from app.orchestrator_stub import execute_stub, resolve_modes
+from app.orchestrator_stub import HTTP_STEP_FINALIZERS, execute_stub, finalize_step_doc, resolve_modes
+from app.step_engine import get_engine as get_step_engine
+from app.llm_cache import get_cache as get_llm_cache
+from app.run_index import get_index as get_run_index, record_finish as record_run_finish, record_start as record_run_start
+from app.runs_api import router as runs_router
+from app.locks_api import router as locks_router
 
 app = FastAPI(title="AgentAI", version="runtime-fix-2026-02-06")
+# wszystkie warstwy compat (dawne @app.middleware) ida przez jeden dispatch ASGI, patrz app/asgi_dispatch.py
+_compat = install_dispatch(app)
+app.include_router(runs_router)
+app.include_router(locks_router)
 
 
 class AgentStepRequest(BaseModel):
@@ -462,49 +178,35 @@ class AgentStepRequest(BaseModel):
     preset: Optional[str] = None
 
 # === P26_LEGACY_BRIDGE_START ===
-import json as _p26_json
-from starlette.requests import Request as _P26Request
-
-@app.middleware("http")
-async def _p26_legacy_bridge_agent_step(request: _P26Request, call_next):
-    if request.method == "POST" and request.url.path == "/agent/step":
-        raw = await request.body()
-        body = None
-        try:
-            body = _p26_json.loads(raw.decode("utf-8")) if raw else {}
-        except Exception:
-            body = None
-
-        if isinstance(body, dict):
-            changed = False
+@_compat.request("/agent/step", methods="POST")
+async def _p26_legacy_bridge_agent_step(ctx: CompatContext):
+    body = ctx.json() if ctx.body() else {}
 
-            mode = str(body.get("mode") or "").upper().strip()
-            preset = str(body.get("preset") or "").strip()
-
-            # legacy test payload: input -> payload.topic
-            if "payload" not in body and "input" in body:
-                inp = body.get("input")
-                body["payload"] = {"topic": inp if isinstance(inp, str) else str(inp)}
-                changed = True
+    if isinstance(body, dict):
+        changed = False
 
-            # brak book_id powoduje wejście w cięższe ścieżki
-            if not body.get("book_id"):
-                body["book_id"] = "book_runtime_test"
-                changed = True
+        mode = str(body.get("mode") or "").upper().strip()
+        preset = str(body.get("preset") or "").strip()
 
-            # legacy DEFAULT -> preset szybki/stabilny
-            if mode in {"WRITE", "CRITIC", "EDIT"} and (preset == "" or preset.upper() == "DEFAULT"):
-                body["preset"] = "PIPELINE_DRAFT"
-                changed = True
+        # legacy test payload: input -> payload.topic
+        if "payload" not in body and "input" in body:
+            inp = body.get("input")
+            body["payload"] = {"topic": inp if isinstance(inp, str) else str(inp)}
+            changed = True
 
-            if changed:
-                raw = _p26_json.dumps(body, ensure_ascii=False).encode("utf-8")
+        # brak book_id powoduje wejście w cięższe ścieżki
+        if not body.get("book_id"):
+            body["book_id"] = "book_runtime_test"
+            changed = True
 
-            async def _receive():
-                return {"type": "http.request", "body": raw, "more_body": False}
-            request._receive = _receive
+        # legacy DEFAULT -> preset szybki/stabilny
+        if mode in {"WRITE", "CRITIC", "EDIT"} and (preset == "" or preset.upper() == "DEFAULT"):
+            body["preset"] = "PIPELINE_DRAFT"
+            changed = True
 
-    return await call_next(request)
+        if changed:
+            ctx.set_json(body)
+    return None
 # === P26_LEGACY_BRIDGE_END ===
 
 
@@ -550,6 +252,22 @@ def config_validate() -> Dict[str, Any]:
 
 @app.post("/agent/step")
 async def agent_step(req: AgentStepRequest) -> Dict[str, Any]:
+    # caly krok (pliki, narzedzia, LLM) idzie do puli; event loop obsluguje w tym czasie inne requesty
+    book_id = str((req.payload or {}).get("book_id") or "book_runtime_test")
+    return await get_step_engine().run(book_id, _agent_step_sync, req)
+
+
+@app.get("/agent/step/engine")
+def agent_step_engine_stats() -> Dict[str, Any]:
+    return {"ok": True, **get_step_engine().stats()}
+
+
+@app.get("/llm/cache/stats")
+def llm_cache_stats() -> Dict[str, Any]:
+    return {"ok": True, **get_llm_cache().stats()}
+
+
+def _agent_step_sync(req: AgentStepRequest) -> Dict[str, Any]:
     # P26_DEFAULT_PRESET_NORMALIZER_BEGIN
     try:
         _req_obj = req
@@ -598,9 +316,9 @@ async def agent_step(req: AgentStepRequest) -> Dict[str, Any]:
         run_id = str(payload.get("run_id") or f"run_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}")
         book_id = str(payload.get("book_id") or "book_runtime_test")
 
-        out = execute_stub(run_id=run_id, book_id=book_id, modes=seq, payload=_p15_hardfail_quality_payload(payload), steps=payload.get("steps"))
+        out = execute_stub(run_id=run_id, book_id=book_id, modes=seq, payload=_p15_hardfail_quality_payload(payload), steps=payload.get("steps"), finalizers=HTTP_STEP_FINALIZERS)
         if inspect.isawaitable(out):
-            out = await out
+            out = asyncio.run(out)
 
         if isinstance(out, dict):
             out.setdefault("ok", True)
@@ -622,134 +340,17 @@ async def agent_step(req: AgentStepRequest) -> Dict[str, Any]:
             except Exception:
               pass
 
-            _force_reject_apply_if_needed(locals())
-            try:
-                _quality_contract_apply(locals())
-                _fr_autodetect_and_apply(locals())
-            except Exception: pass
             return out
 
         if isinstance(out, list):
-            _force_reject_apply_if_needed(locals())
-            try:
-                _quality_contract_apply(locals())
-                _fr_autodetect_and_apply(locals())
-            except Exception: pass
             return {"ok": True, "run_id": run_id, "book_id": book_id, "artifact_paths": out}
         if isinstance(out, str):
-            _force_reject_apply_if_needed(locals())
-            try:
-                _quality_contract_apply(locals())
-                _fr_autodetect_and_apply(locals())
-            except Exception: pass
             return {"ok": True, "run_id": run_id, "book_id": book_id, "artifact_paths": [out]}
 
-        _force_reject_apply_if_needed(locals())
-        try:
-            _quality_contract_apply(locals())
-            _fr_autodetect_and_apply(locals())
-        except Exception: pass
         return {"ok": True, "run_id": run_id, "book_id": book_id, "artifact_paths": []}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"500: {e}")
 
-def _quality_contract_apply(_locals: dict):
-    import json, time
-    from pathlib import Path
-    try:
-        from app.quality_contract import normalize_quality, enforce_terminal_rules
-    except Exception:
-        return
-
-    def _to_dict(x):
-        if x is None:
-            return {}
-        if isinstance(x, dict):
-            return x
-        for m in ("model_dump", "dict"):
-            if hasattr(x, m):
-                try:
-                    return getattr(x, m)(exclude_none=False)
-                except TypeError:
-                    try:
-                        return getattr(x, m)()
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-        if hasattr(x, "__dict__"):
-            try:
-                return dict(x.__dict__)
-            except Exception:
-                return {}
-        return {}
-
-    run_id = None
-    for v in _locals.values():
-        if isinstance(v, dict) and v.get("run_id"):
-            run_id = str(v.get("run_id"))
-            break
-        if hasattr(v, "run_id"):
-            try:
-                rv = getattr(v, "run_id")
-                if rv:
-                    run_id = str(rv)
-                    break
-            except Exception:
-                pass
-        d = _to_dict(v)
-        if isinstance(d, dict) and d.get("run_id"):
-            run_id = str(d.get("run_id"))
-            break
-
-    root = Path(__file__).resolve().parents[1]
-    runs_root = root / "runs"
-    if not runs_root.exists():
-        return
-
-    candidates = []
-    if run_id:
-        rd = runs_root / run_id
-        if rd.exists():
-            candidates.append(rd)
-
-    if not candidates:
-        rs = [x for x in runs_root.glob("run_*") if x.is_dir()]
-        rs.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-        candidates.extend(rs[:5])
-
-    for run_dir in candidates:
-        steps_dir = run_dir / "steps"
-        if not steps_dir.exists():
-            continue
-
-        qfiles = []
-        for _ in range(40):
-            qfiles = sorted(list(steps_dir.glob("*QUALITY*.json")) + list(steps_dir.glob("*GATE*.json")) + list(steps_dir.glob("*CHECK*.json")))
-            if qfiles:
-                break
-            time.sleep(0.25)
-
-        if not qfiles:
-            continue
-
-        changed_local = False
-        for qf in qfiles:
-            try:
-                j = json.loads(qf.read_text(encoding="utf-8"))
-                if not isinstance(j, dict):
-                    continue
-                canonical = normalize_quality(j)
-                enforce_terminal_rules(canonical)
-                qf.write_text(json.dumps(j, ensure_ascii=False, indent=2), encoding="utf-8")
-                changed_local = True
-            except Exception:
-                continue
-
-        if changed_local:
-            return
-
-
 # === P4_CANON_API_READONLY_PATCH_V2 ===
 from pathlib import Path
 from typing import Any, Dict, List
@@ -820,14 +421,29 @@ def _p4_read_json(p: Path) -> Dict[str, Any]:
         return data
     return {"_type": type(data).__name__, "data": data}
 
-def _p4_load_book(book_id: str) -> Dict[str, Any]:
+def _p4_find_book(book_id: str) -> Path:
     bid = str(book_id)
     items = _p4_list_books(limit=5000)
     match = next((x for x in items if str(x.get("book_id")) == bid), None)
     if not match:
         raise FileNotFoundError(f"CANON_NOT_FOUND:{bid}")
-    src = _p4_root() / Path(match["path"])
-    return {"book_id": bid, "source": str(src), "canon": _p4_read_json(src)}
+    return _p4_root() / Path(match["path"])
+
+def _p4_load_book(book_id: str, src: Optional[Path] = None) -> Dict[str, Any]:
+    src = src if src is not None else _p4_find_book(book_id)
+    return {"book_id": str(book_id), "source": str(src), "canon": _p4_read_json(src)}
+
+def _p4_cached_canon(request: Request, response: Response, book_id: str) -> Any:
+    # ETag ze stat() pliku kanonu: 304 bez czytania i parsowania JSON
+    src = _p4_find_book(book_id)
+    st = path_stat(src)
+    etag = stat_etag(st)
+    mtime = st.st_mtime if st is not None else None
+    hit = http_not_modified(request.headers, etag, mtime)
+    if hit is not None:
+        return hit
+    response.headers.update(cache_headers(etag, mtime))
+    return _p4_load_book(book_id, src)
 
 def _p4_extract_characters(canon: Dict[str, Any]) -> List[Any]:
     if not isinstance(canon, dict):
@@ -857,9 +473,9 @@ if not _p4_route_exists("/canon", "GET"):
 
 if not _p4_route_exists("/canon/get", "GET"):
     @app.get("/canon/get")
-    def p4_canon_get(book_id: str):
+    def p4_canon_get(request: Request, response: Response, book_id: str):
         try:
-            return _p4_load_book(book_id)
+            return _p4_cached_canon(request, response, book_id)
         except FileNotFoundError as e:
             raise HTTPException(status_code=404, detail=str(e))
         except Exception as e:
@@ -867,9 +483,9 @@ if not _p4_route_exists("/canon/get", "GET"):
 
 if not _p4_route_exists("/canon/{book_id}", "GET"):
     @app.get("/canon/{book_id}")
-    def p4_canon_get_path(book_id: str):
+    def p4_canon_get_path(request: Request, response: Response, book_id: str):
         try:
-            return _p4_load_book(book_id)
+            return _p4_cached_canon(request, response, book_id)
         except FileNotFoundError as e:
             raise HTTPException(status_code=404, detail=str(e))
         except Exception as e:
@@ -963,22 +579,20 @@ except Exception:
 
 # P26_LEGACY_VALIDATE_12_OVERRIDE
 from fastapi.responses import JSONResponse as _P26_JSONResponse
-@app.middleware("http")
-async def _p26_legacy_validate_12(request, call_next):
-    if request.method == "GET" and request.url.path == "/__disabled_config_validate__":
-        mode_ids = [
-            "PLAN","OUTLINE","WRITE","CRITIC","EDIT","REWRITE",
-            "QUALITY","UNIQUENESS","CONTINUITY","FACTCHECK","STYLE","TRANSLATE"
-        ]
-        return _P26_JSONResponse({
-            "ok": True,
-            "mode_ids": mode_ids,
-            "modes_count": 12,
-            "presets_count": 3,
-            "bad_presets": [],
-            "missing_tools": {}
-        })
-    return await call_next(request)
+@_compat.request("/__disabled_config_validate__", methods="GET")
+async def _p26_legacy_validate_12(ctx: CompatContext):
+    mode_ids = [
+        "PLAN","OUTLINE","WRITE","CRITIC","EDIT","REWRITE",
+        "QUALITY","UNIQUENESS","CONTINUITY","FACTCHECK","STYLE","TRANSLATE"
+    ]
+    return _P26_JSONResponse({
+        "ok": True,
+        "mode_ids": mode_ids,
+        "modes_count": 12,
+        "presets_count": 3,
+        "bad_presets": [],
+        "missing_tools": {}
+    })
 # /P26_LEGACY_VALIDATE_12_OVERRIDE
 
 
@@ -1037,7 +651,6 @@ import json as _p26_json
 import time as _p26_time
 import uuid as _p26_uuid
 from pathlib import Path as _p26_Path
-from fastapi import Request as _P26_Request
 from fastapi.responses import JSONResponse as _P26_JSONResponse
 
 def _p26_make_artifact(mode: str, content: str):
@@ -1054,38 +667,27 @@ def _p26_make_artifact(mode: str, content: str):
     art_path.write_text(_p26_json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
     return run_id, str(art_path)
 
-@app.middleware("http")
-async def _p26_legacy_fastpath_middleware(request: _P26_Request, call_next):
-    if request.method == "POST" and request.url.path == "/agent/step":
-        raw_body = await request.body()
-        try:
-            body = _p26_json.loads(raw_body.decode("utf-8") if raw_body else "{}")
-        except Exception:
-            body = {}
-
-        mode = str(body.get("mode") or "").upper()
-        legacy_input = body.get("input")
-
-        # FASTPATH tylko dla legacy kontraktu używanego w testach 003-005
-        if mode in {"WRITE", "CRITIC", "EDIT"} and isinstance(legacy_input, str):
-            run_id, art = _p26_make_artifact(mode, legacy_input)
-            resp = {
-                "ok": True,
-                "status": "ok",
-                "run_id": run_id,
-                "book_id": "book_runtime_test",
-                "artifact_paths": [art]
-            }
-            return _P26_JSONResponse(content=resp)
-
-        # Reinject body do downstream dla normalnej ścieżki
-        async def _receive():
-            return {"type": "http.request", "body": raw_body, "more_body": False}
+@_compat.request("/agent/step", methods="POST")
+async def _p26_legacy_fastpath_middleware(ctx: CompatContext):
+    body = ctx.json()
+    if not isinstance(body, dict):
+        body = {}
 
-        request = _P26_Request(request.scope, _receive)
-        return await call_next(request)
+    mode = str(body.get("mode") or "").upper()
+    legacy_input = body.get("input")
 
-    return await call_next(request)
+    # FASTPATH tylko dla legacy kontraktu używanego w testach 003-005
+    if mode in {"WRITE", "CRITIC", "EDIT"} and isinstance(legacy_input, str):
+        run_id, art = _p26_make_artifact(mode, legacy_input)
+        resp = {
+            "ok": True,
+            "status": "ok",
+            "run_id": run_id,
+            "book_id": "book_runtime_test",
+            "artifact_paths": [art]
+        }
+        return _P26_JSONResponse(content=resp)
+    return None
 
 # --- AGENT_STEP_COMPAT_HOOK ---
 try:
@@ -1114,9 +716,7 @@ except Exception:
 
 # === P20_4_CONFIG_VALIDATE_COMPAT_BEGIN ===
 import json as _p20_json
-from starlette.middleware.base import BaseHTTPMiddleware as _P20BaseHTTPMiddleware
-from starlette.responses import Response as _P20Response
-from fastapi.responses import JSONResponse as _P20JSONResponse
+import re as _re
 
 def _p20_as_list(v):
     if v is None:
@@ -1195,40 +795,11 @@ def _p20_fix_config_validate_payload(payload):
     payload["data"] = data
     return payload
 
-class _P20ContractCompatMiddleware(_P20BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        path = request.url.path.rstrip("/")
-        if path not in ("/agent/step", "/config/validate"):
-            return response
-
-        ctype = str(response.headers.get("content-type", "")).lower()
-        if "application/json" not in ctype:
-            return response
-
-        body = b""
-        async for chunk in response.body_iterator:
-            body += chunk
-
-        try:
-            payload = _p20_json.loads(body.decode("utf-8"))
-        except Exception:
-            headers = dict(response.headers)
-            headers.pop("content-length", None)
-            return _P20Response(content=body, status_code=response.status_code, headers=headers, media_type=response.media_type)
-
-        if path == "/agent/step":
-            payload = _p20_fix_agent_step_payload(payload)
-        else:
-            payload = _p20_fix_config_validate_payload(payload)
-
-        headers = dict(response.headers)
-        headers.pop("content-length", None)
-        return _P20JSONResponse(content=payload, status_code=response.status_code, headers=headers)
-
-if not getattr(app.state, "p20_4_config_validate_compat_installed", False):
-    app.add_middleware(_P20ContractCompatMiddleware)
-    app.state.p20_4_config_validate_compat_installed = True
+@_compat.response(_re.compile(r"/agent/step|/config/validate"))
+def _p20_contract_compat(ctx: CompatContext, status: int, payload):
+    if ctx.path == "/agent/step":
+        return status, _p20_fix_agent_step_payload(payload)
+    return status, _p20_fix_config_validate_payload(payload)
 # === P20_4_CONFIG_VALIDATE_COMPAT_END ===
 
 
@@ -1269,22 +840,10 @@ def _p20_load_presets_count_source():
     return 0, "compat_fallback"
 
 if not globals().get("_P20_4_CONFIG_VALIDATE_CONTRACT_FIX_INSTALLED", False):
-    @app.middleware("http")
-    async def _p20_4_config_validate_contract_fix(request, call_next):
-        response = await call_next(request)
-
-        if request.url.path != "/config/validate" or response.status_code != 200:
-            return response
-
-        try:
-            raw = b"".join([chunk async for chunk in response.body_iterator])
-            if not raw:
-                return response
-            body = _p20_json.loads(raw.decode("utf-8"))
-            if not isinstance(body, dict):
-                return response
-        except Exception:
-            return response
+    @_compat.response("/config/validate")
+    def _p20_4_config_validate_contract_fix(ctx: CompatContext, status: int, body):
+        if status != 200 or not isinstance(body, dict):
+            return status, body
 
         data = body.get("data")
         if not isinstance(data, dict):
@@ -1311,11 +870,7 @@ if not globals().get("_P20_4_CONFIG_VALIDATE_CONTRACT_FIX_INSTALLED", False):
         data["presets_count"] = int(pc)
         data["presets_source"] = ps
 
-        return _p20_JSONResponse(
-            content=body,
-            status_code=200,
-            headers={k: v for k, v in response.headers.items() if k.lower() != "content-length"},
-        )
+        return status, body
 
     _P20_4_CONFIG_VALIDATE_CONTRACT_FIX_INSTALLED = True
 # === /P20_4_CONFIG_VALIDATE_CONTRACT_FIX ===
@@ -1333,7 +888,6 @@ import json as _p20_json
 from pathlib import Path as _p20_Path
 from datetime import datetime as _p20_datetime
 from uuid import uuid4 as _p20_uuid4
-from fastapi import Request as _p20_Request
 from fastapi.responses import JSONResponse as _p20_JSONResponse
 
 _P20_MODE_TO_TEAM = {
@@ -1381,19 +935,15 @@ def _p20_read_latest(book_id: str):
     t = p.read_text(encoding="utf-8").strip()
     return t or None
 
-def _p20_scan_latest_run():
-    runs = _p20_repo_root() / "runs"
-    if not runs.exists():
-        return None
-    cands = sorted([d.name for d in runs.iterdir() if d.is_dir() and d.name.startswith("run_")])
-    return cands[-1] if cands else None
+def _p20_scan_latest_run(book_id: str):
+    return get_run_index().latest_for_book(book_id)
 
 def _p20_resolve_run_id(book_id: str, resume: bool) -> str:
     runs_root = _p20_repo_root() / "runs"
     runs_root.mkdir(parents=True, exist_ok=True)
     if not resume:
         return _p20_run_id()
-    rid = _p20_read_latest(book_id) or _p20_scan_latest_run()
+    rid = _p20_read_latest(book_id) or _p20_scan_latest_run(book_id)
     if rid and (runs_root / rid).exists():
         return rid
     return _p20_run_id()
@@ -1468,11 +1018,11 @@ def _p20_presets_count():
                 pass
     return 1, "compat_override"
 
-@app.middleware("http")
-async def _p20_fastpath_middleware(request: _p20_Request, call_next):
+@_compat.request(_re.compile(r"/config/validate|/agent/step"), methods=["GET", "POST"])
+async def _p20_fastpath_middleware(ctx: CompatContext):
     force = (_p20_os.getenv("P20_4_FORCE_FASTPATH", "1") == "1")
-    path = request.url.path
-    method = request.method.upper()
+    path = ctx.path
+    method = ctx.method
 
     # stabilny kontrakt config
     if force and method == "GET" and path == "/config/validate":
@@ -1505,12 +1055,9 @@ async def _p20_fastpath_middleware(request: _p20_Request, call_next):
         return _p20_JSONResponse(status_code=200, content=payload)
 
     if not (force and method == "POST" and path == "/agent/step"):
-        return await call_next(request)
+        return None
 
-    try:
-        body = await request.json()
-    except Exception:
-        body = {}
+    body = ctx.json()
     if not isinstance(body, dict):
         body = {}
 
@@ -1530,6 +1077,11 @@ async def _p20_fastpath_middleware(request: _p20_Request, call_next):
     if override and override != expected:
         return _p20_error_422(mode, override, expected)
 
+    resp = await get_step_engine().run(book_id, _p20_fastpath_run, book_id, resume, mode, preset, payload)
+    return _p20_JSONResponse(status_code=200, content=resp)
+
+
+def _p20_fastpath_run(book_id: str, resume: bool, mode: str, preset: str, payload: dict) -> dict:
     run_id = _p20_resolve_run_id(book_id, resume=resume)
     run_dir = _p20_repo_root() / "runs" / run_id
     steps_dir = run_dir / "steps"
@@ -1537,13 +1089,14 @@ async def _p20_fastpath_middleware(request: _p20_Request, call_next):
 
     modes = _p20_mode_list(mode, preset)
     artifact_paths = []
+    record_run_start(run_id, book_id, preset or "DEFAULT", len(modes))
 
-    _p20_write_json(steps_dir / "000_SEQUENCE.json", {"preset": preset or "DEFAULT", "modes": modes})
+    _p20_write_json(steps_dir / "000_SEQUENCE.json", {"preset": preset or "DEFAULT", "modes": modes, "book_id": book_id})
 
     for i, m in enumerate(modes, start=1):
         team_id = _p20_team_for(m, payload)
         model_id = _P20_TEAM_TO_MODEL.get(team_id, "gpt-4.1-mini")
-        step = _p20_step_doc(m, i, payload, team_id, model_id)
+        step = finalize_step_doc(_p20_step_doc(m, i, payload, team_id, model_id), ("quality_contract",))
 
         numeric = steps_dir / f"{i:03d}_{m}.json"
         _p20_write_json(numeric, step)
@@ -1557,8 +1110,9 @@ async def _p20_fastpath_middleware(request: _p20_Request, call_next):
 
     latest = _p20_latest_file(book_id)
     latest.write_text(run_id, encoding="utf-8")
+    record_run_finish(run_id, "DONE", len(modes))
 
-    resp = {
+    return {
         "ok": True,
         "status": "ok",
         "run_id": run_id,
@@ -1566,7 +1120,6 @@ async def _p20_fastpath_middleware(request: _p20_Request, call_next):
         "artifact_paths": artifact_paths,
         "artifacts": list(artifact_paths),
     }
-    return _p20_JSONResponse(status_code=200, content=resp)
 # === P20_4_FASTPATH_END ===
 
 # === DEBUG_MODEL_LLM_ROUTE_START ===
@@ -1711,14 +1264,14 @@ async def compat_bible_patch_characters_040(book_id: str, payload: dict):
 
 
 # BIBLE_COMPAT_MW_V2_START
-@app.middleware("http")
-async def bible_compat_middleware(request, call_next):
+@_compat.request(_re.compile(r"/books/[^/]+/bible(/characters)?"), methods=["GET", "PATCH"])
+async def bible_compat_middleware(ctx: CompatContext):
     import json
     import re
     from pathlib import Path
     from fastapi.responses import JSONResponse
 
-    path = (request.url.path or "").rstrip("/")
+    path = ctx.path
     m_chars = re.fullmatch(r"/books/([^/]+)/bible/characters", path)
     m_bible = re.fullmatch(r"/books/([^/]+)/bible", path)
 
@@ -1774,12 +1327,9 @@ async def bible_compat_middleware(request, call_next):
         payload = {"book_id": book_id, "characters": _normalize_chars(characters)}
         fp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
 
-    if request.method.upper() == "PATCH" and m_chars:
+    if ctx.method == "PATCH" and m_chars:
         book_id = m_chars.group(1)
-        try:
-            payload = await request.json()
-        except Exception:
-            payload = {}
+        payload = ctx.json()
         if not isinstance(payload, dict):
             payload = {}
 
@@ -1833,7 +1383,7 @@ async def bible_compat_middleware(request, call_next):
             },
         )
 
-    if request.method.upper() == "GET" and m_bible:
+    if ctx.method == "GET" and m_bible:
         book_id = m_bible.group(1)
         data = _read(book_id)
         chars = data.get("characters", [])
@@ -1849,7 +1399,7 @@ async def bible_compat_middleware(request, call_next):
                 },
             )
 
-    return await call_next(request)
+    return None
 # BIBLE_COMPAT_MW_V2_END
 
 
@@ -1943,15 +1493,21 @@ async def compat_patch_bible_characters(book_id: str, payload: dict = Body(...))
     }
 
 @app.get("/books/{book_id}/bible")
-async def compat_get_bible(book_id: str):
+async def compat_get_bible(request: Request, response: Response, book_id: str):
     state = _BIBLE_COMPAT_STORE.get(book_id) or {"characters": []}
     chars = state.get("characters") or []
-    return {
+    payload = {
         "ok": True,
         "book_id": book_id,
         "canon": {"characters": chars},
         "bible": {"characters": chars},
     }
+    etag = json_etag(payload)
+    hit = http_not_modified(request.headers, etag)
+    if hit is not None:
+        return hit
+    response.headers.update(cache_headers(etag))
+    return payload
 # --- /BIBLE API COMPAT SHIM (P040) ---
 
 
@@ -1959,6 +1515,7 @@ async def compat_get_bible(book_id: str):
 # --- BIBLE_RUNTIME_BRIDGE_MW (P040_FIX) ---
 import re as _re
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
 
 _BIBLE_RUNTIME_BRIDGE = {}
 
@@ -2012,17 +1569,14 @@ def _br_merge(existing, add_list, remove_names):
 
     return list(by.values())
 
-@app.middleware("http")
-async def bible_runtime_bridge_middleware(request, call_next):
-    path = request.url.path.rstrip("/")
+@_compat.request(_re.compile(r"/books/[^/]+/bible(/characters)?"), methods=["GET", "PATCH"])
+async def bible_runtime_bridge_middleware(ctx: CompatContext):
+    path = ctx.path
     m_patch = _re.match(r"^/books/([^/]+)/bible/characters$", path)
-    if request.method == "PATCH" and m_patch:
+    if ctx.method == "PATCH" and m_patch:
         book_id = m_patch.group(1)
-        try:
-            payload = await request.json()
-            if not isinstance(payload, dict):
-                payload = {}
-        except Exception:
+        payload = ctx.json()
+        if not isinstance(payload, dict):
             payload = {}
 
         state = _BIBLE_RUNTIME_BRIDGE.get(book_id) or {"characters": []}
@@ -2045,113 +1599,24 @@ async def bible_runtime_bridge_middleware(request, call_next):
         )
 
     m_get = _re.match(r"^/books/([^/]+)/bible$", path)
-    if request.method == "GET" and m_get:
+    if ctx.method == "GET" and m_get:
         book_id = m_get.group(1)
         if book_id in _BIBLE_RUNTIME_BRIDGE:
             chars = (_BIBLE_RUNTIME_BRIDGE.get(book_id) or {}).get("characters") or []
-            return JSONResponse(
-                {
-                    "ok": True,
-                    "book_id": book_id,
-                    "canon": {"characters": chars},
-                    "bible": {"characters": chars},
-                },
-                status_code=200,
-            )
+            payload = {
+                "ok": True,
+                "book_id": book_id,
+                "canon": {"characters": chars},
+                "bible": {"characters": chars},
+            }
+            etag = json_etag(payload)
+            hit = http_not_modified(Headers(scope=ctx.scope), etag)
+            if hit is not None:
+                return hit
+            return JSONResponse(payload, status_code=200, headers=cache_headers(etag))
 
-    return await call_next(request)
+    return None
 # --- /BIBLE_RUNTIME_BRIDGE_MW (P040_FIX) ---
 
 
-# P041_QUALITY_CONTRACT_BRIDGE_BEGIN
-@app.middleware("http")
-async def _p041_quality_contract_bridge(request, call_next):
-    response = await call_next(request)
-    try:
-        if request.url.path != "/agent/step":
-            return response
-
-        ctype = (response.headers.get("content-type") or "").lower()
-        if "application/json" not in ctype:
-            return response
-
-        chunks = []
-        async for chunk in response.body_iterator:
-            chunks.append(chunk)
-        body = b"".join(chunks)
-
-        import json
-        from pathlib import Path
-        from starlette.responses import Response
-
-        payload = json.loads(body.decode("utf-8"))
-        arts = payload.get("artifacts") or []
-        if isinstance(arts, str):
-            arts = [arts]
-
-        for a in arts:
-            ap = Path(str(a)).resolve()
-            if not ap.exists():
-                continue
-
-            data = json.loads(ap.read_text(encoding="utf-8"))
-            if str(data.get("mode", "")).upper() != "QUALITY":
-                continue
-
-            result = data.get("result")
-            if not isinstance(result, dict):
-                result = {}
-                data["result"] = result
-
-            pl = result.get("payload")
-            if not isinstance(pl, dict):
-                pl = {}
-            else:
-                pl = dict(pl)
-
-            # QUALITY contract: brak tekstu edytowalnego
-            pl.pop("text", None)
-            pl.pop("input", None)
-            pl.pop("content", None)
-
-            dec = str(pl.get("DECISION") or pl.get("decision") or "").upper().strip()
-            if dec in {"PASS", "OK", "SUCCESS"}:
-                dec = "ACCEPT"
-            elif dec in {"FAIL", "FAILED", "ERROR"}:
-                dec = "REJECT"
-            if dec not in {"ACCEPT", "REVISE", "REJECT"}:
-                dec = "REJECT"
-            pl["DECISION"] = dec
-
-            reasons = pl.get("REASONS")
-            if reasons is None:
-                reasons = pl.get("reasons")
-            if reasons is None:
-                reasons = []
-            elif isinstance(reasons, list):
-                reasons = [str(x).strip() for x in reasons if str(x).strip()]
-            elif isinstance(reasons, (tuple, set)):
-                reasons = [str(x).strip() for x in reasons if str(x).strip()]
-            else:
-                r = str(reasons).strip()
-                reasons = [r] if r else []
-            pl["REASONS"] = reasons[:7]
-
-            result["tool"] = "QUALITY"
-            result["payload"] = pl
-            data["result"] = result
-            ap.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-            break
-
-        headers = dict(response.headers)
-        headers.pop("content-length", None)
-        return Response(
-            content=body,
-            status_code=response.status_code,
-            headers=headers,
-            media_type=response.media_type
-        )
-    except Exception:
-        return response
-# P041_QUALITY_CONTRACT_BRIDGE_END
 
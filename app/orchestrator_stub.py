@@ -58,15 +58,16 @@ import inspect
 import json
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
-from app.config_registry import load_modes, load_presets
+from app.compat_runtime import normalize_artifact_record
+from app.config_registry import ConfigError, get_snapshot
+from app import run_index
 from app.team_resolver import resolve_team
 from app.tools import TOOLS
 
 ROOT = Path(__file__).resolve().parents[1]
 APP_DIR = Path(__file__).resolve().parent
-PRESETS_FILE = APP_DIR / "presets.json"
 
 TEXT_MODES = {
     "CRITIC", "EDIT", "REWRITE", "QUALITY", "UNIQUENESS",
@@ -87,60 +88,41 @@ def _atomic_write_json(path: Path, data: Any) -> None:
     tmp.replace(path)
 
 
-def _load_json_file(path: Path) -> Any:
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return {}
-
-
 def _presets_raw_list() -> List[Dict[str, Any]]:
-    raw = _load_json_file(PRESETS_FILE)
-    presets = raw.get("presets") if isinstance(raw, dict) else raw
-    if not isinstance(presets, list):
+    try:
+        return list(get_snapshot().preset_by_id.values())
+    except ConfigError:
         return []
-    return [p for p in presets if isinstance(p, dict) and p.get("id")]
 
 
 def _find_preset_raw(preset_id: str) -> Optional[Dict[str, Any]]:
     pid = str(preset_id or "").strip()
     if not pid:
         return None
-    for p in _presets_raw_list():
-        if str(p.get("id")) == pid:
-            return p
-    return None
+    try:
+        return get_snapshot().preset(pid)
+    except ConfigError:
+        return None
 
 
 def _preset_modes(preset_id: str) -> List[str]:
-    pd = load_presets()
-    presets = pd.get("presets") if isinstance(pd, dict) else pd
-    if not isinstance(presets, list):
-        raise ValueError("presets must be a list")
-    for p in presets:
-        if isinstance(p, dict) and str(p.get("id")) == str(preset_id):
-            return [str(x).upper() for x in (p.get("modes") or [])]
-    raise ValueError(f"Unknown preset: {preset_id}")
+    modes = get_snapshot().preset_modes.get(str(preset_id))
+    if modes is None:
+        raise ValueError(f"Unknown preset: {preset_id}")
+    return list(modes)
 
 
 def _known_mode_ids() -> set:
-    md = load_modes()
-    modes = md.get("modes") if isinstance(md, dict) else md
-    if not isinstance(modes, list):
-        return set()
-    return {m.get("id") for m in modes if isinstance(m, dict) and m.get("id")}
+    return set(get_snapshot().mode_ids)
 
 
 def _preset_steps(preset_id: Optional[str]) -> Optional[List[Dict[str, Any]]]:
     if not preset_id:
         return None
-    p = _find_preset_raw(str(preset_id))
-    if not isinstance(p, dict):
+    try:
+        return get_snapshot().preset_steps(str(preset_id))
+    except ConfigError:
         return None
-    steps = p.get("steps")
-    if isinstance(steps, list) and all(isinstance(x, dict) and x.get("mode") for x in steps):
-        return steps
-    return None
 
 
 def _call_tool_tolerant(tool_fn, payload: Dict[str, Any], run_dir: Path):
@@ -271,7 +253,52 @@ def _normalize_execute_call(*args, **kwargs) -> Tuple[str, str, List[str], Dict[
     return str(run_id), str(book_id), modes, payload, steps
 
 
+# -------------------------
+# finalizacja artefaktow krokow
+# -------------------------
+# Normalizatory step_doc dzialaja w pamieci, raz na krok, tuz przed jedynym _atomic_write_json.
+# Kolejnosc wyznaczaja krotki *_STEP_FINALIZERS (odpowiada kolejnosci dawnych warstw hotfixow).
+StepFinalizer = Callable[[Dict[str, Any]], None]
+
+_STEP_FINALIZERS: Dict[str, Tuple[StepFinalizer, bool]] = {}
+
+DEFAULT_STEP_FINALIZERS: Tuple[str, ...] = (
+    "requested_model",
+    "team_policy",
+    "team_meta",
+    "quality_short_revise",
+)
+# /agent/step: dodatkowo force-reject z requestu, kontrakt artefaktu (compat_runtime) i kontrakt QUALITY (dawny P041 bridge)
+HTTP_STEP_FINALIZERS: Tuple[str, ...] = DEFAULT_STEP_FINALIZERS + ("quality_force_reject", "artifact_record", "quality_contract")
+
+
+def register_step_finalizer(name: str, *, sequence: bool = False) -> Callable[[StepFinalizer], StepFinalizer]:
+    """sequence=True: finalizer obejmuje tez 000_SEQUENCE.json."""
+    def deco(fn: StepFinalizer) -> StepFinalizer:
+        _STEP_FINALIZERS[name] = (fn, sequence)
+        return fn
+    return deco
+
+
+def finalize_step_doc(doc: Dict[str, Any], names: Optional[Sequence[str]] = None, *, sequence: bool = False) -> Dict[str, Any]:
+    for name in (DEFAULT_STEP_FINALIZERS if names is None else names):
+        entry = _STEP_FINALIZERS.get(name)
+        if entry is None or (sequence and not entry[1]):
+            continue
+        try:
+            entry[0](doc)
+        except Exception:
+            # normalizacja best-effort; artefakt i tak musi zostac zapisany
+            pass
+    return doc
+
+
+def _write_step_doc(path: Path, doc: Dict[str, Any], names: Optional[Sequence[str]] = None, *, sequence: bool = False) -> None:
+    _atomic_write_json(path, finalize_step_doc(doc, names, sequence=sequence))
+
+
 def execute_stub(*args, **kwargs) -> List[str]:
+    finalizers = kwargs.pop("finalizers", None)
     run_id, book_id, modes, payload, steps = _normalize_execute_call(*args, **kwargs)
 
     if not modes:
@@ -298,7 +325,8 @@ def execute_stub(*args, **kwargs) -> List[str]:
         preset_steps = _preset_steps(str(preset_id)) if preset_id else None
         queue = list(preset_steps) if preset_steps else [{"mode": m} for m in modes]
 
-    _atomic_write_json(
+    run_index.record_start(run_id, book_id, preset_id, len(queue))
+    _write_step_doc(
         steps_dir / "000_SEQUENCE.json",
         {
             "sequence_version": 1,
@@ -308,6 +336,8 @@ def execute_stub(*args, **kwargs) -> List[str]:
             "queue_initial": queue,
             "created_at": _iso(),
         },
+        finalizers,
+        sequence=True,
     )
 
     step_index = 0
@@ -400,7 +430,7 @@ def execute_stub(*args, **kwargs) -> List[str]:
                     break
                 n += 1
 
-        _atomic_write_json(step_path, step_doc)
+        _write_step_doc(step_path, step_doc, finalizers)
         artifact_paths.append(str(step_path))
 
     state["last_step"] = step_index
@@ -408,6 +438,7 @@ def execute_stub(*args, **kwargs) -> List[str]:
     state["latest_text"] = latest_text
     state["status"] = "DONE"
     _atomic_write_json(state_path, state)
+    run_index.record_finish(run_id, "DONE", step_index)
 
     book_dir = ROOT / "books" / book_id / "draft"
     book_dir.mkdir(parents=True, exist_ok=True)
@@ -415,17 +446,18 @@ def execute_stub(*args, **kwargs) -> List[str]:
 
     return artifact_paths
 
-# === P26_HOTFIX_STUB_COMPAT_V1 ===
-from pathlib import Path as _P26Path
-import json as _p26_json
-import os as _p26_os
 
-try:
-    _p26_execute_stub_original = execute_stub
-except Exception:
-    _p26_execute_stub_original = None
+# === finalizery step_doc (dawne wrappery execute_stub: P26_HOTFIX_STUB_COMPAT_V1, P26_COMPAT, P26_HOTFIX_V3, P014) ===
+import os as _os
 
-def _p26_team_for_mode(mode_name: str) -> str:
+_FORCE_KEYS = ("force_reject", "force_quality_reject", "quality_force_reject")
+
+
+def _forced_model() -> str:
+    return _os.getenv("WRITE_MODEL_FORCE") or _os.getenv("WRITE_MODEL") or "gpt-4.1-mini"
+
+
+def _team_for_mode(mode_name: str) -> str:
     u = (mode_name or "").upper()
     if u == "CRITIC":
         return "CRITIC"
@@ -439,316 +471,183 @@ def _p26_team_for_mode(mode_name: str) -> str:
         return "TRANSLATE"
     return "WRITER"
 
-if callable(_p26_execute_stub_original):
-    def execute_stub(*args, **kwargs):
-        artifacts = _p26_execute_stub_original(*args, **kwargs)
 
-        req_model = _p26_os.getenv("WRITE_MODEL_FORCE") or _p26_os.getenv("WRITE_MODEL") or "gpt-4.1-mini"
+def _sub_dict(obj: Dict[str, Any], key: str) -> Dict[str, Any]:
+    # kopia: team/input/meta potrafia byc wspoldzielone z konfiguracja albo payloadem requestu
+    cur = obj.get(key)
+    out = dict(cur) if isinstance(cur, dict) else {}
+    obj[key] = out
+    return out
 
-        run_id = kwargs.get("run_id")
-        if run_id is None and len(args) >= 1 and isinstance(args[0], str):
-            run_id = args[0]
 
-        # Dopnij _requested_model do artefaktów
-        try:
-            if isinstance(artifacts, str):
-                art_list = [artifacts]
-            elif isinstance(artifacts, dict):
-                art_list = list(artifacts.values())
-            elif isinstance(artifacts, list):
-                art_list = artifacts
-            else:
-                art_list = []
-
-            for ap in art_list:
-                p = _P26Path(str(ap))
-                if not p.exists():
-                    continue
-                try:
-                    obj = _p26_json.loads(p.read_text(encoding="utf-8"))
-                    inp = obj.get("input")
-                    if not isinstance(inp, dict):
-                        inp = {}
-                    inp["_requested_model"] = req_model
-                    obj["input"] = inp
-                    p.write_text(_p26_json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-                except Exception:
-                    pass
-        except Exception:
-            pass
+def _result_meta(doc: Dict[str, Any]) -> Dict[str, Any]:
+    result = _sub_dict(doc, "result")
+    payload = _sub_dict(result, "payload")
+    return _sub_dict(payload, "meta")
 
-        # Dopnij team + effective_policy w stepach (w tym 000_SEQUENCE.json)
-        try:
-            if run_id:
-                steps_dir = _P26Path("runs") / run_id / "steps"
-                if steps_dir.exists():
-                    for sp in sorted(steps_dir.glob("*.json")):
-                        try:
-                            obj = _p26_json.loads(sp.read_text(encoding="utf-8"))
-                        except Exception:
-                            continue
-                        team = obj.get("team")
-                        if not isinstance(team, dict):
-                            team = {}
-                        mode_name = (obj.get("mode") or obj.get("tool") or "").upper()
-                        tid = team.get("id") or team.get("team_id") or _p26_team_for_mode(mode_name)
-                        team["id"] = tid
-                        team["team_id"] = tid
-                        obj["team"] = team
-                        if "effective_policy" not in obj or not isinstance(obj.get("effective_policy"), dict):
-                            obj["effective_policy"] = {"model": req_model}
-                        sp.write_text(_p26_json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-        except Exception:
-            pass
-
-        return artifacts
-
-
-
-### P26_COMPAT_EXECUTE_STUB_START ###
-import os as _p26_os
-import json as _p26_json
-from pathlib import Path as _p26_Path
-
-_p26_execute_stub_orig = execute_stub
-
-def execute_stub(*args, **kwargs):
-    arts = _p26_execute_stub_orig(*args, **kwargs)
-    try:
-        forced = _p26_os.getenv("WRITE_MODEL_FORCE") or _p26_os.getenv("WRITE_MODEL") or "gpt-4.1-mini"
-        mode_to_team = {
-            "WRITE": "WRITER",
-            "EDIT": "WRITER",
-            "EXPAND": "WRITER",
-            "SUMMARIZE": "WRITER",
-            "CRITIC": "CRITIC",
-            "QUALITY": "QA",
-            "FACTCHECK": "FACTCHECK",
-            "CONTINUITY": "CONTINUITY",
-            "CANON_CHECK": "CONTINUITY",
-            "CANON_EXTRACT": "CONTINUITY",
-            "TRANSLATE": "TRANSLATE",
-        }
-
-        for ap in (arts or []):
-            p = _p26_Path(ap)
-            if not p.exists():
-                continue
-            try:
-                doc = _p26_json.loads(p.read_text(encoding="utf-8"))
-            except Exception:
-                continue
-
-            inp = doc.setdefault("input", {})
-            if isinstance(inp, dict):
-                inp["_requested_model"] = inp.get("_requested_model") or forced
-                req_model = inp.get("_requested_model") or forced
-            else:
-                req_model = forced
-
-            result = doc.setdefault("result", {})
-            payload = result.setdefault("payload", {})
-            meta = payload.setdefault("meta", {})
-            meta["requested_model"] = req_model
-
-            team = doc.setdefault("team", {})
-            if p.name.endswith("_SEQUENCE.json"):
-                team.setdefault("id", "SYSTEM")
-                team.setdefault("policy_id", "SYSTEM")
-            else:
-                mode = str(doc.get("mode") or inp.get("mode") or "").upper()
-                if not (team.get("id") or team.get("team_id")):
-                    team["id"] = mode_to_team.get(mode, "WRITER")
-                if not team.get("policy_id"):
-                    team["policy_id"] = f'{team.get("id","WRITER")}_DEFAULT'
-
-            p.write_text(_p26_json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
-    except Exception:
-        pass
-    return arts
-### P26_COMPAT_EXECUTE_STUB_END ###
-
-# === P26_HOTFIX_V3_EXECUTE_STUB_POSTFIX ===
-import json as _p26_json
-from pathlib import Path as _p26_Path
-
-if not globals().get("_P26_EXECUTE_STUB_WRAPPED", False):
-    _P26_EXECUTE_STUB_WRAPPED = True
-    _P26_EXECUTE_STUB_ORIG = execute_stub
-
-    def _p26_find_run_id(args, kwargs, out):
-        rid = kwargs.get("run_id")
-        if rid:
-            return str(rid)
-
-        if args:
-            first = args[0]
-            if isinstance(first, dict):
-                for k in ("run_id", "RUN_ID"):
-                    v = first.get(k)
-                    if v:
-                        return str(v)
-
-        candidates = []
-
-        def walk(x):
-            if isinstance(x, dict):
-                for v in x.values():
-                    walk(v)
-            elif isinstance(x, (list, tuple, set)):
-                for v in x:
-                    walk(v)
-            elif isinstance(x, str):
-                s = x.replace("\\", "/")
-                parts = [p for p in s.split("/") if p]
-                if "runs" in parts:
-                    i = parts.index("runs")
-                    if i + 1 < len(parts):
-                        candidates.append(parts[i + 1])
-
-        walk(out)
-        if candidates:
-            return candidates[-1]
-
-        runs = _p26_Path("runs")
-        if runs.exists():
-            ds = [d for d in runs.iterdir() if d.is_dir()]
-            if ds:
-                ds.sort(key=lambda d: d.stat().st_mtime)
-                return ds[-1].name
-        return None
-
-    def _p26_fix_step_file(fp: _p26_Path):
-        try:
-            obj = _p26_json.loads(fp.read_text(encoding="utf-8"))
-        except Exception:
-            return
 
-        if not isinstance(obj, dict):
-            return
+def _mode_of(doc: Dict[str, Any]) -> str:
+    return str(doc.get("mode") or "").upper()
 
-        team = obj.get("team")
-        if not isinstance(team, dict):
-            team = {}
 
-        team_id = team.get("id") or team.get("team_id") or obj.get("team_id") or obj.get("effective_team") or "SYSTEM"
-        team["id"] = str(team_id)
-
-        policy_id = team.get("policy_id")
-        meta_policy = None
-        try:
-            meta_policy = (((obj.get("result") or {}).get("payload") or {}).get("meta") or {}).get("policy_id")
-        except Exception:
-            meta_policy = None
+@register_step_finalizer("requested_model")
+def _fin_requested_model(doc: Dict[str, Any]) -> None:
+    model = _forced_model()
+    _sub_dict(doc, "input")["_requested_model"] = model
+    _result_meta(doc)["requested_model"] = model
 
-        if not policy_id:
-            policy_id = meta_policy or obj.get("policy_id") or "DEFAULT"
-        team["policy_id"] = str(policy_id)
 
-        obj["team"] = team
+@register_step_finalizer("team_policy", sequence=True)
+def _fin_team_policy(doc: Dict[str, Any]) -> None:
+    team = _sub_dict(doc, "team")
+    mode_name = (doc.get("mode") or doc.get("tool") or "").upper()
+    tid = team.get("id") or team.get("team_id") or _team_for_mode(mode_name)
+    team["id"] = tid
+    team["team_id"] = tid
+    if not isinstance(doc.get("effective_policy"), dict):
+        doc["effective_policy"] = {"model": _forced_model()}
 
-        result = obj.get("result")
-        if not isinstance(result, dict):
-            result = {}
-            obj["result"] = result
 
-        payload = result.get("payload")
-        if not isinstance(payload, dict):
-            payload = {}
-            result["payload"] = payload
+@register_step_finalizer("team_meta", sequence=True)
+def _fin_team_meta(doc: Dict[str, Any]) -> None:
+    team = _sub_dict(doc, "team")
+    team["id"] = str(team.get("id") or team.get("team_id") or doc.get("team_id") or doc.get("effective_team") or "SYSTEM")
 
-        meta = payload.get("meta")
-        if not isinstance(meta, dict):
-            meta = {}
-            payload["meta"] = meta
+    meta = _result_meta(doc)
+    if not team.get("policy_id"):
+        team["policy_id"] = meta.get("policy_id") or doc.get("policy_id") or "DEFAULT"
+    team["policy_id"] = str(team["policy_id"])
 
-        meta.setdefault("policy_id", team["policy_id"])
-        meta.setdefault("team_id", team["id"])
+    meta.setdefault("policy_id", team["policy_id"])
+    meta.setdefault("team_id", team["id"])
 
-        fp.write_text(_p26_json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
 
-    def execute_stub(*args, **kwargs):
-        out = _P26_EXECUTE_STUB_ORIG(*args, **kwargs)
-        try:
-            rid = _p26_find_run_id(args, kwargs, out)
-            if rid:
-                step_dir = _p26_Path("runs") / str(rid) / "steps"
-                if step_dir.exists():
-                    for fp in sorted(step_dir.glob("*.json")):
-                        _p26_fix_step_file(fp)
-        except Exception:
-            pass
-        return out
+def _is_hard_must_fix(item: Any) -> bool:
+    if isinstance(item, dict):
+        sev = str(item.get("severity", "")).upper()
+        code = str(item.get("id", item.get("code", ""))).upper()
+        return (sev in {"CRITICAL", "BLOCKER", "FATAL", "HARD"}) or ("CRITICAL" in code) or ("BLOCKER" in code) or ("FATAL" in code)
+    s = str(item).upper()
+    return ("CRITICAL" in s) or ("BLOCKER" in s) or ("FATAL" in s)
 
 
 # P014_FORCE_REVISE_SHORT_ONLY_V3
-def _p014_force_revise_short_only(_artifact_paths):
-    try:
-        import json as _json
-        from pathlib import Path as _Path
-        for _ap in (_artifact_paths or []):
-            try:
-                _p = _Path(_ap)
-                if not _p.exists():
-                    continue
-                _obj = _json.loads(_p.read_text(encoding="utf-8"))
-                if str(_obj.get("mode", "")).upper() != "QUALITY":
-                    continue
-
-                _res = _obj.get("result") or {}
-                _pl = _res.get("payload") or {}
-                if not isinstance(_pl, dict):
-                    _pl = {}
-
-                _reasons = _pl.get("REASONS")
-                if isinstance(_reasons, list):
-                    _reasons_list = _reasons
-                elif _reasons is None:
-                    _reasons_list = []
-                else:
-                    _reasons_list = [_reasons]
-
-                _flags = _pl.get("FLAGS") if isinstance(_pl.get("FLAGS"), dict) else {}
-                _must = _pl.get("MUST_FIX") if isinstance(_pl.get("MUST_FIX"), list) else []
-
-                _short = bool(_flags.get("too_short", False)) or any(
-                    ("MIN_WORDS" in str(_r).upper()) or ("ZA MAŁO SŁÓW" in str(_r).upper()) or ("ZA MALO SLOW" in str(_r).upper()) or ("TOO_SHORT" in str(_r).upper())
-                    for _r in _reasons_list
-                )
-
-                def _is_hard(_x):
-                    if isinstance(_x, dict):
-                        _sev = str(_x.get("severity", "")).upper()
-                        _code = str(_x.get("id", _x.get("code", ""))).upper()
-                        return (_sev in {"CRITICAL", "BLOCKER", "FATAL", "HARD"}) or ("CRITICAL" in _code) or ("BLOCKER" in _code) or ("FATAL" in _code)
-                    _s = str(_x).upper()
-                    return ("CRITICAL" in _s) or ("BLOCKER" in _s) or ("FATAL" in _s)
-
-                _hard = any(_is_hard(_m) for _m in _must)
-
-                if str(_pl.get("DECISION", "")).upper() == "REJECT" and _short and (not _hard):
-                    _pl["DECISION"] = "REVISE"
-
-                if "text" in _pl:
-                    _pl.pop("text", None)
-                if not isinstance(_pl.get("REASONS"), list):
-                    _pl["REASONS"] = _reasons_list
-
-                _res["payload"] = _pl
-                _obj["result"] = _res
-                _p.write_text(_json.dumps(_obj, ensure_ascii=False, indent=2), encoding="utf-8")
-            except Exception:
-                pass
-    except Exception:
-        pass
-    return _artifact_paths
+@register_step_finalizer("quality_short_revise")
+def _fin_quality_short_revise(doc: Dict[str, Any]) -> None:
+    if _mode_of(doc) != "QUALITY":
+        return
+    result = _sub_dict(doc, "result")
+    pl = _sub_dict(result, "payload")
+
+    reasons = pl.get("REASONS")
+    if isinstance(reasons, list):
+        reasons_list = reasons
+    elif reasons is None:
+        reasons_list = []
+    else:
+        reasons_list = [reasons]
 
-try:
-    _execute_stub_original_p014_v3
-except NameError:
-    _execute_stub_original_p014_v3 = execute_stub
+    flags = pl.get("FLAGS") if isinstance(pl.get("FLAGS"), dict) else {}
+    must = pl.get("MUST_FIX") if isinstance(pl.get("MUST_FIX"), list) else []
 
-    def execute_stub(*args, **kwargs):
-        _paths = _execute_stub_original_p014_v3(*args, **kwargs)
-        return _p014_force_revise_short_only(_paths)
+    short = bool(flags.get("too_short", False)) or any(
+        ("MIN_WORDS" in str(r).upper()) or ("ZA MAŁO SŁÓW" in str(r).upper()) or ("ZA MALO SLOW" in str(r).upper()) or ("TOO_SHORT" in str(r).upper())
+        for r in reasons_list
+    )
+    hard = any(_is_hard_must_fix(m) for m in must)
+
+    if str(pl.get("DECISION", "")).upper() == "REJECT" and short and not hard:
+        pl["DECISION"] = "REVISE"
+
+    pl.pop("text", None)
+    if not isinstance(pl.get("REASONS"), list):
+        pl["REASONS"] = reasons_list
+
+
+def _has_force_flag(o: Any) -> bool:
+    if isinstance(o, dict):
+        for k, v in o.items():
+            ks = str(k).lower()
+            if ks in _FORCE_KEYS and bool(v):
+                return True
+            if ks == "force_decision" and str(v).upper() == "REJECT":
+                return True
+            if _has_force_flag(v):
+                return True
+        return False
+    if isinstance(o, list):
+        return any(_has_force_flag(x) for x in o)
+    return False
+
+
+@register_step_finalizer("quality_force_reject")
+def _fin_quality_force_reject(doc: Dict[str, Any]) -> None:
+    # wymuszony REJECT na krokach bramkujacych (flaga w payloadzie requestu albo marker [force_reject] w tekscie)
+    mode = _mode_of(doc)
+    if not any(k in mode for k in ("QUALITY", "GATE", "CHECK")):
+        return
+    inp = doc.get("input") if isinstance(doc.get("input"), dict) else {}
+    flag = any(bool(inp.get(k)) for k in _FORCE_KEYS) or str(inp.get("force_decision", "")).upper() == "REJECT"
+    marker = flag or _has_force_flag(inp) or "[force_reject]" in json.dumps(inp, ensure_ascii=False).lower()
+    if not marker:
+        return
+
+    result = _sub_dict(doc, "result")
+    pl = _sub_dict(result, "payload")
+    pl["DECISION"] = "REJECT"
+
+    reasons = list(pl["REASONS"]) if isinstance(pl.get("REASONS"), list) else []
+    for reason, on in (("FORCE_REJECT: request flag active", flag), ("FORCE_REJECT: request flag/marker active", marker)):
+        if on and reason not in reasons:
+            reasons.append(reason)
+    pl["REASONS"] = reasons
+
+    flags = _sub_dict(pl, "FLAGS")
+    flags["force_reject"] = True
+
+    doc["decision"] = "REJECT"
+    doc["revision_reason"] = reasons[-1]
+    doc["flags"] = flags
+
+
+@register_step_finalizer("artifact_record")
+def _fin_artifact_record(doc: Dict[str, Any]) -> None:
+    fixed = normalize_artifact_record(doc)
+    doc.clear()
+    doc.update(fixed)
+
+
+# P041_QUALITY_CONTRACT: QUALITY nie niesie tekstu edytowalnego, DECISION w {ACCEPT, REVISE, REJECT}
+@register_step_finalizer("quality_contract")
+def _fin_quality_contract(doc: Dict[str, Any]) -> None:
+    if _mode_of(doc) != "QUALITY":
+        return
+    result = _sub_dict(doc, "result")
+    pl = _sub_dict(result, "payload")
+
+    pl.pop("text", None)
+    pl.pop("input", None)
+    pl.pop("content", None)
+
+    dec = str(pl.get("DECISION") or pl.get("decision") or "").upper().strip()
+    if dec in {"PASS", "OK", "SUCCESS"}:
+        dec = "ACCEPT"
+    elif dec in {"FAIL", "FAILED", "ERROR"}:
+        dec = "REJECT"
+    if dec not in {"ACCEPT", "REVISE", "REJECT"}:
+        dec = "REJECT"
+    pl["DECISION"] = dec
+
+    reasons = pl.get("REASONS")
+    if reasons is None:
+        reasons = pl.get("reasons")
+    if reasons is None:
+        reasons = []
+    elif isinstance(reasons, (list, tuple, set)):
+        reasons = [str(x).strip() for x in reasons if str(x).strip()]
+    else:
+        r = str(reasons).strip()
+        reasons = [r] if r else []
+    pl["REASONS"] = reasons[:7]
 
+    result["tool"] = "QUALITY"
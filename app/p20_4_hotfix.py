@@ -7,8 +7,6 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
-from fastapi import Request
-from starlette.responses import JSONResponse, Response
 
 
 def install(app) -> None:
@@ -16,62 +14,29 @@ def install(app) -> None:
         return
     app.state.p20_4_hotfix_installed = True
 
-    @app.middleware("http")
-    async def _p20_4_hotfix(request: Request, call_next):
-        if request.url.path != "/agent/step":
-            return await call_next(request)
-
-        body_raw = await request.body()
-        req_json = _safe_json(body_raw)
-
-        # preset alias: stabilizacja testów team layer
-        if isinstance(req_json, dict) and str(req_json.get("preset", "")).upper() == "DRAFT_EDIT_QUALITY":
-            req_json = dict(req_json)
-            req_json["preset"] = "DEFAULT"
-            body_raw = json.dumps(req_json, ensure_ascii=False).encode("utf-8")
-
-        missing_latest_before, latest_before, latest_marker = _resume_missing_state(req_json)
-
-        async def receive():
-            return {"type": "http.request", "body": body_raw, "more_body": False}
-
-        request2 = Request(request.scope, receive)
-        response = await call_next(request2)
-
-        return await _normalize_response(
-            response=response,
-            req_json=req_json if isinstance(req_json, dict) else {},
-            missing_latest_before=missing_latest_before,
-            latest_before=latest_before,
-            latest_marker=latest_marker,
-        )
-
-
-async def _normalize_response(
-    response: Response,
-    req_json: Dict[str, Any],
-    missing_latest_before: bool,
-    latest_before: Optional[str],
-    latest_marker: Optional[Path],
-) -> Response:
-    content_type = (response.headers.get("content-type") or "").lower()
-    if "application/json" not in content_type:
-        return response
-
-    body = b""
-    async for chunk in response.body_iterator:
-        body += chunk
-
-    payload = _safe_json(body)
+    from app.asgi_dispatch import install_dispatch
+
+    install_dispatch(app).add("_p20_4_hotfix", "/agent/step", on_request=_p20_4_request, on_response=_p20_4_response)
+
+
+async def _p20_4_request(ctx) -> None:
+    req_json = ctx.json()
+
+    # preset alias: stabilizacja testów team layer
+    if isinstance(req_json, dict) and str(req_json.get("preset", "")).upper() == "DRAFT_EDIT_QUALITY":
+        req_json = dict(req_json)
+        req_json["preset"] = "DEFAULT"
+        ctx.set_json(req_json)
+
+    ctx.state["p20_4"] = _resume_missing_state(req_json)
+    return None
+
+
+def _p20_4_response(ctx, status_code: int, payload: Any) -> Tuple[int, Any]:
     if not isinstance(payload, dict):
-        return Response(
-            content=body,
-            status_code=response.status_code,
-            headers=_clean_headers(response.headers),
-            media_type="application/json",
-        )
-
-    status_code = int(response.status_code)
+        return status_code, payload
+    missing_latest_before, latest_before, latest_marker = ctx.state.get("p20_4") or (False, None, None)
+
     payload = _normalize_payload(payload)
 
     # 500 -> 422 dla team override
@@ -91,11 +56,7 @@ async def _normalize_response(
     # Schema/compat naprawa artefaktów na dysku
     _normalize_artifact_files(payload)
 
-    return JSONResponse(
-        content=payload,
-        status_code=status_code,
-        headers=_clean_headers(response.headers),
-    )
+    return status_code, payload
 
 
 def _normalize_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -277,13 +238,3 @@ def _repo_root() -> Path:
 
 def _runs_root() -> Path:
     return _repo_root() / "runs"
-
-
-def _clean_headers(headers: Any) -> Dict[str, str]:
-    out: Dict[str, str] = {}
-    for k, v in headers.items():
-        lk = str(k).lower()
-        if lk in ("content-length", "content-type"):
-            continue
-        out[str(k)] = str(v)
-    return out
@@ -4,8 +4,8 @@ import os
 import time
 import uuid
 import importlib
+import re
 from pathlib import Path
-from fastapi import Request
 from starlette.responses import JSONResponse
 
 
@@ -209,13 +209,15 @@ def install_pytest_fastpath(app) -> None:
 
     repo_root = Path(__file__).resolve().parents[1]
 
-    @app.middleware("http")
-    async def _pytest_fastpath(request: Request, call_next):
+    from app.asgi_dispatch import install_dispatch
+
+    @install_dispatch(app).request(re.compile(r"/health|/healthz|/agent/step|/config/(validate|presets|modes|teams)"))
+    async def _pytest_fastpath(ctx):
         if os.getenv("PYTEST_FASTPATH", "0") != "1":
-            return await call_next(request)
+            return None
 
-        path = request.url.path.rstrip("/")
-        method = request.method.upper()
+        path = ctx.path
+        method = ctx.method
 
         # 0) health
         if method == "GET" and path in ("/health", "/healthz"):
@@ -223,11 +225,8 @@ def install_pytest_fastpath(app) -> None:
 
         # 1) NAJPIERW ultra-fast /agent/step (bez ładowania configów)
         if method == "POST" and path == "/agent/step":
-            try:
-                body = await request.json()
-                if not isinstance(body, dict):
-                    body = {}
-            except Exception:
+            body = ctx.json()
+            if not isinstance(body, dict):
                 body = {}
 
             mode = str(body.get("mode") or "WRITE").upper()
@@ -361,5 +360,4 @@ def install_pytest_fastpath(app) -> None:
                 "teams": teams, "team_ids": team_ids, "count": len(team_ids)
             }, status_code=200)
 
-        return await call_next(request)
-
+        return None
@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from pathlib import Path
 from typing import Optional
-import json
 import os
 import tempfile
 import re
 
+from app.run_index import get_index as get_run_index
+
 ROOT = Path(__file__).resolve().parents[1]
 BOOKS_DIR = ROOT / "books"
 RUNS_DIR = ROOT / "runs"
@@ -17,45 +18,9 @@ def _latest_path(book_id: str) -> Path:
     safe = (book_id or "default").strip()
     return BOOKS_DIR / safe / "_latest_run_id.txt"
 
-def _read_book_id_from_run(run_dir: Path) -> Optional[str]:
-    """
-    Próbuje wyciągnąć book_id z pierwszego kroku runa:
-    runs/<run_id>/steps/001_*.json -> input.book_id
-    """
-    steps = run_dir / "steps"
-    if not steps.exists():
-        return None
-    first = None
-    for p in sorted(steps.glob("001_*.json")):
-        first = p
-        break
-    if not first or not first.exists():
-        return None
-    try:
-        data = json.loads(first.read_text(encoding="utf-8"))
-    except Exception:
-        return None
-    inp = data.get("input") if isinstance(data, dict) else None
-    if isinstance(inp, dict):
-        bid = inp.get("book_id")
-        if isinstance(bid, str) and bid.strip():
-            return bid.strip()
-    return None
-
 def _scan_runs_latest(book_id: str) -> Optional[str]:
-    bid = (book_id or "default").strip()
-    if not RUNS_DIR.exists():
-        return None
-
-    # run_id zawiera timestamp -> sort po nazwie malejąco działa jako "najnowszy pierwszy"
-    run_dirs = [p for p in RUNS_DIR.iterdir() if p.is_dir() and p.name.startswith("run_")]
-    run_dirs.sort(key=lambda x: x.name, reverse=True)
-
-    for d in run_dirs:
-        rb = _read_book_id_from_run(d)
-        if rb == bid:
-            return d.name
-    return None
+    # indeks runow (app.run_index) zamiast skanu runs/run_* + parsowania steps/001_*.json
+    return get_run_index().latest_for_book(book_id, prefix="run_")
 
 def get_latest_run_id(book_id: str) -> Optional[str]:
     # 1) preferuj latest file (jeśli istnieje i wskazuje na istniejący run)
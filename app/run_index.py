@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Globalny indeks runow orchestratora: runs/.index/runs.sqlite3 (WAL), wiersz na runs/<run_id>/.
+#
+# execute_stub (i fastpath /agent/step) zapisuja start/koniec runu: book_id, preset_id, status, liczniki krokow,
+# created_at/updated_at. Dzieki temu "ostatni run ksiazki" to jedno zapytanie po indeksie (book_id, created_at)
+# zamiast skanu runs/run_* + parsowania steps/001_*.json, a GET /runs to stronicowanie po run_id (malejaco,
+# jak dawny sort nazw folderow).
+# Runy zapisane inna droga / usuniete z dysku: sync() (stat runs/ + diff nazw przy zmianie mtime),
+# pelna kontrola zgodnosci z naprawa: check(repair=True) albo `python -m app.run_index check --repair`.
+#   RUN_INDEX_DB   domyslnie <root>/runs/.index/runs.sqlite3
+
+ROOT = Path(__file__).resolve().parents[1]
+RUNS_DIR = ROOT / "runs"
+
+RUNNING = "RUNNING"
+DONE = "DONE"
+UNKNOWN = "UNKNOWN"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    book_id TEXT,
+    preset_id TEXT,
+    status TEXT NOT NULL,
+    total_steps INTEGER,
+    completed_steps INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_runs_book ON runs(book_id, created_at DESC, run_id DESC);
+CREATE TABLE IF NOT EXISTS state (k TEXT PRIMARY KEY, v TEXT);
+"""
+
+_FIELDS = ("book_id", "preset_id", "status", "total_steps", "completed_steps")
+
+
+def _read_json(p: Path) -> Any:
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def _parse_ts(value: Any) -> Optional[float]:
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+def _is_run_dir_name(name: str) -> bool:
+    return not name.startswith(".")
+
+
+def summarize_run_dir(run_dir: Path) -> Dict[str, Any]:
+    """Index row rebuilt from disk: 000_SEQUENCE.json / steps/001_*.json (book, preset) + state.json (status, counts)."""
+    steps_dir = run_dir / "steps"
+    seq = _read_json(steps_dir / "000_SEQUENCE.json")
+    seq = seq if isinstance(seq, dict) else {}
+    state = _read_json(run_dir / "state.json")
+    state = state if isinstance(state, dict) else {}
+
+    step_files = sorted(p for p in steps_dir.glob("[0-9][0-9][0-9]_*.json") if not p.name.startswith("000_")) if steps_dir.exists() else []
+
+    book_id = seq.get("book_id")
+    if not book_id and step_files:
+        first = _read_json(step_files[0])
+        inp = first.get("input") if isinstance(first, dict) else None
+        if isinstance(inp, dict):
+            book_id = inp.get("book_id")
+
+    total = state.get("total_steps")
+    if total is None:
+        queue = seq.get("queue_initial") if isinstance(seq.get("queue_initial"), list) else seq.get("modes")
+        total = len(queue) if isinstance(queue, list) else None
+
+    try:
+        mtime = run_dir.stat().st_mtime
+    except OSError:
+        mtime = time.time()
+    completed = state.get("completed_steps")
+    return {
+        "run_id": run_dir.name,
+        "book_id": str(book_id).strip() if isinstance(book_id, str) and book_id.strip() else None,
+        "preset_id": seq.get("preset_id") or seq.get("preset"),
+        "status": str(state.get("status") or UNKNOWN),
+        "total_steps": int(total) if isinstance(total, int) else None,
+        "completed_steps": int(completed) if isinstance(completed, int) else len({p.name[:3] for p in step_files}),
+        "created_at": _parse_ts(state.get("created_at")) or _parse_ts(seq.get("created_at")) or mtime,
+        "updated_at": _parse_ts(state.get("updated_ts")) or mtime,
+    }
+
+
+def _encode_cursor(run_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([run_id]).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        (run_id,) = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return str(run_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+class RunIndex:
+    def __init__(self, runs_dir: Optional[Path] = None, db_path: Optional[Path] = None):
+        self.runs_dir = Path(runs_dir or RUNS_DIR)
+        self.db_path = Path(db_path or os.getenv("RUN_INDEX_DB") or (self.runs_dir / ".index" / "runs.sqlite3"))
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def _state(self, k: str) -> Optional[str]:
+        row = self._conn().execute("SELECT v FROM state WHERE k=?", (k,)).fetchone()
+        return row["v"] if row else None
+
+    def _set_state(self, k: str, v: str) -> None:
+        self._conn().execute("INSERT OR REPLACE INTO state(k, v) VALUES (?,?)", (k, v))
+
+    # --- zapis (execute_stub) ---
+
+    def record_start(self, run_id: str, book_id: Optional[str], preset_id: Optional[str] = None, total_steps: Optional[int] = None) -> None:
+        """New run, or a resumed one (keeps created_at, resets status to RUNNING)."""
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO runs(run_id, book_id, preset_id, status, total_steps, completed_steps, created_at, updated_at) "
+            "VALUES (?,?,?,?,?,0,?,?) ON CONFLICT(run_id) DO UPDATE SET "
+            "book_id=excluded.book_id, preset_id=excluded.preset_id, status=excluded.status, "
+            "total_steps=excluded.total_steps, updated_at=excluded.updated_at",
+            (run_id, book_id, preset_id, RUNNING, total_steps, now, now),
+        )
+
+    def record_finish(self, run_id: str, status: str = DONE, completed_steps: Optional[int] = None, total_steps: Optional[int] = None) -> None:
+        self._conn().execute(
+            "UPDATE runs SET status=?, completed_steps=COALESCE(?, completed_steps), total_steps=COALESCE(?, total_steps), "
+            "updated_at=? WHERE run_id=?",
+            (status, completed_steps, total_steps, time.time(), run_id),
+        )
+
+    def _upsert_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self._conn().executemany(
+            "INSERT OR REPLACE INTO runs(run_id, book_id, preset_id, status, total_steps, completed_steps, created_at, updated_at) "
+            "VALUES (:run_id, :book_id, :preset_id, :status, :total_steps, :completed_steps, :created_at, :updated_at)",
+            rows,
+        )
+
+    # --- zgodnosc z runs/ ---
+
+    def _dir_stamp(self) -> Optional[str]:
+        try:
+            st = self.runs_dir.stat()
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
+    def _dir_names(self) -> set:
+        if not self.runs_dir.exists():
+            return set()
+        return {e.name for e in os.scandir(self.runs_dir) if e.is_dir() and _is_run_dir_name(e.name)}
+
+    def sync(self) -> Dict[str, int]:
+        """Cheap reconcile: O(1) stat of runs/ when unchanged, otherwise a diff of folder names."""
+        with self._sync_lock:
+            stamp = self._dir_stamp()
+            if stamp == self._state("dir_stamp"):
+                return {"added": 0, "removed": 0}
+            c = self._conn()
+            names = self._dir_names()
+            known = {r[0] for r in c.execute("SELECT run_id FROM runs")}
+            gone = known - names
+            rows = [summarize_run_dir(self.runs_dir / n) for n in sorted(names - known)]
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.executemany("DELETE FROM runs WHERE run_id=?", [(n,) for n in gone])
+                self._upsert_rows(rows)
+                self._set_state("dir_stamp", stamp or "")
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+            return {"added": len(rows), "removed": len(gone)}
+
+    def check(self, repair: bool = False) -> Dict[str, Any]:
+        """
+        Full consistency check against runs/: missing rows, rows without a folder, and rows whose
+        book/preset/status/step counts differ from what is on disk. repair=True rewrites them from disk.
+        """
+        with self._sync_lock:
+            c = self._conn()
+            names = self._dir_names()
+            rows = {r["run_id"]: dict(r) for r in c.execute("SELECT * FROM runs")}
+            missing = sorted(names - set(rows))
+            orphaned = sorted(set(rows) - names)
+            mismatched: List[Dict[str, Any]] = []
+            fixes: List[Dict[str, Any]] = [summarize_run_dir(self.runs_dir / n) for n in missing]
+            for n in sorted(names & set(rows)):
+                disk = summarize_run_dir(self.runs_dir / n)
+                row = rows[n]
+                # status RUNNING bez state.json = run w toku, nie rozjazd
+                diff = [
+                    f for f in _FIELDS
+                    if disk[f] is not None and disk[f] != row[f] and not (f == "status" and disk[f] == UNKNOWN)
+                    and not (f == "completed_steps" and row["status"] == RUNNING)
+                ]
+                if diff:
+                    mismatched.append({"run_id": n, "fields": {f: {"index": row[f], "disk": disk[f]} for f in diff}})
+                    fixes.append({**disk, "created_at": row["created_at"], "status": disk["status"] if disk["status"] != UNKNOWN else row["status"]})
+            if repair and (fixes or orphaned):
+                c.execute("BEGIN IMMEDIATE")
+                try:
+                    c.executemany("DELETE FROM runs WHERE run_id=?", [(n,) for n in orphaned])
+                    self._upsert_rows(fixes)
+                    self._set_state("dir_stamp", self._dir_stamp() or "")
+                    c.execute("COMMIT")
+                except BaseException:
+                    c.execute("ROLLBACK")
+                    raise
+            return {
+                "ok": not (missing or orphaned or mismatched),
+                "indexed": len(rows),
+                "on_disk": len(names),
+                "missing": missing,
+                "orphaned": orphaned,
+                "mismatched": mismatched,
+                "repaired": bool(repair and (fixes or orphaned)),
+            }
+
+    # --- odczyt ---
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM runs WHERE run_id=?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest_for_book(self, book_id: str, prefix: str = "") -> Optional[str]:
+        """Newest run of a book (run_id starting with `prefix`) whose folder still exists; stale rows are dropped."""
+        self.sync()
+        c = self._conn()
+        bid = (book_id or "default").strip()
+        while True:
+            rows = c.execute(
+                "SELECT run_id FROM runs WHERE book_id=? AND substr(run_id, 1, ?)=? ORDER BY created_at DESC, run_id DESC LIMIT 8",
+                (bid, len(prefix), prefix),
+            ).fetchall()
+            if not rows:
+                return None
+            for row in rows:
+                if (self.runs_dir / row["run_id"]).is_dir():
+                    return row["run_id"]
+                c.execute("DELETE FROM runs WHERE run_id=?", (row["run_id"],))
+
+    def list_runs(self, limit: int = 50, cursor: Optional[str] = None, book_id: Optional[str] = None) -> Dict[str, Any]:
+        """Page of runs by run_id descending (run ids start with a timestamp): {"runs", "next_cursor"}."""
+        self.sync()
+        where: List[str] = []
+        args: List[Any] = []
+        if book_id:
+            where.append("book_id = ?")
+            args.append(book_id)
+        if cursor:
+            where.append("run_id < ?")
+            args.append(_decode_cursor(cursor))
+        sql = "SELECT * FROM runs" + (" WHERE " + " AND ".join(where) if where else "")
+        sql += " ORDER BY run_id DESC LIMIT ?"
+        rows = [dict(r) for r in self._conn().execute(sql, args + [int(limit) + 1]).fetchall()]
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {"runs": rows, "next_cursor": _encode_cursor(rows[-1]["run_id"]) if more and rows else None}
+
+
+_INDEX: Optional[RunIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index() -> RunIndex:
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = RunIndex()
+        return _INDEX
+
+
+def reset_index(runs_dir: Optional[Path] = None, db_path: Optional[Path] = None) -> RunIndex:
+    global _INDEX
+    with _INDEX_LOCK:
+        _INDEX = RunIndex(runs_dir, db_path)
+        return _INDEX
+
+
+def record_start(run_id: str, book_id: Optional[str], preset_id: Optional[str] = None, total_steps: Optional[int] = None) -> None:
+    # indeks jest pochodna dysku: blad indeksu nie moze wywrocic runu (check() go naprawi)
+    try:
+        get_index().record_start(run_id, book_id, preset_id, total_steps)
+    except Exception:
+        pass
+
+
+def record_finish(run_id: str, status: str = DONE, completed_steps: Optional[int] = None, total_steps: Optional[int] = None) -> None:
+    try:
+        get_index().record_finish(run_id, status, completed_steps, total_steps)
+    except Exception:
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m app.run_index")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ck = sub.add_parser("check", help="compare the run index with runs/")
+    ck.add_argument("--repair", action="store_true")
+    args = ap.parse_args(argv)
+
+    res = get_index().check(repair=args.repair)
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+    return 0 if res["ok"] or res["repaired"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
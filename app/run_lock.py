@@ -1,65 +1,46 @@
 from __future__ import annotations
 
-import os
-import time
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
-ROOT_DIR = Path(__file__).resolve().parent.parent
-LOCKS_DIR = ROOT_DIR / "locks"
+from app.lock_manager import LOCKS_DIR, ROOT_DIR, LockError, LockTimeout, get_lock_manager  # noqa: F401
 
 
-class LockError(RuntimeError):
-    pass
-
-
-def _ensure_dir(p: Path) -> None:
-    p.mkdir(parents=True, exist_ok=True)
+def _lock_name(book_id: str) -> str:
+    if not book_id or not book_id.strip():
+        raise LockError("book_id is empty")
+    return f"book_{book_id}"
 
 
 @contextmanager
 def acquire_book_lock(book_id: str, timeout_sec: int = 10, stale_after_sec: int = 3600) -> Iterator[Path]:
     """
-    Cross-platform lock via atomic create (O_EXCL).
-    Windows-friendly, no external deps.
+    Exclusive per-book lock from app.lock_manager (flock, O_EXCL fallback), FIFO within the process.
+    `stale_after_sec` is the lease TTL: a holder that outlives it can be taken over.
     """
-    if not book_id or not book_id.strip():
-        raise LockError("book_id is empty")
-
-    _ensure_dir(LOCKS_DIR)
-    lock_path = LOCKS_DIR / f"book_{book_id}.lock"
-    deadline = time.time() + timeout_sec
-
-    while True:
-        try:
-            fd = os.open(str(lock_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            try:
-                os.write(fd, f"pid={os.getpid()}\nts={time.time()}\n".encode("utf-8"))
-            finally:
-                os.close(fd)
-            break
-        except FileExistsError:
-            # stale lock?
-            try:
-                age = time.time() - lock_path.stat().st_mtime
-                if age > stale_after_sec:
-                    try:
-                        lock_path.unlink()
-                        continue
-                    except Exception:
-                        pass
-            except Exception:
-                pass
+    name = _lock_name(book_id)
+    mgr = get_lock_manager()
+    try:
+        lease = mgr.acquire(name, timeout=timeout_sec, ttl=stale_after_sec)
+    except LockTimeout:
+        raise LockError(f"Lock busy for book_id={book_id} (timeout {timeout_sec}s): {mgr.path(name)}")
+    try:
+        yield mgr.path(name)
+    finally:
+        lease.release()
 
-            if time.time() >= deadline:
-                raise LockError(f"Lock busy for book_id={book_id} (timeout {timeout_sec}s): {lock_path}")
-            time.sleep(0.2)
 
+@asynccontextmanager
+async def acquire_book_lock_async(book_id: str, timeout_sec: int = 10, stale_after_sec: int = 3600) -> AsyncIterator[Path]:
+    """acquire_book_lock() for async code: waits on the event loop, never blocks it."""
+    name = _lock_name(book_id)
+    mgr = get_lock_manager()
+    try:
+        lease = await mgr.acquire_async(name, timeout=timeout_sec, ttl=stale_after_sec)
+    except LockTimeout:
+        raise LockError(f"Lock busy for book_id={book_id} (timeout {timeout_sec}s): {mgr.path(name)}")
     try:
-        yield lock_path
+        yield mgr.path(name)
     finally:
-        try:
-            lock_path.unlink()
-        except Exception:
-            pass
+        lease.release()
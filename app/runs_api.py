@@ -1,35 +1,56 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
+from .run_index import get_index
 from .run_store import RUNS_DIR, read_json_if_exists, relpath
 
 router = APIRouter(prefix="/runs", tags=["runs"])
 
 
 @router.get("")
-def list_runs(limit: int = 50):
+def list_runs(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    book_id: Optional[str] = Query(None),
+):
     if not RUNS_DIR.exists():
-        return {"runs": []}
+        return {"runs": [], "next_cursor": None}
 
+    try:
+        page = get_index().list_runs(limit=limit, cursor=cursor, book_id=book_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # kolejnosc i pola jak dawniej (run_id malejaco, status/kroki/updated_ts wprost ze state.json, null gdy brak);
+    # book_id, preset_id, created_ts (epoch z indeksu) i next_cursor to pola dodatkowe
     items = []
-    for d in sorted(RUNS_DIR.iterdir(), key=lambda p: p.name, reverse=True):
-        if not d.is_dir():
-            continue
-        st = read_json_if_exists(d / "state.json")
+    for r in page["runs"]:
+        st = read_json_if_exists(RUNS_DIR / r["run_id"] / "state.json") or {}
         items.append({
-            "run_id": d.name,
-            "status": (st or {}).get("status"),
-            "completed_steps": (st or {}).get("completed_steps"),
-            "total_steps": (st or {}).get("total_steps"),
-            "updated_ts": (st or {}).get("updated_ts")
+            "run_id": r["run_id"],
+            "status": st.get("status"),
+            "completed_steps": st.get("completed_steps"),
+            "total_steps": st.get("total_steps"),
+            "updated_ts": st.get("updated_ts"),
+            "book_id": r["book_id"],
+            "preset_id": r["preset_id"],
+            "created_ts": r["created_at"],
         })
-        if len(items) >= limit:
-            break
 
-    return {"runs": items}
+    return {"runs": items, "next_cursor": page["next_cursor"]}
+
+
+@router.get("/index/check")
+def check_run_index():
+    return get_index().check()
+
+
+@router.post("/index/repair")
+def repair_run_index():
+    return get_index().check(repair=True)
 
 
 @router.get("/{run_id}")
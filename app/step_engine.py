@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+# Silnik wykonania /agent/step poza event loopem.
+#
+# AGENT_STEP_EXECUTOR = thread | process   (domyslnie thread)
+# AGENT_STEP_WORKERS  = rozmiar puli        (domyslnie 4)
+# AGENT_STEP_PER_BOOK = max rownoleglych krokow na book_id (domyslnie 1: ten sam run/latest)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default)) or default))
+    except Exception:
+        return default
+
+
+class StepEngine:
+    def __init__(self, kind: Optional[str] = None, workers: Optional[int] = None, per_book: Optional[int] = None):
+        self.kind = (kind or os.getenv("AGENT_STEP_EXECUTOR", "thread") or "thread").strip().lower()
+        if self.kind not in {"thread", "process"}:
+            self.kind = "thread"
+        self.workers = workers or _env_int("AGENT_STEP_WORKERS", 4)
+        self.per_book = per_book or _env_int("AGENT_STEP_PER_BOOK", 1)
+
+        self._pool: Optional[Executor] = None
+        self._pool_lock = threading.Lock()
+        # semafory sa zwiazane z petla (TestClient potrafi tworzyc nowa petle per klient)
+        self._book_sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_sec = 0.0
+
+    def _executor(self) -> Executor:
+        with self._pool_lock:
+            if self._pool is None:
+                if self.kind == "process":
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agent-step")
+            return self._pool
+
+    def _book_sem(self, loop: asyncio.AbstractEventLoop, book_id: str) -> asyncio.Semaphore:
+        sems = self._book_sems.setdefault(loop, {})
+        sem = sems.get(book_id)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_book)
+            sems[book_id] = sem
+        return sem
+
+    async def run(self, book_id: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Awaits fn(*args, **kwargs) in the pool; at most `per_book` concurrent calls per book_id."""
+        loop = asyncio.get_running_loop()
+        sem = self._book_sem(loop, book_id or "default")
+
+        self.waiting += 1
+        try:
+            await sem.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            out = await loop.run_in_executor(self._executor(), partial(fn, *args, **kwargs))
+            self.completed += 1
+            return out
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.busy_sec += time.perf_counter() - t0
+            self.in_flight -= 1
+            sem.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "per_book": self.per_book,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy_sec": round(self.busy_sec, 4),
+            "books_tracked": sum(len(v) for v in self._book_sems.values()),
+        }
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+_ENGINE: Optional[StepEngine] = None
+
+
+def get_engine() -> StepEngine:
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = StepEngine()
+    return _ENGINE
+
+
+def reset_engine(**kwargs: Any) -> StepEngine:
+    global _ENGINE
+    if _ENGINE is not None:
+        _ENGINE.shutdown()
+    _ENGINE = StepEngine(**kwargs)
+    return _ENGINE
+
+
+@atexit.register
+def _shutdown_engine() -> None:
+    if _ENGINE is not None:
+        _ENGINE.shutdown()
@@ -5,7 +5,7 @@ from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List
 
-from .config_registry import ConfigError
+from .config_registry import ConfigError, get_snapshot
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 CONFIG_DIR = ROOT_DIR / "config"
@@ -67,29 +67,9 @@ def policy_for_team(team_id: str) -> dict:
     - zawsze zwraca co najmniej: policy_id + model
     - w AGENT_TEST_MODE=1 może wymusić deterministic/max_tokens=0, ale NIE wycina modelu
     """
-    import os, json
-    from pathlib import Path
-
-    root = Path(__file__).resolve().parents[1]
-    p = root / "config" / "policies.json"
-
-    data = {}
-    if p.exists():
-        try:
-            data = json.loads(p.read_text(encoding="utf-8"))
-        except Exception:
-            data = {}
-
-    teams = {}
-    if isinstance(data, dict) and isinstance(data.get("teams"), dict):
-        teams = data["teams"]
-    elif isinstance(data, dict):
-        # fallback: płaska mapa
-        teams = data
-
-    pol = teams.get(team_id) if isinstance(teams, dict) else None
-    if not isinstance(pol, dict):
-        pol = {}
+    import os
+
+    pol = get_snapshot().policy_for_team(team_id)
 
     # twarde minimum
     pol = dict(pol)
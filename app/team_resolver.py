@@ -4,7 +4,7 @@ import json
 from pathlib import Path
 from typing import Any, Dict, Optional
 
-from app.config_registry import load_modes  # to istnieje i testy już go używają
+from app.config_registry import get_snapshot, load_modes  # to istnieje i testy już go używają
 
 APP_DIR = Path(__file__).resolve().parent
 AGENTS_PATH = APP_DIR / "agents.json"
@@ -41,15 +41,9 @@ def resolve_team(mode_id: str, team_override: str | None = None) -> dict:
     - team_override jest dozwolony tylko jeśli pasuje do mode_team_map (czyli TEAM nie może uruchomić złego MODE)
     - zwracamy: {id, policy_id, model, policy}
     """
-    import json
-    from pathlib import Path
     from app.team_layer import policy_for_team
 
-    root = Path(__file__).resolve().parents[1]
-    map_path = root / "config" / "mode_team_map.json"
-    map_ = json.loads(map_path.read_text(encoding="utf-8")) if map_path.exists() else {}
-
-    expected_team = map_.get(mode_id) or "WRITER"
+    expected_team = get_snapshot().team_for_mode(mode_id) or "WRITER"
 
     if team_override and team_override != expected_team:
         raise ValueError(f"TEAM_OVERRIDE_NOT_ALLOWED: mode={mode_id} override={team_override} expected={expected_team}")
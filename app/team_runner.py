@@ -1,14 +1,15 @@
 import json
 import os
-import urllib.request
-import urllib.error
 from pathlib import Path
-from typing import Any, Dict, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, Tuple, Optional
+
+from app.llm_cache import cacheable, cached_call, cached_stream
+from app.llm_http import LLMHttpError, LLMStream, get_client
+from app.team_layer import policy_for_team
 
 ROOT = Path(__file__).resolve().parents[1]
 APP_TEAMS_PATH = Path(__file__).resolve().with_name("teams.json")          # app/teams.json
 CFG_TEAMS_PATH = ROOT / "config" / "teams.json"                           # config/teams.json
-OPENAI_URL = "https://api.openai.com/v1/chat/completions"
 
 ALIASES = {
     "WRITER_TEAM": "WRITER",
@@ -120,12 +121,8 @@ def _prompt_paths(team_id: str, mode_u: str, team_cfg: Dict[str, Any]) -> Tuple[
         pass
     return system_path, prompt_path
 
-def _openai_chat(model: str, system: str, user: str, temperature: float, max_tokens: int) -> Tuple[str, str]:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY is not set (set it in environment).")
-
-    payload = {
+def _chat_payload(model: str, system: str, user: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+    return {
         "model": model,
         "temperature": temperature,
         ("max_completion_tokens" if any(x in model.lower() for x in ("gpt-5", "o1", "o3")) else "max_tokens"): max_tokens,
@@ -135,30 +132,32 @@ def _openai_chat(model: str, system: str, user: str, temperature: float, max_tok
         ],
     }
 
-    req = urllib.request.Request(
-        OPENAI_URL,
-        data=json.dumps(payload).encode("utf-8"),
-        method="POST",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-    )
+def _openai_error(e: Exception) -> ValueError:
+    if isinstance(e, LLMHttpError):
+        body = e.body
+        if e.status == 401:
+            return ValueError(f"OPENAI 401 Unauthorized: invalid/missing key. Body: {body[:400]}")
+        if e.status == 403:
+            return ValueError(f"OPENAI 403 Forbidden: key/project/region not allowed. Body: {body[:400]}")
+        if e.status == 429:
+            return ValueError(f"OPENAI 429 Rate limit/quota. Body: {body[:400]}")
+        return ValueError(f"OPENAI HTTP {e.status}: {body[:400]}")
+    return ValueError(f"OPENAI request failed: {type(e).__name__}: {e}")
+
+def _api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY is not set (set it in environment).")
+    return api_key
+
+def _openai_chat(model: str, system: str, user: str, temperature: float, max_tokens: int) -> Tuple[str, str]:
+    api_key = _api_key()
+    payload = _chat_payload(model, system, user, temperature, max_tokens)
 
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="replace")
-        if e.code == 401:
-            raise ValueError(f"OPENAI 401 Unauthorized: invalid/missing key. Body: {body[:400]}")
-        if e.code == 403:
-            raise ValueError(f"OPENAI 403 Forbidden: key/project/region not allowed. Body: {body[:400]}")
-        if e.code == 429:
-            raise ValueError(f"OPENAI 429 Rate limit/quota. Body: {body[:400]}")
-        raise ValueError(f"OPENAI HTTP {e.code}: {body[:400]}")
+        data = get_client(os.getenv("OPENAI_BASE_URL"), api_key).post_json("/chat/completions", payload, model=model)
     except Exception as e:
-        raise ValueError(f"OPENAI request failed: {type(e).__name__}: {e}")
+        raise _openai_error(e)
 
     try:
         text = data["choices"][0]["message"]["content"].strip()
@@ -168,6 +167,19 @@ def _openai_chat(model: str, system: str, user: str, temperature: float, max_tok
     effective = data.get("model") or model
     return text, effective
 
+def _openai_chat_stream(model: str, system: str, user: str, temperature: float, max_tokens: int) -> LLMStream:
+    """_openai_chat() as an LLMStream of deltas (same error messages, raised while iterating)."""
+    client = get_client(os.getenv("OPENAI_BASE_URL"), _api_key())
+    payload = _chat_payload(model, system, user, temperature, max_tokens)
+
+    def events() -> Iterator[Dict[str, Any]]:
+        try:
+            yield from client.post_stream("/chat/completions", payload, model=model)
+        except Exception as e:
+            raise _openai_error(e)
+
+    return LLMStream(events(), model)
+
 def run_team_llm(*args, **kwargs) -> Dict[str, Any]:
     """
     Compatibility entrypoint expected by existing code.
@@ -176,9 +188,11 @@ def run_team_llm(*args, **kwargs) -> Dict[str, Any]:
       - mode (str) default WRITE
       - payload (dict) must contain 'text'
       - team_id/team (str) optional
+      - on_delta (callable) optional: streams the completion, on_delta(text_delta) per chunk
     Returns:
       {"text": "...", "meta": {...}}
     """
+    on_delta: Optional[Callable[[str], None]] = kwargs.get("on_delta")
     mode = kwargs.get("mode") or kwargs.get("mode_id") or kwargs.get("operation") or "WRITE"
     payload = kwargs.get("payload") or kwargs.get("input") or {}
     team_id = kwargs.get("team_id") or kwargs.get("team")
@@ -215,7 +229,29 @@ def run_team_llm(*args, **kwargs) -> Dict[str, Any]:
     max_tokens = int(team_cfg.get("max_tokens", 1200))
 
     system = system_txt + "\n\n" + mode_txt
-    out_text, effective = _openai_chat(requested_model, system, user_txt, temperature, max_tokens)
+
+    # deterministyczne wywolania (polityka deterministic / temperature 0) ida przez cache odpowiedzi
+    def _call() -> Dict[str, Any]:
+        t, eff = _openai_chat(requested_model, system, user_txt, temperature, max_tokens)
+        return {"text": t, "effective_model": eff}
+
+    policy = dict(team_cfg)
+    policy.update(policy_for_team(tid))
+    stream_meta: Dict[str, Any] = {}
+    if on_delta is None:
+        out = cached_call("chat", requested_model, temperature, max_tokens, system, user_txt, _call, policy=policy)
+    else:
+        stream = cached_stream(
+            "chat", requested_model, temperature, max_tokens, system, user_txt,
+            lambda: _openai_chat_stream(requested_model, system, user_txt, temperature, max_tokens),
+            lambda st: {"text": st.text.strip(), "effective_model": st.model},
+            policy=policy,
+        )
+        for delta in stream:
+            on_delta(delta)
+        out = {"text": stream.text.strip(), "effective_model": stream.model, "cached": stream.cached}
+        stream_meta = {"ttft_ms": stream.ttft_ms, "stream_ms": stream.total_ms}
+    out_text, effective = out["text"], out["effective_model"]
 
     return {
         "text": out_text,
@@ -224,6 +260,9 @@ def run_team_llm(*args, **kwargs) -> Dict[str, Any]:
             "effective_model": effective,
             "team_id": tid,
             "mode": mode_u,
+            # bypass: wywolanie niedeterministyczne (albo LLM_CACHE=0) w ogole nie pyta cache
+            "llm_cache": "hit" if out.get("cached") else "miss" if cacheable(temperature, policy) else "bypass",
+            **stream_meta,
         },
     }
 
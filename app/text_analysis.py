@@ -0,0 +1,655 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from typing import Any, Callable, Dict, List, MutableMapping, Optional, Sequence, Tuple
+
+# Wspolny silnik analizy tekstu dla quality / proof / critic / critic_v2 / humanity.
+#
+# Document tokenizuje tekst raz (linie, slowa, zdania, akapity z offsetami; kazdy widok liczony leniwie
+# i tylko raz), a zarejestrowane zestawy regul skanuja caly tekst prekompilowanymi wzorcami (finditer w C)
+# zamiast petli po liniach z re.search. document_for() trzyma kilka ostatnich dokumentow, wiec proof + critic
+# na tym samym master.txt w jednym kroku loop_write_job dziela tokenizacje.
+#
+#   analyze(text, ["proof", "critic"], proof={"max_issues": 60})  -> {"proof": {...}, "critic": {...}}
+#
+# Wzorce "w obrebie linii" wykluczaja znaki konca linii z str.splitlines(), zeby wyniki byly identyczne
+# z dawnym skanem linia po linii.
+
+_LB = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+_LINE_BREAK_RE = re.compile(rf"\r\n|[{_LB}]")
+_HWS = rf"[^\S{_LB}]"  # whitespace bez konca linii
+
+_WORD_RE = re.compile(r"\w+")
+_PARA_SEP_RE = re.compile(r"\n\s*\n+")
+# liczba dopasowan "[^.!?…]+[.!?…]" == liczba par (nie-terminator, terminator); ta forma nie backtrackuje
+# kwadratowo na dlugich fragmentach bez interpunkcji
+_SENT_END_RE = re.compile(r"[^.!?…][.!?…]")
+_SENT_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+class Document:
+    def __init__(self, text: str):
+        self.text = text or ""
+
+    @cached_property
+    def lower(self) -> str:
+        return self.text.lower()
+
+    @cached_property
+    def line_starts(self) -> List[int]:
+        """Start offsets of str.splitlines() lines."""
+        if not self.text:
+            return []
+        starts = [0]
+        starts += [m.end() for m in _LINE_BREAK_RE.finditer(self.text)]
+        if starts[-1] == len(self.text):
+            starts.pop()
+        return starts
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_starts)
+
+    def line_no(self, offset: int) -> int:
+        return bisect.bisect_right(self.line_starts, offset)
+
+    def line_text(self, line_no: int) -> str:
+        start = self.line_starts[line_no - 1]
+        m = _LINE_BREAK_RE.search(self.text, start)
+        return self.text[start : m.start() if m else len(self.text)]
+
+    @cached_property
+    def char_counts(self) -> Dict[str, int]:
+        return _char_counts(self.text)
+
+    @cached_property
+    def word_starts(self) -> List[int]:
+        return [m.start() for m in _WORD_RE.finditer(self.text)]
+
+    @property
+    def word_count(self) -> int:
+        return len(self.word_starts)
+
+    def words_between(self, start: int, end: int) -> int:
+        """Words in [start, end); span edges must not cut a word."""
+        return bisect.bisect_left(self.word_starts, end) - bisect.bisect_left(self.word_starts, start)
+
+    @cached_property
+    def paragraphs(self) -> List[Tuple[int, int]]:
+        """Non-blank paragraphs (split on blank lines), as stripped (start, end) spans."""
+        out: List[Tuple[int, int]] = []
+        pos = 0
+        t = self.text
+        for m in list(_PARA_SEP_RE.finditer(t)) + [None]:
+            end = m.start() if m else len(t)
+            a, b = pos, end
+            while a < b and t[a].isspace():
+                a += 1
+            while b > a and t[b - 1].isspace():
+                b -= 1
+            if a < b:
+                out.append((a, b))
+            if m:
+                pos = m.end()
+        return out
+
+    def span_text(self, span: Tuple[int, int]) -> str:
+        return self.text[span[0] : span[1]]
+
+    @cached_property
+    def sentence_count(self) -> int:
+        """Sentences ending in . ! ? or an ellipsis."""
+        return sum(1 for _ in _SENT_END_RE.finditer(self.text))
+
+    @cached_property
+    def sentence_chunks(self) -> List[Tuple[int, int]]:
+        """text.strip() split on whitespace after . ! ? (re.split semantics: "" gives one empty chunk)."""
+        t = self.text
+        a, b = 0, len(t)
+        while a < b and t[a].isspace():
+            a += 1
+        while b > a and t[b - 1].isspace():
+            b -= 1
+        out: List[Tuple[int, int]] = []
+        pos = a
+        for m in _SENT_SPLIT_RE.finditer(t, a, b):
+            out.append((pos, m.start()))
+            pos = m.end()
+        out.append((pos, b))
+        return out
+
+
+RuleSet = Callable[[Document, Dict[str, Any]], Any]
+RULE_SETS: Dict[str, RuleSet] = {}
+
+
+def register_rule_set(name: str) -> Callable[[RuleSet], RuleSet]:
+    def deco(fn: RuleSet) -> RuleSet:
+        RULE_SETS[name] = fn
+        return fn
+
+    return deco
+
+
+_DOCS: "OrderedDict[str, Document]" = OrderedDict()
+_DOCS_LOCK = threading.Lock()
+_DOCS_MAX = 4
+
+
+def document_for(text: str) -> Document:
+    """Shared Document for a text (small LRU), so several tools on the same master tokenize it once."""
+    text = text or ""
+    with _DOCS_LOCK:
+        doc = _DOCS.get(text)
+        if doc is not None:
+            _DOCS.move_to_end(text)
+            return doc
+        doc = Document(text)
+        _DOCS[text] = doc
+        while len(_DOCS) > _DOCS_MAX:
+            _DOCS.popitem(last=False)
+        return doc
+
+
+def analyze(text: str, tools: Optional[Sequence[str]] = None, **options: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs the named rule sets (default: all) over one Document; options are per tool name."""
+    doc = document_for(text)
+    names = list(tools) if tools else list(RULE_SETS)
+    out: Dict[str, Any] = {}
+    for name in names:
+        fn = RULE_SETS.get(name)
+        if fn is None:
+            raise ValueError(f"unknown rule set: {name}")
+        out[name] = fn(doc, options.get(name) or {})
+    return out
+
+
+# --- proof (books_proof_api) ---
+
+_PROOF_LINE_RULES: List[Tuple[str, "re.Pattern[str]", Callable[["re.Match[str]"], str]]] = [
+    ("TRAILING_WS", re.compile(rf"[\t ](?=[{_LB}]|\Z)"), lambda m: "Trailing whitespace"),
+    ("DOUBLE_SPACE", re.compile(r"  "), lambda m: "Double space found"),
+    ("SPACE_BEFORE_PUNCT", re.compile(rf"{_HWS}+[.,;:!?]"), lambda m: "Space before punctuation"),
+    ("MULTI_PUNCT", re.compile(r"[.,;:!?]{2,}"), lambda m: "Multiple punctuation marks in a row"),
+    ("REPEAT_WORD", re.compile(rf"\b(\w+){_HWS}+\1\b", re.IGNORECASE), lambda m: f"Repeated word: '{m.group(1)}'"),
+]
+
+
+def _proof_line_issues(doc: Document, limit: int) -> List[Tuple[int, int, str, str]]:
+    """First `limit` per-line findings as (line, rule order, message, snippet), in report order."""
+    text = doc.text
+    starts = doc.line_starts
+    found: Dict[Tuple[int, int], str] = {}
+    for order, (_tp, pat, msg) in enumerate(_PROOF_LINE_RULES):
+        # jedno trafienie na linie wystarczy: po trafieniu skok na poczatek nastepnej linii;
+        # po `limit` liniach kolejne trafienia tej reguly i tak nie zmieszcza sie w wyniku
+        pos, hits = 0, 0
+        while hits < limit:
+            m = pat.search(text, pos)
+            if m is None:
+                break
+            line_no = doc.line_no(m.start())
+            found[(line_no, order)] = msg(m)
+            hits += 1
+            if line_no >= len(starts):
+                break
+            pos = starts[line_no]
+    return [(ln, order, found[(ln, order)], doc.line_text(ln)[:180]) for ln, order in sorted(found)[:limit]]
+
+
+def _char_counts(s: str) -> Dict[str, int]:
+    """Character-level facts used by the global checks (summed per paragraph in the incremental path)."""
+    return {
+        "excl": s.count("!"),
+        "quest": s.count("?"),
+        "dashes": s.count("—") + s.count("–"),
+        "tab": int("\t" in s),
+        "nbsp": int("\u00a0" in s),
+        "blank_run": int("\n\n\n\n" in s),
+    }
+
+
+def _proof_report(chars: int, cc: Dict[str, int], line_issues: Sequence[Sequence[Any]], max_issues: int, lines: int, words: int) -> Dict[str, Any]:
+    issues: List[Dict[str, Any]] = [
+        {"type": _PROOF_LINE_RULES[order][0], "line": ln, "snippet": snippet, "message": msg}
+        for ln, order, msg, snippet in line_issues[:max_issues]
+    ]
+
+    # Global checks
+    if cc["tab"] and len(issues) < max_issues:
+        issues.append({"type": "TAB_CHAR", "line": 0, "snippet": "\\t", "message": "Tab characters present (prefer spaces)"})
+    if cc["nbsp"] and len(issues) < max_issues:
+        issues.append({"type": "NBSP", "line": 0, "snippet": "NBSP", "message": "Non-breaking spaces present"})
+
+    return {"issues": issues, "stats": {"chars": chars, "lines": lines, "words": words}}
+
+
+@register_rule_set("proof")
+def _proof(doc: Document, opts: Dict[str, Any]) -> Dict[str, Any]:
+    max_issues = int(opts.get("max_issues", 80))
+    line_issues = _proof_line_issues(doc, max_issues)
+    return _proof_report(len(doc.text), doc.char_counts, line_issues, max_issues, doc.line_count, doc.word_count)
+
+
+# --- critic (books_critic_api) ---
+
+_DIALOGUE_LINE_RE = re.compile(rf"(?:\A|[{_LB}]){_HWS}*[–-]")
+
+
+def _critic_report(chars: int, cc: Dict[str, int], lines: int, paras: int, sents: int, words: int, dialogue: int) -> Dict[str, Any]:
+    return {
+        "chars": chars,
+        "lines": lines,
+        "paragraphs": paras,
+        "sentences": sents,
+        "words": words,
+        "avg_sentence_words": round((words / sents) if sents else 0.0, 2),
+        "avg_paragraph_words": round((words / paras) if paras else 0.0, 2),
+        "exclamations": cc["excl"],
+        "questions": cc["quest"],
+        "dialogue_lines": dialogue,
+    }
+
+
+@register_rule_set("critic")
+def _critic(doc: Document, opts: Dict[str, Any]) -> Dict[str, Any]:
+    dialogue = sum(1 for _ in _DIALOGUE_LINE_RE.finditer(doc.text))
+    return _critic_report(len(doc.text), doc.char_counts, doc.line_count, len(doc.paragraphs), doc.sentence_count, doc.word_count, dialogue)
+
+
+# --- critic_v2 (books_critic_v2_api) ---
+
+_PLACEHOLDER_V2_RE = re.compile(r"\b(NEUTRAL_[A-Z0-9_]+|TBD)\b")
+_VAGUE_RE = re.compile(r"\b(ogólnie|w zasadzie|tak naprawdę|w pewnym sensie|właściwie)\b")
+THIN_SCAN_PARAGRAPHS = 30
+
+
+def _excerpt(s: str, n: int = 420) -> str:
+    s = s.strip()
+    return (s[:n] + "…") if len(s) > n else s
+
+
+def _meta_excerpt(para: str) -> Optional[str]:
+    p = para.lower()
+    return _excerpt(para) if "to jest" in p and "wpis" in p and "master" in p else None
+
+
+def _thin_excerpt(para: str, words: int) -> Optional[str]:
+    return _excerpt(para) if 20 <= words <= 45 else None
+
+
+def _len_stats(lens: Sequence[int]) -> Tuple[int, int, int]:
+    return len(lens), sum(lens), sum(x * x for x in lens)
+
+
+def _critic_v2_report(
+    ph_hits: int,
+    lens: Tuple[int, int, int],
+    sentences: int,
+    vague: int,
+    paragraphs: int,
+    meta: Optional[str],
+    thin: Sequence[Tuple[int, str]],
+    max_points: int,
+) -> Dict[str, Any]:
+    points: List[Dict[str, Any]] = []
+
+    # 1) placeholdery
+    if ph_hits:
+        points.append({"type": "PLACEHOLDERS", "severity": "high", "note": f"W tekście są placeholdery (x{ph_hits}). Usuń przed wydaniem.", "excerpt": "GLOBAL"})
+
+    # 2) monotonia rytmu: mala wariancja dlugosci zdan
+    # lens = (liczba zdan, suma slow, suma kwadratow) -> wariancja bez listy dlugosci
+    n, total, total_sq = lens
+    if n >= 8:
+        avg = total / n
+        var = total_sq / n - avg * avg
+        if var < 20:
+            points.append({"type": "RHYTHM_MONOTONY", "severity": "med", "note": "Rytm zdań jest monotonny (mała zmienność długości).", "excerpt": "GLOBAL"})
+
+    # 3) ogolniki
+    if vague >= 3:
+        points.append({"type": "VAGUE_PHRASES", "severity": "med", "note": f"Dużo ogólników/wytrychów (x{vague}).", "excerpt": "GLOBAL"})
+
+    # 4) pierwszy akapit jak meta-komentarz
+    if meta is not None:
+        points.append({"type": "META_TEXT", "severity": "high", "note": "Początek wygląda jak meta-komentarz techniczny, nie jak proza.", "excerpt": meta})
+
+    # 5) krotkie, ogolne akapity (thin: (indeks akapitu, excerpt) z pierwszych THIN_SCAN_PARAGRAPHS)
+    for i, excerpt in thin:
+        if len(points) < max_points:
+            points.append({"type": "THIN_PARAGRAPH", "severity": "low", "note": "Akapit może być zbyt cienki — rozważ doprecyzowanie obrazu/akcji.", "excerpt": f"para_index={i}: " + excerpt})
+
+    points = points[:max_points]
+
+    score = 100
+    for pt in points:
+        if pt["severity"] == "high":
+            score -= 18
+        elif pt["severity"] == "med":
+            score -= 10
+        else:
+            score -= 6
+    score = max(0, min(100, score))
+
+    return {
+        "metrics": {"paragraphs": paragraphs, "sentences": sentences, "points_count": len(points), "score": score},
+        "points": points,
+    }
+
+
+@register_rule_set("critic_v2")
+def _critic_v2(doc: Document, opts: Dict[str, Any]) -> Dict[str, Any]:
+    paras = doc.paragraphs
+    chunks = doc.sentence_chunks
+    thin: List[Tuple[int, str]] = []
+    for i, span in enumerate(paras[:THIN_SCAN_PARAGRAPHS]):
+        ex = _thin_excerpt(doc.span_text(span), doc.words_between(*span))
+        if ex is not None:
+            thin.append((i, ex))
+    return _critic_v2_report(
+        ph_hits=sum(1 for _ in _PLACEHOLDER_V2_RE.finditer(doc.text)),
+        lens=_len_stats([doc.words_between(a, b) for a, b in chunks if a < b]),
+        sentences=len(chunks),
+        vague=sum(1 for _ in _VAGUE_RE.finditer(doc.lower)),
+        paragraphs=len(paras),
+        meta=_meta_excerpt(doc.span_text(paras[0])) if paras else None,
+        thin=thin,
+        max_points=int(opts.get("max_points", 12)),
+    )
+
+
+# --- humanity (books_humanity_api) ---
+
+AIISH_PHRASES = (
+    "warto zauważyć",
+    "podsumowując",
+    "należy pamiętać",
+    "w dzisiejszych czasach",
+    "bez wątpienia",
+    "co więcej",
+    "warto dodać",
+)
+_RELATIVE_RE = re.compile(r"\b(który|która|które)\b")
+
+
+def _humanity_report(chars: int, cc: Dict[str, int], phrases: Sequence[str], has_relative: bool) -> List[str]:
+    flags: List[str] = [f"Możliwy schematyczny zwrot: **{ph}**" for ph in phrases]
+    if cc["blank_run"]:
+        flags.append("Dziwne przerwy: 4+ pustych linii z rzędu.")
+    if cc["dashes"] == 0 and chars > 1500:
+        flags.append("Brak pauz/dialogów (—/–). Jeśli to proza sceniczna, może być zbyt monolityczne.")
+    if chars > 2000 and has_relative:
+        flags.append("Sprawdź nadmiar zdań względnych (który/która/które) – mogą wydłużać rytm.")
+    return flags[:25]
+
+
+@register_rule_set("humanity")
+def _humanity(doc: Document, opts: Dict[str, Any]) -> List[str]:
+    t = doc.lower
+    return _humanity_report(len(doc.text), doc.char_counts, [ph for ph in AIISH_PHRASES if ph in t], bool(_RELATIVE_RE.search(t)))
+
+
+# --- inkrementalnie: fakty per akapit + scalanie ---
+#
+# Tekst = seg0 sep0 seg1 sep1 ... gdzie sep to separator akapitow (_PARA_SEP_RE), a seg to pelne linie
+# akapitu. Fakty segmentu (liczniki, trafienia proof z numerami linii wzglednymi, dlugosci zdan, ...)
+# zaleza tylko od jego tresci, wiec cache per hash segmentu; scalanie daje raporty identyczne z analyze().
+
+INCREMENTAL_TOOLS = ("proof", "critic", "critic_v2", "humanity")
+SEGMENT_ISSUE_CAP = 500  # max_issues w API proof ma le=500
+_SENT_TERMS = ".!?…"
+
+# odcisk regul: zmiana wzorca / listy fraz / formatu faktow uniewaznia cache akapitow
+RULES_VERSION = 1
+RULES_FINGERPRINT = hashlib.sha1(
+    repr(
+        (
+            RULES_VERSION,
+            SEGMENT_ISSUE_CAP,
+            _LB,
+            [(tp, pat.pattern, pat.flags) for tp, pat, _ in _PROOF_LINE_RULES],
+            [p.pattern for p in (_WORD_RE, _PARA_SEP_RE, _SENT_END_RE, _SENT_SPLIT_RE, _DIALOGUE_LINE_RE, _PLACEHOLDER_V2_RE, _VAGUE_RE, _RELATIVE_RE)],
+            AIISH_PHRASES,
+            THIN_SCAN_PARAGRAPHS,
+        )
+    ).encode("utf-8")
+).hexdigest()[:16]
+
+
+def segment_key(segment: str) -> str:
+    return hashlib.blake2b(segment.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _line_breaks(s: str, pos: int = 0) -> int:
+    return len(_LINE_BREAK_RE.findall(s, pos))
+
+
+def segment_facts(segment: str) -> Dict[str, Any]:
+    """JSON-serializable per-paragraph facts that analyze_incremental() merges."""
+    doc = Document(segment)
+    stripped = segment.strip()
+    lower = doc.lower
+    facts: Dict[str, Any] = {
+        "nl": _line_breaks(segment),
+        "cc": _char_counts(segment),
+        "issues": [list(x) for x in _proof_line_issues(doc, SEGMENT_ISSUE_CAP)],
+        "words": doc.word_count,
+        "pairs": doc.sentence_count,
+        "starts_term": segment[:1] in tuple(_SENT_TERMS),
+        "dialogue": sum(1 for _ in _DIALOGUE_LINE_RE.finditer(segment)),
+        "para": bool(stripped),
+        "ph": sum(1 for _ in _PLACEHOLDER_V2_RE.finditer(segment)),
+        "vague": sum(1 for _ in _VAGUE_RE.finditer(lower)),
+        "phrases": [i for i, ph in enumerate(AIISH_PHRASES) if ph in lower],
+        "relative": bool(_RELATIVE_RE.search(lower)),
+    }
+    if stripped:
+        facts["chunks"] = [doc.words_between(a, b) for a, b in doc.sentence_chunks]
+        facts["ends_term"] = stripped[-1] in ".!?"
+        facts["meta"] = _meta_excerpt(stripped)
+        facts["thin"] = _thin_excerpt(stripped, doc.word_count)
+    return facts
+
+
+class _Merge:
+    """Running merge of segment facts, in text order; copy() snapshots it for a resume checkpoint."""
+
+    _LISTS = ("keys", "added", "line_issues", "thin")
+
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+        self.added: List[str] = []
+        self.line_issues: List[Tuple[int, int, str, str]] = []
+        self.thin: List[Tuple[int, str]] = []
+        self.phrases: set = set()
+        self.cc: Dict[str, int] = dict.fromkeys(_char_counts(""), 0)
+        self.n_lens = self.sum_lens = self.sq_lens = self.last_len = 0
+        self.breaks = self.words = self.sents = self.dialogue = self.ph = self.vague = self.paragraphs = 0
+        self.relative = False
+        self.prev_ends_term = True
+        self.meta: Optional[str] = None
+        self.sep_start = 0
+
+    def copy(self) -> "_Merge":
+        other = _Merge()
+        other.__dict__.update(self.__dict__)
+        for name in self._LISTS:
+            setattr(other, name, list(getattr(self, name)))
+        other.phrases = set(self.phrases)
+        other.cc = dict(self.cc)
+        return other
+
+    def add_issues(self, issues: Sequence[Sequence[Any]], base: int, max_issues: int) -> None:
+        for rel, order, msg, snippet in issues:
+            if len(self.line_issues) >= max_issues:
+                break
+            self.line_issues.append((base + rel, order, msg, snippet))
+
+    def add_counts(self, cc: Dict[str, int]) -> None:
+        for k, v in cc.items():
+            self.cc[k] += v
+
+    def add_segment(self, f: Dict[str, Any], at_start: bool, max_issues: int) -> None:
+        self.add_issues(f["issues"], self.breaks, max_issues)
+        self.add_counts(f["cc"])
+        self.breaks += f["nl"]
+        self.words += f["words"]
+        self.sents += f["pairs"] + (1 if not at_start and f["starts_term"] else 0)
+        self.dialogue += f["dialogue"]
+        self.ph += f["ph"]
+        self.vague += f["vague"]
+        self.phrases.update(f["phrases"])
+        self.relative = self.relative or f["relative"]
+        if f["para"]:
+            chunks = f["chunks"]
+            if self.n_lens and not self.prev_ends_term:
+                # poprzedni akapit bez [.!?] na koncu: jego ostatnie "zdanie" ciagnie sie w ten akapit
+                merged = self.last_len + chunks[0]
+                self.sum_lens += chunks[0]
+                self.sq_lens += merged * merged - self.last_len * self.last_len
+                self.last_len = merged
+                chunks = chunks[1:]
+            for x in chunks:
+                self.n_lens += 1
+                self.sum_lens += x
+                self.sq_lens += x * x
+                self.last_len = x
+            self.prev_ends_term = f["ends_term"]
+            if self.paragraphs == 0:
+                self.meta = f["meta"]
+            if self.paragraphs < THIN_SCAN_PARAGRAPHS and f["thin"] is not None:
+                self.thin.append((self.paragraphs, f["thin"]))
+            self.paragraphs += 1
+
+    def add_separator(self, sep: str, ends_cr: bool, max_issues: int) -> None:
+        # pierwszy "\n" separatora konczy ostatnia linie segmentu (chyba ze domyka "\r\n")
+        if not ends_cr:
+            self.breaks += 1
+        if sep.strip("\n") and len(self.line_issues) < max_issues:
+            # rzadki przypadek: linie z samymi spacjami/tabami miedzy akapitami
+            self.add_issues(_proof_line_issues(Document(sep[1:]), SEGMENT_ISSUE_CAP), self.breaks, max_issues)
+        self.add_counts(_char_counts(sep))
+        self.breaks += _line_breaks(sep, 1)
+
+
+def _resume(text: str, checkpoint: Optional[Dict[str, Any]]) -> Tuple[int, "_Merge"]:
+    """(pos, state) to continue from when `text` extends the checkpointed text; else (0, empty)."""
+    if checkpoint and text.startswith(checkpoint["prefix"]):
+        m = _PARA_SEP_RE.match(text, checkpoint["sep_start"])
+        if m is not None and m.end() == checkpoint["pos"]:
+            return checkpoint["pos"], checkpoint["state"].copy()
+    return 0, _Merge()
+
+
+def analyze_incremental(
+    text: str,
+    tools: Optional[Sequence[str]] = None,
+    cache: Optional[MutableMapping[str, Dict[str, Any]]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    checkpoints: Optional[Dict[int, Dict[str, Any]]] = None,
+    **options: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Same reports as analyze(), built from per-paragraph facts.
+
+    `cache` maps segment_key() -> segment_facts(); only paragraphs missing from it are analysed.
+    `checkpoints` (optional, kept by the caller between calls) holds the merge state up to the last
+    paragraph boundary, so a text that only grew at the end is merged from there on.
+    `stats` (optional) receives segments / analysed counts and the keys seen and added.
+    """
+    text = text or ""
+    names = list(tools) if tools else list(INCREMENTAL_TOOLS)
+    max_issues = int((options.get("proof") or {}).get("max_issues", 80))
+    rest = [n for n in names if n not in INCREMENTAL_TOOLS]
+    if max_issues > SEGMENT_ISSUE_CAP and "proof" in names:
+        rest.append("proof")
+    out_rest = analyze(text, rest, **options) if rest else {}
+    if cache is None:
+        cache = {}
+
+    pos, st = _resume(text, (checkpoints or {}).get(max_issues))
+    st.added = []
+    for m in list(_PARA_SEP_RE.finditer(text, pos)) + [None]:
+        end = m.start() if m else len(text)
+        seg = text[pos:end]
+        key = segment_key(seg)
+        f = cache.get(key)
+        if f is None:
+            f = segment_facts(seg)
+            cache[key] = f
+            st.added.append(key)
+        st.keys.append(key)
+        if m is None:
+            if checkpoints is not None and pos > 0:
+                # stan sprzed ostatniego (jeszcze rosnacego) akapitu
+                cp_state = st.copy()
+                cp_state.keys.pop()
+                checkpoints[max_issues] = {"prefix": text[:pos], "pos": pos, "sep_start": st.sep_start, "state": cp_state}
+            st.add_segment(f, pos == 0, max_issues)
+            break
+        st.add_segment(f, pos == 0, max_issues)
+        st.add_separator(m.group(0), seg.endswith("\r"), max_issues)
+        st.sep_start = m.start()
+        pos = m.end()
+
+    lines = (st.breaks + (0 if text[-1] in _LB else 1)) if text else 0
+    if stats is not None:
+        stats.update({"segments": len(st.keys), "analysed": len(st.added), "keys": st.keys, "added": st.added})
+
+    out: Dict[str, Any] = {}
+    for name in names:
+        if name in out_rest:
+            out[name] = out_rest[name]
+        elif name == "proof":
+            out[name] = _proof_report(len(text), st.cc, st.line_issues, max_issues, lines, st.words)
+        elif name == "critic":
+            out[name] = _critic_report(len(text), st.cc, lines, st.paragraphs, st.sents, st.words, st.dialogue)
+        elif name == "critic_v2":
+            out[name] = _critic_v2_report(
+                ph_hits=st.ph,
+                lens=(st.n_lens, st.sum_lens, st.sq_lens),
+                sentences=st.n_lens or 1,
+                vague=st.vague,
+                paragraphs=st.paragraphs,
+                meta=st.meta,
+                thin=st.thin,
+                max_points=int((options.get("critic_v2") or {}).get("max_points", 12)),
+            )
+        elif name == "humanity":
+            out[name] = _humanity_report(len(text), st.cc, [ph for i, ph in enumerate(AIISH_PHRASES) if i in st.phrases], st.relative)
+    return out
+
+
+# --- quality (app.quality_rules.evaluate_quality) ---
+
+_QWORD_CHARS = "0-9A-Za-zÀ-ÿĄĆĘŁŃÓŚŹŻąćęłńóśźż"
+_QWORD_RE = re.compile(rf"[{_QWORD_CHARS}]+(?:[-'][{_QWORD_CHARS}]+)?")
+
+QUALITY_META_PATTERNS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("META_AI", re.compile(r"(?i)\b(as an ai|as a language model|jako model językowy)\b")),
+    ("META_PROCESS", re.compile(r"(?i)\b(w tym rozdziale|w tej części|teraz opiszę|poniżej przedstawię|w kolejnym kroku)\b")),
+]
+QUALITY_PLACEHOLDER_PATTERNS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("PLACEHOLDER_TODO", re.compile(r"(?i)\bTODO\b")),
+    ("PLACEHOLDER_LOREM", re.compile(r"(?i)\blorem ipsum\b")),
+    ("PLACEHOLDER_TAGS", re.compile(r"<[^>]{1,60}>")),
+]
+QUALITY_LIST_RE = re.compile(r"(?m)^\s*([-*]|[0-9]+\.)\s+\S+")
+
+
+@register_rule_set("quality")
+def _quality(doc: Document, opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Raw findings for evaluate_quality (the decision/issue wording stays in app.quality_rules)."""
+    t = doc.text
+    return {
+        "words": sum(1 for _ in _QWORD_RE.finditer(t)),
+        "chars": len(t),
+        "meta": [issue_id for issue_id, pat in QUALITY_META_PATTERNS if pat.search(t)],
+        "placeholders": [issue_id for issue_id, pat in QUALITY_PLACEHOLDER_PATTERNS if pat.search(t)],
+        "has_lists": bool(QUALITY_LIST_RE.search(t)),
+    }
@@ -60,9 +60,12 @@ import re
 from pathlib import Path
 from typing import Any, Dict, List
 
-from app.canon_store import load_canon
 from app.canon_check import canon_check
+from app.canon_index import get_compiled_canon
 from app.quality_rules import evaluate_quality
+from app.uniqueness_index import get_index as get_uniqueness_index
+
+_ENTITY_CANDIDATE_RE = re.compile(r"\b[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+(?:\s+[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+)?\b")
 
 def _is_test_mode() -> bool:
     return os.environ.get("AGENT_TEST_MODE", "0") == "1"
@@ -247,32 +250,21 @@ def tool_continuity(payload: Dict[str, Any]) -> Dict[str, Any]:
 def tool_uniqueness(payload: Dict[str, Any]) -> Dict[str, Any]:
     book_id = payload.get("book_id") or "default"
     text = (payload.get("text") or "").strip()
-    reg_path = os.environ.get("UNIQUENESS_REGISTRY_PATH", "runs/_tmp/uniqueness_registry.jsonl")
-    p = Path(reg_path)
-    p.parent.mkdir(parents=True, exist_ok=True)
-
-    matches = []
-    if p.exists():
-        for line in p.read_text("utf-8", errors="ignore").splitlines():
-            try:
-                d = json.loads(line)
-                if d.get("text") == text and d.get("book_id") != book_id:
-                    matches.append(d)
-            except Exception:
-                pass
-
-    score = 1.0 if matches else 0.0
-    decision = "REVISE" if score >= 0.90 else "ACCEPT"
-
-    with p.open("a", encoding="utf-8") as f:
-        f.write(json.dumps({"book_id":book_id, "text":text}, ensure_ascii=False) + "\n")
+    threshold = payload.get("threshold")
+    threshold = float(os.environ.get("UNIQUENESS_THRESHOLD", "0.90") if threshold is None else threshold)
+
+    # MinHash/LSH: podobienstwo (estymata Jaccarda) zamiast pelnego skanu i porownania 1:1
+    r = get_uniqueness_index(payload.get("corpus")).check_and_add(book_id, text)
+    matches = r["matches"]
+    score = float(r["score"])
+    decision = "REVISE" if score >= threshold else "ACCEPT"
 
     return {"tool":"UNIQUENESS","payload":{
         "UNIQ_DECISION": decision,
         "UNIQ_SCORE": score,
         "UNIQ_MATCH": (matches[0] if matches else None),
         "MATCHES": matches,
-        "meta":{"requested_model": payload.get("_requested_model")}
+        "meta":{"requested_model": payload.get("_requested_model"), "index_docs": r["docs"], "threshold": threshold}
     }}
 
 def tool_factcheck(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -295,8 +287,8 @@ def tool_canon_check(payload):
     book_id = str((payload or {}).get("book_id") or "default")
     text = str((payload or {}).get("text") or "")
     scene_ref = str((payload or {}).get("scene_ref") or (payload or {}).get("scene") or "")
-    canon = load_canon(book_id)
-    report = canon_check(text=text, canon=canon, scene_ref=scene_ref)
+    cc = get_compiled_canon(book_id)
+    report = canon_check(text=text, canon=cc.canon, scene_ref=scene_ref, compiled=cc)
     return {"tool": "CANON_CHECK", "payload": _p15_hardfail_quality_payload(report)}
 
 TOOLS = {
@@ -386,58 +378,23 @@ def tool_continuity(payload):
     if not text or not book_id:
         return {"tool": "CONTINUITY", "payload": _p15_hardfail_quality_payload(base)}
 
-    from pathlib import Path
-    import json
-    import re
-
-    root = Path(__file__).resolve().parents[1]
-    bible_path = root / "books" / book_id / "book_bible.json"
-    if not bible_path.exists():
-        return {"tool": "CONTINUITY", "payload": _p15_hardfail_quality_payload(base)}
-
-    try:
-        bible = json.loads(bible_path.read_text(encoding="utf-8"))
-    except Exception:
-        return {"tool": "CONTINUITY", "payload": _p15_hardfail_quality_payload(base)}
-
-    rules = bible.get("continuity_rules") if isinstance(bible, dict) else {}
-    if not isinstance(rules, dict):
-        rules = {}
-    flag_unknown = bool(rules.get("flag_unknown_entities", False))
-    force_unknown = bool(rules.get("force_unknown_entities", False))
-
-    canon = bible.get("canon") if isinstance(bible, dict) else {}
-    if not isinstance(canon, dict):
-        canon = {}
-    chars = canon.get("characters")
-    if not isinstance(chars, list):
-        chars = []
-
-    known = set()
-    for ch in chars:
-        if not isinstance(ch, dict):
-            continue
-        n = str(ch.get("name") or "").strip()
-        if n:
-            known.add(n.lower())
-        aliases = ch.get("aliases")
-        if isinstance(aliases, list):
-            for a in aliases:
-                a = str(a or "").strip()
-                if a:
-                    known.add(a.lower())
+    cc = get_compiled_canon(book_id)
+    flag_unknown = bool(cc.rules.get("flag_unknown_entities", False))
+    force_unknown = bool(cc.rules.get("force_unknown_entities", False))
+    known = cc.known
 
     # test_033: pusty kanon + force_unknown_entities=False => cisza i puste listy
     if not known and not force_unknown:
         return {"tool": "CONTINUITY", "payload": _p15_hardfail_quality_payload(base)}
 
-    candidates = re.findall(r"\b[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+(?:\s+[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+)?\b", text)
+    candidates = _ENTITY_CANDIDATE_RE.findall(text)
     dedup, seen = [], set()
     for c in candidates:
         if c not in seen:
             seen.add(c)
             dedup.append(c)
     base["CANDIDATES"] = dedup
+    base["MENTIONS"] = cc.name_counts(text)
 
     if flag_unknown:
         unknown = []
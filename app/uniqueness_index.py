@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import base64
+import bisect
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# MinHash + LSH dla UNIQUENESS.
+#
+# Plik rejestru (UNIQUENESS_REGISTRY_PATH) to append-only JSONL bez pelnego tekstu:
+#   {"n": doc_no, "b": book_id, "h": sha1, "s": base64(NUM_PERM x uint32), "x": excerpt, "t": ts}
+# W pamieci: bucket LSH (BANDS x ROWS) -> lista doc_no, doczytywany przyrostowo od ostatniego offsetu.
+# Sygnatury trzymane spakowane (bytes, NUM_PERM x uint32 LE = 256 B zamiast krotki 64 intow, ~2.6 KB),
+# klucz bucketu to bytes (nr pasma + jego 16 B); slowa porownywane przez memoryview tylko dla kandydatow LSH.
+# Retencja: UNIQUENESS_MAX_DOCS / UNIQUENESS_RETENTION_DAYS, egzekwowana przez kompakcje pliku.
+# Liczba przeterminowanych = bisect po niemalejacej liscie ts (kolejnosc dopisywania), bez skanu docs.
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SIG_BYTES = NUM_PERM * 4
+SHINGLE_WORDS = int(os.getenv("UNIQUENESS_SHINGLE_WORDS", "5") or 5)
+EXCERPT_CHARS = 160
+
+_MERSENNE = (1 << 61) - 1
+_MAX32 = 0xFFFFFFFF
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _perm_params() -> List[Tuple[int, int]]:
+    out = []
+    for i in range(NUM_PERM):
+        d = hashlib.blake2b(f"minhash-perm-{i}".encode("ascii"), digest_size=16).digest()
+        a = (int.from_bytes(d[:8], "little") % (_MERSENNE - 1)) + 1
+        b = int.from_bytes(d[8:], "little") % _MERSENNE
+        out.append((a, b))
+    return out
+
+
+_PERMS = _perm_params()
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall((text or "").lower())
+    if not words:
+        return set()
+    k = max(1, SHINGLE_WORDS)
+    if len(words) <= k:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash(text: str) -> Optional[Tuple[int, ...]]:
+    sh = _shingles(text)
+    if not sh:
+        return None
+    hv = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in sh]
+    sig = []
+    for a, b in _PERMS:
+        sig.append(min(((a * x + b) % _MERSENNE) & _MAX32 for x in hv))
+    return tuple(sig)
+
+
+Sig = Union[Tuple[int, ...], bytes]
+
+
+def _words(sig: Sig) -> Sequence[int]:
+    # rowna kolejnosc bajtow po obu stronach, wiec porownanie slow nie zalezy od endianness hosta
+    return memoryview(sig).cast("I") if isinstance(sig, bytes) else sig
+
+
+def jaccard_estimate(s1: Sig, s2: Sig) -> float:
+    """Share of equal MinHash values; both signatures as tuples or both packed (see _raw)."""
+    return sum(1 for x, y in zip(_words(s1), _words(s2)) if x == y) / float(NUM_PERM)
+
+
+def _raw(sig: Tuple[int, ...]) -> bytes:
+    return struct.pack(f"<{NUM_PERM}I", *sig)
+
+
+def _band_keys(raw: bytes) -> List[bytes]:
+    step = ROWS * 4
+    return [bytes((bi,)) + raw[bi * step:(bi + 1) * step] for bi in range(BANDS)]
+
+
+def _pack(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _unpack(s: str) -> bytes:
+    raw = base64.b64decode(s)
+    if len(raw) != SIG_BYTES:
+        raise ValueError(f"bad signature length {len(raw)}")
+    return raw
+
+
+def _max_docs() -> int:
+    return int(os.getenv("UNIQUENESS_MAX_DOCS", "200000") or 200000)
+
+
+def _retention_sec() -> float:
+    days = float(os.getenv("UNIQUENESS_RETENTION_DAYS", "0") or 0)
+    return days * 86400.0
+
+
+class UniquenessIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.docs: Dict[int, Dict[str, Any]] = {}
+        self.buckets: Dict[bytes, List[int]] = {}
+        self.by_sha: Dict[str, List[int]] = {}
+        self._ts: List[float] = []
+        self._offset = 0
+        self._ino: Optional[int] = None
+        self._next = 1
+
+    # -------------------------
+    # load / sync z plikiem
+    # -------------------------
+    def _add_mem(self, rec: Dict[str, Any]) -> None:
+        if "s" not in rec and "text" in rec:
+            # stary format rejestru: {"book_id", "text"}
+            text = str(rec.get("text") or "").strip()
+            legacy_sig = minhash(text)
+            if legacy_sig is None:
+                return
+            rec = {"n": self._next, "b": rec.get("book_id"), "h": hashlib.sha1(text.encode("utf-8")).hexdigest(), "s": _pack(_raw(legacy_sig)), "x": text[:EXCERPT_CHARS], "t": None}
+        n = int(rec["n"])
+        sig = _unpack(rec["s"])
+        self.docs[n] = {"n": n, "book_id": rec.get("b"), "sha1": rec.get("h"), "excerpt": rec.get("x", ""), "ts": rec.get("t"), "sig": sig}
+        for k in _band_keys(sig):
+            self.buckets.setdefault(k, []).append(n)
+        if rec.get("h"):
+            self.by_sha.setdefault(rec["h"], []).append(n)
+        # max z poprzednim: lista zostaje posortowana nawet przy cofnietym zegarze (zanizony licznik, nie skan)
+        self._ts.append(max(float(rec.get("t") or 0), self._ts[-1] if self._ts else 0.0))
+        self._next = max(self._next, n + 1)
+
+    def _sync(self) -> None:
+        if not self.path.exists():
+            if self._offset:
+                self._reset()
+            return
+        st = self.path.stat()
+        if self._ino != st.st_ino or st.st_size < self._offset:
+            self._reset()
+            self._ino = st.st_ino
+        if st.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for ln in data[:end].splitlines():
+            try:
+                self._add_mem(json.loads(ln.decode("utf-8")))
+            except Exception:
+                continue
+        self._offset += end
+
+    # -------------------------
+    # API
+    # -------------------------
+    def query(self, sig: Sig, sha1: str, exclude_book: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        sig = sig if isinstance(sig, bytes) else _raw(sig)
+        cand = set(self.by_sha.get(sha1, []))
+        for k in _band_keys(sig):
+            cand.update(self.buckets.get(k, ()))
+        out = []
+        for n in cand:
+            d = self.docs.get(n)
+            if not d or (exclude_book is not None and d["book_id"] == exclude_book):
+                continue
+            score = 1.0 if d["sha1"] == sha1 else jaccard_estimate(sig, d["sig"])
+            out.append({"doc_id": n, "book_id": d["book_id"], "score": round(score, 4), "sha1": d["sha1"], "excerpt": d["excerpt"], "ts": d["ts"]})
+        out.sort(key=lambda m: (-m["score"], -m["doc_id"]))
+        return out[:limit]
+
+    def check_and_add(self, book_id: str, text: str, limit: int = 5) -> Dict[str, Any]:
+        text = (text or "").strip()
+        sha1 = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        sig = minhash(text)
+        with self._lock:
+            self._sync()
+            if sig is None:
+                return {"score": 0.0, "matches": [], "indexed": False, "docs": len(self.docs)}
+            raw = _raw(sig)
+            matches = self.query(raw, sha1, exclude_book=book_id, limit=limit)
+
+            rec = {"n": self._next, "b": book_id, "h": sha1, "s": _pack(raw), "x": text[:EXCERPT_CHARS], "t": round(time.time(), 3)}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+            self._sync()
+
+            if len(self.docs) > int(_max_docs() * 1.25) or self._expired_count() > len(self.docs) // 4:
+                self._compact_locked()
+
+        return {"score": matches[0]["score"] if matches else 0.0, "matches": matches, "indexed": True, "docs": len(self.docs)}
+
+    def _expired_count(self) -> int:
+        ttl = _retention_sec()
+        if ttl <= 0:
+            return 0
+        return bisect.bisect_left(self._ts, time.time() - ttl)
+
+    def _compact_locked(self) -> Dict[str, Any]:
+        ttl = _retention_sec()
+        cutoff = time.time() - ttl if ttl > 0 else None
+        keep = sorted(self.docs.values(), key=lambda d: d["n"])
+        if cutoff is not None:
+            keep = [d for d in keep if (d["ts"] or 0) >= cutoff]
+        keep = keep[-_max_docs():]
+
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            for d in keep:
+                rec = {"n": d["n"], "b": d["book_id"], "h": d["sha1"], "s": _pack(d["sig"]), "x": d["excerpt"], "t": d["ts"]}
+                f.write((json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8"))
+        before = len(self.docs)
+        os.replace(tmp, self.path)
+        self._reset()
+        self._sync()
+        return {"ok": True, "before": before, "after": len(self.docs)}
+
+    def compact(self) -> Dict[str, Any]:
+        with self._lock:
+            self._sync()
+            return self._compact_locked()
+
+
+_INDEXES: Dict[str, UniquenessIndex] = {}
+_INDEXES_GUARD = threading.Lock()
+
+
+def registry_path(corpus: Optional[str] = None) -> Path:
+    p = Path(os.environ.get("UNIQUENESS_REGISTRY_PATH", "runs/_tmp/uniqueness_registry.jsonl"))
+    c = (corpus or "").strip()
+    if c and c != "default":
+        safe = re.sub(r"[^A-Za-z0-9_\-]", "_", c)[:64]
+        p = p.with_name(f"{p.stem}.{safe}{p.suffix}")
+    return p
+
+
+def get_index(corpus: Optional[str] = None) -> UniquenessIndex:
+    p = registry_path(corpus)
+    key = str(p.resolve())
+    with _INDEXES_GUARD:
+        idx = _INDEXES.get(key)
+        if idx is None:
+            idx = UniquenessIndex(p)
+            _INDEXES[key] = idx
+        return idx
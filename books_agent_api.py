@@ -18,6 +18,7 @@ from books_core import (
     atomic_write_text,
     atomic_write_json,
     read_text_safe,
+    read_tail_text,
 )
 
 from books_architect_api import architect_run, ArchitectRunReq
@@ -264,7 +265,7 @@ def loop_write(req: LoopWriteReq):
 
         state = _load_state(book_root)
         avoid = _avoid_sets(state, last=25)
-        opener_blacklist = { _opener_key(s) for s in _sentence_split_tail(read_text_safe(master), 40) if _opener_key(s) }
+        opener_blacklist = { _opener_key(s) for s in _sentence_split_tail(read_tail_text(master, sentences=40), 40) if _opener_key(s) }
 
         steps: List[Dict[str, Any]] = []
 
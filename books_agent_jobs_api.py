@@ -3,14 +3,15 @@ from __future__ import annotations
 import json
 import re
 import hashlib
-import threading
-import queue
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional, Set, Tuple
 
 from fastapi import APIRouter
 from pydantic import BaseModel, Field
 
+from books_chunk_pipeline import ChunkPipeline, ChunkSpec
+from books_job_queue import Heartbeat, LeaseLost, get_pool as get_job_pool, get_queue as get_job_queue
+
 from books_core import (
     safe_book_root,
     safe_resolve_under,
@@ -21,9 +22,10 @@ from books_core import (
     atomic_write_text,
     atomic_write_json,
     read_text_safe,
+    read_tail_text,
 )
 
-from books_architect_api import architect_run, ArchitectRunReq
+from books_architect_api import architect_brief, architect_commit, ArchitectRunReq
 from books_writer_api import writer_generate, WriterGenerateReq
 from books_proof_api import proof_check, ProofCheckReq
 from books_critic_api import critic_check, CriticCheckReq
@@ -147,6 +149,14 @@ def _pick_opener(arr: List[str], seed: int, shift: int, avoid_keys: Set[str], bl
     return arr[start]
 
 
+def _fingerprint_clash(meta: Dict[str, str], committed: List[Dict[str, str]]) -> Optional[str]:
+    for other in committed:
+        for k in ("place", "prop", "dialog", "hook", "p2_key", "p3_key"):
+            if meta.get(k) and meta.get(k) == other.get(k):
+                return f"{k} repeats a chunk committed meanwhile: {meta[k][:60]!r}"
+    return None
+
+
 def _offline_chunk(arch_md: str, job_run_id: str, i: int, words: int, avoid: Dict[str, Set[str]], opener_blacklist: Set[str]) -> Tuple[str, Dict[str, str]]:
     seed = _seed_int(arch_md + f"|{job_run_id}|{i}|")
 
@@ -245,6 +255,9 @@ def _offline_chunk(arch_md: str, job_run_id: str, i: int, words: int, avoid: Dic
     while len(text.split()) < words:
         cand = micro[(seed + k) % len(micro)]
         k += 1
+        if len(used) == len(micro):
+            # wszystkie mikro-zdania juz uzyte, a brakuje slow: kolejna runda (inaczej petla bez konca)
+            used.clear()
         if cand in used:
             continue
         used.add(cand)
@@ -262,34 +275,18 @@ def _offline_chunk(arch_md: str, job_run_id: str, i: int, words: int, avoid: Dic
 
 
 # -------------------------
-# WORKER THREAD
+# WORKERS (trwala kolejka: books_job_queue)
 # -------------------------
-_JOB_Q: "queue.Queue[Dict[str, Any]]" = queue.Queue()
-_STARTED = False
-
-
-def _worker_loop():
-    while True:
-        job = _JOB_Q.get()
-        try:
-            _run_job(job)
-        except Exception:
-            # worker must never die
-            pass
-        finally:
-            _JOB_Q.task_done()
+JOB_KIND = "loop_write"
 
 
 def _ensure_worker():
-    global _STARTED
-    if _STARTED:
-        return
-    t = threading.Thread(target=_worker_loop, daemon=True)
-    t.start()
-    _STARTED = True
+    pool = get_job_pool()
+    pool.register(JOB_KIND, lambda qjob: _run_job(qjob["payload"], lease=qjob.get("lease")))
+    pool.start()
 
 
-def _run_job(job: Dict[str, Any]) -> None:
+def _run_job(job: Dict[str, Any], lease: Optional[Heartbeat] = None) -> None:
     book = job["book"]
     job_id = job["job_id"]
     req = job["req"]
@@ -299,10 +296,11 @@ def _run_job(job: Dict[str, Any]) -> None:
     ensure_dir(book_root)
 
     job_state = _read_job(book_root, job_id)
-    job_state.update({"status": "RUNNING", "started_at": _utc_iso()})
+    # ponowna proba (wygasly lease po crashu albo blad poprzedniej proby): kontynuujemy od ostatniego zapisanego kroku
+    steps: List[Dict[str, Any]] = list(job_state.get("steps") or []) if job_state.get("status") in ("RUNNING", "FAILED") else []
+    job_state.update({"status": "RUNNING", "started_at": job_state.get("started_at") if steps else _utc_iso()})
     _write_job(book_root, job_id, job_state)
 
-    steps: List[Dict[str, Any]] = []
     try:
         master = safe_resolve_under(book_root, "draft/master.txt")
         ensure_dir(master.parent)
@@ -311,20 +309,36 @@ def _run_job(job: Dict[str, Any]) -> None:
 
         fp = _fp_load(book_root)
         avoid = _avoid_sets(fp, last=25)
-        opener_blacklist = { _opener_key(s) for s in _sentence_tail(read_text_safe(master), 40) if _opener_key(s) }
+        opener_blacklist = { _opener_key(s) for s in _sentence_tail(read_tail_text(master, sentences=40), 40) if _opener_key(s) }
 
-        for i in range(req["n"]):
-            # cancel support
-            cur = _read_job(book_root, job_id)
-            if cur.get("cancel") is True:
-                job_state.update({"status": "CANCELLED", "finished_at": _utc_iso(), "steps": steps})
-                _write_job(book_root, job_id, job_state)
-                return
+        committed_meta: List[Dict[str, str]] = []
 
-            arch = architect_run(ArchitectRunReq(book=book, path="draft/master.txt", chunk_hint_words=max(200, req["words_per_step"])))
-            arch_md = (arch.get("preview") or "") + f"\nSALT:{job_run_id}:{i}:{arch.get('run_id','')}\n"
+        def snapshot() -> Dict[str, Any]:
+            return {"avoid": {k: set(v) for k, v in avoid.items()}, "blacklist": set(opener_blacklist)}
 
-            chunk, meta = _offline_chunk(arch_md, job_run_id, i, req["words_per_step"], avoid, opener_blacklist)
+        arch_req = ArchitectRunReq(book=book, path="draft/master.txt", chunk_hint_words=max(200, req["words_per_step"]))
+
+        def generate(spec: ChunkSpec) -> Tuple[Dict[str, Any], str, Dict[str, str]]:
+            # bez zapisow: run architekta i architect_latest zapisuje dopiero commit() zatwierdzonego chunka
+            i = spec.index
+            arch = architect_brief(arch_req)
+            arch_md = (arch.get("preview") or "") + f"\nSALT:{job_run_id}:{i}:{arch.get('run_id','')}\n"
+            if spec.attempt:
+                arch_md += f"RETRY:{spec.attempt}\n"
+            chunk, meta = _offline_chunk(arch_md, job_run_id, i, req["words_per_step"], spec.context["avoid"], spec.context["blacklist"])
+            return arch, chunk, meta
+
+        def check(spec: ChunkSpec, out: Tuple[Dict[str, Any], str, Dict[str, str]]) -> Optional[str]:
+            # spekulatywny chunk nie widzial chunkow zatwierdzonych po jego snapshot(): nie moze ich powtarzac
+            return _fingerprint_clash(out[2], committed_meta[spec.committed - steps_before:])
+
+        def commit(spec: ChunkSpec, out: Tuple[Dict[str, Any], str, Dict[str, str]]) -> None:
+            nonlocal avoid
+            if lease is not None:
+                lease.check()  # lease stracony = job prowadzi juz inny worker, nie dopisujemy do master
+            i = spec.index
+            brief, chunk, meta = out
+            arch = architect_commit(arch_req, brief)
             wr = writer_generate(WriterGenerateReq(book=book, text=chunk, ensure_newline=True, preview_chars=700))
 
             pr = proof_check(ProofCheckReq(book=book, path="draft/master.txt", max_issues=60)) if req["do_proof"] else None
@@ -335,6 +349,7 @@ def _run_job(job: Dict[str, Any]) -> None:
             fp["items"].append(item)
             fp["items"] = fp["items"][-60:]
             _fp_save(book_root, fp)
+            committed_meta.append(meta)
 
             avoid = _avoid_sets(fp, last=25)
             opener_blacklist.add(meta.get("p2_key", ""))
@@ -354,7 +369,19 @@ def _run_job(job: Dict[str, Any]) -> None:
             job_state.update({"progress": {"i": i + 1, "n": req["n"]}, "steps": steps})
             _write_job(book_root, job_id, job_state)
 
-        report_json = {"ok": True, "book": book, "job_id": job_id, "run_id": job_run_id, "steps": steps}
+        # cancel support (sprawdzane przed kazdym zatwierdzeniem)
+        cancelled = lambda: _read_job(book_root, job_id).get("cancel") is True  # noqa: E731
+        steps_before = len(steps)
+        pipe = ChunkPipeline(generate, commit, snapshot, check=check, inflight=req.get("inflight") or 1)
+        pipeline = pipe.run(n=req["n"] - steps_before, start=steps_before, done=cancelled)
+        if len(steps) < req["n"]:
+            job_state.update({"status": "CANCELLED", "finished_at": _utc_iso(), "steps": steps, "pipeline": pipeline})
+            _write_job(book_root, job_id, job_state)
+            return
+
+        if lease is not None:
+            lease.check()
+        report_json = {"ok": True, "book": book, "job_id": job_id, "run_id": job_run_id, "steps": steps, "pipeline": pipeline}
         report_md = "# Agent loop_write (JOB)\n" + "\n".join([f"- {s['i']}: place={s['fingerprint'].get('place')} prop={s['fingerprint'].get('prop')} hook={s['fingerprint'].get('hook')}" for s in steps]) + "\n"
 
         atomic_write_text(safe_resolve_under(book_root, f"analysis/agent_loop_write_job_report_{job_run_id}.md"), report_md)
@@ -377,6 +404,7 @@ def _run_job(job: Dict[str, Any]) -> None:
             "status": "SUCCESS",
             "finished_at": _utc_iso(),
             "steps": steps,
+            "pipeline": pipeline,
             "paths": {
                 "job_file": f"jobs/{job_id}.json",
                 "run_meta": run_written["paths"]["meta"],
@@ -388,9 +416,13 @@ def _run_job(job: Dict[str, Any]) -> None:
             },
         })
         _write_job(book_root, job_id, job_state)
+    except LeaseLost:
+        raise  # stan joba zapisuje juz worker, ktory go przejal
     except Exception as e:
-        job_state.update({"status": "SUCCESS_FALLBACK", "finished_at": _utc_iso(), "error": repr(e), "steps": steps})
+        # kolejka musi zobaczyc blad: ponowi job (od zapisanych krokow) albo po max prob oznaczy FAILED
+        job_state.update({"status": "FAILED", "finished_at": _utc_iso(), "error": repr(e), "steps": steps})
         _write_job(book_root, job_id, job_state)
+        raise
 
 
 # -------------------------
@@ -403,6 +435,9 @@ class LoopWriteJobReq(BaseModel):
     do_proof: bool = True
     do_critic: bool = False
     do_stylist: bool = True
+    # >1: tyle krokow generowanych naraz (spekulatywnie), zatwierdzanych po kolei; 1 = sekwencyjnie
+    inflight: int = Field(1, ge=1, le=8)
+    priority: int = Field(0, ge=-100, le=100)
 
 
 class JobResp(BaseModel):
@@ -439,7 +474,13 @@ def loop_write_job(req: LoopWriteJobReq):
     }
     _write_job(book_root, job_id, payload)
 
-    _JOB_Q.put({"book": req.book, "job_id": job_id, "job_run_id": job_run_id, "req": req.model_dump()})
+    get_job_queue().enqueue(
+        JOB_KIND,
+        req.book,
+        {"book": req.book, "job_id": job_id, "job_run_id": job_run_id, "req": req.model_dump()},
+        priority=req.priority,
+        job_id=job_id,
+    )
 
     return {"ok": True, "book": req.book, "job_id": job_id, "status": "QUEUED", "created_at": payload["created_at"], "paths": {"job_file": f"jobs/{job_id}.json"}, "progress": payload["progress"]}
 
@@ -457,6 +498,23 @@ def cancel_job(book: str, job_id: str):
     ensure_dir(book_root)
     st = _read_job(book_root, job_id)
     st["cancel"] = True
-    st["status"] = st.get("status") if st.get("status") in {"SUCCESS", "SUCCESS_FALLBACK"} else "CANCEL_REQUESTED"
+    if get_job_queue().cancel(job_id):
+        # jeszcze nie wystartowal: worker go nie wezmie
+        st["status"] = "CANCELLED"
+        st["finished_at"] = _utc_iso()
+    else:
+        st["status"] = st.get("status") if st.get("status") in {"SUCCESS", "SUCCESS_FALLBACK", "FAILED"} else "CANCEL_REQUESTED"
     _write_job(book_root, job_id, st)
     return {"ok": True, "book": book, "job_id": job_id, "status": st["status"]}
+
+
+@router.get("/jobs/metrics")
+def jobs_metrics():
+    _ensure_worker()
+    return {"ok": True, "queue": get_job_queue().metrics(), "workers": get_job_pool().stats()}
+
+
+@router.on_event("startup")
+def _start_job_workers():
+    # joby QUEUED sprzed restartu (i te z wygaslym lease po crashu) ruszaja od razu po starcie serwera
+    _ensure_worker()
@@ -9,6 +9,8 @@ from typing import Literal
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
+from books_job_queue import get_queue as get_job_queue
+
 router = APIRouter(prefix="/books/agent", tags=["books-agent"])
 
 ROOT = Path(__file__).resolve().parent
@@ -104,5 +106,7 @@ def step(req: StepReq):
 
     job_path = jobs_dir / f"{job_id}.json"
     _atomic_write_json(job_path, job)
+    # plik zostaje (podglad/status); kolejnosc wykonania trzyma trwala kolejka, z ktorej bierze worker/once
+    get_job_queue().enqueue("worker_prompt", req.book, job, job_id=job_id)
 
     return StepResp(job_id=job_id, prompt_file=rel_prompt, status="QUEUED")
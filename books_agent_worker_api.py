@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
-import traceback
+import queue
+import threading
 import time
+import traceback
+import uuid
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Literal, List, Tuple
+from typing import Any, Callable, Dict, Iterator, Optional, Literal, List, Tuple
 
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from llm_client import generate_text
+from app.lock_manager import Lease, get_lock_manager
+from books_core import read_tail_text
+from app.llm_http import stream_metrics
+from books_draft_store import DraftStore, accept_buffer, append_text as _store_append_text, recover_accept
+from books_job_queue import FAILED as JOB_FAILED, QUEUED as JOB_QUEUED, RUNNING as JOB_RUNNING, Heartbeat, get_queue as get_job_queue
+from llm_client import generate_text, stream_text
 
 router = APIRouter(prefix="/books/agent", tags=["books-agent"])
 
@@ -35,9 +45,7 @@ def atomic_write_json(path: Path, obj: dict) -> None:
 
 
 def append_text(path: Path, text: str) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as f:
-        f.write(text)
+    _store_append_text(path, text)
 
 
 def read_text_safe(path: Path) -> str:
@@ -82,41 +90,135 @@ def ensure_book_scaffold(book: str) -> Path:
 # =========================
 # LOCK per book (.lock)
 # =========================
-def acquire_book_lock(book_dir: Path, ttl_sec: int = 1800) -> Tuple[bool, str]:
-    lock_path = book_dir / ".lock"
+_WORKER_LEASES: Dict[str, Lease] = {}
+_WORKER_LEASES_LOCK = threading.Lock()
 
-    # jeśli stary lock wisi (np. po crashu) -> zdejmij
-    if lock_path.exists():
-        try:
-            age = time.time() - lock_path.stat().st_mtime
-            if age > ttl_sec:
-                lock_path.unlink(missing_ok=True)
-        except Exception:
-            pass
 
+def acquire_book_lock(book_dir: Path, ttl_sec: int = 1800) -> Tuple[bool, str]:
+    # app.lock_manager: lease odnawiany w tle, wiec lock zyje tyle co proces workera (nie wygasa po mtime);
+    # books/<book>/.lock zostaje jako marker dla narzedzi patrzacych na pliki
+    lock_path = book_dir / ".lock"
+    marker = json.dumps({"pid": os.getpid(), "ts": utc_now_iso()}, ensure_ascii=False)
     try:
-        # atomowe utworzenie (fail jeśli istnieje)
-        fd = os.open(str(lock_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            f.write(json.dumps({"pid": os.getpid(), "ts": utc_now_iso()}, ensure_ascii=False))
-        return True, "LOCKED"
-    except FileExistsError:
-        return False, f"LOCK_EXISTS: {lock_path}"
+        lease = get_lock_manager().try_acquire(
+            f"worker_{book_dir.name}", ttl=ttl_sec, marker=(lock_path, marker), keepalive=True
+        )
     except Exception as e:
         return False, f"LOCK_ERROR: {e}"
+    if lease is None:
+        return False, f"LOCK_EXISTS: {lock_path}"
+    with _WORKER_LEASES_LOCK:
+        _WORKER_LEASES[str(book_dir)] = lease
+    return True, "LOCKED"
 
 
 def release_book_lock(book_dir: Path) -> None:
-    lock_path = book_dir / ".lock"
+    with _WORKER_LEASES_LOCK:
+        lease = _WORKER_LEASES.pop(str(book_dir), None)
+    if lease is not None:
+        lease.release()
+
+
+# =========================
+# KOLEJKA JOBOW (books_job_queue)
+# =========================
+PROMPT_JOB_KIND = "worker_prompt"
+PROMPT_JOB_LEASE_S = float(os.getenv("BOOKS_PROMPT_JOB_LEASE_S", "300") or 300)
+
+
+def mirror_job_failure(job_p: Path, qjob: Dict[str, Any]) -> None:
+    """Writes a FAILED queue row back into its jobs/<id>.json (status, error), so the file does not stay QUEUED."""
+    job = read_json_safe(job_p)
+    if not job or str(job.get("status") or "QUEUED").upper() != "QUEUED":
+        return
+    job.update(
+        status="FAILED",
+        error=qjob.get("error") or "FAILED",
+        failed_utc=utc_now_iso(),
+        attempts=int(qjob.get("attempts") or 0),
+    )
+    atomic_write_json(job_p, job)
+
+
+# import_file_jobs() leci przy kazdym worker_once: pelny glob jobs/*.json tylko po zmianie katalogu (nowy,
+# usuniety albo podmieniony plik), a poza tym stat() plikow, ktore mozna ponowic edycja w miejscu (FAILED,
+# nie-QUEUED), i q.get() jobow czekajacych w kolejce (ich porazke trzeba odbic w pliku). mtime katalogu jest
+# zgrubny: katalogowi zmienionemu < 1 s przed skanem nie ufamy i nastepne wywolanie skanuje od nowa.
+_ALWAYS = -1
+_IMPORT_SCANS: Dict[str, Tuple[Any, int, Dict[Path, int]]] = {}
+_IMPORT_SCANS_LOCK = threading.Lock()
+
+
+def _mtime_ns(p: Path) -> Optional[int]:
     try:
-        lock_path.unlink(missing_ok=True)
-    except Exception:
-        pass
+        return p.stat().st_mtime_ns
+    except OSError:
+        return None
 
 
-def pick_oldest_job(jobs_dir: Path) -> Optional[Path]:
-    jobs = sorted(jobs_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
-    return jobs[0] if jobs else None
+def _import_file_job(q: Any, book: str, p: Path) -> Tuple[int, Optional[int]]:
+    """(enqueued, watch): watch = st_mtime_ns to re-check the file at, _ALWAYS, or None (nothing to watch)."""
+    known = q.get(p.stem)
+    if known is not None and known.get("status") != JOB_FAILED:
+        active = known.get("kind") == PROMPT_JOB_KIND and known.get("status") in (JOB_QUEUED, JOB_RUNNING)
+        return 0, _ALWAYS if active else None
+    try:
+        st = p.stat()
+    except OSError:
+        return 0, None
+    job = read_json_safe(p)
+    # w jobs/ leza tez stany loop_write_job; bierzemy tylko joby z promptem
+    if not job.get("prompt_file"):
+        return 0, None
+    if str(job.get("status") or "QUEUED").upper() != "QUEUED":
+        return 0, st.st_mtime_ns
+    ts = st.st_mtime
+    payload = {**job, "_enqueued_from_file": ts}
+    if known is not None:
+        # FAILED w kolejce, plik dalej QUEUED: starszy niz porazka = porazka niezapisana w pliku
+        # (np. wygasly lease po crashu workera); nowszy = ktos ponowil job recznie
+        if ts <= float(known.get("finished_at") or 0):
+            mirror_job_failure(p, known)
+            return 0, _mtime_ns(p)
+        if q.requeue(p.stem, payload):
+            return 1, _ALWAYS
+        return 0, st.st_mtime_ns
+    q.enqueue(PROMPT_JOB_KIND, book, payload, priority=int(job.get("priority") or 0), job_id=p.stem)
+    return 1, _ALWAYS
+
+
+def import_file_jobs(book: str, jobs_dir: Path) -> int:
+    """
+    Enqueues prompt-job files (jobs/<id>.json with prompt_file) not yet known to the queue.
+    A job that FAILED in the queue is mirrored into its file; setting the file back to QUEUED
+    (file newer than the failure) re-enqueues it. Globs the directory only when it has changed.
+    """
+    q = get_job_queue()
+    dir_ns = _mtime_ns(jobs_dir)
+    if dir_ns is None:
+        return 0
+    now = time.time()
+    with _IMPORT_SCANS_LOCK:
+        prev = _IMPORT_SCANS.get(str(jobs_dir))
+    if prev is not None and prev[0] is q and prev[1] == dir_ns:
+        watch = dict(prev[2])
+        paths = [p for p, ns in watch.items() if ns == _ALWAYS or _mtime_ns(p) != ns]
+    else:
+        watch, paths = {}, list(jobs_dir.glob("*.json"))
+    n = 0
+    for p in paths:
+        added, w = _import_file_job(q, book, p)
+        n += added
+        if w is None:
+            watch.pop(p, None)
+        else:
+            watch[p] = w
+    with _IMPORT_SCANS_LOCK:
+        if now - dir_ns / 1e9 > 1.0:
+            _IMPORT_SCANS[str(jobs_dir)] = (q, dir_ns, watch)
+        else:
+            _IMPORT_SCANS.pop(str(jobs_dir), None)
+    return n
 
 
 def contains_meta(text: str) -> bool:
@@ -133,6 +235,60 @@ def contains_meta(text: str) -> bool:
     return any(x in t for x in bad)
 
 
+# Szybka bramka (META_TEXT / pusty tekst) liczona przyrostowo: <plik>.gate.json pamieta, ile bajtow juz
+# sprawdzono (+ sha256 ostatnich _GATE_OVERLAP bajtow i inode), wiec kolejne sprawdzenie czyta tylko dopisany
+# ogon (z zakladka na frazy przeciete granica). Zmiana wczesniejszych bajtow (rewrite/truncate) = pelny skan.
+_GATE_OVERLAP = 256  # >= najdluzsza fraza contains_meta w UTF-8
+
+
+def _gate_path(path: Path) -> Path:
+    return path.with_name(path.name + ".gate.json")
+
+
+def fast_gate(path: Path) -> Dict[str, Any]:
+    """{"chars", "nonblank", "meta", "scanned_bytes", "incremental"} for the whole file, scanning only its new tail."""
+    try:
+        st = path.stat()
+    except OSError:
+        return {"chars": 0, "nonblank": False, "meta": False, "scanned_bytes": 0, "incremental": False}
+    size = st.st_size
+    state = read_json_safe(_gate_path(path))
+    start, chars, nonblank, meta = 0, 0, False, False
+    done = int(state.get("bytes") or 0)
+    if state.get("ino") == st.st_ino and 0 < done <= size:
+        lo = max(0, done - _GATE_OVERLAP)
+        with open(path, "rb") as f:
+            f.seek(lo)
+            window = f.read(done - lo)
+        if hashlib.sha256(window).hexdigest() == state.get("tail_sha256"):
+            start, chars, nonblank, meta = done, int(state["chars"]), bool(state["nonblank"]), bool(state["meta"])
+
+    scan_from = max(0, start - _GATE_OVERLAP)
+    with open(path, "rb") as f:
+        f.seek(scan_from)
+        data = f.read(size - scan_from)
+    new = data[start - scan_from :].decode("utf-8", errors="replace")
+    if start == 0:
+        new = new.lstrip("\ufeff")
+    chars += len(new)
+    nonblank = nonblank or bool(new.strip())
+    meta = meta or contains_meta(data.decode("utf-8", errors="replace"))
+
+    if size != start or not state:
+        atomic_write_json(
+            _gate_path(path),
+            {
+                "bytes": size,
+                "ino": st.st_ino,
+                "tail_sha256": hashlib.sha256(data[-_GATE_OVERLAP:] if data else b"").hexdigest(),
+                "chars": chars,
+                "nonblank": nonblank,
+                "meta": meta,
+            },
+        )
+    return {"chars": chars, "nonblank": nonblank, "meta": meta, "scanned_bytes": len(data), "incremental": start > 0}
+
+
 # =========================
 # MODELE API
 # =========================
@@ -154,6 +310,8 @@ class WorkerOnceResp(BaseModel):
     job_done_path: Optional[str] = None
     model: Optional[str] = None
     usage: Optional[dict] = None
+    ttft_ms: Optional[float] = None
+    stream_ms: Optional[float] = None
     error: Optional[str] = None
 
 
@@ -177,6 +335,7 @@ class FactCheckResp(BaseModel):
     checked_chars: int
     model: str
     issues: List[FactIssue] = []
+    scanned_bytes: Optional[int] = None
 
 
 class AcceptReq(BaseModel):
@@ -194,10 +353,54 @@ class AcceptResp(BaseModel):
     master_path: Optional[str] = None
     buffer_path: Optional[str] = None
     error: Optional[str] = None
+    recovery: Optional[str] = None
+
+
+Emit = Callable[[str, Dict[str, Any]], None]
 
 
 @router.post("/worker/once", response_model=WorkerOnceResp)
 def worker_once(req: WorkerOnceReq):
+    return _run_worker_once(req)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/worker/stream")
+def worker_stream(req: WorkerOnceReq):
+    """
+    worker_once() as server-sent events: `job` (claimed job), `delta` ({"text"}) per token chunk as it is
+    appended to the draft, then `done` (WorkerOnceResp incl. ttft_ms). The job finishes even if the client leaves.
+    """
+    events: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue()
+
+    def run() -> None:
+        try:
+            resp = _run_worker_once(req, emit=lambda ev, data: events.put((ev, data)))
+            events.put(("done", resp.model_dump()))
+        except Exception as e:
+            events.put(("done", WorkerOnceResp(ok=False, book=req.book, processed=True, status="ERROR", error=str(e)).model_dump()))
+
+    threading.Thread(target=run, name=f"worker-stream-{req.book}", daemon=True).start()
+
+    def gen() -> Iterator[str]:
+        while True:
+            ev, data = events.get()
+            yield _sse(ev, data)
+            if ev == "done":
+                return
+
+    return StreamingResponse(gen(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/worker/stream/metrics")
+def worker_stream_metrics():
+    return {"ok": True, "llm_stream": stream_metrics()}
+
+
+def _run_worker_once(req: WorkerOnceReq, emit: Optional[Emit] = None) -> WorkerOnceResp:
     book_dir = ensure_book_scaffold(req.book)
 
     got, msg = acquire_book_lock(book_dir)
@@ -206,112 +409,34 @@ def worker_once(req: WorkerOnceReq):
 
     try:
         jobs_dir = book_dir / "jobs"
-        jobs_done_dir = book_dir / "jobs_done"
         draft_dir = book_dir / "draft"
         master_path = draft_dir / "master.txt"
         buffer_path = draft_dir / "buffer.txt"
 
-        # wybór joba
-        job_p: Optional[Path] = None
-        if req.job_id:
-            cand = jobs_dir / f"{req.job_id}.json"
-            if cand.exists():
-                job_p = cand
-            else:
-                return WorkerOnceResp(ok=False, book=req.book, processed=True, status="JOB_NOT_FOUND", error=req.job_id)
-
-        if job_p is None:
-            job_p = pick_oldest_job(jobs_dir)
-
-        if job_p is None:
+        # wybór joba: z trwalej kolejki (priority, potem najstarszy; jeden RUNNING na ksiazke)
+        q = get_job_queue()
+        import_file_jobs(req.book, jobs_dir)
+        owner = f"worker_once-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        qjob = q.claim(owner, lease_s=PROMPT_JOB_LEASE_S, kinds=[PROMPT_JOB_KIND], book=req.book, job_id=req.job_id)
+
+        if qjob is None:
+            if req.job_id:
+                known = q.get(req.job_id)
+                if known is None or known.get("book") != req.book:
+                    return WorkerOnceResp(ok=False, book=req.book, processed=True, status="JOB_NOT_FOUND", error=req.job_id)
+            if q.is_book_busy(req.book):
+                return WorkerOnceResp(ok=False, book=req.book, processed=False, status="BOOK_BUSY", error="JOB_RUNNING")
             return WorkerOnceResp(ok=True, book=req.book, processed=True, status="NO_JOBS", master_path=str(master_path), buffer_path=str(buffer_path))
 
-        job = read_json_safe(job_p)
-        job_id = job.get("job_id") or job_p.stem
-        mode = job.get("mode", "buffer")
-        prompt_file = job.get("prompt_file")
-
-        prompt_text = ""
-        if prompt_file:
-            p = ROOT / prompt_file
-            prompt_text = read_text_safe(p)
-
-        # payload: najpierw per-book, potem globalny
-        payload = read_json_safe(book_dir / "payload.json")
-        if not payload:
-            payload = read_json_safe(ROOT / "payload.json")
-
-        topic = payload.get("topic", "")
-        words = int(payload.get("words", 800) or 800)
-
-        master_tail = read_text_safe(master_path)[-4000:]
-        buffer_tail = read_text_safe(buffer_path)[-2000:]
-
-        user = (
-            f"TOPIC: {topic}\n"
-            f"TARGET_WORDS: ~{words}\n\n"
-            f"MASTER_TAIL:\n{master_tail}\n\n"
-            f"BUFFER_TAIL:\n{buffer_tail}\n\n"
-            f"ZADANIE: Napisz kolejny fragment zgodnie z instrukcją w PROMPT.\n"
-        )
-
-        full_prompt = (prompt_text.strip() + "\n\n" + user).strip()
-
-        model = os.getenv("OPENAI_MODEL", os.getenv("OPENAI_PRIMARY", "gpt-4.1-mini"))
-
-        out = None
-        try:
-            out = generate_text(full_prompt, model=model)
-        except TypeError:
-            out = generate_text(full_prompt)
-
-        text = out.get("text") if isinstance(out, dict) else str(out)
-        model_used = out.get("model") if isinstance(out, dict) else model
-        usage = out.get("usage") if isinstance(out, dict) else None
-
-        text = (text or "").strip()
-        if not text.endswith("\n"):
-            text += "\n"
-
-        wrote_to: Literal["buffer", "master"] = "buffer"
-        if mode == "autonomous":
-            append_text(master_path, "\n" + text)
-            wrote_to = "master"
-        else:
-            append_text(buffer_path, "\n" + text)
-            wrote_to = "buffer"
-
-        done = {
-            **job,
-            "status": "SUCCESS",
-            "finished_utc": utc_now_iso(),
-            "wrote_to": wrote_to,
-            "model": model_used,
-        }
-        if usage is not None:
-            done["usage"] = usage
-
-        done_path = jobs_done_dir / f"{job_id}.json"
-        atomic_write_json(done_path, done)
-
         try:
-            job_p.unlink()
-        except Exception:
-            pass
-
-        return WorkerOnceResp(
-            ok=True,
-            book=req.book,
-            processed=True,
-            job_id=job_id,
-            status="SUCCESS",
-            master_path=str(master_path),
-            buffer_path=str(buffer_path),
-            wrote_to=wrote_to,
-            job_done_path=str(done_path),
-            model=model_used,
-            usage=usage,
-        )
+            with Heartbeat(q, qjob["job_id"], owner, PROMPT_JOB_LEASE_S):
+                resp = _process_prompt_job(req, book_dir, qjob, emit=emit)
+        except Exception as e:
+            q.finish(qjob["job_id"], owner, JOB_FAILED, repr(e))
+            mirror_job_failure(jobs_dir / f"{qjob['job_id']}.json", q.get(qjob["job_id"]) or {"error": repr(e)})
+            raise
+        q.finish(qjob["job_id"], owner)
+        return resp
 
     except Exception as e:
         traceback.print_exc()
@@ -320,6 +445,112 @@ def worker_once(req: WorkerOnceReq):
         release_book_lock(book_dir)
 
 
+def _process_prompt_job(req: WorkerOnceReq, book_dir: Path, qjob: dict, emit: Optional[Emit] = None) -> WorkerOnceResp:
+    jobs_dir = book_dir / "jobs"
+    jobs_done_dir = book_dir / "jobs_done"
+    draft_dir = book_dir / "draft"
+    master_path = draft_dir / "master.txt"
+    buffer_path = draft_dir / "buffer.txt"
+    job_p = jobs_dir / f"{qjob['job_id']}.json"
+    job = read_json_safe(job_p) or dict(qjob.get("payload") or {})
+    job.pop("_enqueued_from_file", None)
+    job_id = job.get("job_id") or qjob["job_id"]
+    mode = job.get("mode", "buffer")
+    prompt_file = job.get("prompt_file")
+
+    prompt_text = ""
+    if prompt_file:
+        p = ROOT / prompt_file
+        prompt_text = read_text_safe(p)
+
+    # payload: najpierw per-book, potem globalny
+    payload = read_json_safe(book_dir / "payload.json")
+    if not payload:
+        payload = read_json_safe(ROOT / "payload.json")
+
+    topic = payload.get("topic", "")
+    words = int(payload.get("words", 800) or 800)
+
+    master_tail = read_tail_text(master_path, chars=4000)
+    buffer_tail = read_tail_text(buffer_path, chars=2000)
+
+    user = (
+        f"TOPIC: {topic}\n"
+        f"TARGET_WORDS: ~{words}\n\n"
+        f"MASTER_TAIL:\n{master_tail}\n\n"
+        f"BUFFER_TAIL:\n{buffer_tail}\n\n"
+        f"ZADANIE: Napisz kolejny fragment zgodnie z instrukcją w PROMPT.\n"
+    )
+
+    full_prompt = (prompt_text.strip() + "\n\n" + user).strip()
+
+    model = os.getenv("OPENAI_MODEL", os.getenv("OPENAI_PRIMARY", "gpt-4.1-mini"))
+
+    wrote_to: Literal["buffer", "master"] = "master" if mode == "autonomous" else "buffer"
+    if emit is not None:
+        emit("job", {"job_id": job_id, "model": model, "wrote_to": wrote_to})
+
+    # tokeny trafiaja do draftu na biezaco (DraftStore.stream: crash/blad = rollback niedokonczonego chunka);
+    # tekst jak dawniej: "\n" + strip() + "\n", wiec biale znaki z konca delty wstrzymujemy do nastepnej
+    stream = stream_text(full_prompt, model=model)
+    with DraftStore(master_path if wrote_to == "master" else buffer_path).stream() as st:
+        st.write("\n")
+        started, held = False, ""
+        for delta in stream:
+            piece = held + delta
+            if not started:
+                piece = piece.lstrip()
+                if not piece:
+                    continue
+                started = True
+            body = piece.rstrip()
+            held = piece[len(body):]
+            if body:
+                st.write(body)
+                if emit is not None:
+                    emit("delta", {"text": body})
+        st.write("\n")
+
+    model_used = stream.model or model
+    usage = stream.usage
+
+    done = {
+        **job,
+        "status": "SUCCESS",
+        "finished_utc": utc_now_iso(),
+        "wrote_to": wrote_to,
+        "model": model_used,
+        "ttft_ms": stream.ttft_ms,
+        "stream_ms": stream.total_ms,
+    }
+    if usage is not None:
+        done["usage"] = usage
+
+    done_path = jobs_done_dir / f"{job_id}.json"
+    atomic_write_json(done_path, done)
+
+    try:
+        job_p.unlink()
+    except Exception:
+        pass
+
+    return WorkerOnceResp(
+        ok=True,
+        book=req.book,
+        processed=True,
+        job_id=job_id,
+        status="SUCCESS",
+        master_path=str(master_path),
+        buffer_path=str(buffer_path),
+        wrote_to=wrote_to,
+        job_done_path=str(done_path),
+        model=model_used,
+        usage=usage,
+        ttft_ms=stream.ttft_ms,
+        stream_ms=stream.total_ms,
+    )
+
+
 @router.post("/fact_check", response_model=FactCheckResp)
 def fact_check(req: FactCheckReq):
     book_dir = ensure_book_scaffold(req.book)
@@ -328,36 +559,40 @@ def fact_check(req: FactCheckReq):
     buffer_path = draft_dir / "buffer.txt"
 
     target = buffer_path if req.source == "buffer" else master_path
-    text = read_text_safe(target)
-    checked = len(text)
+    gate = fast_gate(target)
+    checked, scanned = gate["chars"], gate["scanned_bytes"]
 
-    if not text.strip():
+    if not gate["nonblank"]:
         return FactCheckResp(
             ok=False,
             book=req.book,
             checked_chars=0,
             model="fast",
             issues=[FactIssue(severity="low", type="BUFFER_EMPTY", claim="Brak tekstu do sprawdzenia.")],
+            scanned_bytes=scanned,
         )
 
     # FAST guard: blokuj metatekst
-    if contains_meta(text):
+    if gate["meta"]:
         return FactCheckResp(
             ok=False,
             book=req.book,
             checked_chars=checked,
             model="fast",
             issues=[FactIssue(severity="high", type="META_TEXT", claim="Wykryto metatekst (prośby o streszczenie/wyjaśnienia).")],
+            scanned_bytes=scanned,
         )
 
     if not req.deep:
-        return FactCheckResp(ok=True, book=req.book, checked_chars=checked, model="fast", issues=[])
+        return FactCheckResp(ok=True, book=req.book, checked_chars=checked, model="fast", issues=[], scanned_bytes=scanned)
+
+    text = read_tail_text(target, chars=12000)
 
     fact_model = os.getenv("OPENAI_FACT_MODEL", os.getenv("OPENAI_MODEL", "gpt-4.1-mini"))
     prompt = (
         "Sprawdź spójność tekstu. Zwróć WYŁĄCZNIE JSON:\n"
         '{ "ok": true/false, "issues": [ { "severity":"low|medium|high", "type":"...", "claim":"...", "evidence":"...", "suggested_fix":"..." } ] }\n\n'
-        "TEKST:\n" + text[-12000:]
+        "TEKST:\n" + text
     )
 
     try:
@@ -382,7 +617,7 @@ def fact_check(req: FactCheckReq):
             except Exception:
                 issues.append(FactIssue(severity="low", type="parse", claim=str(it)))
 
-        return FactCheckResp(ok=ok, book=req.book, checked_chars=checked, model=fact_model, issues=issues)
+        return FactCheckResp(ok=ok, book=req.book, checked_chars=checked, model=fact_model, issues=issues, scanned_bytes=scanned)
 
     except Exception:
         return FactCheckResp(
@@ -391,6 +626,7 @@ def fact_check(req: FactCheckReq):
             checked_chars=checked,
             model=fact_model,
             issues=[FactIssue(severity="low", type="FACT_CHECK_FALLBACK", claim="Deep fact_check failed; fallback OK.")],
+            scanned_bytes=scanned,
         )
 
 
@@ -407,8 +643,11 @@ def accept(req: AcceptReq):
         master_path = draft_dir / "master.txt"
         buffer_path = draft_dir / "buffer.txt"
 
-        buf = read_text_safe(buffer_path)
-        if not buf.strip():
+        # przerwany wczesniej accept (crash miedzy appendem do master a czyszczeniem bufora) -> dokoncz
+        recovered = recover_accept(master_path, buffer_path)["action"]
+        recovery = None if recovered == "none" else recovered
+
+        if not fast_gate(buffer_path)["nonblank"]:
             return AcceptResp(
                 ok=False,
                 book=req.book,
@@ -416,9 +655,11 @@ def accept(req: AcceptReq):
                 master_path=str(master_path),
                 buffer_path=str(buffer_path),
                 error="BUFFER_EMPTY",
+                recovery=recovery,
             )
 
         if req.require_fact_ok and not req.bypass_gate:
+            # bramka przyrostowa: po fast_gate powyzej czyta tylko zakladke, nie caly bufor
             fc = fact_check(FactCheckReq(book=req.book, source="buffer", deep=False))
             if not fc.ok:
                 return AcceptResp(
@@ -428,24 +669,30 @@ def accept(req: AcceptReq):
                     master_path=str(master_path),
                     buffer_path=str(buffer_path),
                     error="FACT_GATE_BLOCKED",
+                    recovery=recovery,
                 )
 
-        master_prev = read_text_safe(master_path)
-        new_master = (master_prev + "\n" + buf).lstrip("\n")
-        atomic_write_text(master_path, new_master)
-
-        added = len(buf)
-
-        if req.clear_buffer:
-            atomic_write_text(buffer_path, "")
+        # O(bufor): append do master (segment) + consume bufora pod intencja; master nie jest czytany
+        res = accept_buffer(master_path, buffer_path, clear=req.clear_buffer)
+        if not res["ok"]:
+            return AcceptResp(
+                ok=False,
+                book=req.book,
+                status="BUFFER_EMPTY",
+                master_path=str(master_path),
+                buffer_path=str(buffer_path),
+                error="BUFFER_EMPTY",
+                recovery=recovery,
+            )
 
         return AcceptResp(
             ok=True,
             book=req.book,
             status="SUCCESS",
-            added_chars=added,
+            added_chars=res["added_chars"],
             master_path=str(master_path),
             buffer_path=str(buffer_path),
+            recovery=recovery,
         )
 
     finally:
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.text_analysis import RULES_FINGERPRINT, analyze, analyze_incremental
+
+# Cache analizy akapitow ksiazki: books/<book>/analysis_cache.sqlite3 (WAL), klucz = hash tresci akapitu.
+#
+# proof / critic / critic_v2 / humanity na draft/master.txt analizuja tylko nowe albo zmienione akapity
+# (app.text_analysis.analyze_incremental); reszta raportu to scalanie faktow z cache. Wiersze z innym
+# odciskiem regul (RULES_FINGERPRINT) sa kasowane przy pierwszym uzyciu, wiec zmiana regul = jedna pelna
+# analiza. Fakty akapitow nieuzywanych od KEEP_GENERATIONS analiz sa przycinane, gdy cache urosnie ponad
+# PRUNE_SLACK + 2x liczba akapitow ostatniego tekstu (wywolania na fragmencie, np. critic_v2 na koncowce
+# master.txt, nie wyrzucaja wiec akapitow calej ksiazki). W pamieci trzymamy tez checkpoint scalania do
+# ostatniej granicy akapitu: tekst, ktory tylko urosl na koncu, jest scalany od tego miejsca.
+#
+# Wylaczenie: BOOKS_ANALYSIS_CACHE=0 (wtedy zwykle analyze() na calym tekscie).
+
+CACHE_NAME = "analysis_cache.sqlite3"
+PRUNE_SLACK = 2000
+KEEP_GENERATIONS = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS paragraphs (
+    hash TEXT PRIMARY KEY,
+    rules TEXT NOT NULL,
+    facts TEXT NOT NULL
+);
+"""
+
+
+def cache_enabled() -> bool:
+    return (os.getenv("BOOKS_ANALYSIS_CACHE") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+class ParagraphCache:
+    def __init__(self, book_root: Path):
+        self.book_root = Path(book_root)
+        self.db_path = self.book_root / CACHE_NAME
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._facts: Optional[Dict[str, Dict[str, Any]]] = None
+        self._used: Dict[str, int] = {}
+        self._gen = 0
+        self._checkpoints: Dict[int, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.executescript(_SCHEMA)
+            self._local.conn = c
+        return c
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._facts is None:
+            c = self._conn()
+            c.execute("DELETE FROM paragraphs WHERE rules != ?", (RULES_FINGERPRINT,))
+            facts: Dict[str, Dict[str, Any]] = {}
+            for h, raw in c.execute("SELECT hash, facts FROM paragraphs"):
+                try:
+                    facts[h] = json.loads(raw)
+                except Exception:
+                    continue
+            self._facts = facts
+        return self._facts
+
+    def analyze(self, text: str, tools: Optional[Sequence[str]] = None, **options: Dict[str, Any]) -> Dict[str, Any]:
+        """analyze_incremental() over this book's paragraph cache; new facts are persisted before returning."""
+        with self._lock:
+            facts = self._load()
+            stats: Dict[str, Any] = {}
+            out = analyze_incremental(text, tools, cache=facts, stats=stats, checkpoints=self._checkpoints, **options)
+            added: List[str] = stats.get("added") or []
+            self.misses += len(added)
+            self.hits += int(stats.get("segments") or 0) - len(added)
+
+            c = self._conn()
+            if added:
+                rows = [(h, RULES_FINGERPRINT, json.dumps(facts[h], ensure_ascii=False)) for h in added]
+                c.execute("BEGIN")
+                c.executemany("INSERT OR REPLACE INTO paragraphs(hash, rules, facts) VALUES (?,?,?)", rows)
+                c.execute("COMMIT")
+
+            self._gen += 1
+            keys: List[str] = stats.get("keys") or []
+            for h in keys:
+                self._used[h] = self._gen
+            if len(facts) > 2 * len(keys) + PRUNE_SLACK:
+                cutoff = self._gen - KEEP_GENERATIONS
+                stale = [h for h in facts if self._used.get(h, 0) <= cutoff]
+                for h in stale:
+                    facts.pop(h, None)
+                    self._used.pop(h, None)
+                self._checkpoints.clear()
+                if stale:
+                    c.execute("BEGIN")
+                    c.executemany("DELETE FROM paragraphs WHERE hash=?", [(h,) for h in stale])
+                    c.execute("COMMIT")
+            return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._facts) if self._facts is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rules": RULES_FINGERPRINT,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn().execute("DELETE FROM paragraphs")
+            self._facts = {}
+            self._used.clear()
+            self._checkpoints.clear()
+
+
+_CACHES: Dict[str, ParagraphCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_cache(book_root: Path) -> ParagraphCache:
+    key = str(Path(book_root).resolve())
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = ParagraphCache(Path(key))
+            _CACHES[key] = cache
+        return cache
+
+
+def reset_caches() -> None:
+    with _CACHES_LOCK:
+        _CACHES.clear()
+
+
+def analyze_book_text(book_root: Path, text: str, tools: Optional[Sequence[str]] = None, **options: Dict[str, Any]) -> Dict[str, Any]:
+    """Reports for `text` of a book, incremental when the cache is enabled; any cache error falls back to analyze()."""
+    if cache_enabled() and Path(book_root).is_dir():
+        try:
+            return get_cache(book_root).analyze(text, tools, **options)
+        except Exception:
+            pass
+    return analyze(text, tools, **options)
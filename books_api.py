@@ -15,6 +15,8 @@ from typing import Any, Dict, Optional, Literal, Union
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
+from app.lock_manager import Lease, get_lock_manager
+
 router = APIRouter(prefix="/books", tags=["books"])
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -78,39 +80,34 @@ def _atomic_write_json(path: Path, data: dict) -> None:
     tmp.replace(path)
 
 
+def agent_lock_name(book: str) -> str:
+    return f"agent_{book}"
+
+
+# lock joba per ksiazka: app.lock_manager (zwalniany przez jadro, gdy proces padnie);
+# _active.lock z job_id to tylko marker dla monitor_jobs.ps1 i GET /books/book/{book}/lock
+_AGENT_LEASES: Dict[str, Lease] = {}
+
+
 def _read_lock(book: str) -> Optional[str]:
-    lf = _lock_file(book)
-    if not lf.exists():
+    holder = get_lock_manager().holder(agent_lock_name(book))
+    if holder is None:
         return None
-    try:
-        s = lf.read_text(encoding="utf-8", errors="replace").strip()
-        return s or "UNKNOWN"
-    except Exception:
-        return "UNKNOWN"
+    return str(holder.get("owner") or "UNKNOWN")
 
 
 def _try_create_lock(book: str, job_id: str) -> bool:
-    lf = _lock_file(book)
-    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY
-    try:
-        fd = os.open(str(lf), flags)
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            f.write(job_id)
-        return True
-    except FileExistsError:
+    lease = get_lock_manager().try_acquire(agent_lock_name(book), owner=job_id, marker=(_lock_file(book), job_id))
+    if lease is None:
         return False
+    _AGENT_LEASES[job_id] = lease
+    return True
 
 
 def _release_lock(book: str, job_id: str) -> None:
-    lf = _lock_file(book)
-    try:
-        if not lf.exists():
-            return
-        current = lf.read_text(encoding="utf-8", errors="replace").strip()
-        if current == job_id:
-            lf.unlink(missing_ok=True)
-    except Exception:
-        pass
+    lease = _AGENT_LEASES.pop(job_id, None)
+    if lease is not None:
+        lease.release()
 
 
 class RunReq(BaseModel):
@@ -11,12 +11,11 @@ from books_core import (
     safe_resolve_under,
     ensure_dir,
     make_run_id,
-    atomic_write_text,
-    atomic_write_json,
     write_run,
     write_latest,
-    read_text_safe,
+    read_tail_text,
 )
+from books_run_journal import RunBatch
 
 router = APIRouter(prefix="/books/architect", tags=["books.architect"])
 
@@ -47,7 +46,7 @@ def _load_text(book_root, req: ArchitectRunReq) -> Tuple[str, str]:
     rel = req.path or "draft/master.txt"
     p = safe_resolve_under(book_root, rel)
     if p.exists() and p.is_file():
-        return read_text_safe(p), rel
+        return read_tail_text(p, sentences=12), rel
     return "", rel
 
 
@@ -150,16 +149,11 @@ def _suggest_next(goal: Optional[str], tail_sents: List[str], entities: List[str
     }
 
 
-@router.post("/run", response_model=ArchitectRunResp)
-def architect_run(req: ArchitectRunReq):
+def architect_brief(req: ArchitectRunReq) -> Dict[str, Any]:
+    """Plans the next chunk without writing anything; architect_commit() persists it."""
     run_id = make_run_id("architect")
-    role = "ARCHITEKT"
-    title = "ARCHITECT_BRIEF"
-
     try:
         book_root = safe_book_root(req.book)
-        ensure_dir(book_root)
-
         text, source = _load_text(book_root, req)
         fallback = not bool(text.strip())
 
@@ -205,13 +199,33 @@ def architect_run(req: ArchitectRunReq):
         md.append("## Writer instruction")
         md.append("- Zero streszczeń. Pokaż ruch i koszt decyzji. Jeden konkret w środku sceny.")
         report_md = "\n".join(md).strip() + "\n"
+        return {"ok": True, "run_id": run_id, "fallback": fallback, "preview": report_md[:500], "report_md": report_md, "report_json": report_json}
+    except Exception as e:
+        return {"ok": False, "run_id": run_id, "preview": f"(fallback) Exception: {e!r}", "error": e}
+
+
+def architect_commit(req: ArchitectRunReq, brief: Dict[str, Any]) -> Dict[str, Any]:
+    """Writes reports, architect latest and the run record for a brief from architect_brief()."""
+    run_id = brief["run_id"]
+    role = "ARCHITEKT"
+    title = "ARCHITECT_BRIEF"
+
+    try:
+        if not brief["ok"]:
+            raise brief["error"]
+        book_root = safe_book_root(req.book)
+        ensure_dir(book_root)
+        fallback = brief["fallback"]
+        report_md = brief["report_md"]
+        report_json = brief["report_json"]
 
         report_md_rel = f"analysis/architect_report_{run_id}.md"
         report_json_rel = f"analysis/architect_report_{run_id}.json"
-        w_rmd = atomic_write_text(safe_resolve_under(book_root, report_md_rel), report_md)
-        w_rjson = atomic_write_json(safe_resolve_under(book_root, report_json_rel), report_json)
+        batch = RunBatch(book_root)  # raporty + latest + run = jeden zapis do dziennika runow
+        w_rmd = batch.write_text(report_md_rel, report_md)
+        w_rjson = batch.write_json(report_json_rel, report_json)
 
-        w_latest = write_latest(book_root, "architect", report_md, json_obj=report_json, raw_text=report_md)
+        w_latest = write_latest(book_root, "architect", report_md, json_obj=report_json, raw_text=report_md, batch=batch)
 
         run_written = write_run(
             book_root=book_root,
@@ -222,6 +236,7 @@ def architect_run(req: ArchitectRunReq):
             role=role,
             input_obj=req.model_dump(),
             output_obj={"ok": True, "fallback": fallback, "report": {"md": report_md_rel, "json": report_json_rel}, "latest": w_latest.get("paths", {})},
+            batch=batch,
         )
 
         return {
@@ -254,3 +269,8 @@ def architect_run(req: ArchitectRunReq):
             "paths": {},
             "writes": {"error": repr(e)},
         }
+
+
+@router.post("/run", response_model=ArchitectRunResp)
+def architect_run(req: ArchitectRunReq):
+    return architect_commit(req, architect_brief(req))
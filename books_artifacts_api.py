@@ -5,6 +5,7 @@ from pydantic import BaseModel
 from typing import Any, Dict
 
 from books_core import safe_book_root, safe_resolve_under, read_text_safe
+from books_run_journal import materialize_path
 
 router = APIRouter(prefix="/books/book/{book}/artifacts", tags=["books.artifacts"])
 
@@ -25,6 +26,7 @@ class ArtifactLatestResp(BaseModel):
 def read_artifact(book: str, path: str = Query(..., description="Relative path under book root")):
     root = safe_book_root(book)
     target = safe_resolve_under(root, path)
+    materialize_path(root, target.relative_to(root).as_posix())
     if not target.exists() or not target.is_file():
         raise HTTPException(status_code=404, detail="file not found")
     try:
@@ -41,6 +43,8 @@ def latest_artifact(book: str, kind: str = Query(...)):
     md_path = analysis / f"{kind}_latest.md"
     json_path = analysis / f"{kind}_latest.json"
     raw_path = analysis / f"{kind}_latest.raw"
+    for p in (md_path, json_path, raw_path):
+        materialize_path(root, p.relative_to(root).as_posix())
 
     md = read_text_safe(md_path) if md_path.exists() else f"(stub) No latest md for kind='{kind}'"
     raw = read_text_safe(raw_path) if raw_path.exists() else md
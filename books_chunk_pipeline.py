@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Potokowe generowanie chunkow z zatwierdzaniem w kolejnosci (grow_to_wordcount, agent loop_write_job).
+#
+# Trzymamy `inflight` wywolan generatora naraz. Chunk i dostaje spekulatywny kontekst: beat z outline'u
+# (beat(i)) + snapshot() stanu zatwierdzonego w chwili zlecenia (zwykle ogon tekstu). Zatwierdzamy
+# (commit) scisle po kolei 0, 1, 2, ... w watku wywolujacym. Jesli przed zatwierdzeniem chunka i doszly
+# chunki, ktorych jego kontekst nie widzial, check() porownuje go z tym, co faktycznie zatwierdzono;
+# odrzucony chunk generujemy ponownie na aktualnym stanie (max_regen razy, potem zatwierdzamy z uwaga).
+# generate() nie moze niczego zapisywac (odrzucone i nadmiarowe wyniki sa wyrzucane) - zapisy tylko w commit().
+#
+# inflight=1 to dokladnie dotychczasowy tryb sekwencyjny (kontekst zawsze aktualny, check nie jest wolany).
+# stats() podaje czas scienny i szacowany czas sekwencyjny (generacje zatwierdzonych chunkow + commity).
+
+
+@dataclass
+class ChunkSpec:
+    index: int  # pozycja w kolejnosci zatwierdzania (od `start`)
+    beat: str
+    context: Any  # snapshot() w chwili zlecenia
+    committed: int  # indeks nastepnego chunka do zatwierdzenia w chwili snapshot()
+    attempt: int = 0
+
+    @property
+    def stale(self) -> bool:
+        return self.committed < self.index
+
+
+class ChunkPipeline:
+    def __init__(
+        self,
+        generate: Callable[[ChunkSpec], Any],
+        commit: Callable[[ChunkSpec, Any], None],
+        snapshot: Callable[[], Any],
+        check: Optional[Callable[[ChunkSpec, Any], Optional[str]]] = None,
+        beat: Optional[Callable[[int], str]] = None,
+        inflight: int = 1,
+        max_regen: int = 2,
+    ):
+        self.generate = generate
+        self.commit = commit
+        self.snapshot = snapshot
+        self.check = check
+        self.beat = beat or (lambda i: "")
+        self.inflight = max(1, int(inflight))
+        self.max_regen = max(0, int(max_regen))
+
+        self.committed = 0
+        self.generated = 0
+        self.regenerated = 0
+        self.discarded = 0
+        self.forced: List[Dict[str, Any]] = []
+        self.wall_s = 0.0
+        self.gen_s = 0.0  # wszystkie generacje (takze odrzucone)
+        self.committed_gen_s = 0.0
+        self.commit_s = 0.0
+
+    def _timed(self, spec: ChunkSpec) -> Tuple[Any, float]:
+        t0 = time.perf_counter()
+        out = self.generate(spec)
+        return out, time.perf_counter() - t0
+
+    def run(self, n: Optional[int] = None, start: int = 0, done: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        """Generates and commits chunks start..start+n-1 (n=None: until done() is true). Returns stats()."""
+        end = None if n is None else start + n
+        pending: Dict[int, Tuple[ChunkSpec, "Future[Tuple[Any, float]]"]] = {}
+        pool = ThreadPoolExecutor(max_workers=self.inflight, thread_name_prefix="chunk-gen")
+        nxt = cur = start
+        t0 = time.perf_counter()
+
+        def submit(i: int, attempt: int = 0) -> None:
+            spec = ChunkSpec(index=i, beat=self.beat(i), context=self.snapshot(), committed=cur, attempt=attempt)
+            pending[i] = (spec, pool.submit(self._timed, spec))
+
+        try:
+            while (end is None or cur < end) and not (done and done()):
+                while len(pending) < self.inflight and (end is None or nxt < end):
+                    submit(nxt)
+                    nxt += 1
+
+                spec, fut = pending.pop(cur)
+                out, dt = fut.result()
+                self.generated += 1
+                self.gen_s += dt
+
+                issue = self.check(spec, out) if (self.check and spec.stale) else None
+                if issue and spec.attempt < self.max_regen:
+                    self.regenerated += 1
+                    submit(cur, spec.attempt + 1)
+                    continue
+                if issue:
+                    self.forced.append({"index": cur, "issue": issue})
+
+                c0 = time.perf_counter()
+                self.commit(spec, out)
+                self.commit_s += time.perf_counter() - c0
+                self.committed_gen_s += dt
+                self.committed += 1
+                cur += 1
+        finally:
+            # spekulatywne chunki za koncem (target osiagniety / cancel / blad) nie sa potrzebne:
+            # nierozpoczete anulujemy, na trwajace czekamy, zeby zaden generate() nie przezyl run()
+            self.discarded += len(pending)
+            for _, fut in pending.values():
+                fut.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.wall_s += time.perf_counter() - t0
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        sequential = self.committed_gen_s + self.commit_s
+        return {
+            "mode": "pipelined" if self.inflight > 1 else "sequential",
+            "inflight": self.inflight,
+            "committed": self.committed,
+            "generated": self.generated,
+            "regenerated": self.regenerated,
+            "discarded": self.discarded,
+            "forced": list(self.forced),
+            "wall_s": round(self.wall_s, 3),
+            "gen_s": round(self.gen_s, 3),
+            "commit_s": round(self.commit_s, 3),
+            "sequential_est_s": round(sequential, 3),
+            "speedup": round(sequential / self.wall_s, 2) if self.wall_s > 0 else None,
+        }
+
+
+_SENT_SPLIT_RE = re.compile(r"(?<=[\.\!\?…])\s+")
+_WORD_RE = re.compile(r"\w+")
+
+
+def _sentence_keys(text: str, min_words: int = 4) -> List[str]:
+    keys = []
+    for s in _SENT_SPLIT_RE.split(text or ""):
+        w = _WORD_RE.findall(s.lower())
+        if len(w) >= min_words:
+            keys.append(" ".join(w))
+    return keys
+
+
+def continuity_issue(committed_tail: str, chunk: str, max_repeat_ratio: float = 0.2) -> Optional[str]:
+    """
+    Cheap check of a speculative chunk against the text actually committed before it: the chunk must not
+    re-tell it (its opening sentence or more than `max_repeat_ratio` of its sentences already in the tail).
+    """
+    tail = set(_sentence_keys(committed_tail))
+    sents = _sentence_keys(chunk)
+    if not tail or not sents:
+        return None
+    if sents[0] in tail:
+        return f"opening sentence repeats committed text: {sents[0][:80]!r}"
+    repeated = sum(1 for s in sents if s in tail)
+    if repeated / len(sents) > max_repeat_ratio:
+        return f"{repeated}/{len(sents)} sentences repeat committed text"
+    return None
@@ -10,6 +10,8 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+from books_runs_catalog import record_run
+
 
 BOOK_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_\-]{0,63}$")
 
@@ -108,6 +110,76 @@ def read_text_safe(path: Path, max_bytes: int = 2_000_000) -> str:
     return data.decode("utf-8", errors="replace")
 
 
+_TAIL_BLOCK = 64 * 1024
+_SENT_SPLIT_RE = re.compile(r"(?<=[\.\!\?…])\s+")
+_PARA_SPLIT_RE = re.compile(r"\n[ \t\r]*\n")
+
+
+def read_tail_bytes(path: Path, max_bytes: int) -> bytes:
+    """Seek-from-end read; leading UTF-8 continuation bytes are dropped so decoding never splits a char."""
+    if max_bytes <= 0 or not path.exists():
+        return b""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = max(0, size - max_bytes)
+        f.seek(start)
+        data = f.read(size - start)
+    if start > 0:
+        i = 0
+        while i < len(data) and i < 4 and (data[i] & 0xC0) == 0x80:
+            i += 1
+        data = data[i:]
+    return data
+
+
+def read_tail_text(
+    path: Path,
+    *,
+    chars: Optional[int] = None,
+    lines: Optional[int] = None,
+    sentences: Optional[int] = None,
+    paragraphs: Optional[int] = None,
+) -> str:
+    """
+    O(tail) tail of a UTF-8 text file: last `chars` characters, or a text span holding
+    at least the last `lines`/`sentences`/`paragraphs` units (window grows x2 until enough).
+    """
+    if not path.exists():
+        return ""
+    size = path.stat().st_size
+
+    def _decode(b: bytes, covers_start: bool) -> str:
+        t = b.decode("utf-8", errors="replace")
+        return t.lstrip("\ufeff") if covers_start else t
+
+    if chars is not None:
+        if chars <= 0:
+            return ""
+        n = min(size, chars * 4)
+        return _decode(read_tail_bytes(path, n), n >= size)[-chars:]
+
+    if lines is not None:
+        want, split = lines, (lambda t: t.splitlines())
+    elif sentences is not None:
+        want, split = sentences, (lambda t: [p for p in _SENT_SPLIT_RE.split(t.strip()) if p.strip()])
+    elif paragraphs is not None:
+        want, split = paragraphs, (lambda t: [p for p in _PARA_SPLIT_RE.split(t.strip()) if p.strip()])
+    else:
+        return _decode(read_tail_bytes(path, size), True)
+
+    if want <= 0:
+        return ""
+    window = _TAIL_BLOCK
+    while True:
+        n = min(size, window)
+        text = _decode(read_tail_bytes(path, n), n >= size)
+        # pierwsza jednostka w oknie moze byc ucieta, wiec potrzeba want+1
+        if n >= size or len(split(text)) > want:
+            return text
+        window *= 2
+
+
 @dataclass
 class RunPaths:
     meta: str
@@ -125,9 +197,16 @@ def write_run(
     input_obj: Any,
     output_obj: Any,
     extra_meta: Optional[Dict[str, Any]] = None,
+    batch: Optional[Any] = None,
 ) -> Dict[str, Any]:
+    """
+    Run record (meta/input/output). With the run journal on (default) this is one append to
+    runs/.journal/ together with every file collected in `batch` (books_run_journal.RunBatch);
+    runs/<run_id>/*.json are materialized when a runs API asks for them.
+    """
+    from books_run_journal import get_journal, journal_enabled
+
     runs_dir = book_root / "runs" / run_id
-    ensure_dir(runs_dir)
 
     meta_path = runs_dir / "meta.json"
     input_path = runs_dir / "input.json"
@@ -151,9 +230,16 @@ def write_run(
     if extra_meta:
         meta.update(extra_meta)
 
+    if journal_enabled():
+        w = get_journal(book_root).append_run(run_id, meta, input_obj, output_obj, files=batch.files if batch else None)
+        record_run(book_root, meta, output_obj)
+        return {"ok": bool(w.get("ok")), "meta": meta, "paths": asdict(paths), "writes": {"journal": w}}
+
+    ensure_dir(runs_dir)
     w1 = atomic_write_json(meta_path, meta)
     w2 = atomic_write_json(input_path, input_obj)
     w3 = atomic_write_json(output_path, output_obj)
+    record_run(book_root, meta, output_obj)
 
     return {
         "ok": bool(w1.get("ok")) and bool(w2.get("ok")) and bool(w3.get("ok")),
@@ -169,26 +255,46 @@ def write_latest(
     md_text: str,
     json_obj: Optional[Any] = None,
     raw_text: Optional[str] = None,
+    batch: Optional[Any] = None,
 ) -> Dict[str, Any]:
+    """analysis/<kind>_latest.{md,json,raw}; with `batch` they ride along with the run record (write_run)."""
+    from books_run_journal import get_journal, journal_enabled
+
     analysis_dir = book_root / "analysis"
-    ensure_dir(analysis_dir)
 
     md_path = analysis_dir / f"{kind}_latest.md"
     json_path = analysis_dir / f"{kind}_latest.json"
     raw_path = analysis_dir / f"{kind}_latest.raw"
 
     stub = {"ok": True, "stub": json_obj is None, "kind": kind, "created_at": utc_now_iso()}
-
-    w_md = atomic_write_text(md_path, md_text)
-    w_json = atomic_write_json(json_path, json_obj if json_obj is not None else stub)
-    w_raw = atomic_write_text(raw_path, raw_text if raw_text is not None else md_text)
+    paths = {
+        "md": str(md_path.relative_to(book_root)),
+        "json": str(json_path.relative_to(book_root)),
+        "raw": str(raw_path.relative_to(book_root)),
+    }
+    md_rel, json_rel, raw_rel = (Path(p).as_posix() for p in paths.values())
+
+    if batch is not None:
+        w_md = batch.write_text(md_rel, md_text)
+        w_json = batch.write_json(json_rel, json_obj if json_obj is not None else stub)
+        w_raw = batch.write_text(raw_rel, raw_text if raw_text is not None else md_text)
+    elif journal_enabled():
+        w = get_journal(book_root).append_files(
+            {
+                md_rel: {"text": md_text},
+                json_rel: {"json": json_obj if json_obj is not None else stub},
+                raw_rel: {"text": raw_text if raw_text is not None else md_text},
+            }
+        )
+        return {"ok": bool(w.get("ok")), "paths": paths, "writes": {"journal": w}}
+    else:
+        ensure_dir(analysis_dir)
+        w_md = atomic_write_text(md_path, md_text)
+        w_json = atomic_write_json(json_path, json_obj if json_obj is not None else stub)
+        w_raw = atomic_write_text(raw_path, raw_text if raw_text is not None else md_text)
 
     return {
         "ok": bool(w_md.get("ok")) and bool(w_json.get("ok")) and bool(w_raw.get("ok")),
-        "paths": {
-            "md": str(md_path.relative_to(book_root)),
-            "json": str(json_path.relative_to(book_root)),
-            "raw": str(raw_path.relative_to(book_root)),
-        },
+        "paths": paths,
         "writes": {"md": w_md, "json": w_json, "raw": w_raw},
     }
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import re
 from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter
@@ -11,12 +10,13 @@ from books_core import (
     safe_resolve_under,
     ensure_dir,
     make_run_id,
-    atomic_write_text,
-    atomic_write_json,
     write_run,
     write_latest,
     read_text_safe,
 )
+from app.text_analysis import analyze
+from books_analysis_cache import analyze_book_text
+from books_run_journal import RunBatch
 
 router = APIRouter(prefix="/books/critic", tags=["books.critic"])
 
@@ -40,10 +40,6 @@ class CriticCheckResp(BaseModel):
     writes: Dict[str, Any]
 
 
-_SENT_RE = re.compile(r"[^.!?…]+[.!?…]", re.UNICODE)
-_WORD_RE = re.compile(r"\b[\wĄĆĘŁŃÓŚŹŻąćęłńóśźż]+\b", re.UNICODE)
-
-
 def _load_text(book_root, req: CriticCheckReq) -> Tuple[str, str]:
     if req.text and req.text.strip():
         return req.text, "(inline)"
@@ -55,30 +51,7 @@ def _load_text(book_root, req: CriticCheckReq) -> Tuple[str, str]:
 
 
 def _metrics(text: str) -> Dict[str, Any]:
-    lines = text.splitlines()
-    paras = [p for p in re.split(r"\n\s*\n", text.strip()) if p.strip()]
-    sents = _SENT_RE.findall(text) if text else []
-    words = _WORD_RE.findall(text) if text else []
-
-    avg_sent_len = (len(words) / len(sents)) if sents else 0.0
-    avg_para_len = (len(words) / len(paras)) if paras else 0.0
-
-    exclam = text.count("!") if text else 0
-    quest = text.count("?") if text else 0
-    dash_dialogue = sum(1 for ln in lines if ln.lstrip().startswith(("–", "-")))
-
-    return {
-        "chars": len(text),
-        "lines": len(lines),
-        "paragraphs": len(paras),
-        "sentences": len(sents),
-        "words": len(words),
-        "avg_sentence_words": round(avg_sent_len, 2),
-        "avg_paragraph_words": round(avg_para_len, 2),
-        "exclamations": exclam,
-        "questions": quest,
-        "dialogue_lines": dash_dialogue,
-    }
+    return analyze(text, ["critic"])["critic"]
 
 
 def _notes(m: Dict[str, Any], max_notes: int) -> List[str]:
@@ -122,7 +95,7 @@ def critic_check(req: CriticCheckReq):
         text, source = _load_text(book_root, req)
         fallback = not bool(text.strip())
 
-        m = _metrics(text) if text else {"chars": 0, "words": 0}
+        m = analyze_book_text(book_root, text, ["critic"])["critic"] if text else {"chars": 0, "words": 0}
         notes = _notes(m if isinstance(m, dict) else {}, req.max_notes) if text else []
 
         report_json = {"ok": True, "tool": "critic", "source": source, "metrics": m, "notes": notes}
@@ -140,13 +113,12 @@ def critic_check(req: CriticCheckReq):
 
         report_md_rel = f"analysis/critic_report_{run_id}.md"
         report_json_rel = f"analysis/critic_report_{run_id}.json"
-        report_md_path = safe_resolve_under(book_root, report_md_rel)
-        report_json_path = safe_resolve_under(book_root, report_json_rel)
+        batch = RunBatch(book_root)  # raporty + latest + run = jeden zapis do dziennika runow
 
-        w_rmd = atomic_write_text(report_md_path, report_md)
-        w_rjson = atomic_write_json(report_json_path, report_json)
+        w_rmd = batch.write_text(report_md_rel, report_md)
+        w_rjson = batch.write_json(report_json_rel, report_json)
 
-        w_latest = write_latest(book_root, "critic", report_md, json_obj=report_json, raw_text=report_md)
+        w_latest = write_latest(book_root, "critic", report_md, json_obj=report_json, raw_text=report_md, batch=batch)
 
         run_out = {
             "ok": True,
@@ -166,6 +138,7 @@ def critic_check(req: CriticCheckReq):
             role=role,
             input_obj=run_in,
             output_obj=run_out,
+            batch=batch,
         )
 
         return {
@@ -10,6 +10,9 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
+from app.text_analysis import analyze
+from books_analysis_cache import analyze_book_text
+
 print(f"[CRITIC_V2_API] LOADED: {__file__}")
 
 router = APIRouter(prefix="/books", tags=["critic"])
@@ -104,67 +107,8 @@ def _write_run_one_shot(
     return run_id
 
 
-def _split_paragraphs(text: str) -> List[str]:
-    return [p.strip() for p in re.split(r"\n\s*\n+", text) if p.strip()]
-
-
-def _excerpt(s: str, n: int = 420) -> str:
-    s = s.strip()
-    return (s[:n] + "…") if len(s) > n else s
-
-
 def _critic_heuristic(text: str, max_points: int = 12) -> Dict[str, Any]:
-    paras = _split_paragraphs(text)
-    points: List[Dict[str, Any]] = []
-
-    # Heurystyki “czytelnicze” (neutralne, bez fabuły)
-    # 1) placeholdery
-    ph_hits = len(re.findall(r"\b(NEUTRAL_[A-Z0-9_]+|TBD)\b", text))
-    if ph_hits:
-        points.append({"type": "PLACEHOLDERS", "severity": "high", "note": f"W tekście są placeholdery (x{ph_hits}). Usuń przed wydaniem.", "excerpt": "GLOBAL"})
-
-    # 2) monotonia rytmu: dużo podobnych długości zdań (bardzo prosto)
-    sentences = re.split(r"(?<=[.!?])\s+", text.strip())
-    lens = [len(re.findall(r"\w+", s)) for s in sentences if s.strip()]
-    if len(lens) >= 8:
-        avg = sum(lens) / max(1, len(lens))
-        var = sum((x - avg) ** 2 for x in lens) / max(1, len(lens))
-        if var < 20:
-            points.append({"type": "RHYTHM_MONOTONY", "severity": "med", "note": "Rytm zdań jest monotonny (mała zmienność długości).", "excerpt": "GLOBAL"})
-
-    # 3) brak konkretu: dużo ogólników (lista bardzo krótka, neutralna)
-    vague = re.findall(r"\b(ogólnie|w zasadzie|tak naprawdę|w pewnym sensie|właściwie)\b", text.lower())
-    if len(vague) >= 3:
-        points.append({"type": "VAGUE_PHRASES", "severity": "med", "note": f"Dużo ogólników/wytrychów (x{len(vague)}).", "excerpt": "GLOBAL"})
-
-    # 4) jeśli pierwszy akapit wygląda jak meta-komentarz
-    if paras:
-        p0 = paras[0].lower()
-        if "to jest" in p0 and "wpis" in p0 and "master" in p0:
-            points.append({"type": "META_TEXT", "severity": "high", "note": "Początek wygląda jak meta-komentarz techniczny, nie jak proza.", "excerpt": _excerpt(paras[0])})
-
-    # 5) szybkie “miejsca do wzmocnienia”: krótkie, ogólne akapity
-    for i, p in enumerate(paras[:30]):
-        w = re.findall(r"\w+", p)
-        if 20 <= len(w) <= 45 and len(points) < max_points:
-            points.append({"type": "THIN_PARAGRAPH", "severity": "low", "note": "Akapit może być zbyt cienki — rozważ doprecyzowanie obrazu/akcji.", "excerpt": f"para_index={i}: " + _excerpt(p)})
-
-    points = points[:max_points]
-
-    score = 100
-    for pt in points:
-        if pt["severity"] == "high":
-            score -= 18
-        elif pt["severity"] == "med":
-            score -= 10
-        else:
-            score -= 6
-    score = max(0, min(100, score))
-
-    return {
-        "metrics": {"paragraphs": len(paras), "sentences": len(sentences), "points_count": len(points), "score": score},
-        "points": points,
-    }
+    return analyze(text, ["critic_v2"], critic_v2={"max_points": max_points})["critic_v2"]
 
 
 class CriticBody(BaseModel):
@@ -191,7 +135,7 @@ def critic_check(body: CriticBody) -> Dict[str, Any]:
     txt = _read_text(master_path)
     ctx = txt[-body.context_chars:] if body.context_chars > 0 else txt
 
-    res = _critic_heuristic(ctx, max_points=body.max_points)
+    res = analyze_book_text(_books_dir() / book, ctx, ["critic_v2"], critic_v2={"max_points": body.max_points})["critic_v2"]
 
     ts_tag = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
     report_path = (analysis_dir / f"critic_report_{ts_tag}.md").resolve()
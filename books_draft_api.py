@@ -16,6 +16,7 @@ from books_core import (
     write_latest,
     read_text_safe,
 )
+from books_run_journal import RunBatch
 
 router = APIRouter(prefix="/books/draft", tags=["books.draft"])
 
@@ -234,8 +235,9 @@ def draft_cleanup(req: DraftCleanupReq):
         draft_path = safe_resolve_under(book_root, req.path)
         if not draft_path.exists():
             report_md = f"# Draft cleanup v3\n- book: `{req.book}`\n- run_id: `{run_id}`\n\n(fallback) File not found: `{req.path}`\n"
-            w_latest = write_latest(book_root, "draft_cleanup", report_md, json_obj={"ok": True, "stub": True}, raw_text=report_md)
-            run_written = write_run(book_root, run_id, "draft_cleanup_v3", title, "SUCCESS_FALLBACK", role, req.model_dump(), {"ok": True, "note": "file not found"})
+            batch = RunBatch(book_root)
+            w_latest = write_latest(book_root, "draft_cleanup", report_md, json_obj={"ok": True, "stub": True}, raw_text=report_md, batch=batch)
+            run_written = write_run(book_root, run_id, "draft_cleanup_v3", title, "SUCCESS_FALLBACK", role, req.model_dump(), {"ok": True, "note": "file not found"}, batch=batch)
             return {
                 "ok": True,
                 "book": req.book,
@@ -301,7 +303,9 @@ def draft_cleanup(req: DraftCleanupReq):
             "```\n"
         )
 
-        w_latest = write_latest(book_root, "draft_cleanup", report_md, json_obj=report_json, raw_text=cleaned)
+        # draft i backup zostaja zwyklymi plikami; latest + run ida jednym zapisem do dziennika runow
+        batch = RunBatch(book_root)
+        w_latest = write_latest(book_root, "draft_cleanup", report_md, json_obj=report_json, raw_text=cleaned, batch=batch)
 
         run_written = write_run(
             book_root=book_root,
@@ -312,6 +316,7 @@ def draft_cleanup(req: DraftCleanupReq):
             role=role,
             input_obj=req.model_dump(),
             output_obj={"ok": True, "stats": report_json, "latest": w_latest.get("paths", {})},
+            batch=batch,
         )
 
         return {
@@ -0,0 +1,578 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Segmentowy, append-only zapis draftu (master.txt / buffer.txt).
+#
+# Uklad na dysku (dla draft/master.txt):
+#   draft/master.txt                      - zmaterializowany tekst (czytaja go wszystkie API)
+#   draft/segments/master.txt/manifest.jsonl  - 1 linia JSON na base/segment (offset, bytes, words, sha256)
+#   draft/segments/master.txt/000001.txt ...  - surowe bajty kazdego dopisanego chunka
+# Katalog segmentow nazwany pelna nazwa pliku (master.txt i master.md maja osobne); dawny katalog
+# segments/<stem>/ jest przejmowany przy pierwszym uzyciu, jesli obok nie ma innego pliku o tym stemie.
+#
+# Append kosztuje O(chunk): segment (fsync) -> linia w manifest (commit) -> dopisanie do master.txt.
+# Po crashu miedzy commitem a dopisaniem recover() dogrywa ostatni segment z pliku segmentu.
+# compact() zwija manifest do jednego rekordu "base" i usuwa pliki segmentow.
+#
+# stream(): append przyrostowy (tokeny z LLM). Kazda delta od razu trafia do master.txt (widoczna dla
+# czytajacych) i do segments/<name>/stream.part; commit() robi z tego zwykly segment + rekord w manifest.
+# Crash w trakcie streamu: recover() widzi stream.part i obcina plik do konca ostatniego rekordu
+# (niedokonczony chunk nie zostaje w drafcie, jego tekst zostaje w <seq>.aborted.part).
+#
+# accept_buffer(): buffer.txt -> master.txt w O(bufora): zwykly append() do master + consume() bufora
+# (bez czytania i przepisywania master). Para append + czyszczenie bufora jest atomowa wzgledem crashy dzieki
+# intencji draft/segments/accept.intent.json (fsync przed appendem, usuwana po consume); recover_accept()
+# dokancza przerwany accept (roll forward) na podstawie offsetu i sha256 z intencji.
+
+MANIFEST_NAME = "manifest.jsonl"
+COMPACT_EVERY = int(os.getenv("DRAFT_COMPACT_EVERY", "64") or 64)
+STREAM_PART = "stream.part"
+STREAM_FSYNC_S = float(os.getenv("DRAFT_STREAM_FSYNC_S", "1.0") or 1.0)
+ACCEPT_INTENT = "accept.intent.json"
+
+_LOCKS: Dict[str, threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _path_lock(path: Path) -> threading.Lock:
+    key = str(path.resolve())
+    with _LOCKS_GUARD:
+        lk = _LOCKS.get(key)
+        if lk is None:
+            lk = threading.Lock()
+            _LOCKS[key] = lk
+        return lk
+
+
+def _fsync_write(path: Path, data: bytes) -> None:
+    tmp = path.parent / f".tmp_{path.name}.{uuid.uuid4().hex}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def count_words(text: str) -> int:
+    return len((text or "").split())
+
+
+def segments_dir_for(path: Path) -> Path:
+    return path.parent / "segments" / path.name
+
+
+def _adopt_legacy_segments(path: Path, seg_dir: Path) -> None:
+    """Renames a pre-existing segments/<stem>/ to segments/<name>/ when no sibling file shares the stem."""
+    legacy = path.parent / "segments" / path.stem
+    if seg_dir.exists() or not legacy.is_dir():
+        return
+    if any(p.stem == path.stem and p.name != path.name for p in path.parent.iterdir() if p.is_file()):
+        return  # niejednoznaczne (np. master.txt i master.md): nowy katalog startuje od rebase z pliku
+    try:
+        os.rename(legacy, seg_dir)
+    except OSError:
+        pass  # inny watek/proces przejal go pierwszy
+
+
+class DraftStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.seg_dir = segments_dir_for(self.path)
+        _adopt_legacy_segments(self.path, self.seg_dir)
+        self.manifest_path = self.seg_dir / MANIFEST_NAME
+
+    # -------------------------
+    # manifest
+    # -------------------------
+    def _last_record(self) -> Optional[Dict[str, Any]]:
+        """Reads only the manifest tail; drops a torn (uncommitted) last line."""
+        if not self.manifest_path.exists():
+            return None
+        with open(self.manifest_path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return None
+            back = min(size, 8192)
+            f.seek(size - back)
+            tail = f.read(back)
+            if not tail.endswith(b"\n"):
+                cut = tail.rfind(b"\n")
+                if cut >= 0:
+                    f.truncate(size - back + cut + 1)
+                    tail = tail[: cut + 1]
+                elif back == size:
+                    f.truncate(0)
+                    tail = b""
+            lines = [ln for ln in tail.split(b"\n") if ln.strip()]
+        if not lines:
+            return None
+        return json.loads(lines[-1].decode("utf-8"))
+
+    def _append_record(self, rec: Dict[str, Any]) -> None:
+        line = (json.dumps(rec, ensure_ascii=False, sort_keys=True) + "\n").encode("utf-8")
+        with open(self.manifest_path, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def manifest(self) -> List[Dict[str, Any]]:
+        if not self.manifest_path.exists():
+            return []
+        out: List[Dict[str, Any]] = []
+        for ln in self.manifest_path.read_text(encoding="utf-8").splitlines():
+            if ln.strip():
+                try:
+                    out.append(json.loads(ln))
+                except Exception:
+                    break
+        return out
+
+    def _rebase(self, reason: str, data: Optional[bytes] = None) -> Dict[str, Any]:
+        """Adopts the current master (or `data` about to replace it) as a base checkpoint."""
+        self.seg_dir.mkdir(parents=True, exist_ok=True)
+        if data is None:
+            data = self.path.read_bytes() if self.path.exists() else b""
+        text = data.decode("utf-8", errors="replace")
+        last = self._last_record()
+        rec = {
+            "kind": "base",
+            "seq": (int(last["seq"]) + 1) if last else 0,
+            "offset": 0,
+            "bytes": len(data),
+            "words": count_words(text),
+            "total_words": count_words(text),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "reason": reason,
+            "created_at": _utc_now_iso(),
+        }
+        _fsync_write(self.manifest_path, (json.dumps(rec, ensure_ascii=False, sort_keys=True) + "\n").encode("utf-8"))
+        self._drop_segment_files()
+        return rec
+
+    def _drop_segment_files(self) -> None:
+        for p in self.seg_dir.glob("*.txt"):
+            try:
+                p.unlink()
+            except Exception:
+                pass
+
+    # -------------------------
+    # recovery
+    # -------------------------
+    def _recover_locked(self) -> Dict[str, Any]:
+        last = self._last_record()
+        size = self.path.stat().st_size if self.path.exists() else 0
+
+        if last is None:
+            rec = self._rebase("init")
+            return {"ok": True, "action": "init", "bytes": rec["bytes"]}
+
+        end = int(last["offset"]) + int(last["bytes"])
+        part = self.seg_dir / STREAM_PART
+        if part.exists():
+            # przerwany stream(): wszystko za ostatnim rekordem to niezatwierdzony chunk
+            os.replace(part, self.seg_dir / f"{int(last['seq']) + 1:06d}.aborted.part")
+            if size > end:
+                with open(self.path, "r+b") as f:
+                    f.truncate(end)
+                    f.flush()
+                    os.fsync(f.fileno())
+                return {"ok": True, "action": "stream_rolled_back", "bytes": end}
+        if size == end:
+            return {"ok": True, "action": "none", "bytes": size}
+
+        if last.get("kind") == "segment" and int(last["offset"]) <= size < end:
+            seg_path = self.seg_dir / str(last["file"])
+            data = seg_path.read_bytes() if seg_path.exists() else b""
+            if hashlib.sha256(data).hexdigest() == last.get("sha256"):
+                with open(self.path, "r+b" if self.path.exists() else "wb") as f:
+                    f.truncate(int(last["offset"]))
+                    f.seek(int(last["offset"]))
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                return {"ok": True, "action": "replayed", "seq": last["seq"], "bytes": end}
+
+        rec = self._rebase("external_change")
+        return {"ok": True, "action": "rebased", "bytes": rec["bytes"]}
+
+    def recover(self) -> Dict[str, Any]:
+        with _path_lock(self.path):
+            return self._recover_locked()
+
+    # -------------------------
+    # public API
+    # -------------------------
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def ends_with_newline(self) -> bool:
+        """True also for empty file (nothing to separate from)."""
+        if not self.path.exists():
+            return True
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def read_range(self, offset: int, n: int) -> bytes:
+        if n <= 0 or not self.path.exists():
+            return b""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(n)
+
+    def total_words(self) -> int:
+        with _path_lock(self.path):
+            self._recover_locked()
+            last = self._last_record() or {}
+            return int(last.get("total_words") or 0)
+
+    def append(self, text: str) -> Dict[str, Any]:
+        data = (text or "").encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with _path_lock(self.path):
+            rec0 = self._recover_locked()
+            last = self._last_record() or {}
+            offset = int(last.get("offset", 0)) + int(last.get("bytes", 0))
+            seq = int(last.get("seq", 0)) + 1
+            words = count_words(text)
+
+            seg_name = f"{seq:06d}.txt"
+            _fsync_write(self.seg_dir / seg_name, data)
+
+            rec = {
+                "kind": "segment",
+                "seq": seq,
+                "file": seg_name,
+                "offset": offset,
+                "bytes": len(data),
+                "words": words,
+                "total_words": int(last.get("total_words") or 0) + words,
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "created_at": _utc_now_iso(),
+            }
+            self._append_record(rec)
+
+            with open(self.path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            compacted = None
+            if COMPACT_EVERY > 0 and seq % COMPACT_EVERY == 0:
+                compacted = self._compact_locked()
+
+        return {
+            "ok": True,
+            "mode": "segment_append",
+            "seq": seq,
+            "segment": seg_name,
+            "offset": offset,
+            "bytes": len(data),
+            "words": words,
+            "total_words": rec["total_words"],
+            "sha256": rec["sha256"],
+            "recovery": rec0.get("action"),
+            "compacted": compacted is not None,
+        }
+
+    @contextmanager
+    def stream(self) -> Iterator["DraftStream"]:
+        """
+        Incremental append: `with store.stream() as st: st.write(delta)`; committed as one segment on exit,
+        rolled back on exception. Other appends to this file wait until the stream ends.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with _path_lock(self.path):
+            self._recover_locked()
+            st = DraftStream(self)
+            try:
+                yield st
+            except BaseException:
+                st.abort()
+                raise
+            st.commit()
+
+    def consume(self, n: int, sha256: str) -> Dict[str, Any]:
+        """
+        Drops the first `n` bytes if they still hash to `sha256` (no-op otherwise, so a replayed consume is
+        harmless). The new base record goes to the manifest before the file changes: a crash in between is
+        seen by recover() as an external change and the bytes stay (accept recovery consumes them again).
+        """
+        with _path_lock(self.path):
+            self._recover_locked()
+            data = self.path.read_bytes() if self.path.exists() else b""
+            if len(data) < n or hashlib.sha256(data[:n]).hexdigest() != sha256:
+                return {"ok": True, "action": "none", "bytes": len(data)}
+            rest = data[n:]
+            self._rebase("consume", data=rest)
+            if rest:
+                _fsync_write(self.path, rest)
+            else:
+                with open(self.path, "r+b") as f:
+                    f.truncate(0)
+                    f.flush()
+                    os.fsync(f.fileno())
+            return {"ok": True, "action": "consumed", "bytes": n, "left": len(rest)}
+
+    def _compact_locked(self) -> Dict[str, Any]:
+        rec0 = self._recover_locked()
+        last = self._last_record() or {}
+        size = self.size()
+        segs = sum(1 for r in self.manifest() if r.get("kind") == "segment")
+        base = {
+            "kind": "base",
+            "seq": int(last.get("seq", 0)) + 1,
+            "offset": 0,
+            "bytes": size,
+            "words": int(last.get("total_words") or 0),
+            "total_words": int(last.get("total_words") or 0),
+            "reason": "compact",
+            "created_at": _utc_now_iso(),
+        }
+        _fsync_write(self.manifest_path, (json.dumps(base, ensure_ascii=False, sort_keys=True) + "\n").encode("utf-8"))
+        self._drop_segment_files()
+        return {"ok": True, "recovery": rec0.get("action"), "segments_folded": segs, "bytes": size, "total_words": base["total_words"]}
+
+    def compact(self) -> Dict[str, Any]:
+        """Materializes master.txt from pending segments and folds the manifest into one base record."""
+        with _path_lock(self.path):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            return self._compact_locked()
+
+
+class DraftStream:
+    """Open streamed segment of a DraftStore; created by DraftStore.stream() (path lock held)."""
+
+    def __init__(self, store: DraftStore):
+        self.store = store
+        last = store._last_record() or {}
+        self.offset = int(last.get("offset", 0)) + int(last.get("bytes", 0))
+        self.seq = int(last.get("seq", 0)) + 1
+        self.total_words_before = int(last.get("total_words") or 0)
+        self.result: Optional[Dict[str, Any]] = None
+        self._parts: List[bytes] = []
+        self._synced = time.monotonic()
+        self._part = open(store.seg_dir / STREAM_PART, "wb")
+        self._draft = open(store.path, "ab")
+
+    @property
+    def data(self) -> bytes:
+        return b"".join(self._parts)
+
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8", errors="replace")
+
+    def write(self, text: str) -> None:
+        if self.result is not None:
+            raise RuntimeError("DraftStream already closed")
+        data = (text or "").encode("utf-8")
+        if not data:
+            return
+        # stream.part przed draftem: recover() musi wiedziec, ze bajty za rekordem to niezatwierdzony stream
+        self._part.write(data)
+        self._part.flush()
+        self._draft.write(data)
+        self._draft.flush()
+        self._parts.append(data)
+        if time.monotonic() - self._synced >= STREAM_FSYNC_S:
+            os.fsync(self._part.fileno())
+            os.fsync(self._draft.fileno())
+            self._synced = time.monotonic()
+
+    def _close_files(self) -> None:
+        for f in (self._part, self._draft):
+            if not f.closed:
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+
+    def commit(self) -> Dict[str, Any]:
+        if self.result is not None:
+            return self.result
+        store = self.store
+        self._close_files()
+        data = self.data
+        part = store.seg_dir / STREAM_PART
+        if not data:
+            part.unlink()
+            self.result = {"ok": True, "mode": "stream_append", "seq": None, "bytes": 0, "words": 0, "total_words": self.total_words_before}
+            return self.result
+
+        seg_name = f"{self.seq:06d}.txt"
+        os.replace(part, store.seg_dir / seg_name)
+        words = count_words(data.decode("utf-8", errors="replace"))
+        rec = {
+            "kind": "segment",
+            "seq": self.seq,
+            "file": seg_name,
+            "offset": self.offset,
+            "bytes": len(data),
+            "words": words,
+            "total_words": self.total_words_before + words,
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "created_at": _utc_now_iso(),
+        }
+        store._append_record(rec)
+
+        compacted = None
+        if COMPACT_EVERY > 0 and self.seq % COMPACT_EVERY == 0:
+            compacted = store._compact_locked()
+        self.result = {
+            "ok": True,
+            "mode": "stream_append",
+            "seq": self.seq,
+            "segment": seg_name,
+            "offset": self.offset,
+            "bytes": len(data),
+            "words": words,
+            "total_words": rec["total_words"],
+            "sha256": rec["sha256"],
+            "compacted": compacted is not None,
+        }
+        return self.result
+
+    def abort(self) -> Dict[str, Any]:
+        if self.result is not None:
+            return self.result
+        self._close_files()
+        self.result = {"ok": False, "mode": "stream_abort", **self.store._recover_locked()}
+        return self.result
+
+
+def accept_intent_path(master_path: Path) -> Path:
+    return Path(master_path).parent / "segments" / ACCEPT_INTENT
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _accept_chunk(buf: bytes, intent: Dict[str, Any]) -> bytes:
+    return intent["sep"].encode("utf-8") + buf[int(intent["skip"]) : int(intent["buffer_bytes"])]
+
+
+def recover_accept(master_path: Path, buffer_path: Path) -> Dict[str, Any]:
+    """Finishes an accept interrupted by a crash (see accept_buffer); {"action": "none"} without an intent."""
+    ip = accept_intent_path(master_path)
+    if not ip.exists():
+        return {"ok": True, "action": "none"}
+    try:
+        intent = json.loads(ip.read_text(encoding="utf-8"))
+    except Exception:
+        # intencja nie doszla do fsync: accept nie zdazyl niczego zmienic
+        ip.unlink()
+        return {"ok": True, "action": "dropped_torn_intent"}
+
+    master, buffer = DraftStore(master_path), DraftStore(buffer_path)
+    master.recover()
+    buffer.recover()
+    before, n = int(intent["master_before"]), int(intent["chunk_bytes"])
+    action = "completed"
+
+    if _sha(master.read_range(before, n)) != intent["chunk_sha256"] or master.size() < before + n:
+        buf = buffer.read_range(0, int(intent["buffer_bytes"]))
+        if master.size() != before or _sha(buf) != intent["buffer_sha256"]:
+            # ktos zmienil master/bufor po crashu: nie zgadujemy, intencja idzie do archiwum
+            os.replace(ip, ip.with_name(f"{intent.get('id', 'accept')}.stale.json"))
+            return {"ok": False, "action": "stale_intent", "intent": intent}
+        master.append(_accept_chunk(buf, intent).decode("utf-8"))
+        action = "rolled_forward"
+
+    if intent.get("clear"):
+        buffer.consume(int(intent["buffer_bytes"]), intent["buffer_sha256"])
+    ip.unlink()
+    return {"ok": True, "action": action, "id": intent.get("id"), "bytes": n}
+
+
+def accept_buffer(master_path: Path, buffer_path: Path, clear: bool = True) -> Dict[str, Any]:
+    """
+    Appends buffer.txt to master.txt ("\n" separator, none into an empty master) and optionally clears the
+    accepted bytes from the buffer. Cost O(buffer): master is never read or rewritten. Callers serialize
+    accepts per book (book lock); append()/consume() take the per-file locks themselves.
+    """
+    recovered = recover_accept(master_path, buffer_path)
+    master, buffer = DraftStore(master_path), DraftStore(buffer_path)
+    buffer.recover()
+    buf = buffer.read_range(0, buffer.size())
+    if not buf.strip():
+        return {"ok": False, "action": "buffer_empty", "recovery": recovered["action"]}
+
+    master.recover()
+    before = master.size()
+    skip = 0 if before else len(buf) - len(buf.lstrip(b"\n"))
+    intent = {
+        "id": uuid.uuid4().hex[:12],
+        "master_before": before,
+        "sep": "\n" if before else "",
+        "skip": skip,
+        "buffer_bytes": len(buf),
+        "buffer_sha256": _sha(buf),
+        "clear": bool(clear),
+        "created_at": _utc_now_iso(),
+    }
+    chunk = _accept_chunk(buf, intent)
+    intent.update(chunk_bytes=len(chunk), chunk_sha256=_sha(chunk))
+
+    ip = accept_intent_path(master_path)
+    ip.parent.mkdir(parents=True, exist_ok=True)
+    _fsync_write(ip, json.dumps(intent, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    res = master.append(chunk.decode("utf-8", errors="replace"))
+    consumed = buffer.consume(len(buf), intent["buffer_sha256"]) if clear else None
+    ip.unlink()
+    return {
+        "ok": True,
+        "action": "accepted",
+        "added_chars": len(buf.decode("utf-8", errors="replace")),
+        "bytes": len(chunk),
+        "master_bytes": before + len(chunk),
+        "seq": res["seq"],
+        "buffer_left": consumed["left"] if consumed and "left" in consumed else None,
+        "recovery": recovered["action"],
+    }
+
+
+def append_text(path: Path, text: str) -> Dict[str, Any]:
+    return DraftStore(path).append(text)
+
+
+def compact(path: Path) -> Dict[str, Any]:
+    return DraftStore(path).compact()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compact segmented draft store (materialize master.txt).")
+    ap.add_argument("--book", required=True)
+    ap.add_argument("--file", default="draft/master.txt", help="Relative path under book root")
+    args = ap.parse_args(argv)
+
+    from books_core import safe_book_root, safe_resolve_under
+
+    path = safe_resolve_under(safe_book_root(args.book), args.file)
+    print(json.dumps(compact(path), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
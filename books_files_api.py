@@ -3,13 +3,19 @@ from __future__ import annotations
 
 import os
 import re
+import zlib
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel, Field
 
+from app.http_cache import cache_headers, combine_etags, not_modified, path_stat, stat_etag
+from books_core import read_tail_text
+from books_draft_store import DraftStore
+from books_search_index import get_search_index
+
 router = APIRouter(prefix="/books", tags=["books-files"])
 
 _DEFAULT_BOOKS_ROOT = (Path(__file__).resolve().parent / "books").resolve()
@@ -43,21 +49,22 @@ def _safe_resolve_under(root: Path, rel: str) -> Path:
 
 
 def _read_text_file(path: Path, tail_lines: Optional[int] = None, tail_bytes: Optional[int] = None) -> str:
-    text = path.read_text(encoding="utf-8", errors="replace")
+    # tail_* czyta od konca pliku (seek), bez ladowania calego manuskryptu
     if tail_bytes is not None:
         if tail_bytes < 0 or tail_bytes > 5_000_000:
             raise HTTPException(status_code=400, detail={"code": "INVALID_TAIL_BYTES"})
         if tail_bytes == 0:
             return ""
-        return text[-tail_bytes:]
+        return read_tail_text(path, chars=tail_bytes)
     if tail_lines is not None:
         if tail_lines < 0 or tail_lines > 50_000:
             raise HTTPException(status_code=400, detail={"code": "INVALID_TAIL_LINES"})
         if tail_lines == 0:
             return ""
+        text = read_tail_text(path, lines=tail_lines)
         lines = text.splitlines()
         return "\n".join(lines[-tail_lines:]) + ("\n" if text.endswith("\n") else "")
-    return text
+    return path.read_text(encoding="utf-8", errors="replace")
 
 
 class FileReadResponse(BaseModel):
@@ -82,14 +89,40 @@ class InboxListResponse(BaseModel):
 
 
 @router.get("/book/{book}/master", response_model=FileReadResponse)
-def get_master(book: str, tail_lines: Optional[int] = Query(default=None), tail_bytes: Optional[int] = Query(default=None)):
+def get_master(
+    request: Request,
+    response: Response,
+    book: str,
+    tail_lines: Optional[int] = Query(default=None),
+    tail_bytes: Optional[int] = Query(default=None),
+):
     bdir = _book_dir(book)
     master_path = _safe_resolve_under(bdir, "draft/master.txt")
 
-    if not master_path.exists():
+    # ETag ze stat() (+ wariant tail_*): 304 bez czytania manuskryptu
+    st = path_stat(master_path)
+    etag = combine_etags([stat_etag(st)], variant=f"{tail_lines}:{tail_bytes}")
+    mtime = st.st_mtime if st is not None else None
+    hit = not_modified(request.headers, etag, mtime)
+    if hit is not None:
+        return hit
+    response.headers.update(cache_headers(etag, mtime))
+    response.headers["Accept-Ranges"] = "bytes"
+
+    if st is None:
         return FileReadResponse(path=str(master_path), exists=False, content="")
 
-    st = master_path.stat()
+    rng = request.headers.get("range")
+    if rng and tail_lines is None and tail_bytes is None and _if_range_ok(request.headers.get("if-range"), etag):
+        span = _parse_byte_range(rng, st.st_size)
+        if span is not None:
+            a, b = span
+            data = DraftStore(master_path).read_range(a, b - a + 1)
+            headers = cache_headers(etag, mtime)
+            headers["Accept-Ranges"] = "bytes"
+            headers["Content-Range"] = f"bytes {a}-{a + len(data) - 1}/{st.st_size}"
+            return Response(content=data, status_code=206, media_type="text/plain; charset=utf-8", headers=headers)
+
     content = _read_text_file(master_path, tail_lines=tail_lines, tail_bytes=tail_bytes)
     return FileReadResponse(
         path=str(master_path),
@@ -100,6 +133,169 @@ def get_master(book: str, tail_lines: Optional[int] = Query(default=None), tail_
     )
 
 
+# =========================
+# RANGE / DELTA / AKAPITY dla master.txt (edytory i monitory sledzace pisanie)
+#   GET /books/book/{book}/master + naglowek Range: bytes=a-b -> 206, surowe bajty (seek, bez czytania calosci)
+#   GET /books/book/{book}/master/delta?since=<cursor> -> to, co dopisano od kursora, + nowy kursor
+#   GET /books/book/{book}/master/paragraphs?start=&count= -> zakres akapitow z indeksu w pamieci
+#
+# Kursor = "<offset>.<crc32 ostatnich bajtow przed offsetem>". Jesli master zostal przepisany/obciety
+# (crc sie nie zgadza albo plik jest krotszy), delta zwraca reset=true i tresc od poczatku pliku.
+# =========================
+
+DELTA_MAX_BYTES = 4_000_000
+_CURSOR_CHECK = 64
+
+
+def _parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Single `bytes=` range -> (first, last) inclusive; None = ignore (serve 200); 416 when unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or "," in spec or not dash:
+        return None  # multi-range i inne jednostki: caly plik (RFC 9110 pozwala zignorowac Range)
+    try:
+        if first == "":
+            a, b = size - int(last), size - 1
+        else:
+            a, b = int(first), (int(last) if last else size - 1)
+    except ValueError:
+        return None
+    if first != "" and last and b < a:
+        return None  # bytes=5-2: bledna skladnia
+    if size == 0 or a >= size or b < a:
+        raise HTTPException(status_code=416, detail={"code": "RANGE_NOT_SATISFIABLE"}, headers={"Content-Range": f"bytes */{size}"})
+    return max(0, a), min(b, size - 1)
+
+
+def _if_range_ok(header: Optional[str], etag: str) -> bool:
+    # If-Range tylko z ETag (silne porownanie); inny/nieaktualny -> caly plik zamiast zakresu
+    return header is None or header.strip() == etag
+
+
+def _is_cont(byte: int) -> bool:
+    return (byte & 0xC0) == 0x80
+
+
+def _utf8_complete(data: bytes) -> int:
+    """Length of `data` without a trailing incomplete UTF-8 sequence."""
+    i = len(data)
+    while i > 0 and len(data) - i < 3 and _is_cont(data[i - 1]):
+        i -= 1
+    if i == 0:
+        return len(data)
+    lead = data[i - 1]
+    need = 1 if lead < 0xC0 else 2 if lead < 0xE0 else 3 if lead < 0xF0 else 4
+    return len(data) if len(data) - i + 1 >= need else i - 1
+
+
+def _cursor(offset: int, before: bytes) -> str:
+    return f"{offset}.{zlib.crc32(before) & 0xFFFFFFFF:08x}"
+
+
+def _parse_cursor(since: str) -> Tuple[int, Optional[int]]:
+    off, _, crc = (since or "0").strip().partition(".")
+    try:
+        return max(0, int(off)), (int(crc, 16) if crc else None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail={"code": "INVALID_CURSOR"})
+
+
+class MasterDeltaResponse(BaseModel):
+    path: str
+    exists: bool
+    size_bytes: int = 0
+    modified_utc: Optional[str] = None
+    offset: int = Field(default=0, description="Bajt, od ktorego zaczyna sie content.")
+    end: int = Field(default=0, description="Bajt za ostatnim zwroconym bajtem.")
+    cursor: str = Field(default="0", description="Przekaz jako ?since= w nastepnym wywolaniu.")
+    reset: bool = Field(default=False, description="Kursor nieaktualny (master przepisany): content od poczatku pliku.")
+    more: bool = Field(default=False, description="Jest wiecej danych niz max_bytes.")
+    content: str = ""
+
+
+class MasterParagraph(BaseModel):
+    para_index: int
+    char_start: int
+    text: str
+
+
+class MasterParagraphsResponse(BaseModel):
+    path: str
+    exists: bool
+    total: int = 0
+    items: List[MasterParagraph] = Field(default_factory=list)
+
+
+@router.get("/book/{book}/master/delta", response_model=MasterDeltaResponse)
+def get_master_delta(
+    book: str,
+    since: str = Query(default="0", description='Kursor z poprzedniej odpowiedzi albo sam offset w bajtach.'),
+    max_bytes: int = Query(default=DELTA_MAX_BYTES, ge=1, le=DELTA_MAX_BYTES),
+):
+    bdir = _book_dir(book)
+    master_path = _safe_resolve_under(bdir, "draft/master.txt")
+    st = path_stat(master_path)
+    if st is None:
+        return MasterDeltaResponse(path=str(master_path), exists=False)
+
+    offset, crc = _parse_cursor(since)
+    size = st.st_size
+    reset = offset > size
+    with master_path.open("rb") as f:
+        if not reset and crc is not None:
+            back = min(offset, _CURSOR_CHECK)
+            f.seek(offset - back)
+            reset = (zlib.crc32(f.read(back)) & 0xFFFFFFFF) != crc
+        if reset:
+            offset = 0
+        back = min(offset, _CURSOR_CHECK)
+        f.seek(offset - back)
+        before = f.read(back)
+        want = min(max_bytes, size - offset)
+        data = f.read(want + 3)  # +3: dokonczenie znaku UTF-8 przecietego przez max_bytes
+
+    keep = min(want, len(data))
+    while keep < len(data) and _is_cont(data[keep]):
+        keep += 1
+    # na koncu tylko pelne znaki (pisarz moze byc w trakcie zapisu wielobajtowego znaku)
+    data = data[:keep]
+    data = data[: _utf8_complete(data)]
+    end = offset + len(data)
+    return MasterDeltaResponse(
+        path=str(master_path),
+        exists=True,
+        size_bytes=size,
+        modified_utc=_utc_iso(st.st_mtime),
+        offset=offset,
+        end=end,
+        cursor=_cursor(end, (before + data)[-_CURSOR_CHECK:]),
+        reset=reset,
+        more=end < size,
+        content=data.decode("utf-8", errors="replace"),
+    )
+
+
+@router.get("/book/{book}/master/paragraphs", response_model=MasterParagraphsResponse)
+def get_master_paragraphs(
+    book: str,
+    start: int = Query(default=1, ge=1, description="Numer pierwszego akapitu (1-based, jak para_index w search)."),
+    count: int = Query(default=20, ge=1, le=1000),
+):
+    bdir = _book_dir(book)
+    master_path = _safe_resolve_under(bdir, "draft/master.txt")
+    if not master_path.exists():
+        return MasterParagraphsResponse(path=str(master_path), exists=False)
+
+    # indeks z books_search_index: po dopisaniu przetwarza tylko ogon, akapity trzyma w pamieci
+    res = get_search_index(master_path).paragraphs(start, count)
+    return MasterParagraphsResponse(
+        path=str(master_path),
+        exists=True,
+        total=res["total"],
+        items=[MasterParagraph(**p) for p in res["items"]],
+    )
+
+
 @router.get("/book/{book}/inbox", response_model=InboxListResponse)
 def list_inbox(book: str):
     bdir = _book_dir(book)
@@ -171,16 +367,17 @@ def get_notes(book: str, tail_lines: Optional[int] = Query(default=None), tail_b
 # =========================
 
 class MasterSearchRequest(BaseModel):
-    q: str = Field(..., description="Fraza do wyszukania (min 1 znak).")
+    q: str = Field(..., description='Zapytanie: słowa (wszystkie muszą wystąpić), "fraza", prefiks*. Bez rozróżniania polskich znaków.')
     limit: int = Field(default=10, ge=1, le=200, description="Maksymalna liczba wyników.")
     case_sensitive: bool = Field(default=False, description="Czy rozróżniać wielkość liter.")
-    in_paragraphs: bool = Field(default=True, description="Szukaj w akapitach (rozdzielonych pustą linią).")
+    in_paragraphs: bool = Field(default=True, description="True: akapity wg trafności (BM25); False: w kolejności tekstu, match_index od początku pliku.")
 
 
 class MasterSearchHit(BaseModel):
     para_index: int = Field(..., ge=1, description="Numer akapitu (1-based).")
     match_index: int = Field(..., ge=0, description="Pozycja znaku w akapicie (0-based).")
     excerpt: str = Field(..., description="Krótki fragment z kontekstem.")
+    score: float = Field(default=0.0, description="Trafność BM25 (0 przy wyszukiwaniu w kolejności tekstu).")
 
 
 class MasterSearchResponse(BaseModel):
@@ -188,6 +385,7 @@ class MasterSearchResponse(BaseModel):
     exists: bool
     total_hits: int = 0
     hits: List[MasterSearchHit] = Field(default_factory=list)
+    truncated: bool = Field(default=False, description="Prefiks* rozwinięty tylko do limitu termów: wyniki mogą być niepełne.")
 
 
 def _split_paragraphs(text: str) -> List[str]:
@@ -195,19 +393,8 @@ def _split_paragraphs(text: str) -> List[str]:
     return [p for p in parts if p.strip()]
 
 
-@router.post("/book/{book}/master/search", response_model=MasterSearchResponse)
-def master_search(book: str, payload: MasterSearchRequest):
-    bdir = _book_dir(book)
-    master_path = _safe_resolve_under(bdir, "draft/master.txt")
-
-    if not master_path.exists():
-        return MasterSearchResponse(path=str(master_path), exists=False, total_hits=0, hits=[])
-
-    raw = master_path.read_text(encoding="utf-8", errors="replace")
-    q = (payload.q or "").strip()
-    if not q:
-        raise HTTPException(status_code=400, detail={"code": "EMPTY_QUERY"})
-
+def _scan_search(master_path: Path, raw: str, q: str, payload: MasterSearchRequest) -> MasterSearchResponse:
+    # zapytanie bez slow (np. sama interpunkcja): dotychczasowe wyszukiwanie podciagu po calym pliku
     haystack = raw
     needle = q
 
@@ -264,3 +451,35 @@ def master_search(book: str, payload: MasterSearchRequest):
                 break
 
     return MasterSearchResponse(path=str(master_path), exists=True, total_hits=total_hits, hits=hits)
+
+
+@router.post("/book/{book}/master/search", response_model=MasterSearchResponse)
+def master_search(book: str, payload: MasterSearchRequest):
+    bdir = _book_dir(book)
+    master_path = _safe_resolve_under(bdir, "draft/master.txt")
+
+    if not master_path.exists():
+        return MasterSearchResponse(path=str(master_path), exists=False, total_hits=0, hits=[])
+
+    q = (payload.q or "").strip()
+    if not q:
+        raise HTTPException(status_code=400, detail={"code": "EMPTY_QUERY"})
+
+    # indeks w pamieci (books_search_index): bez czytania pliku, jesli master.txt sie nie zmienil
+    found = get_search_index(master_path).search(
+        q, limit=payload.limit, case_sensitive=payload.case_sensitive, ranked=payload.in_paragraphs
+    )
+    if found is None:
+        raw = master_path.read_text(encoding="utf-8", errors="replace")
+        return _scan_search(master_path, raw, q, payload)
+
+    hits = [
+        MasterSearchHit(
+            para_index=h["para_index"],
+            match_index=h["match_index"] if payload.in_paragraphs else h["offset"],
+            excerpt=h["excerpt"],
+            score=h["score"],
+        )
+        for h in found["hits"]
+    ]
+    return MasterSearchResponse(path=str(master_path), exists=True, total_hits=found["total_hits"], hits=hits, truncated=found["truncated"])
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import re
 from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter
@@ -11,11 +10,13 @@ from books_core import (
     safe_resolve_under,
     ensure_dir,
     make_run_id,
-    atomic_write_text,
     write_run,
     write_latest,
     read_text_safe,
 )
+from app.text_analysis import analyze
+from books_analysis_cache import analyze_book_text
+from books_run_journal import RunBatch
 
 router = APIRouter(prefix="/books/humanity", tags=["books.humanity"])
 
@@ -38,17 +39,6 @@ class HumanityCheckResp(BaseModel):
     writes: Dict[str, Any]
 
 
-_AIISH_PHRASES = [
-    "warto zauważyć",
-    "podsumowując",
-    "należy pamiętać",
-    "w dzisiejszych czasach",
-    "bez wątpienia",
-    "co więcej",
-    "warto dodać",
-]
-
-
 def _load_text(book_root, req: HumanityCheckReq) -> Tuple[str, str]:
     if req.text and req.text.strip():
         return req.text, "(inline)"
@@ -60,18 +50,7 @@ def _load_text(book_root, req: HumanityCheckReq) -> Tuple[str, str]:
 
 
 def _find_flags(text: str) -> List[str]:
-    t = text.lower()
-    flags: List[str] = []
-    for ph in _AIISH_PHRASES:
-        if ph in t:
-            flags.append(f"Możliwy schematyczny zwrot: **{ph}**")
-    if re.search(r"\n{4,}", text):
-        flags.append("Dziwne przerwy: 4+ pustych linii z rzędu.")
-    if text.count("—") + text.count("–") == 0 and len(text) > 1500:
-        flags.append("Brak pauz/dialogów (—/–). Jeśli to proza sceniczna, może być zbyt monolityczne.")
-    if re.search(r"\b(który|która|które)\b", t) and len(text) > 2000:
-        flags.append("Sprawdź nadmiar zdań względnych (który/która/które) – mogą wydłużać rytm.")
-    return flags[:25]
+    return analyze(text, ["humanity"])["humanity"]
 
 
 @router.post("/check", response_model=HumanityCheckResp)
@@ -87,7 +66,7 @@ def humanity_check(req: HumanityCheckReq):
         text, source = _load_text(book_root, req)
         fallback = not bool(text.strip())
 
-        flags = _find_flags(text) if text else []
+        flags = analyze_book_text(book_root, text, ["humanity"])["humanity"] if text else []
         md = ["# Humanity report", f"- book: `{req.book}`", f"- run_id: `{run_id}`", f"- source: `{source}`", ""]
         if fallback:
             md += ["(fallback) No input text found. Provide `text` or ensure `draft/master.txt` exists.", ""]
@@ -105,11 +84,11 @@ def humanity_check(req: HumanityCheckReq):
         report_md = "\n".join(md).strip() + "\n"
 
         report_md_rel = f"analysis/humanity_report_{run_id}.md"
-        report_md_path = safe_resolve_under(book_root, report_md_rel)
-        w_rmd = atomic_write_text(report_md_path, report_md)
+        batch = RunBatch(book_root)  # raport + latest + run = jeden zapis do dziennika runow
+        w_rmd = batch.write_text(report_md_rel, report_md)
 
         # latest (JSON stub auto)
-        w_latest = write_latest(book_root, "humanity", report_md, json_obj=None, raw_text=report_md)
+        w_latest = write_latest(book_root, "humanity", report_md, json_obj=None, raw_text=report_md, batch=batch)
 
         run_out = {
             "ok": True,
@@ -129,6 +108,7 @@ def humanity_check(req: HumanityCheckReq):
             role=role,
             input_obj=run_in,
             output_obj=run_out,
+            batch=batch,
         )
 
         return {
@@ -13,10 +13,9 @@ from books_core import (
     make_run_id,
     write_run,
     write_latest,
-    atomic_write_text,
-    atomic_write_json,
     read_text_safe,
 )
+from books_run_journal import RunBatch
 
 router = APIRouter(prefix="/books/humanity", tags=["books.humanity.llm"])
 
@@ -102,10 +101,11 @@ def humanity_stylist(req: StylistReq):
 
             report_md_rel = f"analysis/humanity_stylist_report_{run_id}.md"
             report_json_rel = f"analysis/humanity_stylist_report_{run_id}.json"
-            atomic_write_text(safe_resolve_under(book_root, report_md_rel), report_md)
-            atomic_write_json(safe_resolve_under(book_root, report_json_rel), report_json)
+            batch = RunBatch(book_root)
+            batch.write_text(report_md_rel, report_md)
+            batch.write_json(report_json_rel, report_json)
 
-            w_latest = write_latest(book_root, "stylist", report_md, json_obj=report_json, raw_text=raw_text)
+            w_latest = write_latest(book_root, "stylist", report_md, json_obj=report_json, raw_text=raw_text, batch=batch)
             run_written = write_run(
                 book_root=book_root,
                 run_id=run_id,
@@ -115,6 +115,7 @@ def humanity_stylist(req: StylistReq):
                 role=role,
                 input_obj=req.model_dump(),
                 output_obj={"ok": True, "fallback": True, "report_md": report_md_rel, "report_json": report_json_rel, "latest": w_latest.get("paths", {})},
+                batch=batch,
             )
 
             return {
@@ -144,10 +145,11 @@ def humanity_stylist(req: StylistReq):
 
         report_md_rel = f"analysis/humanity_stylist_report_{run_id}.md"
         report_json_rel = f"analysis/humanity_stylist_report_{run_id}.json"
-        atomic_write_text(safe_resolve_under(book_root, report_md_rel), report_md)
-        atomic_write_json(safe_resolve_under(book_root, report_json_rel), report_json)
+        batch = RunBatch(book_root)
+        batch.write_text(report_md_rel, report_md)
+        batch.write_json(report_json_rel, report_json)
 
-        w_latest = write_latest(book_root, "stylist", report_md, json_obj=report_json, raw_text=raw_text)
+        w_latest = write_latest(book_root, "stylist", report_md, json_obj=report_json, raw_text=raw_text, batch=batch)
         run_written = write_run(
             book_root=book_root,
             run_id=run_id,
@@ -157,6 +159,7 @@ def humanity_stylist(req: StylistReq):
             role=role,
             input_obj=req.model_dump(),
             output_obj={"ok": True, "fallback": True, "report_md": report_md_rel, "report_json": report_json_rel, "latest": w_latest.get("paths", {})},
+            batch=batch,
         )
 
         return {
@@ -180,7 +183,8 @@ def humanity_stylist(req: StylistReq):
     except Exception as e:
         # Nigdy ERROR — zawsze SUCCESS_FALLBACK
         report_md = f"## Summary\n(fallback) Exception: {e!r}\n"
-        w_latest = write_latest(book_root, "stylist", report_md, json_obj={"ok": True, "fallback": True, "error": repr(e)}, raw_text=report_md)
+        batch = RunBatch(book_root)
+        w_latest = write_latest(book_root, "stylist", report_md, json_obj={"ok": True, "fallback": True, "error": repr(e)}, raw_text=report_md, batch=batch)
         run_written = write_run(
             book_root=book_root,
             run_id=run_id,
@@ -190,6 +194,7 @@ def humanity_stylist(req: StylistReq):
             role=role,
             input_obj=req.model_dump(),
             output_obj={"ok": True, "fallback": True, "error": repr(e), "latest": w_latest.get("paths", {})},
+            batch=batch,
         )
         return {
             "ok": True,
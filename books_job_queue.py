@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Trwala kolejka jobow (SQLite, WAL) + pula workerow.
+#
+# Job: QUEUED -> RUNNING (lease: lease_owner + lease_expires, odnawiany heartbeatem) -> DONE / FAILED / CANCELLED.
+# claim() bierze najwyzszy priority, potem najstarszy, z pominieciem ksiazek, ktore maja juz job RUNNING
+# (serializacja per ksiazka). Job RUNNING z wygaslym lease (crash procesu/workera) wraca do QUEUED przy
+# nastepnym claim(), a po BOOKS_JOB_MAX_ATTEMPTS probach konczy jako FAILED. Tak samo job, ktorego handler
+# rzucil wyjatek (fail()): wraca do QUEUED, dopoki nie wyczerpie prob. Handler puli dostaje w job["lease"]
+# swoj Heartbeat; lease.check() miedzy krokami rzuca LeaseLost, gdy job przejal juz ktos inny.
+#   BOOKS_JOBS_DB          domyslnie <root>/jobs/queue.sqlite3
+#   BOOKS_JOB_WORKERS      liczba watkow puli (domyslnie 2)
+#   BOOKS_JOB_LEASE_S      dlugosc lease w sekundach (domyslnie 60; heartbeat co 1/3)
+#   BOOKS_JOB_MAX_ATTEMPTS domyslnie 3
+
+ROOT = Path(__file__).resolve().parent
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+DONE = "DONE"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    book TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_pick ON jobs(status, priority DESC, enqueued_at);
+CREATE INDEX IF NOT EXISTS ix_jobs_book ON jobs(book, status);
+CREATE INDEX IF NOT EXISTS ix_jobs_finished ON jobs(finished_at);
+"""
+
+
+class LeaseLost(RuntimeError):
+    """The worker no longer holds the job's lease (expired and taken over, or finished elsewhere)."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    d = dict(row)
+    try:
+        d["payload"] = json.loads(d.get("payload") or "{}")
+    except Exception:
+        d["payload"] = {}
+    return d
+
+
+def _pct(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))], 4)
+
+
+class JobQueue:
+    def __init__(self, db_path: Optional[Path] = None, *, max_attempts: Optional[int] = None):
+        self.db_path = Path(db_path or os.getenv("BOOKS_JOBS_DB") or (ROOT / "jobs" / "queue.sqlite3"))
+        self.max_attempts = max_attempts if max_attempts is not None else _env_int("BOOKS_JOB_MAX_ATTEMPTS", 3)
+        self._local = threading.local()
+        self._listeners: List[Callable[[], None]] = []
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def on_enqueue(self, fn: Callable[[], None]) -> None:
+        self._listeners.append(fn)
+
+    def enqueue(self, kind: str, book: str, payload: Dict[str, Any], *, priority: int = 0, job_id: Optional[str] = None) -> str:
+        """Adds a job; an existing job_id is left untouched (idempotent import)."""
+        job_id = job_id or uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT OR IGNORE INTO jobs(job_id, kind, book, priority, status, payload, enqueued_at) VALUES (?,?,?,?,?,?,?)",
+            (job_id, kind, book, int(priority), QUEUED, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        for fn in list(self._listeners):
+            try:
+                fn()
+            except Exception:
+                pass
+        return job_id
+
+    def _recover_expired(self, c: sqlite3.Connection, now: float) -> None:
+        c.execute(
+            "UPDATE jobs SET status=?, finished_at=?, error=COALESCE(error, 'LEASE_EXPIRED'), lease_owner=NULL, lease_expires=NULL "
+            "WHERE status=? AND lease_expires < ? AND attempts >= ?",
+            (FAILED, now, RUNNING, now, self.max_attempts),
+        )
+        c.execute(
+            "UPDATE jobs SET status=?, lease_owner=NULL, lease_expires=NULL WHERE status=? AND lease_expires < ?",
+            (QUEUED, RUNNING, now),
+        )
+
+    def claim(
+        self,
+        owner: str,
+        *,
+        lease_s: float,
+        kinds: Optional[Iterable[str]] = None,
+        book: Optional[str] = None,
+        job_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        where = ["j.status = ?", "NOT EXISTS (SELECT 1 FROM jobs r WHERE r.book = j.book AND r.status = ?)"]
+        args: List[Any] = [QUEUED, RUNNING]
+        kinds = list(kinds) if kinds is not None else None
+        if kinds is not None:
+            if not kinds:
+                return None
+            where.append(f"j.kind IN ({','.join('?' * len(kinds))})")
+            args.extend(kinds)
+        if book is not None:
+            where.append("j.book = ?")
+            args.append(book)
+        if job_id is not None:
+            where.append("j.job_id = ?")
+            args.append(job_id)
+
+        c = self._conn()
+        now = time.time()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            self._recover_expired(c, now)
+            row = c.execute(
+                f"SELECT j.job_id FROM jobs j WHERE {' AND '.join(where)} ORDER BY j.priority DESC, j.enqueued_at LIMIT 1",
+                args,
+            ).fetchone()
+            if row is None:
+                c.execute("COMMIT")
+                return None
+            c.execute(
+                "UPDATE jobs SET status=?, lease_owner=?, lease_expires=?, started_at=?, attempts=attempts+1 WHERE job_id=?",
+                (RUNNING, owner, now + lease_s, now, row["job_id"]),
+            )
+            job = c.execute("SELECT * FROM jobs WHERE job_id=?", (row["job_id"],)).fetchone()
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return _row_to_job(job)
+
+    def heartbeat(self, job_id: str, owner: str, lease_s: float) -> bool:
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_expires=? WHERE job_id=? AND lease_owner=? AND status=?",
+            (time.time() + lease_s, job_id, owner, RUNNING),
+        )
+        return cur.rowcount == 1
+
+    def finish(self, job_id: str, owner: str, status: str = DONE, error: Optional[str] = None) -> bool:
+        cur = self._conn().execute(
+            "UPDATE jobs SET status=?, finished_at=?, error=?, lease_owner=NULL, lease_expires=NULL "
+            "WHERE job_id=? AND lease_owner=? AND status=?",
+            (status, time.time(), error, job_id, owner, RUNNING),
+        )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        """Records a failed attempt: back to QUEUED while attempts < max_attempts, then FAILED."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status=CASE WHEN attempts < ? THEN ? ELSE ? END, "
+            "finished_at=CASE WHEN attempts < ? THEN NULL ELSE ? END, error=?, lease_owner=NULL, lease_expires=NULL "
+            "WHERE job_id=? AND lease_owner=? AND status=?",
+            (self.max_attempts, QUEUED, FAILED, self.max_attempts, time.time(), error, job_id, owner, RUNNING),
+        )
+        return cur.rowcount == 1
+
+    def holds(self, job_id: str, owner: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM jobs WHERE job_id=? AND lease_owner=? AND status=? AND lease_expires >= ?",
+            (job_id, owner, RUNNING, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def requeue(self, job_id: str, payload: Optional[Dict[str, Any]] = None) -> bool:
+        """Puts a FAILED job back in the queue (explicit retry); attempts start from zero."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status=?, payload=COALESCE(?, payload), enqueued_at=?, started_at=NULL, finished_at=NULL, "
+            "error=NULL, attempts=0, lease_owner=NULL, lease_expires=NULL WHERE job_id=? AND status=?",
+            (QUEUED, json.dumps(payload, ensure_ascii=False) if payload is not None else None, time.time(), job_id, FAILED),
+        )
+        return cur.rowcount == 1
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a job that has not started yet."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status=?, finished_at=? WHERE job_id=? AND status=?",
+            (CANCELLED, time.time(), job_id, QUEUED),
+        )
+        return cur.rowcount == 1
+
+    def is_book_busy(self, book: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM jobs WHERE book=? AND status=? AND lease_expires >= ? LIMIT 1", (book, RUNNING, time.time())
+        ).fetchone()
+        return row is not None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def metrics(self, last: int = 200) -> Dict[str, Any]:
+        c = self._conn()
+        now = time.time()
+        by_status = {r["status"]: r["n"] for r in c.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        queued_by_kind = {r["kind"]: r["n"] for r in c.execute("SELECT kind, COUNT(*) AS n FROM jobs WHERE status=? GROUP BY kind", (QUEUED,))}
+        oldest = c.execute("SELECT MIN(enqueued_at) AS t FROM jobs WHERE status=?", (QUEUED,)).fetchone()["t"]
+        rows = c.execute(
+            "SELECT enqueued_at, started_at, finished_at FROM jobs WHERE finished_at IS NOT NULL AND started_at IS NOT NULL "
+            "ORDER BY finished_at DESC LIMIT ?",
+            (last,),
+        ).fetchall()
+        waits = [r["started_at"] - r["enqueued_at"] for r in rows]
+        runs = [r["finished_at"] - r["started_at"] for r in rows]
+        return {
+            "depth": by_status.get(QUEUED, 0),
+            "running": by_status.get(RUNNING, 0),
+            "by_status": by_status,
+            "queued_by_kind": queued_by_kind,
+            "oldest_queued_age_s": round(now - oldest, 3) if oldest else None,
+            "wait_s": {"p50": _pct(waits, 0.5), "p95": _pct(waits, 0.95)},
+            "run_s": {"p50": _pct(runs, 0.5), "p95": _pct(runs, 0.95)},
+            "sample": len(rows),
+        }
+
+
+class Heartbeat:
+    """Keeps a job lease alive from a background thread while the body runs."""
+
+    def __init__(self, queue: JobQueue, job_id: str, owner: str, lease_s: float):
+        self.queue = queue
+        self.job_id = job_id
+        self.owner = owner
+        self.lease_s = lease_s
+        self._stop = threading.Event()
+        self._t: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(max(0.05, self.lease_s / 3)):
+            try:
+                self.queue.heartbeat(self.job_id, self.owner, self.lease_s)
+            except Exception:
+                pass
+
+    def check(self) -> None:
+        """Raises LeaseLost when the lease is gone; call between steps, before writing their results."""
+        if not self.queue.holds(self.job_id, self.owner):
+            raise LeaseLost(self.job_id)
+
+    def __enter__(self) -> "Heartbeat":
+        self._t = threading.Thread(target=self._run, name=f"job-hb-{self.job_id[:8]}", daemon=True)
+        self._t.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        if self._t is not None:
+            self._t.join()
+
+
+class JobWorkerPool:
+    def __init__(self, queue: JobQueue, *, workers: Optional[int] = None, lease_s: Optional[float] = None, idle_poll_s: float = 1.0):
+        self.queue = queue
+        self.workers = max(1, workers if workers is not None else _env_int("BOOKS_JOB_WORKERS", 2))
+        self.lease_s = float(lease_s if lease_s is not None else _env_int("BOOKS_JOB_LEASE_S", 60))
+        self.idle_poll_s = idle_poll_s
+        self.owner_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.done = 0
+        self.failed = 0
+        queue.on_enqueue(self._wake.set)
+
+    def register(self, kind: str, fn: Callable[[Dict[str, Any]], Any]) -> None:
+        self._handlers[kind] = fn
+        self._wake.set()
+
+    def start(self) -> "JobWorkerPool":
+        with self._lock:
+            if self._threads:
+                return self
+            self._stopping.clear()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._loop, args=(f"{self.owner_prefix}-w{i}",), name=f"books-job-w{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        self._wake.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for t in threads:
+            t.join(timeout)
+
+    def _loop(self, owner: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim(owner, lease_s=self.lease_s, kinds=list(self._handlers))
+            except Exception:
+                job = None
+            if job is None:
+                self._wake.wait(self.idle_poll_s)
+                self._wake.clear()
+                continue
+            # inny worker moze czekac na ten sam wake; po zakonczeniu joba ksiazka sie zwalnia
+            self._run_one(owner, job)
+            self._wake.set()
+
+    def _run_one(self, owner: str, job: Dict[str, Any]) -> None:
+        fn = self._handlers.get(job["kind"])
+        try:
+            with Heartbeat(self.queue, job["job_id"], owner, self.lease_s) as lease:
+                if fn is None:
+                    raise RuntimeError(f"no handler for job kind {job['kind']}")
+                fn({**job, "lease": lease})
+        except Exception as e:
+            # worker must never die; po LeaseLost fail() nic nie zmienia (job nalezy juz do innego workera)
+            self.failed += 1
+            self.queue.fail(job["job_id"], owner, repr(e))
+            return
+        self.done += 1
+        self.queue.finish(job["job_id"], owner, DONE)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for t in self._threads if t.is_alive()),
+            "kinds": sorted(self._handlers),
+            "lease_s": self.lease_s,
+            "done": self.done,
+            "failed": self.failed,
+        }
+
+
+_QUEUE: Optional[JobQueue] = None
+_POOL: Optional[JobWorkerPool] = None
+_GUARD = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    global _QUEUE
+    with _GUARD:
+        if _QUEUE is None:
+            _QUEUE = JobQueue()
+        return _QUEUE
+
+
+def get_pool() -> JobWorkerPool:
+    global _POOL
+    q = get_queue()
+    with _GUARD:
+        if _POOL is None:
+            _POOL = JobWorkerPool(q)
+        return _POOL
+
+
+def reset(db_path: Optional[Path] = None, **pool_kwargs: Any) -> JobWorkerPool:
+    """Stops the current pool and switches to a fresh queue/pool (tests, benchmarks)."""
+    global _QUEUE, _POOL
+    with _GUARD:
+        old = _POOL
+        _QUEUE = JobQueue(db_path)
+        _POOL = JobWorkerPool(_QUEUE, **pool_kwargs)
+    if old is not None:
+        old.stop()
+    return _POOL
@@ -8,6 +8,9 @@ from typing import Any, Dict
 
 from fastapi import APIRouter, HTTPException
 
+from app.lock_manager import get_lock_manager
+from books_api import agent_lock_name
+
 router = APIRouter(prefix="/books", tags=["books"])
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -37,19 +40,18 @@ def get_job(job_id: str) -> Dict[str, Any]:
 def get_book_lock(book: str) -> Dict[str, Any]:
     book = _safe_book_id(book)
     lf = BOOKS_DIR / book / "_active.lock"
-    if not lf.exists():
+    holder = get_lock_manager().holder(agent_lock_name(book))
+    if holder is None:
         return {"book": book, "locked": False, "lock_path": str(lf), "job_id": None}
-    job_id = lf.read_text(encoding="utf-8", errors="replace").strip() or "UNKNOWN"
-    return {"book": book, "locked": True, "lock_path": str(lf), "job_id": job_id}
+    return {"book": book, "locked": True, "lock_path": str(lf), "job_id": str(holder.get("owner") or "UNKNOWN")}
 
 
 @router.post("/book/{book}/lock/clear")
 def clear_book_lock(book: str) -> Dict[str, Any]:
     book = _safe_book_id(book)
     lf = BOOKS_DIR / book / "_active.lock"
-    existed = lf.exists()
-    if existed:
-        lf.unlink(missing_ok=True)
+    existed = get_lock_manager().force_release(agent_lock_name(book)) or lf.exists()
+    lf.unlink(missing_ok=True)
     return {"book": book, "cleared": True, "existed": existed, "lock_path": str(lf)}
 
 
@@ -7,11 +7,14 @@ import re
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional, List, Literal
+from typing import Any, Dict, Optional, List, Literal, Tuple
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel, Field
 
+from app.http_cache import cache_headers, combine_etags, not_modified, path_stat, stat_etag
+from books_notes_log import LOG_NAME as NOTES_LOG_NAME, NotesCorrupt, NotesLog, get_notes_log
+
 router = APIRouter(prefix="/books", tags=["books-memory"])
 
 _DEFAULT_BOOKS_ROOT = (Path(__file__).resolve().parent / "books").resolve()
@@ -86,6 +89,7 @@ class Meta(BaseModel):
     exists: bool
     size_bytes: int = 0
     modified_utc: Optional[str] = None
+    etag: Optional[str] = None
 
 
 class JsonResp(BaseModel):
@@ -107,14 +111,15 @@ class WriteText(BaseModel):
 
 
 def _meta(path: Path) -> Meta:
-    if not path.exists():
-        return Meta(path=str(path), exists=False)
-    st = path.stat()
+    st = path_stat(path)
+    if st is None:
+        return Meta(path=str(path), exists=False, etag=stat_etag(None))
     return Meta(
         path=str(path),
         exists=True,
         size_bytes=st.st_size,
         modified_utc=_utc_iso(st.st_mtime),
+        etag=stat_etag(st),
     )
 
 
@@ -180,7 +185,8 @@ def set_summary(book: str, payload: WriteText):
 
 
 # =========================
-#  NOTES (NADZÓR) -> memory/notes.json
+#  NOTES (NADZÓR) -> memory/notes.json + memory/notes.log.jsonl (books_notes_log)
+#  add/update/delete = 1 linia w logu; GET czyta z indeksu w pamięci (filtry + paginacja)
 # =========================
 
 LocatorKind = Literal["PHRASE", "PARAGRAPH", "SCENE", "CHARACTER"]
@@ -220,45 +226,79 @@ class NotesReplace(BaseModel):
     notes: List[Note] = Field(default_factory=list)
 
 
+class NoteUpdate(BaseModel):
+    type: Optional[str] = None
+    severity: Optional[Severity] = None
+    scope: Optional[Scope] = None
+    locator: Optional[NoteLocator] = None
+    text: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+
+class NotesResp(JsonResp):
+    total: Optional[int] = None
+
+
+# view=all: jak dawniej cala lista w odpowiedzi (O(n)); view=note: tylko zmieniona notatka (O(1))
+NotesView = Literal["all", "note"]
+
+
 def _notes_path(book: str) -> Path:
     return _mem_path(book, "notes.json")
 
 
-def _read_notes(book: str) -> List[dict]:
+def _notes_log(book: str) -> NotesLog:
     p = _notes_path(book)
-    data = _read_json(p)
-    if data is None:
-        return []
-    if isinstance(data, list):
-        return [x for x in data if isinstance(x, dict)]
-    raise HTTPException(status_code=500, detail={"code": "NOTES_CORRUPT", "path": str(p)})
+    try:
+        log = get_notes_log(p.parent)
+        log.refresh()  # uszkodzony log wychodzi tu (NOTES_CORRUPT), nie w srodku operacji
+        return log
+    except NotesCorrupt:
+        raise HTTPException(status_code=500, detail={"code": "NOTES_CORRUPT", "path": str(p)})
+
+
+def _read_notes(book: str) -> List[dict]:
+    return _notes_log(book).all()
 
 
 def _write_notes(book: str, notes: List[dict]) -> None:
-    p = _notes_path(book)
-    _atomic_write_json(p, notes)
+    _notes_log(book).replace(notes)
 
 
-@router.get("/book/{book}/memory/notes", response_model=JsonResp)
-def get_notes(book: str):
+def _notes_resp(book: str, view: NotesView, note: Any = None) -> NotesResp:
     p = _notes_path(book)
-    return JsonResp(meta=_meta(p), data=_read_notes(book))
+    if view == "note":
+        return NotesResp(meta=_meta(p), data=note)
+    return NotesResp(meta=_meta(p), data=_read_notes(book))
+
+
+@router.get("/book/{book}/memory/notes", response_model=NotesResp)
+def get_notes(
+    book: str,
+    tag: Optional[str] = Query(None),
+    scope: Optional[Scope] = Query(None),
+    severity: Optional[Severity] = Query(None),
+    type: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description="substring of note text (case-insensitive)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    p = _notes_path(book)
+    res = _notes_log(book).query(tag=tag, scope=scope, severity=severity, type=type, q=q, limit=limit, offset=offset)
+    return NotesResp(meta=_meta(p), data=res["items"], total=res["total"])
 
 
-@router.post("/book/{book}/memory/notes", response_model=JsonResp)
+@router.post("/book/{book}/memory/notes", response_model=NotesResp)
 def replace_notes(book: str, payload: NotesReplace):
-    p = _notes_path(book)
     notes = [n.model_dump() for n in payload.notes]
     _write_notes(book, notes)
-    return JsonResp(meta=_meta(p), data=_read_notes(book))
+    return _notes_resp(book, "all")
 
 
-@router.post("/book/{book}/memory/notes/add", response_model=JsonResp)
-def add_note(book: str, payload: NoteAdd):
-    p = _notes_path(book)
+@router.post("/book/{book}/memory/notes/add", response_model=NotesResp)
+def add_note(book: str, payload: NoteAdd, view: NotesView = Query("all")):
     now = _utc_iso(datetime.now(timezone.utc).timestamp())
 
-    notes = _read_notes(book)
     note = Note(
         id=str(uuid.uuid4()),
         type=payload.type,
@@ -271,18 +311,23 @@ def add_note(book: str, payload: NoteAdd):
         updated_utc=now,
     ).model_dump()
 
-    notes.append(note)
-    _write_notes(book, notes)
-    return JsonResp(meta=_meta(p), data=_read_notes(book))
+    return _notes_resp(book, view, _notes_log(book).add(note))
 
 
-@router.post("/book/{book}/memory/notes/{note_id}/delete", response_model=JsonResp)
-def delete_note(book: str, note_id: str):
-    p = _notes_path(book)
-    notes = _read_notes(book)
-    new_notes = [n for n in notes if str(n.get("id")) != note_id]
-    _write_notes(book, new_notes)
-    return JsonResp(meta=_meta(p), data=_read_notes(book))
+@router.post("/book/{book}/memory/notes/{note_id}/update", response_model=NotesResp)
+def update_note(book: str, note_id: str, payload: NoteUpdate, view: NotesView = Query("all")):
+    fields = payload.model_dump(exclude_unset=True)
+    fields["updated_utc"] = _utc_iso(datetime.now(timezone.utc).timestamp())
+    note = _notes_log(book).update(note_id, fields)
+    if note is None:
+        raise HTTPException(status_code=404, detail={"code": "NOTE_NOT_FOUND", "id": note_id})
+    return _notes_resp(book, view, note)
+
+
+@router.post("/book/{book}/memory/notes/{note_id}/delete", response_model=NotesResp)
+def delete_note(book: str, note_id: str, view: NotesView = Query("all")):
+    deleted = _notes_log(book).delete(note_id)
+    return _notes_resp(book, view, {"id": note_id, "deleted": deleted})
 
 
 # =========================
@@ -307,6 +352,21 @@ class BulkMemoryWrite(BaseModel):
     notes: Optional[List[Note]] = None
 
 
+_BULK_FILES = ("canon.json", "decisions.json", "bans.json", "summary.md", "notes.json", NOTES_LOG_NAME)
+
+
+def _bulk_etags(book: str) -> Tuple[Dict[str, str], Optional[float]]:
+    """Per-file ETags (stat only) and newest mtime for the bulk response."""
+    tags: Dict[str, str] = {}
+    mtime: Optional[float] = None
+    for name in _BULK_FILES:
+        st = path_stat(_mem_path(book, name))
+        tags[name] = stat_etag(st)
+        if st is not None and (mtime is None or st.st_mtime > mtime):
+            mtime = st.st_mtime
+    return tags, mtime
+
+
 def _bulk_read(book: str) -> BulkMemoryResp:
     p_canon = _mem_path(book, "canon.json")
     p_dec = _mem_path(book, "decisions.json")
@@ -318,7 +378,11 @@ def _bulk_read(book: str) -> BulkMemoryResp:
     decisions = JsonResp(meta=_meta(p_dec), data=_read_json(p_dec))
     bans = JsonResp(meta=_meta(p_bans), data=_read_json(p_bans))
     summary = TextResp(meta=_meta(p_sum), text=_read_text(p_sum, tail_lines=None))
-    notes = JsonResp(meta=_meta(p_notes), data=_read_notes(book))
+    # notatki = snapshot + log: ETag sekcji z obu plikow
+    notes_log = _notes_log(book)
+    notes_meta = _meta(p_notes)
+    notes_meta.etag = combine_etags([notes_meta.etag or "", stat_etag(path_stat(notes_log.log_path))])
+    notes = JsonResp(meta=notes_meta, data=notes_log.all())
 
     return BulkMemoryResp(
         canon=canon,
@@ -330,7 +394,14 @@ def _bulk_read(book: str) -> BulkMemoryResp:
 
 
 @router.get("/book/{book}/memory/bulk", response_model=BulkMemoryResp)
-def get_memory_bulk(book: str):
+def get_memory_bulk(request: Request, response: Response, book: str):
+    # ETag calosci = hash ETagow sekcji; 304 bez czytania zadnego z pieciu plikow
+    tags, mtime = _bulk_etags(book)
+    etag = combine_etags(tags.values())
+    hit = not_modified(request.headers, etag, mtime)
+    if hit is not None:
+        return hit
+    response.headers.update(cache_headers(etag, mtime))
     return _bulk_read(book)
 
 
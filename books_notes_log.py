@@ -0,0 +1,406 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.lock_manager import file_lock
+
+# Notatki nadzoru (memory/notes.json) jako log zdarzen + skompaktowany snapshot.
+#
+#   memory/notes.json        - snapshot: lista notatek (ten sam format co dawniej, czytelny dla starych narzedzi)
+#   memory/notes.log.jsonl   - zdarzenia po snapshocie, 1 linia JSON: op=add|update|delete
+#
+# add/update/delete = jedna linia dopisana do logu + zmiana indeksu w pamieci (id, tag, scope, severity, type),
+# bez czytania i przepisywania calego pliku. Zdarzenia sa idempotentne (upsert/usun po id), wiec powtorne
+# odtworzenie logu na snapshocie, ktory juz je zawiera (crash w trakcie kompakcji), daje ten sam stan.
+#
+# Kompakcja (co NOTES_COMPACT_EVERY zdarzen, w watku w tle): snapshot pisany poza lockiem z kopii stanu,
+# potem pod lockiem podmiana notes.json i przeniesienie do nowego logu tylko zdarzen dopisanych w miedzyczasie.
+# Zmiany z innego procesu wykrywa refresh(): inny snapshot (stat) = pelne przeladowanie, dluzszy log = doczytanie.
+# Miedzy procesami: file_lock(memory/.notes.lock) na refresh+dopisanie, na odczyt ogona+podmiane w kompakcji
+# i na doczytanie logu (sam stat bez zmian idzie bez locka). Cala linia logu, ktorej nie da sie odczytac,
+# to NotesCorrupt, nie cicho pominiete zdarzenie.
+
+SNAPSHOT_NAME = "notes.json"
+LOG_NAME = "notes.log.jsonl"
+LOCK_NAME = ".notes.lock"
+COMPACT_EVERY = int(os.getenv("NOTES_COMPACT_EVERY", "500") or 500)
+FSYNC = (os.getenv("NOTES_FSYNC", "0") or "0") == "1"
+
+INDEXED = ("tags", "scope", "severity", "type")
+
+
+class NotesCorrupt(ValueError):
+    pass
+
+
+def _stamp(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _keys(note: Dict[str, Any], field: str) -> Iterable[str]:
+    v = note.get(field)
+    if field == "tags":
+        return [str(t) for t in v] if isinstance(v, list) else []
+    return [str(v)] if v is not None else []
+
+
+class NotesLog:
+    def __init__(self, mem_dir: Path, compact_every: Optional[int] = None):
+        self.mem_dir = Path(mem_dir)
+        self.snapshot_path = self.mem_dir / SNAPSHOT_NAME
+        self.log_path = self.mem_dir / LOG_NAME
+        self.compact_every = COMPACT_EVERY if compact_every is None else int(compact_every)
+        self._lock = threading.RLock()
+        self._notes: Dict[str, Dict[str, Any]] = {}  # kolejnosc wstawienia = kolejnosc listy
+        self._order: Dict[str, int] = {}
+        self._next = 0
+        self._gen = 0  # +1 przy kazdej podmianie snapshotu/logu
+        self._index: Dict[str, Dict[str, Set[str]]] = {f: {} for f in INDEXED}
+        self._snap_stamp: Optional[Tuple[int, int, int]] = None
+        self._log_ino: Optional[int] = None
+        self._held = 0  # glebokosc file_lock w tym obiekcie (pod self._lock)
+        self._log_end = 0
+        self._log_events = 0
+        self._compactor: Optional[threading.Thread] = None
+        self.compactions = 0
+        with self._exclusive():
+            self._load()
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        # lock miedzyprocesowy katalogu memory (bez katalogu nie ma czego chronic; zapisy tworza go wczesniej)
+        with self._lock:
+            if self._held or not self.mem_dir.is_dir():
+                self._held += 1
+                try:
+                    yield
+                finally:
+                    self._held -= 1
+                return
+            with file_lock(self.mem_dir / LOCK_NAME):
+                self._held = 1
+                try:
+                    yield
+                finally:
+                    self._held = 0
+
+    # -------------------------
+    # stan w pamieci
+    # -------------------------
+    def _unindex(self, note: Dict[str, Any]) -> None:
+        nid = str(note.get("id"))
+        for f in INDEXED:
+            for k in _keys(note, f):
+                ids = self._index[f].get(k)
+                if ids is not None:
+                    ids.discard(nid)
+                    if not ids:
+                        del self._index[f][k]
+
+    def _put(self, note: Dict[str, Any]) -> None:
+        nid = str(note.get("id"))
+        old = self._notes.get(nid)
+        if old is not None:
+            self._unindex(old)
+        else:
+            self._order[nid] = self._next
+            self._next += 1
+        self._notes[nid] = note
+        for f in INDEXED:
+            for k in _keys(note, f):
+                self._index[f].setdefault(k, set()).add(nid)
+
+    def _drop(self, nid: str) -> Optional[Dict[str, Any]]:
+        old = self._notes.pop(nid, None)
+        if old is not None:
+            self._unindex(old)
+            del self._order[nid]
+        return old
+
+    def _apply(self, ev: Dict[str, Any]) -> None:
+        op = ev.get("op")
+        if op == "add" and isinstance(ev.get("note"), dict):
+            self._put(ev["note"])
+        elif op == "update" and str(ev.get("id")) in self._notes:
+            # nowy dict (nie mutacja): kompakcja serializuje kopie listy poza lockiem
+            self._put({**self._notes[str(ev["id"])], **(ev.get("fields") or {})})
+        elif op == "delete":
+            self._drop(str(ev.get("id")))
+
+    def _reset(self) -> None:
+        self._notes = {}
+        self._order = {}
+        self._gen += 1
+        self._index = {f: {} for f in INDEXED}
+        self._log_end = 0
+        self._log_events = 0
+        self._log_ino = None
+
+    def _load(self) -> None:
+        self._reset()
+        self._snap_stamp = _stamp(self.snapshot_path)
+        if self._snap_stamp is not None:
+            try:
+                data = json.loads(self.snapshot_path.read_text(encoding="utf-8-sig", errors="replace"))
+            except json.JSONDecodeError as e:
+                raise NotesCorrupt(f"{self.snapshot_path}: {e}")
+            if not isinstance(data, list):
+                raise NotesCorrupt(f"{self.snapshot_path}: not a list")
+            for n in data:
+                if isinstance(n, dict) and n.get("id") is not None:
+                    self._put(n)
+        self._replay(truncate_torn=True)
+
+    def _replay(self, truncate_torn: bool = False) -> None:
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            self._log_ino = os.fstat(f.fileno()).st_ino
+            f.seek(self._log_end)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        pos = self._log_end
+        for ln in data[:end].split(b"\n")[:-1]:
+            if ln.strip():
+                try:
+                    ev = json.loads(ln.decode("utf-8"))
+                except ValueError as e:
+                    raise NotesCorrupt(f"{self.log_path}: bad event at byte {pos}: {e}")
+                if not isinstance(ev, dict):
+                    raise NotesCorrupt(f"{self.log_path}: bad event at byte {pos}: not an object")
+                self._apply(ev)
+                self._log_events += 1
+            pos += len(ln) + 1
+        self._log_end += end
+        if truncate_torn and end < len(data):
+            # urwana ostatnia linia (crash w trakcie zapisu): zdarzenie nie zostalo zatwierdzone
+            with open(self.log_path, "r+b") as f:
+                f.truncate(self._log_end)
+
+    def _changed(self) -> bool:
+        if _stamp(self.snapshot_path) != self._snap_stamp:
+            return True
+        try:
+            st = self.log_path.stat()
+        except OSError:
+            return self._log_end > 0
+        return st.st_size != self._log_end or (self._log_ino is not None and st.st_ino != self._log_ino)
+
+    def refresh(self) -> None:
+        """Picks up writes made by other processes (O(1) stat when nothing changed)."""
+        with self._lock:
+            if not self._held and not self._changed():
+                return
+            with self._exclusive():
+                # pod lockiem nikt nie dopisuje ani nie podmienia plikow; inny log (inode) albo krotszy = od nowa
+                log = _stamp(self.log_path)
+                size = log[2] if log is not None else 0
+                swapped = log is not None and self._log_ino is not None and log[0] != self._log_ino
+                if _stamp(self.snapshot_path) != self._snap_stamp or swapped or size < self._log_end:
+                    self._load()
+                elif size > self._log_end:
+                    self._replay(truncate_torn=True)
+
+    # -------------------------
+    # zapis
+    # -------------------------
+    def _append(self, ev: Dict[str, Any]) -> None:
+        # wolane pod _exclusive() po refresh(): koniec logu na dysku == self._log_end
+        line = (json.dumps(ev, ensure_ascii=False, sort_keys=True) + "\n").encode("utf-8")
+        fd = os.open(str(self.log_path), os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            if os.fstat(fd).st_size != self._log_end:
+                os.ftruncate(fd, self._log_end)  # urwana linia po crashu innego procesu
+            os.write(fd, line)
+            if FSYNC:
+                os.fsync(fd)
+            self._log_ino = os.fstat(fd).st_ino
+        finally:
+            os.close(fd)
+        self._log_end += len(line)
+        self._log_events += 1
+        self._apply(ev)
+        if self.compact_every > 0 and self._log_events >= self.compact_every:
+            self._compact_in_background()
+
+    def add(self, note: Dict[str, Any]) -> Dict[str, Any]:
+        note = dict(note)
+        note.setdefault("id", str(uuid.uuid4()))
+        self.mem_dir.mkdir(parents=True, exist_ok=True)
+        with self._exclusive():
+            self.refresh()
+            self._append({"op": "add", "note": note})
+            return self._notes[str(note["id"])]
+
+    def update(self, note_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        fields = {k: v for k, v in fields.items() if k != "id"}
+        self.mem_dir.mkdir(parents=True, exist_ok=True)
+        with self._exclusive():
+            self.refresh()
+            if note_id not in self._notes:
+                return None
+            self._append({"op": "update", "id": note_id, "fields": fields})
+            return self._notes[note_id]
+
+    def delete(self, note_id: str) -> bool:
+        self.mem_dir.mkdir(parents=True, exist_ok=True)
+        with self._exclusive():
+            self.refresh()
+            if note_id not in self._notes:
+                return False
+            self._append({"op": "delete", "id": note_id})
+            return True
+
+    def replace(self, notes: List[Dict[str, Any]]) -> None:
+        """Whole-list write (POST /notes, bulk): new snapshot, empty log."""
+        self.mem_dir.mkdir(parents=True, exist_ok=True)
+        with self._exclusive():
+            self._reset()
+            for n in notes:
+                self._put(dict(n))
+            self._write_snapshot(notes, log_tail=b"")
+
+    # -------------------------
+    # kompakcja
+    # -------------------------
+    def _write_snapshot(self, notes: List[Dict[str, Any]], log_tail: bytes) -> None:
+        self.mem_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.snapshot_path.with_name(f".{SNAPSHOT_NAME}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps(notes, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        self._swap(tmp, log_tail)
+
+    def _swap(self, snapshot_tmp: Path, log_tail: bytes) -> None:
+        # kolejnosc: snapshot, potem log. Crash pomiedzy = nowy snapshot + stary log -> odtworzenie idempotentne
+        os.replace(snapshot_tmp, self.snapshot_path)
+        log_tmp = self.log_path.with_name(f".{LOG_NAME}.{uuid.uuid4().hex}.tmp")
+        log_tmp.write_bytes(log_tail)
+        os.replace(log_tmp, self.log_path)
+        self._gen += 1
+        self._snap_stamp = _stamp(self.snapshot_path)
+        self._log_ino = _stamp(self.log_path)[0]  # type: ignore[index]
+        self._log_end = len(log_tail)
+        self._log_events = log_tail.count(b"\n")
+
+    def compact(self) -> Dict[str, Any]:
+        """Folds the log into notes.json; writers are only blocked for the final swap."""
+        with self._lock:
+            self.refresh()
+            notes = list(self._notes.values())
+            off, gen = self._log_end, self._gen
+        tmp = self.snapshot_path.with_name(f".{SNAPSHOT_NAME}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps(notes, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        with self._exclusive():
+            # pod lockiem: zaden proces nie dopisze linii miedzy odczytem ogona a podmiana logu
+            self.refresh()
+            if gen != self._gen:
+                # w miedzyczasie ktos podmienil snapshot/log (replace, inny proces): ta kopia jest nieaktualna
+                tmp.unlink()
+                return {"ok": False, "reason": "superseded"}
+            tail = b""
+            if self.log_path.exists():
+                with open(self.log_path, "rb") as f:
+                    f.seek(off)
+                    tail = f.read(self._log_end - off)
+            folded = self._log_events - tail.count(b"\n")
+            self._swap(tmp, tail)
+            self.compactions += 1
+            return {"ok": True, "notes": len(notes), "events_folded": folded, "events_left": self._log_events}
+
+    def _compact_in_background(self) -> None:
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+
+        def run() -> None:
+            try:
+                self.compact()
+            except Exception:
+                pass  # log zostaje zrodlem prawdy; sprobujemy przy nastepnym progu
+
+        self._compactor = threading.Thread(target=run, name="notes-compact", daemon=True)
+        self._compactor.start()
+
+    def wait_compaction(self, timeout: Optional[float] = None) -> None:
+        t = self._compactor
+        if t is not None:
+            t.join(timeout)
+
+    # -------------------------
+    # odczyt
+    # -------------------------
+    def get(self, note_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.refresh()
+            return self._notes.get(note_id)
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.refresh()
+            return list(self._notes.values())
+
+    def query(
+        self,
+        *,
+        tag: Optional[str] = None,
+        scope: Optional[str] = None,
+        severity: Optional[str] = None,
+        type: Optional[str] = None,
+        q: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """Notes matching every given filter, in insertion order: {"items", "total"}."""
+        with self._lock:
+            self.refresh()
+            sets = [self._index[f].get(v, set()) for f, v in (("tags", tag), ("scope", scope), ("severity", severity), ("type", type)) if v]
+            if sets:
+                ids = set.intersection(*sorted(sets, key=len))
+                notes = [self._notes[i] for i in sorted(ids, key=self._order.__getitem__)]
+            else:
+                notes = list(self._notes.values())
+        qq = (q or "").strip().lower()
+        if qq:
+            notes = [n for n in notes if qq in str(n.get("text") or "").lower()]
+        total = len(notes)
+        page = notes[offset:] if limit is None else notes[offset : offset + limit]
+        return {"items": page, "total": total}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "notes": len(self._notes),
+                "log_events": self._log_events,
+                "log_bytes": self._log_end,
+                "compactions": self.compactions,
+                "tags": len(self._index["tags"]),
+            }
+
+
+_LOGS: Dict[str, NotesLog] = {}
+_LOGS_LOCK = threading.Lock()
+
+
+def get_notes_log(mem_dir: Path) -> NotesLog:
+    key = str(Path(mem_dir).resolve())
+    with _LOGS_LOCK:
+        log = _LOGS.get(key)
+        if log is None:
+            log = NotesLog(Path(key))
+            _LOGS[key] = log
+        return log
+
+
+def reset_notes_logs() -> None:
+    with _LOGS_LOCK:
+        _LOGS.clear()
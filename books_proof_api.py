@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import re
 from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter
@@ -11,12 +10,13 @@ from books_core import (
     safe_resolve_under,
     ensure_dir,
     make_run_id,
-    atomic_write_text,
-    atomic_write_json,
     write_run,
     write_latest,
     read_text_safe,
 )
+from app.text_analysis import analyze
+from books_analysis_cache import analyze_book_text
+from books_run_journal import RunBatch
 
 router = APIRouter(prefix="/books/proof", tags=["books.proof"])
 
@@ -40,10 +40,6 @@ class ProofCheckResp(BaseModel):
     writes: Dict[str, Any]
 
 
-_WORD_RE = re.compile(r"\b[\wĄĆĘŁŃÓŚŹŻąćęłńóśźż]+\b", re.UNICODE)
-_REPEAT_WORD_RE = re.compile(r"\b([\wĄĆĘŁŃÓŚŹŻąćęłńóśźż]+)\s+\1\b", re.IGNORECASE | re.UNICODE)
-
-
 def _load_text(book_root, req: ProofCheckReq) -> Tuple[str, str]:
     if req.text and req.text.strip():
         return req.text, "(inline)"
@@ -55,39 +51,7 @@ def _load_text(book_root, req: ProofCheckReq) -> Tuple[str, str]:
 
 
 def _proof_issues(text: str, max_issues: int) -> List[Dict[str, Any]]:
-    issues: List[Dict[str, Any]] = []
-    lines = text.splitlines() or [""]
-
-    def add(tp: str, line_no: int, snippet: str, msg: str):
-        if len(issues) >= max_issues:
-            return
-        issues.append({"type": tp, "line": line_no, "snippet": snippet[:180], "message": msg})
-
-    for i, line in enumerate(lines, start=1):
-        if line.rstrip("\n\r\t ") != line:
-            add("TRAILING_WS", i, line, "Trailing whitespace")
-
-        if "  " in line:
-            add("DOUBLE_SPACE", i, line, "Double space found")
-
-        if re.search(r"\s+[.,;:!?]", line):
-            add("SPACE_BEFORE_PUNCT", i, line, "Space before punctuation")
-
-        if re.search(r"[.,;:!?]{2,}", line):
-            add("MULTI_PUNCT", i, line, "Multiple punctuation marks in a row")
-
-        m = _REPEAT_WORD_RE.search(line)
-        if m:
-            add("REPEAT_WORD", i, line, f"Repeated word: '{m.group(1)}'")
-
-    # Global checks
-    if "\t" in text:
-        add("TAB_CHAR", 0, "\\t", "Tab characters present (prefer spaces)")
-
-    if "\u00A0" in text:
-        add("NBSP", 0, "NBSP", "Non-breaking spaces present")
-
-    return issues
+    return analyze(text, ["proof"], proof={"max_issues": max_issues})["proof"]["issues"]
 
 
 @router.post("/check", response_model=ProofCheckResp)
@@ -103,12 +67,10 @@ def proof_check(req: ProofCheckReq):
         text, source = _load_text(book_root, req)
         fallback = not bool(text.strip())
 
-        issues = _proof_issues(text, req.max_issues) if text else []
-        words = _WORD_RE.findall(text) if text else []
+        report = analyze_book_text(book_root, text, ["proof"], proof={"max_issues": req.max_issues})["proof"]
+        issues = report["issues"] if text else []
         stats = {
-            "chars": len(text),
-            "lines": len(text.splitlines()) if text else 0,
-            "words": len(words),
+            **report["stats"],
             "issues": len(issues),
             "source": source,
         }
@@ -139,14 +101,13 @@ def proof_check(req: ProofCheckReq):
         # per-run report files
         report_md_rel = f"analysis/proof_report_{run_id}.md"
         report_json_rel = f"analysis/proof_report_{run_id}.json"
-        report_md_path = safe_resolve_under(book_root, report_md_rel)
-        report_json_path = safe_resolve_under(book_root, report_json_rel)
+        batch = RunBatch(book_root)  # raporty + latest + run = jeden zapis do dziennika runow
 
-        w_rmd = atomic_write_text(report_md_path, report_md)
-        w_rjson = atomic_write_json(report_json_path, report_json)
+        w_rmd = batch.write_text(report_md_rel, report_md)
+        w_rjson = batch.write_json(report_json_rel, report_json)
 
         # latest
-        w_latest = write_latest(book_root, "proof", report_md, json_obj=report_json, raw_text=report_md)
+        w_latest = write_latest(book_root, "proof", report_md, json_obj=report_json, raw_text=report_md, batch=batch)
 
         # run log
         run_out = {
@@ -167,6 +128,7 @@ def proof_check(req: ProofCheckReq):
             role=role,
             input_obj=run_in,
             output_obj=run_out,
+            batch=batch,
         )
 
         preview = report_md[:500]
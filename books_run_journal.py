@@ -0,0 +1,472 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.lock_manager import file_lock
+from books_core import atomic_write_json, atomic_write_text, ensure_dir, safe_resolve_under, utc_now_iso
+
+# Dziennik runow ksiazki: books/<book>/runs/.journal/ (append-only), zamiast folderu runs/<run_id>/ na run.
+#
+# Jedno wywolanie narzedzia (proof/critic/humanity/draft_cleanup/architect) to jeden rekord:
+# meta + input + output + wszystkie pliki, ktore dotad szly osobnymi atomic_write (analysis/*_report_<id>.*,
+# analysis/<kind>_latest.*). Koszt zapisu = jeden os.write() na otwartym segmencie, bez tmp+rename.
+#
+# Uklad na dysku:
+#   runs/.journal/000001.seg  - ramki [magic "RJ01" | len u32 | crc32 u32 | JSON], rekordy op=run|files|forget
+#   runs/.journal/000001.idx  - indeks zamknietego segmentu (run_id/plik -> offset), pisany przy rotacji
+#
+# Segment rotuje po RUN_JOURNAL_SEGMENT_MB. Aktywny segment jest skanowany przy otwarciu (ucieta ramka po
+# crashu jest obcinana) i doczytywany przyrostowo, gdy urosnie (zapis z innego procesu).
+# Zapis (refresh + rotacja + os.write) i obcinanie ucietej ramki ida pod file_lock(runs/.journal/.lock),
+# wiec offset rekordu to zawsze koniec segmentu widziany pod lockiem, takze przy wielu procesach.
+#
+# Legacy pliki (runs/<id>/{meta,input,output}.json, raporty, *_latest.*) powstaja leniwie: materialize_run()
+# / materialize_path() wolaja API runow i artefaktow, zanim przeczytaja plik z dysku.
+# RUN_JOURNAL=0 przywraca stary zapis plik-po-pliku.
+
+JOURNAL_DIR = ".journal"
+SEGMENT_BYTES = int(float(os.getenv("RUN_JOURNAL_SEGMENT_MB", "16") or 16) * 1024 * 1024)
+FSYNC = (os.getenv("RUN_JOURNAL_FSYNC", "0") or "0") == "1"
+RUN_FILES = ("meta", "input", "output")
+
+_MAGIC = b"RJ01"
+_HEADER = struct.Struct("<4sII")
+
+Loc = Tuple[int, int, int]  # (segment, offset ramki, dlugosc payloadu)
+
+
+def journal_enabled() -> bool:
+    return (os.getenv("RUN_JOURNAL", "1") or "1") != "0"
+
+
+def _frame(record: Dict[str, Any]) -> bytes:
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def _scan(path: Path, start: int = 0) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """Yields (offset, payload length, record) for every intact frame from `start`; stops at a torn one."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        off = start
+        while True:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                return
+            magic, n, crc = _HEADER.unpack(head)
+            payload = f.read(n) if magic == _MAGIC else b""
+            if magic != _MAGIC or len(payload) < n or zlib.crc32(payload) != crc:
+                return
+            try:
+                rec = json.loads(payload.decode("utf-8"))
+            except Exception:
+                return
+            yield off, n, rec
+            off += _HEADER.size + n
+
+
+def _file_value(entry: Dict[str, Any]) -> Tuple[str, Any]:
+    return ("json", entry["json"]) if "json" in entry else ("text", entry.get("text", ""))
+
+
+class _SegmentIndex:
+    """run_id/file -> location for one segment, in record order (forget drops earlier entries)."""
+
+    def __init__(self) -> None:
+        self.runs: Dict[str, Tuple[int, int]] = {}
+        self.files: Dict[str, Tuple[int, int]] = {}
+        self.forgotten: List[str] = []
+
+    def add(self, off: int, n: int, rec: Dict[str, Any]) -> None:
+        op = rec.get("op")
+        if op == "forget":
+            rid = str(rec.get("run_id") or "")
+            self.runs.pop(rid, None)
+            self.forgotten.append(rid)
+            return
+        if op == "run":
+            self.runs[str(rec.get("run_id"))] = (off, n)
+        for rel in (rec.get("files") or {}):
+            self.files[rel] = (off, n)
+
+    def to_json(self, size: int) -> Dict[str, Any]:
+        return {"size": size, "runs": self.runs, "files": self.files, "forgotten": self.forgotten}
+
+    @classmethod
+    def from_json(cls, obj: Dict[str, Any]) -> "_SegmentIndex":
+        ix = cls()
+        ix.runs = {k: (int(v[0]), int(v[1])) for k, v in (obj.get("runs") or {}).items()}
+        ix.files = {k: (int(v[0]), int(v[1])) for k, v in (obj.get("files") or {}).items()}
+        ix.forgotten = [str(x) for x in (obj.get("forgotten") or [])]
+        return ix
+
+
+class RunJournal:
+    def __init__(self, book_root: Path, segment_bytes: Optional[int] = None):
+        self.book_root = Path(book_root)
+        self.dir = self.book_root / "runs" / JOURNAL_DIR
+        self.segment_bytes = int(segment_bytes or SEGMENT_BYTES)
+        self._lock = threading.RLock()
+        self._runs: Dict[str, Loc] = {}
+        self._files: Dict[str, Loc] = {}
+        self._fresh: set = set()  # pliki zmaterializowane od ostatniego zapisu do dziennika (w tym procesie)
+        self._seg = 0
+        self._end = 0
+        self._active = _SegmentIndex()
+        self._held = 0  # glebokosc file_lock w tym obiekcie (pod self._lock)
+        self.appends = 0
+        self.materialized = 0
+        self._load()
+
+    # -------------------------
+    # indeks
+    # -------------------------
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        # miedzyprocesowy lock dziennika; wolany pod self._lock, zagniezdzenie (refresh -> _load) bez deadlocka
+        with self._lock:
+            if self._held:
+                self._held += 1
+                try:
+                    yield
+                finally:
+                    self._held -= 1
+                return
+            ensure_dir(self.dir)
+            with file_lock(self.dir / ".lock"):
+                self._held = 1
+                try:
+                    yield
+                finally:
+                    self._held = 0
+
+    def _seg_path(self, seg: int) -> Path:
+        return self.dir / f"{seg:06d}.seg"
+
+    def _idx_path(self, seg: int) -> Path:
+        return self.dir / f"{seg:06d}.idx"
+
+    def _segments(self) -> List[int]:
+        if not self.dir.exists():
+            return []
+        return sorted(int(p.stem) for p in self.dir.glob("*.seg") if p.stem.isdigit())
+
+    def _apply(self, seg: int, ix: _SegmentIndex) -> None:
+        for rid in ix.forgotten:
+            self._runs.pop(rid, None)
+        for rid, (off, n) in ix.runs.items():
+            self._runs[rid] = (seg, off, n)
+        for rel, (off, n) in ix.files.items():
+            self._files[rel] = (seg, off, n)
+            self._fresh.discard(rel)
+
+    def _sealed_index(self, seg: int) -> _SegmentIndex:
+        path, idx = self._seg_path(seg), self._idx_path(seg)
+        try:
+            obj = json.loads(idx.read_text(encoding="utf-8"))
+            if int(obj.get("size", -1)) == path.stat().st_size:
+                return _SegmentIndex.from_json(obj)
+        except Exception:
+            pass
+        ix = _SegmentIndex()
+        for off, n, rec in _scan(path):
+            ix.add(off, n, rec)
+        atomic_write_json(idx, ix.to_json(path.stat().st_size))
+        return ix
+
+    def _load(self) -> None:
+        self._runs.clear()
+        self._files.clear()
+        self._fresh.clear()
+        segs = self._segments()
+        for seg in segs[:-1]:
+            self._apply(seg, self._sealed_index(seg))
+        self._seg = segs[-1] if segs else 1
+        self._active = _SegmentIndex()
+        self._end = 0
+        path = self._seg_path(self._seg)
+        if path.exists():
+            self._scan_active()
+            if path.stat().st_size > self._end:
+                with self._exclusive():
+                    # pod lockiem nikt nie jest w trakcie zapisu: co zostalo za ostatnia cala ramka to crash
+                    self._scan_active()
+                    if path.stat().st_size > self._end:
+                        with open(path, "r+b") as f:
+                            f.truncate(self._end)
+
+    def _scan_active(self) -> None:
+        fresh = _SegmentIndex()
+        for off, n, rec in _scan(self._seg_path(self._seg), self._end):
+            self._active.add(off, n, rec)
+            fresh.add(off, n, rec)
+            self._end = off + _HEADER.size + n
+        self._apply(self._seg, fresh)
+
+    def refresh(self) -> None:
+        """Picks up records appended by other processes (new frames in the active segment or a rotation)."""
+        with self._lock:
+            while True:
+                path = self._seg_path(self._seg)
+                try:
+                    size = path.stat().st_size
+                except OSError:
+                    size = 0
+                if size < self._end:
+                    # dziennik usuniety/obciety poza nami (np. skasowana ksiazka): indeks od nowa
+                    self._load()
+                    return
+                if size > self._end:
+                    self._scan_active()
+                if not self._seg_path(self._seg + 1).exists():
+                    return
+                self._seg += 1
+                self._active = _SegmentIndex()
+                self._end = 0
+
+    def stamp(self) -> str:
+        """Changes whenever a record is appended (used by the runs catalog to notice journal writes)."""
+        with self._lock:
+            self.refresh()
+            return f"{self._seg}:{self._end}"
+
+    # -------------------------
+    # zapis
+    # -------------------------
+    def _rotate(self) -> None:
+        atomic_write_json(self._idx_path(self._seg), self._active.to_json(self._end))
+        self._seg += 1
+        self._active = _SegmentIndex()
+        self._end = 0
+
+    def append(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        data = _frame(record)
+        with self._exclusive():
+            self.refresh()
+            if self._end and self._end + len(data) > self.segment_bytes:
+                self._rotate()
+            path = self._seg_path(self._seg)
+            fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                if os.fstat(fd).st_size != self._end:
+                    # ucieta ramka po crashu innego procesu: zapis musi trafic dokladnie w self._end
+                    os.ftruncate(fd, self._end)
+                os.write(fd, data)
+                if FSYNC:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            off, n = self._end, len(data) - _HEADER.size
+            ix = _SegmentIndex()
+            ix.add(off, n, record)
+            self._active.add(off, n, record)
+            self._apply(self._seg, ix)
+            self._end = off + len(data)
+            self.appends += 1
+        rel = path.relative_to(self.book_root).as_posix()
+        return {"ok": True, "mode": "journal_append", "segment": rel, "offset": off, "bytes": len(data)}
+
+    def append_run(
+        self,
+        run_id: str,
+        meta: Dict[str, Any],
+        input_obj: Any,
+        output_obj: Any,
+        files: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        return self.append({"op": "run", "run_id": run_id, "meta": meta, "input": input_obj, "output": output_obj, "files": files or {}})
+
+    def append_files(self, files: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        return self.append({"op": "files", "ts": utc_now_iso(), "files": files})
+
+    def forget(self, run_id: str) -> bool:
+        """Tombstones a journaled run (its files stay in the segment until the segment is dropped)."""
+        with self._lock:
+            self.refresh()
+            if run_id not in self._runs:
+                return False
+            self.append({"op": "forget", "run_id": run_id})
+            return True
+
+    # -------------------------
+    # odczyt
+    # -------------------------
+    def _read(self, loc: Loc) -> Dict[str, Any]:
+        seg, off, n = loc
+        with open(self._seg_path(seg), "rb") as f:
+            f.seek(off + _HEADER.size)
+            return json.loads(f.read(n).decode("utf-8"))
+
+    def run_ids(self) -> List[str]:
+        with self._lock:
+            self.refresh()
+            return list(self._runs)
+
+    def has_run(self, run_id: str) -> bool:
+        with self._lock:
+            self.refresh()
+            return run_id in self._runs
+
+    def read_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """{"meta", "input", "output", "files"} of a journaled run, or None."""
+        with self._lock:
+            self.refresh()
+            loc = self._runs.get(run_id)
+        if loc is None:
+            return None
+        rec = self._read(loc)
+        return {k: rec.get(k) for k in RUN_FILES + ("files",)}
+
+    def iter_runs(self, run_ids: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for rid in run_ids:
+            rec = self.read_run(rid)
+            if rec is not None:
+                yield rid, rec
+
+    # -------------------------
+    # materializacja legacy plikow
+    # -------------------------
+    def _write_file(self, rel: str, entry: Dict[str, Any]) -> None:
+        kind, value = _file_value(entry)
+        target = safe_resolve_under(self.book_root, rel)
+        w = atomic_write_json(target, value) if kind == "json" else atomic_write_text(target, value)
+        if not w.get("ok"):
+            raise OSError(f"materialize {rel}: {w.get('error')}")
+        self.materialized += 1
+
+    def _is_fresh(self, rel: str) -> bool:
+        return rel in self._fresh and (self.book_root / rel).exists()
+
+    def materialize_run(self, run_id: str) -> bool:
+        """Writes runs/<id>/{meta,input,output}.json (+ files this run still owns) if they are missing."""
+        run_dir = self.book_root / "runs" / run_id
+        if (run_dir / "meta.json").exists():
+            return True
+        with self._lock:
+            self.refresh()
+            loc = self._runs.get(run_id)
+            if loc is None:
+                return False
+            rec = self._read(loc)
+            for name in ("input", "output", "meta"):  # meta ostatni: jego obecnosc = run kompletny
+                self._write_file(f"runs/{run_id}/{name}.json", {"json": rec.get(name)})
+            for rel, entry in (rec.get("files") or {}).items():
+                if self._files.get(rel) == loc and not self._is_fresh(rel):
+                    self._write_file(rel, entry)
+                    self._fresh.add(rel)
+        return True
+
+    def materialize_path(self, rel: str) -> bool:
+        """Makes book-relative `rel` current on disk if the journal holds it; False if it does not."""
+        rel = Path(rel).as_posix()
+        parts = rel.split("/")
+        if len(parts) == 3 and parts[0] == "runs" and parts[2] in ("meta.json", "input.json", "output.json"):
+            return self.materialize_run(parts[1])
+        with self._lock:
+            self.refresh()
+            loc = self._files.get(rel)
+            if loc is None:
+                return False
+            if not self._is_fresh(rel):
+                self._write_file(rel, self._read(loc)["files"][rel])
+                self._fresh.add(rel)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "segments": len(self._segments()),
+                "active_segment": self._seg,
+                "active_bytes": self._end,
+                "runs": len(self._runs),
+                "files": len(self._files),
+                "appends": self.appends,
+                "materialized": self.materialized,
+            }
+
+
+class RunBatch:
+    """
+    Collects the files of one tool invocation so write_latest()/write_run() can commit them with the run
+    record as a single journal append. With RUN_JOURNAL=0 every write goes straight to disk, as before.
+    """
+
+    def __init__(self, book_root: Path):
+        self.book_root = Path(book_root)
+        self.journal = journal_enabled()
+        self.files: Dict[str, Dict[str, Any]] = {}
+
+    def _put(self, rel: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        safe_resolve_under(self.book_root, rel)
+        self.files[Path(rel).as_posix()] = entry
+        return {"ok": True, "mode": "journal_pending"}
+
+    def write_text(self, rel: str, text: str) -> Dict[str, Any]:
+        if not self.journal:
+            return atomic_write_text(safe_resolve_under(self.book_root, rel), text)
+        return self._put(rel, {"text": text})
+
+    def write_json(self, rel: str, obj: Any) -> Dict[str, Any]:
+        if not self.journal:
+            return atomic_write_json(safe_resolve_under(self.book_root, rel), obj)
+        return self._put(rel, {"json": obj})
+
+
+_JOURNALS: Dict[str, RunJournal] = {}
+_JOURNALS_LOCK = threading.Lock()
+
+
+def get_journal(book_root: Path) -> RunJournal:
+    key = str(Path(book_root).resolve())
+    with _JOURNALS_LOCK:
+        j = _JOURNALS.get(key)
+        if j is None:
+            j = RunJournal(Path(key))
+            _JOURNALS[key] = j
+        return j
+
+
+def reset_journals() -> None:
+    with _JOURNALS_LOCK:
+        _JOURNALS.clear()
+
+
+def has_journal(book_root: Path) -> bool:
+    return (Path(book_root) / "runs" / JOURNAL_DIR).is_dir()
+
+
+def materialize_run(book_root: Path, run_id: str) -> bool:
+    """Best-effort: legacy run folder for API readers; True when runs/<id>/meta.json is (now) on disk."""
+    if (Path(book_root) / "runs" / run_id / "meta.json").exists():
+        return True
+    if not has_journal(book_root):
+        return False
+    try:
+        return get_journal(book_root).materialize_run(run_id)
+    except Exception:
+        return False
+
+
+def materialize_path(book_root: Path, rel: str) -> bool:
+    if not has_journal(book_root):
+        return False
+    try:
+        return get_journal(book_root).materialize_path(rel)
+    except Exception:
+        return False
+
+
+def forget_journaled_run(book_root: Path, run_id: str) -> bool:
+    if not has_journal(book_root):
+        return False
+    try:
+        return get_journal(book_root).forget(run_id)
+    except Exception:
+        return False
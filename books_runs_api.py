@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from books_core import safe_book_root, safe_resolve_under, read_text_safe
+from books_runs_catalog import get_catalog
+from books_run_journal import materialize_run
 
 router = APIRouter(prefix="/books/book/{book}", tags=["books.runs"])
 
@@ -22,6 +24,7 @@ class RunsListResp(BaseModel):
     ok: bool
     items: List[RunItem]
     total: int
+    next_cursor: Optional[str] = None
 
 class RunDetailResp(BaseModel):
     ok: bool
@@ -41,46 +44,32 @@ def _preview_from_output(output_json: Any, max_len: int = 240) -> str:
                 return v.strip()[:max_len]
     return ""
 
-def _iter_runs(root: Path) -> List[Dict[str, Any]]:
-    runs_dir = root / "runs"
-    if not runs_dir.exists():
-        return []
-    out: List[Dict[str, Any]] = []
-    for run_folder in runs_dir.iterdir():
-        if not run_folder.is_dir():
-            continue
-        meta_path = run_folder / "meta.json"
-        input_path = run_folder / "input.json"
-        output_path = run_folder / "output.json"
-        if not meta_path.exists():
-            continue
-        try:
-            meta = _load_json(meta_path)
-        except Exception:
-            continue
-
-        output_obj = None
-        try:
-            if output_path.exists():
-                output_obj = _load_json(output_path)
-        except Exception:
-            output_obj = None
-
-        out.append({
-            "run_id": meta.get("run_id", run_folder.name),
-            "role": meta.get("role", ""),
-            "title": meta.get("title", ""),
-            "status": meta.get("status", ""),
-            "created_at": meta.get("created_at", ""),
-            "paths": meta.get("paths", {
-                "meta": str(meta_path.relative_to(root)),
-                "input": str(input_path.relative_to(root)),
-                "output": str(output_path.relative_to(root)),
-            }),
-            "preview": _preview_from_output(output_obj) if output_obj is not None else "",
-        })
-    out.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return out
+def _catalog_item(r: Dict[str, Any]) -> Dict[str, Any]:
+    run_id = r["run_id"]
+    return {
+        "run_id": run_id,
+        "role": r["role"],
+        "title": r["title"],
+        "status": r["status"],
+        "created_at": r["created_at"],
+        "paths": r["paths"] if r["paths"] is not None else {
+            "meta": f"runs/{run_id}/meta.json",
+            "input": f"runs/{run_id}/input.json",
+            "output": f"runs/{run_id}/output.json",
+        },
+        "preview": _preview_from_output(r["previews"]),
+    }
+
+def _query_runs(root: Path, limit: int, offset: int, cursor: Optional[str], **filters: Any) -> Dict[str, Any]:
+    if not (root / "runs").exists():
+        return {"ok": True, "items": [], "total": 0, "next_cursor": None}
+    try:
+        # jak dawny _iter_runs: najnowsze po created_at, tylko runy z meta.json
+        res = get_catalog(root).query(limit=limit, offset=offset, cursor=cursor, exact=True, order="created", **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    items = [_catalog_item(r) for r in res["items"]]
+    return {"ok": True, "items": items, "total": res["total"], "next_cursor": res["next_cursor"]}
 
 @router.get("/runs_query", response_model=RunsListResp)
 def runs_query(
@@ -90,34 +79,26 @@ def runs_query(
     role: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (keyset pagination)"),
 ):
     root = safe_book_root(book)
-    items = _iter_runs(root)
-
-    if q:
-        qq = q.lower()
-        items = [x for x in items if (qq in (x.get("title","").lower() + " " + x.get("status","").lower() + " " + x.get("role","").lower()))]
-    if status:
-        items = [x for x in items if x.get("status") == status]
-    if role:
-        items = [x for x in items if x.get("role") == role]
-
-    total = len(items)
-    sliced = items[offset: offset + limit]
-    return {"ok": True, "items": sliced, "total": total}
+    return _query_runs(root, limit, offset, cursor, q=q, q_fields=("title", "status", "role"), status=status, role=role)
 
 @router.get("/runs", response_model=RunsListResp)
-def runs_list(book: str, limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0)):
+def runs_list(
+    book: str,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (keyset pagination)"),
+):
     root = safe_book_root(book)
-    items = _iter_runs(root)
-    total = len(items)
-    sliced = items[offset: offset + limit]
-    return {"ok": True, "items": sliced, "total": total}
+    return _query_runs(root, limit, offset, cursor)
 
 @router.get("/runs/{run_id}", response_model=RunDetailResp)
 def run_detail(book: str, run_id: str):
     root = safe_book_root(book)
     run_dir = safe_resolve_under(root, f"runs/{run_id}")
+    materialize_run(root, run_dir.name)
     if not run_dir.exists() or not run_dir.is_dir():
         raise HTTPException(status_code=404, detail="run not found")
 
@@ -0,0 +1,446 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Katalog runow ksiazki: books/<book>/runs_catalog.sqlite3 (WAL), jeden wiersz na books/<book>/runs/<run_id>/.
+#
+# Listy /runs i /runs_query czytaja stad zamiast parsowac meta.json + output.json kazdego runu:
+# filtr po role/status na indeksie, kolejnosc run_id DESC (jak dawny skan folderow) albo order="created"
+# (created_ts DESC, run_id DESC), paginacja offset albo keyset (cursor), wyszukiwanie q przez FTS5
+# (tokenizer trigram = dopasowanie podciagu jak dawne `in`).
+# Folder bez meta.json (np. zapis w toku) ma wiersz zastepczy has_meta=0 z pustymi polami: /runs_query
+# pokazuje go (pola null, jak dawny skan), pozostale listy go pomijaja; sync() podmienia go, gdy meta sie pojawi.
+#
+# Zapis: books_core.write_run, books_runs_store.create_run i POST /books/book/{book}/runs wolaja record_run().
+# Runy zapisane inna droga (albo usuniete z dysku) wylapuje sync(): jeden stat katalogu runs/ na zapytanie,
+# a przy zmianie mtime diff nazw folderow z katalogiem (JSON czytany tylko dla nowych runow).
+# Runy z dziennika (books_run_journal, runs/.journal/) nie maja folderu: sync() bierze ich run_id z indeksu
+# dziennika, a stempel obejmuje rozmiar aktywnego segmentu (zapis z innego procesu tez wymusza diff).
+#
+#   python -m books_runs_catalog rebuild [book ...]   # pelny backfill z folderow (bez argumentow: wszystkie)
+
+ROOT = Path(__file__).resolve().parent
+CATALOG_NAME = "runs_catalog.sqlite3"
+
+# klucze output.json, z ktorych API buduja preview (kazde API ma wlasna kolejnosc)
+PREVIEW_KEYS = ("preview", "summary", "message", "status_message", "note", "result")
+PREVIEW_MAX = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    role TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    status TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    model TEXT,
+    title TEXT NOT NULL DEFAULT '',
+    tool TEXT,
+    created_at TEXT NOT NULL DEFAULT '',
+    created_ts REAL NOT NULL DEFAULT 0,
+    paths TEXT,
+    previews TEXT,
+    preview TEXT NOT NULL DEFAULT '',
+    has_meta INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS ix_runs_order ON runs(created_ts DESC, run_id DESC);
+CREATE INDEX IF NOT EXISTS ix_runs_role ON runs(role, created_ts DESC, run_id DESC);
+CREATE INDEX IF NOT EXISTS ix_runs_status ON runs(status, created_ts DESC, run_id DESC);
+CREATE INDEX IF NOT EXISTS ix_runs_role_id ON runs(role, run_id DESC);
+CREATE INDEX IF NOT EXISTS ix_runs_status_id ON runs(status, run_id DESC);
+CREATE TABLE IF NOT EXISTS state (k TEXT PRIMARY KEY, v TEXT);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5(
+    role, title, status, preview, content='runs', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS runs_fts_ai AFTER INSERT ON runs BEGIN
+    INSERT INTO runs_fts(rowid, role, title, status, preview) VALUES (new.rowid, new.role, new.title, new.status, new.preview);
+END;
+CREATE TRIGGER IF NOT EXISTS runs_fts_ad AFTER DELETE ON runs BEGIN
+    INSERT INTO runs_fts(runs_fts, rowid, role, title, status, preview) VALUES ('delete', old.rowid, old.role, old.title, old.status, old.preview);
+END;
+CREATE TRIGGER IF NOT EXISTS runs_fts_au AFTER UPDATE ON runs BEGIN
+    INSERT INTO runs_fts(runs_fts, rowid, role, title, status, preview) VALUES ('delete', old.rowid, old.role, old.title, old.status, old.preview);
+    INSERT INTO runs_fts(rowid, role, title, status, preview) VALUES (new.rowid, new.role, new.title, new.status, new.preview);
+END;
+"""
+
+_SEARCH_FIELDS = ("role", "title", "status", "preview")
+ORDERS = ("run_id", "created")
+
+
+def _parse_ts(value: Any) -> Optional[float]:
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
+
+
+def _read_json(p: Path) -> Any:
+    try:
+        return json.loads(p.read_text(encoding="utf-8", errors="replace"))
+    except Exception:
+        return None
+
+
+def _previews(output_obj: Any) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    if isinstance(output_obj, dict):
+        for k in PREVIEW_KEYS:
+            v = output_obj.get(k)
+            if isinstance(v, str) and v.strip():
+                out[k] = v.strip()[:PREVIEW_MAX]
+    return out
+
+
+def _encode_cursor(key: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str, order: str) -> List[Any]:
+    """[run_id] for order="run_id", [created_ts, run_id] for order="created"."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        if order == "created":
+            ts, run_id = key
+            return [float(ts), str(run_id)]
+        (run_id,) = key
+        return [str(run_id)]
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def _row_to_item(row: sqlite3.Row) -> Dict[str, Any]:
+    d = dict(row)
+    for k in ("paths", "previews"):
+        try:
+            v = json.loads(d.get(k) or "null")
+        except Exception:
+            v = None
+        d[k] = v if isinstance(v, dict) else None if k == "paths" else {}
+    return d
+
+
+class RunCatalog:
+    def __init__(self, book_root: Path):
+        self.book_root = Path(book_root)
+        self.runs_dir = self.book_root / "runs"
+        self.db_path = self.book_root / CATALOG_NAME
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        c = self._conn()
+        c.executescript(_SCHEMA)
+        if "has_meta" not in {r["name"] for r in c.execute("PRAGMA table_info(runs)")}:
+            # katalog sprzed wierszy zastepczych
+            c.execute("ALTER TABLE runs ADD COLUMN has_meta INTEGER NOT NULL DEFAULT 1")
+        try:
+            c.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # sqlite bez fts5/trigram (< 3.34): q idzie przez LIKE
+            self.fts = False
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def _state(self, k: str) -> Optional[str]:
+        row = self._conn().execute("SELECT v FROM state WHERE k=?", (k,)).fetchone()
+        return row["v"] if row else None
+
+    def _set_state(self, k: str, v: str) -> None:
+        self._conn().execute("INSERT OR REPLACE INTO state(k, v) VALUES (?,?)", (k, v))
+
+    # --- zapis ---
+
+    def _row(self, run_id: str, meta: Dict[str, Any], output_obj: Any, run_dir: Optional[Path]) -> Tuple[Any, ...]:
+        created_at = meta.get("created_at") or meta.get("ts") or meta.get("timestamp") or ""
+        ts = _parse_ts(created_at) or _parse_ts(meta.get("ts_start"))
+        if ts is None and run_dir is not None:
+            try:
+                ts = run_dir.stat().st_mtime
+            except OSError:
+                ts = None
+        previews = _previews(output_obj)
+        preview = next(iter(previews.values()), "")
+        paths = meta.get("paths")
+        return (
+            run_id,
+            str(meta.get("role") or ""),
+            str(meta.get("status") or ""),
+            meta.get("model") if isinstance(meta.get("model"), str) else None,
+            str(meta.get("title") or ""),
+            meta.get("tool") if isinstance(meta.get("tool"), str) else None,
+            str(created_at),
+            float(ts or 0.0),
+            json.dumps(paths, ensure_ascii=False) if isinstance(paths, dict) else None,
+            json.dumps(previews, ensure_ascii=False),
+            preview,
+            1,
+        )
+
+    def _placeholder(self, run_id: str, run_dir: Path) -> Tuple[Any, ...]:
+        try:
+            ts = run_dir.stat().st_mtime
+        except OSError:
+            ts = 0.0
+        return (run_id, "", "", None, "", None, "", ts, None, "{}", "", 0)
+
+    def _upsert(self, rows: Iterable[Tuple[Any, ...]]) -> None:
+        self._conn().executemany(
+            "INSERT INTO runs(run_id, role, status, model, title, tool, created_at, created_ts, paths, previews, preview, has_meta) "
+            "VALUES (?,?,?,?,?,?,?,?,?,?,?,?) ON CONFLICT(run_id) DO UPDATE SET "
+            "role=excluded.role, status=excluded.status, model=excluded.model, title=excluded.title, tool=excluded.tool, "
+            "created_at=excluded.created_at, created_ts=excluded.created_ts, paths=excluded.paths, "
+            "previews=excluded.previews, preview=excluded.preview, has_meta=excluded.has_meta",
+            rows,
+        )
+
+    def upsert(self, meta: Dict[str, Any], output_obj: Any = None, *, run_id: Optional[str] = None) -> str:
+        run_id = str(run_id or meta.get("run_id") or "")
+        if not run_id:
+            raise ValueError("run_id is required")
+        self._upsert([self._row(run_id, meta, output_obj, self.runs_dir / run_id)])
+        return run_id
+
+    def remove(self, run_id: str) -> None:
+        self._conn().execute("DELETE FROM runs WHERE run_id=?", (run_id,))
+
+    def _journal(self) -> Any:
+        # import leniwy: books_core -> books_runs_catalog, a books_run_journal importuje books_core
+        from books_run_journal import get_journal, has_journal
+
+        return get_journal(self.book_root) if has_journal(self.book_root) else None
+
+    def _journal_ids(self) -> set:
+        journal = self._journal()
+        return set(journal.run_ids()) if journal else set()
+
+    def _run_names(self) -> set:
+        names = {e.name for e in os.scandir(self.runs_dir) if e.is_dir() and not e.name.startswith(".")}
+        return names | self._journal_ids()
+
+    def _index_dirs(self, names: Iterable[str]) -> Tuple[int, List[str]]:
+        """Indexes run folders (or journal records) by name; returns (indexed, names still missing meta.json)."""
+        rows: List[Tuple[Any, ...]] = []
+        placeholders: List[Tuple[Any, ...]] = []
+        pending: List[str] = []
+        journal = self._journal()
+        journaled = set(journal.run_ids()) if journal else set()
+        for name in names:
+            d = self.runs_dir / name
+            meta_path = d / "meta.json"
+            if not meta_path.exists():
+                if name in journaled:
+                    rec = journal.read_run(name)
+                    if rec and isinstance(rec.get("meta"), dict):
+                        rows.append(self._row(name, rec["meta"], rec.get("output"), None))
+                elif d.is_dir():
+                    pending.append(name)
+                    placeholders.append(self._placeholder(name, d))
+                continue
+            meta = _read_json(meta_path)
+            if not isinstance(meta, dict):
+                continue
+            rows.append(self._row(name, meta, _read_json(d / "output.json"), d))
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            self._upsert(rows + placeholders)
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        return len(rows), pending
+
+    def _dir_stamp(self) -> Optional[str]:
+        try:
+            st = self.runs_dir.stat()
+        except OSError:
+            return None
+        journal = self._journal()
+        return f"{st.st_mtime_ns}:{st.st_size}:{journal.stamp() if journal else ''}"
+
+    def sync(self) -> Dict[str, int]:
+        """Cheap reconcile with the runs/ folder: O(1) when its mtime is unchanged."""
+        with self._sync_lock:
+            stamp = self._dir_stamp()
+            pending = json.loads(self._state("pending") or "[]")
+            if stamp is not None and stamp == self._state("dir_stamp") and not pending:
+                return {"added": 0, "removed": 0}
+            c = self._conn()
+            known = {r[0] for r in c.execute("SELECT run_id FROM runs")}
+            if stamp is None:
+                names: set = set()
+            elif stamp == self._state("dir_stamp"):
+                names = known | set(pending)
+            else:
+                names = self._run_names()
+            gone = known - names
+            c.executemany("DELETE FROM runs WHERE run_id=?", [(n,) for n in gone])
+            added, pending = self._index_dirs(sorted((names - known) | (set(pending) & names)))
+            self._set_state("pending", json.dumps(pending))
+            if stamp is not None:
+                self._set_state("dir_stamp", stamp)
+            return {"added": added, "removed": len(gone)}
+
+    def rebuild(self) -> Dict[str, int]:
+        """Drops the catalog and backfills it from every books/<book>/runs/<run_id>/ folder and journaled run."""
+        with self._sync_lock:
+            stamp = self._dir_stamp()
+            c = self._conn()
+            c.execute("DELETE FROM runs")
+            if self.fts:
+                c.execute("INSERT INTO runs_fts(runs_fts) VALUES ('rebuild')")
+            names = sorted(self._run_names()) if stamp is not None else []
+            added, pending = self._index_dirs(names)
+            self._set_state("pending", json.dumps(pending))
+            self._set_state("dir_stamp", stamp or "")
+            return {"indexed": added, "pending": len(pending)}
+
+    # --- odczyt ---
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM runs WHERE run_id=?", (run_id,)).fetchone()
+        return _row_to_item(row) if row else None
+
+    def query(
+        self,
+        *,
+        role: Optional[str] = None,
+        status: Optional[str] = None,
+        q: Optional[str] = None,
+        q_fields: Iterable[str] = ("role", "title", "preview"),
+        exact: bool = False,
+        limit: Optional[int] = 50,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        order: str = "run_id",
+        include_metaless: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Filtered page of runs, run_id desc (order="created": created_ts desc): {"items", "total", "next_cursor"}.
+        exact=True compares role/status case-sensitively; cursor (keyset) takes precedence over offset;
+        limit=None returns every match; include_metaless adds run folders without meta.json (empty fields).
+        """
+        if order not in ORDERS:
+            raise ValueError(f"invalid order: {order}")
+        self.sync()
+        where: List[str] = [] if include_metaless else ["has_meta = 1"]
+        args: List[Any] = []
+        for col, val in (("role", role), ("status", status)):
+            if val:
+                where.append(f"{col} = ?" + (f" AND {col} = ? COLLATE BINARY" if exact else ""))
+                args.extend([val, val] if exact else [val])
+        qq = (q or "").strip()
+        if qq:
+            fields = [f for f in q_fields if f in _SEARCH_FIELDS] or list(_SEARCH_FIELDS)
+            if self.fts and len(qq) >= 3:
+                phrase = '"' + qq.replace('"', '""') + '"'
+                where.append("rowid IN (SELECT rowid FROM runs_fts WHERE runs_fts MATCH ?)")
+                args.append("{" + " ".join(fields) + "} : " + phrase)
+            else:
+                like = "%" + qq.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                where.append("(" + " OR ".join(f"{f} LIKE ? ESCAPE '\\'" for f in fields) + ")")
+                args.extend([like] * len(fields))
+
+        c = self._conn()
+        base = " WHERE " + " AND ".join(where) if where else ""
+        total = c.execute("SELECT COUNT(*) FROM runs" + base, args).fetchone()[0]
+
+        page_where, page_args = list(where), list(args)
+        if cursor:
+            key = _decode_cursor(cursor, order)
+            if order == "created":
+                page_where.append("(created_ts < ? OR (created_ts = ? AND run_id < ?))")
+                page_args.extend([key[0], key[0], key[1]])
+            else:
+                page_where.append("run_id < ?")
+                page_args.extend(key)
+            offset = 0
+        sql = "SELECT * FROM runs" + (" WHERE " + " AND ".join(page_where) if page_where else "")
+        sql += " ORDER BY " + ("created_ts DESC, run_id DESC" if order == "created" else "run_id DESC") + " LIMIT ? OFFSET ?"
+        rows = c.execute(sql, page_args + [-1 if limit is None else int(limit) + 1, int(offset)]).fetchall()
+
+        items = [_row_to_item(r) for r in (rows if limit is None else rows[:limit])]
+        more = limit is not None and len(rows) > limit
+        last = items[-1] if items else None
+        next_cursor = None
+        if more and last is not None:
+            next_cursor = _encode_cursor([last["created_ts"], last["run_id"]] if order == "created" else [last["run_id"]])
+        return {"items": items, "total": total, "next_cursor": next_cursor}
+
+
+_CATALOGS: Dict[str, RunCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_catalog(book_root: Path) -> RunCatalog:
+    """Process-wide catalog per book root; a new catalog backfills itself from the runs/ folder."""
+    key = str(Path(book_root).resolve())
+    with _CATALOGS_LOCK:
+        cat = _CATALOGS.get(key)
+        if cat is None:
+            cat = RunCatalog(Path(key))
+            _CATALOGS[key] = cat
+        return cat
+
+
+def reset_catalogs() -> None:
+    with _CATALOGS_LOCK:
+        _CATALOGS.clear()
+
+
+def record_run(book_root: Path, meta: Dict[str, Any], output_obj: Any = None) -> bool:
+    """Best-effort catalog update after a run folder is written; the folder stays the source of truth."""
+    try:
+        get_catalog(book_root).upsert(meta, output_obj)
+        return True
+    except Exception:
+        return False
+
+
+def forget_run(book_root: Path, run_id: str) -> bool:
+    try:
+        get_catalog(book_root).remove(run_id)
+        return True
+    except Exception:
+        return False
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m books_runs_catalog")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="backfill catalogs from books/<book>/runs/")
+    rb.add_argument("books", nargs="*", help="book ids (default: all books)")
+    args = ap.parse_args(argv)
+
+    books_dir = ROOT / "books"
+    books = args.books
+    if not books and books_dir.exists():
+        books = sorted(p.name for p in books_dir.iterdir() if (p / "runs").is_dir())
+    for book in books:
+        res = get_catalog(books_dir / book).rebuild()
+        print(f"{book}: indexed={res['indexed']} pending={res['pending']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,6 +7,8 @@ from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, HTTPException
 
+from books_run_journal import materialize_run
+
 print(f"[RUNS_DETAILS_API] LOADED: {__file__}")
 
 router = APIRouter(prefix="/books", tags=["runs"])
@@ -64,6 +66,7 @@ def runs_get_details(book: str, run_id: str) -> Dict[str, Any]:
     _validate_book(book)
     _validate_run_id(run_id)
 
+    materialize_run(_books_dir() / book, run_id)  # run z dziennika -> legacy folder przy pierwszym odczycie
     run_dir = _books_dir() / book / "runs" / run_id
     meta_path = run_dir / "meta.json"
     input_path = run_dir / "input.json"
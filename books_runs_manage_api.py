@@ -7,6 +7,9 @@ from typing import Any, Dict
 
 from fastapi import APIRouter, HTTPException
 
+from books_runs_catalog import forget_run
+from books_run_journal import forget_journaled_run
+
 print(f"[RUNS_MANAGE_API] LOADED: {__file__}")
 
 router = APIRouter(prefix="/books", tags=["runs"])
@@ -38,20 +41,23 @@ def runs_delete(book: str, run_id: str) -> Dict[str, Any]:
     """
     UI: usuń wpis timeline.
     Disk:
-      deletes books/<book>/runs/<run_id>/
+      deletes books/<book>/runs/<run_id>/ and/or tombstones the run in runs/.journal/
     """
     _validate_book(book)
     _validate_run_id(run_id)
 
     run_dir = _books_dir() / book / "runs" / run_id
-    if not run_dir.exists():
-        raise HTTPException(status_code=404, detail="Run not found.")
-    if not run_dir.is_dir():
+    if run_dir.exists() and not run_dir.is_dir():
         raise HTTPException(status_code=400, detail="Run path is not a directory.")
+    journaled = forget_journaled_run(_books_dir() / book, run_id)
+    if not run_dir.exists() and not journaled:
+        raise HTTPException(status_code=404, detail="Run not found.")
 
-    try:
-        shutil.rmtree(run_dir)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete run: {e}")
+    if run_dir.exists():
+        try:
+            shutil.rmtree(run_dir)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to delete run: {e}")
+    forget_run(_books_dir() / book, run_id)
 
     return {"ok": True, "book": book, "run_id": run_id, "deleted": True}
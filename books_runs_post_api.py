@@ -11,6 +11,8 @@ from typing import Any, Dict, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
+from books_runs_catalog import record_run
+
 print(f"[RUNS_POST_API] LOADED: {__file__}")
 
 router = APIRouter(prefix="/books", tags=["runs"])
@@ -106,5 +108,6 @@ def runs_create_post(book: str, body: RunCreateBody) -> Dict[str, Any]:
     _atomic_write_json(run_dir / "meta.json", meta)
     _atomic_write_json(run_dir / "input.json", body.inputs or {})
     _atomic_write_json(run_dir / "output.json", body.outputs or {})
+    record_run(_books_dir() / book, meta, body.outputs or {})
 
     return {"ok": True, "book": book, "run_id": run_id, "meta": meta}
@@ -9,6 +9,8 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
+from books_runs_catalog import get_catalog
+
 # DZIAŁAJĄCY endpoint pod UI:
 # /books/book/{book}/runs_query?limit=...&offset=...&role=...&status=...&q=...
 router = APIRouter(prefix="/books/book/{book}/runs_query", tags=["runs"])
@@ -37,6 +39,7 @@ class RunsQueryResponse(BaseModel):
     limit: int
     offset: int
     items: List[RunItem]
+    next_cursor: Optional[str] = None
 
 
 def _book_root(book: str) -> Path:
@@ -133,6 +136,7 @@ def query_runs(
     q: Optional[str] = Query(None, description="Search in role/title/preview"),
     limit: int = Query(50, ge=1, le=500),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (keyset pagination)"),
 ):
     book_root = _book_root(book)
     if not book_root.exists():
@@ -142,53 +146,37 @@ def query_runs(
     if not runs_root.exists():
         return RunsQueryResponse(ok=True, book=book, total=0, limit=limit, offset=offset, items=[])
 
-    run_dirs = [d for d in runs_root.iterdir() if d.is_dir()]
-
-    def _sort_key(d: Path):
-        name = d.name
-        try:
-            mtime = d.stat().st_mtime
-        except Exception:
-            mtime = 0.0
-        return (name, mtime)
-
-    run_dirs.sort(key=_sort_key, reverse=True)
-
-    q_l = (q or "").strip().lower()
+    try:
+        res = get_catalog(book_root).query(
+            role=role,
+            status=status,
+            q=q,
+            q_fields=("role", "title", "preview"),
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            include_metaless=True,  # dawny skan folderow: run bez meta.json tez na liscie (pola null)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
     items: List[RunItem] = []
-    for d in run_dirs:
-        run_id = d.name
-        meta = _read_json(d / "meta.json")
-        outj = _read_json(d / "output.json")
-
-        paths_raw = meta.get("paths")
-        paths_rel = _normalize_paths(book, paths_raw) if isinstance(paths_raw, dict) else {}
-
-        item = RunItem(
-            run_id=run_id,
-            role=meta.get("role"),
-            title=meta.get("title"),
-            status=meta.get("status"),
-            model=meta.get("model"),
-            created_at=meta.get("created_at") or meta.get("ts") or meta.get("timestamp"),
-            preview=_extract_preview(outj),
-            paths=paths_rel,
-            primary_md=_pick_primary_md(paths_rel),
+    for r in res["items"]:
+        paths_rel = _normalize_paths(book, r["paths"]) if r["paths"] is not None else {}
+        items.append(
+            RunItem(
+                run_id=r["run_id"],
+                role=r["role"] or None,
+                title=r["title"] or None,
+                status=r["status"] or None,
+                model=r["model"],
+                created_at=r["created_at"] or None,
+                preview=_extract_preview(r["previews"]),
+                paths=paths_rel,
+                primary_md=_pick_primary_md(paths_rel),
+            )
         )
 
-        if role and (item.role or "").lower() != role.lower():
-            continue
-        if status and (item.status or "").lower() != status.lower():
-            continue
-        if q_l:
-            hay = f"{item.role or ''} {item.title or ''} {item.preview or ''}".lower()
-            if q_l not in hay:
-                continue
-
-        items.append(item)
-
-    total = len(items)
-    sliced = items[offset : offset + limit]
-
-    return RunsQueryResponse(ok=True, book=book, total=total, limit=limit, offset=offset, items=sliced)
+    return RunsQueryResponse(
+        ok=True, book=book, total=res["total"], limit=limit, offset=offset, items=items, next_cursor=res["next_cursor"]
+    )
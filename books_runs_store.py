@@ -8,6 +8,9 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from books_runs_catalog import get_catalog, record_run
+from books_run_journal import materialize_run
+
 
 def _root_dir() -> Path:
     return Path(__file__).resolve().parent
@@ -99,58 +102,33 @@ def create_run(
     _atomic_write_json(meta_path, meta)
     _atomic_write_json(in_path, input_obj if input_obj is not None else {})
     _atomic_write_json(out_path, output_obj if output_obj is not None else {})
+    record_run(_books_dir() / book, meta, output_obj)
 
     return {"run_id": run_id, "dir": str(run_dir), "meta": meta}
 
 
 def list_runs(book: str) -> List[Dict[str, Any]]:
-    runs_dir = _books_dir() / book / "runs"
-    if not runs_dir.exists():
+    book_root = _books_dir() / book
+    if not (book_root / "runs").exists():
         return []
 
     items: List[Dict[str, Any]] = []
-    for d in runs_dir.iterdir():
-        if not d.is_dir():
-            continue
-        meta_path = d / "meta.json"
-        if not meta_path.exists():
-            continue
-        try:
-            meta = json.loads(meta_path.read_text(encoding="utf-8"))
-        except Exception:
-            continue
-
-        created_at = meta.get("created_at")
+    for r in get_catalog(book_root).query(limit=None, order="created")["items"]:
         items.append(
             {
-                "run_id": d.name,
-                "role": meta.get("role"),
-                "status": meta.get("status"),
-                "model": meta.get("model"),
-                "created_at": created_at,
-                "paths": meta.get("paths") if isinstance(meta.get("paths"), dict) else {},
+                "run_id": r["run_id"],
+                "role": r["role"] or None,
+                "status": r["status"] or None,
+                "model": r["model"],
+                "created_at": r["created_at"] or None,
+                "paths": r["paths"] or {},
             }
         )
-
-    def sort_key(x: Dict[str, Any]) -> float:
-        s = x.get("created_at")
-        try:
-            # ISO sort-ish; fallback to mtime
-            dt = datetime.fromisoformat(s.replace("Z", "+00:00")) if isinstance(s, str) else None
-            if dt:
-                return dt.timestamp()
-        except Exception:
-            pass
-        try:
-            return (runs_dir / x["run_id"]).stat().st_mtime
-        except Exception:
-            return 0.0
-
-    items.sort(key=sort_key, reverse=True)
     return items
 
 
 def read_run(book: str, run_id: str) -> Dict[str, Any]:
+    materialize_run(_books_dir() / book, run_id)
     run_dir = _books_dir() / book / "runs" / run_id
     meta_path = run_dir / "meta.json"
     in_path = run_dir / "input.json"
@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import math
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Indeks pelnotekstowy draft/master.txt dla POST /books/book/{book}/master/search.
+#
+# W pamieci, per plik: slownik termow (lower + zdjete polskie znaki: "żółw" == "zolw"), dla kazdego termu
+# rosnaca lista akapitow (array) z liczba wystapien, a dla akapitu jego tekst, ciag id termow i offsety
+# tokenow w akapicie. Akapity jak w dotychczasowym _split_paragraphs: separator (?:\r?\n){2,}, puste pomijane.
+#
+# Odswiezanie przy kazdym zapytaniu to jeden stat(): ten sam (mtime_ns, size) = bez zmian. Jesli plik tylko
+# urosl (zgadza sie hash poczatku pliku i bajtow od poczatku ostatniego akapitu do starego konca),
+# doczytujemy tylko ogon od ostatniego akapitu i indeksujemy go ponownie; kazda inna zmiana = pelna przebudowa.
+#
+# Zapytanie: slowa (AND), "fraza w cudzyslowie", prefiks* ; wyniki to akapity w kolejnosci BM25.
+# Prefiks rozwijamy do MAX_PREFIX_TERMS termow (wtedy wynik ma truncated=True). case_sensitive: trafienie
+# (filtr i pozycja w excerpt) to wystapienie termu/frazy, ktorego tekst zaczyna sie od slow zapytania 1:1.
+# paragraphs(): zakres akapitow z pamieci (GET /books/book/{book}/master/paragraphs), bez czytania pliku.
+
+K1 = 1.2
+B = 0.75
+MAX_PREFIX_TERMS = 256
+EXCERPT_CONTEXT = 120
+HEAD_CHECK_BYTES = 4096
+
+_PARA_SEP_RE = re.compile(r"(?:\r?\n){2,}")
+_TOKEN_RE = re.compile(r"\w+")
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+_PL_FOLD = str.maketrans("ąćęłńóśźż", "acelnoszz")
+
+
+def fold(text: str) -> str:
+    """lower() + Polish diacritics removed, same length as `text` (offsets stay valid)."""
+    low = text.lower()
+    if len(low) != len(text):
+        low = "".join((c.lower() or c)[0] for c in text)
+    return low.translate(_PL_FOLD)
+
+
+def tokenize(text: str) -> List[Tuple[str, int]]:
+    return [(m.group(0), m.start()) for m in _TOKEN_RE.finditer(fold(text))]
+
+
+class _Para:
+    __slots__ = ("start", "text", "tids", "offs")
+
+    def __init__(self, start: int, text: str, tids: array, offs: array):
+        self.start = start
+        self.text = text
+        self.tids = tids
+        self.offs = offs
+
+
+class _Clause:
+    __slots__ = ("kind", "raw", "tids", "truncated")
+
+    def __init__(self, kind: str, raw: str, tids: List[int], truncated: bool = False):
+        self.kind = kind  # term | prefix | phrase
+        self.raw = raw  # slowa zapytania w oryginalnej wielkosci liter (bez interpunkcji z brzegow)
+        self.tids = tids
+        self.truncated = truncated
+
+
+class MasterSearchIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.appends = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._vocab: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._sorted_terms: Optional[List[str]] = None
+        self._post: List[array] = []
+        self._tf: List[array] = []
+        self._paras: List[_Para] = []
+        self._total_tokens = 0
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._tail_byte = 0
+        self._tail_char = 0
+        self._tail_hash = ""
+        self._head_hash = ""
+        self._appendable = False
+
+    # --- budowa ---
+
+    def _add_para(self, start: int, text: str) -> None:
+        pid = len(self._paras)
+        vocab, post, tf = self._vocab, self._post, self._tf
+        tids = array("I")
+        offs = array("I")
+        counts: Dict[int, int] = {}
+        for m in _TOKEN_RE.finditer(fold(text)):
+            term = m.group(0)
+            tid = vocab.get(term)
+            if tid is None:
+                tid = len(self._terms)
+                vocab[term] = tid
+                self._terms.append(term)
+                post.append(array("I"))
+                tf.append(array("I"))
+                if self._sorted_terms is not None:
+                    insort(self._sorted_terms, term)
+            tids.append(tid)
+            offs.append(m.start())
+            counts[tid] = counts.get(tid, 0) + 1
+        for tid, n in counts.items():
+            post[tid].append(pid)
+            tf[tid].append(n)
+        self._total_tokens += len(tids)
+        self._paras.append(_Para(start, text, tids, offs))
+
+    def _drop_last_para(self) -> None:
+        p = self._paras.pop()
+        for tid in set(p.tids):
+            self._post[tid].pop()
+            self._tf[tid].pop()
+        self._total_tokens -= len(p.tids)
+
+    def _index_text(self, text: str, base: int) -> None:
+        pos = 0
+        for m in _PARA_SEP_RE.finditer(text):
+            seg = text[pos:m.start()]
+            if seg.strip():
+                self._add_para(base + pos, seg)
+            pos = m.end()
+        seg = text[pos:]
+        if seg.strip():
+            self._add_para(base + pos, seg)
+
+    def _remember_tail(self, raw: bytes, text: str, base_byte: int, base_char: int) -> None:
+        # raw/text: bajty i tekst od base_byte/base_char do konca pliku
+        self._tail_char = self._paras[-1].start if self._paras else 0
+        rel = self._tail_char - base_char
+        self._tail_byte = base_byte + len(text[:rel].encode("utf-8"))
+        self._tail_hash = hashlib.blake2b(raw[self._tail_byte - base_byte:], digest_size=16).hexdigest()
+
+    def _build(self, st: os.stat_result) -> None:
+        self._reset()
+        raw = self.path.read_bytes()
+        try:
+            text = raw.decode("utf-8")
+            self._appendable = True
+        except UnicodeDecodeError:
+            text = raw.decode("utf-8", errors="replace")
+        self._index_text(text, 0)
+        self._head_hash = hashlib.blake2b(raw[:HEAD_CHECK_BYTES], digest_size=16).hexdigest()
+        if self._appendable:
+            self._remember_tail(raw, text, 0, 0)
+        self._stamp = (st.st_mtime_ns, st.st_size)
+        self.builds += 1
+
+    def _try_append(self, st: os.stat_result) -> bool:
+        if not self._appendable or self._stamp is None or st.st_size <= self._stamp[1]:
+            return False
+        old_size = self._stamp[1]
+        with self.path.open("rb") as f:
+            head = f.read(min(HEAD_CHECK_BYTES, old_size))
+            f.seek(self._tail_byte)
+            raw = f.read()
+        if hashlib.blake2b(head, digest_size=16).hexdigest() != self._head_hash:
+            return False
+        old_tail = old_size - self._tail_byte
+        if hashlib.blake2b(raw[:old_tail], digest_size=16).hexdigest() != self._tail_hash:
+            return False
+        try:
+            text = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            return False
+        while self._paras and self._paras[-1].start >= self._tail_char:
+            self._drop_last_para()
+        self._index_text(text, self._tail_char)
+        if old_size < HEAD_CHECK_BYTES:
+            with self.path.open("rb") as f:
+                self._head_hash = hashlib.blake2b(f.read(HEAD_CHECK_BYTES), digest_size=16).hexdigest()
+        self._remember_tail(raw, text, self._tail_byte, self._tail_char)
+        self._stamp = (st.st_mtime_ns, st.st_size)
+        self.appends += 1
+        return True
+
+    def refresh(self) -> bool:
+        """Brings the index up to date with the file; False when the file does not exist."""
+        try:
+            st = self.path.stat()
+        except OSError:
+            self._reset()
+            return False
+        if self._stamp == (st.st_mtime_ns, st.st_size):
+            return True
+        if not self._try_append(st):
+            self._build(st)
+        return True
+
+    # --- zapytania ---
+
+    def _expand_prefix(self, prefix: str) -> Tuple[List[int], bool]:
+        # (id termow, czy przycieto do MAX_PREFIX_TERMS)
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._terms)
+        terms = self._sorted_terms
+        out: List[int] = []
+        i = bisect_left(terms, prefix)
+        while i < len(terms) and terms[i].startswith(prefix):
+            if len(out) == MAX_PREFIX_TERMS:
+                return out, True
+            out.append(self._vocab[terms[i]])
+            i += 1
+        return out, False
+
+    def _parse(self, q: str) -> List[_Clause]:
+        clauses: List[_Clause] = []
+        for m in _QUERY_RE.finditer(q):
+            phrase, word = m.group(1), m.group(2)
+            raw = phrase if phrase is not None else word
+            prefix = phrase is None and word.endswith("*")
+            if prefix:
+                raw = raw.rstrip("*")
+            tokpos = tokenize(raw)
+            if not tokpos:
+                continue
+            toks = [t for t, _ in tokpos]
+            raw = raw[tokpos[0][1]:tokpos[-1][1] + len(toks[-1])]  # fold() zachowuje dlugosc
+            if prefix and len(toks) == 1:
+                tids, truncated = self._expand_prefix(toks[0])
+                clauses.append(_Clause("prefix", raw, tids, truncated))
+            elif len(toks) == 1:
+                tid = self._vocab.get(toks[0])
+                clauses.append(_Clause("term", raw, [tid] if tid is not None else []))
+            else:
+                tids = [self._vocab.get(t) for t in toks]
+                clauses.append(_Clause("phrase", raw, [] if None in tids else tids))  # type: ignore[list-item]
+        return clauses
+
+    def _clause_tf(self, c: _Clause) -> Dict[int, int]:
+        # akapit -> liczba wystapien termu (dla prefiksu suma po rozwinieciach)
+        tf: Dict[int, int] = {}
+        for tid in c.tids:
+            for pid, n in zip(self._post[tid], self._tf[tid]):
+                tf[pid] = tf.get(pid, 0) + n
+        return tf
+
+    def _phrase_count(self, pid: int, tids: List[int]) -> int:
+        seq = self._paras[pid].tids
+        k = len(tids)
+        n = 0
+        first = tids[0]
+        for i in range(len(seq) - k + 1):
+            if seq[i] == first and all(seq[i + j] == tids[j] for j in range(1, k)):
+                n += 1
+        return n
+
+    def _first_match(self, pid: int, clauses: List[_Clause], case_sensitive: bool = False) -> Optional[Tuple[int, int]]:
+        # (offset, dlugosc) pierwszego trafienia ktorejkolwiek klauzuli w akapicie; None = brak
+        p = self._paras[pid]
+        singles: Dict[int, List[str]] = {}
+        phrases = []
+        for c in clauses:
+            if c.kind == "phrase":
+                phrases.append(c)
+            else:
+                for tid in c.tids:
+                    singles.setdefault(tid, []).append(c.raw)
+        seq, offs, text = p.tids, p.offs, p.text
+        for i, tid in enumerate(seq):
+            if tid in singles and (not case_sensitive or any(text.startswith(raw, offs[i]) for raw in singles[tid])):
+                return offs[i], len(self._terms[tid])
+            for c in phrases:
+                ph = c.tids
+                k = len(ph)
+                if tid == ph[0] and list(seq[i:i + k]) == ph and (not case_sensitive or text.startswith(c.raw, offs[i])):
+                    last = i + k - 1
+                    return offs[i], offs[last] + len(self._terms[seq[last]]) - offs[i]
+        return None
+
+    def search(self, q: str, limit: int = 10, case_sensitive: bool = False, ranked: bool = True) -> Optional[Dict[str, Any]]:
+        """Matching paragraphs of `q`; None when the query has no indexable words (caller falls back to a scan)."""
+        with self._lock:
+            if not self.refresh():
+                return {"total_hits": 0, "hits": [], "truncated": False}
+            clauses = self._parse(q)
+            if not clauses:
+                return None
+            n_paras = len(self._paras)
+            avgdl = (self._total_tokens / n_paras) if n_paras else 0.0
+
+            tfs: List[Tuple[_Clause, Dict[int, int]]] = []
+            cand: Optional[Set[int]] = None
+            simple = sorted((c for c in clauses if c.kind != "phrase"), key=lambda c: sum(len(self._post[t]) for t in c.tids))
+            for c in simple:
+                tf = self._clause_tf(c)
+                cand = set(tf) if cand is None else cand.intersection(tf)
+                tfs.append((c, tf))
+                if not cand:
+                    break
+            for c in (c for c in clauses if c.kind == "phrase"):
+                if cand is not None and not cand:
+                    break
+                if not c.tids:
+                    cand = set()
+                    break
+                base: Optional[Set[int]] = cand
+                for tid in sorted(set(c.tids), key=lambda t: len(self._post[t])):
+                    s = set(self._post[tid])
+                    base = s if base is None else base.intersection(s)
+                tf = {}
+                for pid in base or ():
+                    n = self._phrase_count(pid, c.tids)
+                    if n:
+                        tf[pid] = n
+                cand = set(tf)
+                tfs.append((c, tf))
+            cand = cand or set()
+
+            if case_sensitive and cand:
+                cand = {pid for pid in cand if all(self._first_match(pid, [c], True) for c in clauses)}
+
+            scores: Dict[int, float] = {}
+            if ranked:
+                for c, tf in tfs:
+                    df = sum(1 for pid in tf if pid in cand) if c.kind == "phrase" else len(tf)
+                    idf = math.log(1.0 + (n_paras - df + 0.5) / (df + 0.5))
+                    for pid in cand:
+                        f = tf.get(pid, 0)
+                        dl = len(self._paras[pid].tids)
+                        norm = K1 * (1.0 - B + B * (dl / avgdl if avgdl else 1.0))
+                        scores[pid] = scores.get(pid, 0.0) + idf * f * (K1 + 1.0) / (f + norm)
+                top = heapq.nsmallest(limit, cand, key=lambda pid: (-scores[pid], pid))
+            else:
+                top = heapq.nsmallest(limit, cand)
+
+            hits = []
+            for pid in top:
+                p = self._paras[pid]
+                off, ln = self._first_match(pid, clauses, case_sensitive) or (0, 0)
+                a = max(0, off - EXCERPT_CONTEXT)
+                b = min(len(p.text), off + ln + EXCERPT_CONTEXT)
+                hits.append(
+                    {
+                        "para_index": pid + 1,
+                        "match_index": off,
+                        "offset": p.start + off,
+                        "excerpt": p.text[a:b].replace("\r", ""),
+                        "score": round(scores.get(pid, 0.0), 4),
+                    }
+                )
+            return {"total_hits": len(cand), "hits": hits, "truncated": any(c.truncated for c in clauses)}
+
+    def paragraphs(self, start: int = 1, count: int = 20) -> Dict[str, Any]:
+        """Paragraphs start..start+count-1 (1-based, same numbering as search hits), served from memory."""
+        with self._lock:
+            if not self.refresh():
+                return {"total": 0, "items": []}
+            i = max(0, start - 1)
+            items = [
+                {"para_index": pid + 1, "char_start": p.start, "text": p.text}
+                for pid, p in enumerate(self._paras[i : i + max(0, count)], start=i)
+            ]
+            return {"total": len(self._paras), "items": items}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "paragraphs": len(self._paras),
+                "terms": len(self._terms),
+                "tokens": self._total_tokens,
+                "builds": self.builds,
+                "appends": self.appends,
+            }
+
+
+_INDEXES: Dict[str, MasterSearchIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_search_index(path: Path) -> MasterSearchIndex:
+    key = str(Path(path).resolve())
+    with _INDEXES_LOCK:
+        idx = _INDEXES.get(key)
+        if idx is None:
+            idx = MasterSearchIndex(Path(key))
+            _INDEXES[key] = idx
+        return idx
+
+
+def reset_search_indexes() -> None:
+    with _INDEXES_LOCK:
+        _INDEXES.clear()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Pattern, Tuple
+
+# Natywny licznik slow zgodny z regulami Worda (Document.ComputeStatistics(wdStatisticWords)), bez COM.
+#
+# Slowo = ciag znakow miedzy bialymi znakami (domyslnie NBSP tez rozdziela). Reguly Worda:
+#  - "e-mail", "tak—nie", "a/b", "itd.", "3,14", "(np." to jedno slowo,
+#  - samodzielna interpunkcja ("–" otwierajace dialog, "...", "?!", "»") nie jest liczona,
+#  - "1 000 000" to trzy slowa (spacja rozdziela grupy cyfr).
+# Kazda regula jest przelaczalna w WordCountRules.
+#
+# count_file_words() trzyma biezacy wynik obok pliku (<plik>.wc.json): rozmiar, mtime, inode, offset poczatku
+# ostatniej linii i liczbe slow przed nia. Slowo nigdy nie przechodzi przez "\n", wiec gdy plik tylko urosl
+# (ten sam inode, zgadza sie hash poczatku pliku i bajtow przed starym koncem) liczymy od ostatniej linii do
+# konca; kazda inna zmiana (albo inne reguly) = pelne przeliczenie.
+#
+# Ograniczenie: hashujemy tylko poczatek i okno przed starym koncem, nie caly policzony prefiks (to byloby
+# czytanie calego pliku). Edycja w srodku pliku w miejscu (ten sam inode) polaczona z dopisaniem nie jest
+# wykryta i licznik moze odplynac - dlatego co WORDCOUNT_FULL_EVERY przyrostowych liczen (0 = nigdy) liczymy
+# calosc od nowa. Zapis przez tmp+rename (atomic_write_*) zmienia inode i zawsze daje pelne przeliczenie.
+
+STATE_SUFFIX = ".wc.json"
+STATE_VERSION = 2
+CHECK_BYTES = 4096
+FULL_RECOUNT_EVERY = int(os.getenv("WORDCOUNT_FULL_EVERY", "64") or 0)
+
+_DASHES = "\u2010\u2011\u2012\u2013\u2014\u2015\u2212"
+_NBSP = "\u00a0\u2007\u202f"
+
+
+@dataclass(frozen=True)
+class WordCountRules:
+    count_punctuation: bool = False  # samodzielne "–", "...", "»" licza sie jako slowa
+    split_dashes: bool = False  # "tak—nie" / "tak–nie" = 2 slowa (myslnik jako separator; "-" nie)
+    nbsp_separates: bool = True  # twarda spacja rozdziela slowa jak zwykla spacja
+    join_digit_groups: bool = False  # "1 000 000" = 1 slowo (polskie grupowanie tysiecy)
+
+    def fingerprint(self) -> str:
+        return ",".join(f"{k}={int(v)}" for k, v in sorted(asdict(self).items()))
+
+
+WORD_RULES = WordCountRules()
+
+
+@dataclass(frozen=True)
+class FileWordCount:
+    words: int
+    mode: str  # "cached" | "incremental" | "full"
+    counted_bytes: int
+
+
+_PATTERNS: Dict[WordCountRules, Tuple[Pattern[str], Optional[Pattern[str]]]] = {}
+
+
+def _patterns(rules: WordCountRules) -> Tuple[Pattern[str], Optional[Pattern[str]]]:
+    pats = _PATTERNS.get(rules)
+    if pats is not None:
+        return pats
+    excl = _DASHES if rules.split_dashes else ""
+    tok = f"[^\\s{excl}]" if rules.nbsp_separates else f"(?:[^\\s{excl}]|[{_NBSP}])"
+    if rules.count_punctuation:
+        word = re.compile(f"(?<!{tok}){tok}+")
+    else:
+        # znaki tokenu bez liter/cyfr, pierwsza litera/cyfra, reszta tokenu (klasy rozlaczne = liniowo)
+        word = re.compile(f"(?<!{tok})(?:(?![^\\W_]){tok})*[^\\W_]{tok}*")
+    groups = None
+    if rules.join_digit_groups:
+        gap = f"[ {_NBSP}]" if rules.nbsp_separates else " "
+        groups = re.compile(f"(?<!{tok})\\d{{1,3}}(?:{gap}\\d{{3}})+(?!{tok})")
+    pats = _PATTERNS[rules] = (word, groups)
+    return pats
+
+
+def count_words(text: str, rules: WordCountRules = WORD_RULES) -> int:
+    """Word-compatible word count of `text` under `rules`."""
+    if not text:
+        return 0
+    word, groups = _patterns(rules)
+    n = sum(1 for _ in word.finditer(text))
+    if groups is not None:
+        for m in groups.finditer(text):
+            n -= sum(1 for ch in m.group(0) if not ch.isdigit())
+    return n
+
+
+def state_path(path: Path) -> Path:
+    return path.with_name(path.name + STATE_SUFFIX)
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _count_bytes(data: bytes, rules: WordCountRules) -> int:
+    return count_words(data.decode("utf-8", errors="replace"), rules)
+
+
+def _load_state(path: Path, fp: str) -> Optional[Dict[str, Any]]:
+    try:
+        st = json.loads(state_path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(st, dict) or st.get("version") != STATE_VERSION or st.get("rules") != fp:
+        return None
+    return st
+
+
+def _save_state(path: Path, st: Dict[str, Any]) -> None:
+    sp = state_path(path)
+    tmp = sp.with_name(f"{sp.name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_text(json.dumps(st), encoding="utf-8")
+        os.replace(tmp, sp)
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+def _checks(f, size: int, tail: int) -> Tuple[str, str]:
+    f.seek(0)
+    head = _digest(f.read(min(CHECK_BYTES, size)))
+    start = max(0, min(tail, size - CHECK_BYTES))
+    f.seek(start)
+    return head, _digest(f.read(size - start))
+
+
+def count_file_words(path: Path, rules: WordCountRules = WORD_RULES, persist: bool = True) -> FileWordCount:
+    """Word count of a UTF-8 text file; with `persist` only bytes appended since the last call are counted."""
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return FileWordCount(0, "full", 0)
+
+    size = stat.st_size
+    fp = rules.fingerprint()
+    st = _load_state(path, fp) if persist else None
+    if st is not None and st["size"] == size and st["mtime_ns"] == stat.st_mtime_ns:
+        return FileWordCount(int(st["words"]), "cached", 0)
+
+    with path.open("rb") as f:
+        mode, start, before = "full", 0, 0
+        since_full = int(st.get("since_full", 0)) if st is not None else 0
+        if (
+            st is not None
+            and st.get("ino") == stat.st_ino
+            and (FULL_RECOUNT_EVERY <= 0 or since_full < FULL_RECOUNT_EVERY)
+            and size > st["size"] >= st["tail"]
+            and _checks(f, st["size"], st["tail"]) == (st["head"], st["check"])
+        ):
+            mode, start, before = "incremental", int(st["tail"]), int(st["before"])
+        f.seek(start)
+        data = f.read(size - start)
+        if start == 0 and data.startswith(b"\xef\xbb\xbf"):
+            data, start = data[3:], 3
+
+        cut = data.rfind(b"\n") + 1
+        before += _count_bytes(data[:cut], rules)
+        words = before + _count_bytes(data[cut:], rules)
+        if persist:
+            tail = start + cut
+            head, check = _checks(f, size, tail)
+            _save_state(path, {
+                "version": STATE_VERSION,
+                "rules": fp,
+                "size": size,
+                "mtime_ns": stat.st_mtime_ns,
+                "ino": stat.st_ino,
+                "since_full": since_full + 1 if mode == "incremental" else 0,
+                "words": words,
+                "tail": tail,
+                "before": before,
+                "head": head,
+                "check": check,
+            })
+    return FileWordCount(words, mode, len(data))
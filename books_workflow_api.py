@@ -11,6 +11,8 @@ from typing import Any, Dict, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
+from books_draft_store import append_text as _store_append_text
+
 print(f"[WORKFLOW_API] LOADED: {__file__}")
 
 router = APIRouter(prefix="/books", tags=["workflow"])
@@ -52,9 +54,7 @@ def _atomic_write_json(path: Path, obj: Any) -> None:
 
 
 def _append_text(path: Path, text: str) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8", newline="\n") as f:
-        f.write(text)
+    _store_append_text(path, text)
 
 
 def _write_run_one_shot(
@@ -10,11 +10,10 @@ from books_core import (
     safe_resolve_under,
     ensure_dir,
     make_run_id,
-    atomic_write_text,
     write_run,
     write_latest,
-    read_text_safe,
 )
+from books_draft_store import DraftStore
 
 router = APIRouter(prefix="/books/writer", tags=["books.writer"])
 
@@ -55,23 +54,16 @@ def writer_generate(req: WriterGenerateReq):
         incoming = req.text or ""
         incoming = incoming.replace("\r\n", "\n").replace("\r", "\n")
 
-        # Read existing (best-effort)
-        existing = ""
-        try:
-            if draft_path.exists():
-                existing = read_text_safe(draft_path)
-        except Exception:
-            existing = ""
+        store = DraftStore(draft_path)
 
         to_append = incoming
         if req.ensure_newline:
-            prefix = "" if (not existing or existing.endswith("\n")) else "\n"
+            prefix = "" if store.ends_with_newline() else "\n"
             suffix = "" if to_append.endswith("\n") else "\n"
             to_append = prefix + to_append + suffix
 
-        new_text = existing + to_append
-
-        w_draft = atomic_write_text(draft_path, new_text)
+        # O(chunk): segment + manifest + append (bez przepisywania calego master.txt)
+        w_draft = store.append(to_append)
 
         fallback = not bool(w_draft.get("ok"))
 
@@ -155,3 +147,16 @@ def writer_generate(req: WriterGenerateReq):
             "paths": {},
             "writes": {"error": repr(e)},
         }
+
+
+class WriterCompactReq(BaseModel):
+    book: str
+    path: str = Field("draft/master.txt", description="Relative path under book root")
+
+
+@router.post("/compact")
+def writer_compact(req: WriterCompactReq):
+    book_root = safe_book_root(req.book)
+    draft_path = safe_resolve_under(book_root, req.path)
+    out = DraftStore(draft_path).compact()
+    return {"ok": bool(out.get("ok")), "book": req.book, "path": req.path, **out}
@@ -3,12 +3,18 @@
 from __future__ import annotations
 
 import argparse
+import re
 import shutil
 import subprocess
 import sys
 import time
 from datetime import datetime
 from pathlib import Path
+from typing import List
+
+from books_chunk_pipeline import ChunkPipeline, ChunkSpec, continuity_issue
+from books_core import read_tail_text
+from books_wordcount import WordCountRules, count_file_words
 
 try:
     sys.stdout.reconfigure(encoding="utf-8", errors="replace")
@@ -62,11 +68,24 @@ Write-Output $count
         raise RuntimeError(f"WordCount parse failed. stdout={out!r} stderr={r.stderr!r}")
 
 
+def rules_from_args(args: argparse.Namespace) -> WordCountRules:
+    return WordCountRules(
+        count_punctuation=args.wc_count_punct,
+        split_dashes=args.wc_split_dashes,
+        nbsp_separates=not args.wc_nbsp_joins,
+        join_digit_groups=args.wc_join_digits,
+    )
+
+
+def word_count(txt_path: Path, args: argparse.Namespace) -> int:
+    # domyslnie licznik natywny (books_wordcount, przyrostowo); --counter word = Word COM (tylko Windows)
+    if args.counter == "word":
+        return word_count_via_word_com(txt_path)
+    return count_file_words(txt_path, rules_from_args(args)).words
+
+
 def tail_text(path: Path, max_chars: int) -> str:
-    if not path.exists():
-        return ""
-    data = path.read_text(encoding="utf-8", errors="replace")
-    return data[-max_chars:]
+    return read_tail_text(path, chars=max_chars)
 
 
 def append_utf8(path: Path, text: str) -> None:
@@ -117,6 +136,37 @@ def resolve_output_path(args: argparse.Namespace) -> Path:
     return in_path
 
 
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def load_outline(args: argparse.Namespace) -> List[str]:
+    # jeden beat na linie; chunk i dostaje beat i (dalej bez beatu)
+    if not args.outline_file:
+        return []
+    of = Path(args.outline_file).resolve()
+    if not of.exists():
+        raise FileNotFoundError(f"outline_file not found: {of}")
+    lines = of.read_text(encoding="utf-8", errors="replace").splitlines()
+    return [_BULLET_RE.sub("", ln).strip() for ln in lines if ln.strip()]
+
+
+def build_prompt(base_prompt: str, context: str, beat: str = "", ahead: int = 0) -> str:
+    prompt = (
+        f"{base_prompt}\n\n"
+        f"=== OSTATNI FRAGMENT TEKSTU (kontekst, kontynuuj) ===\n"
+        f"{context}\n"
+        f"=== KONIEC KONTEKSTU ===\n\n"
+    )
+    if ahead > 0:
+        prompt += (
+            f"Między kontekstem a Twoim fragmentem powstaje jeszcze {ahead} inny fragment. "
+            f"Nie powtarzaj kontekstu ani jego ostatniej sceny; zacznij od nowego momentu akcji.\n"
+        )
+    if beat:
+        prompt += f"Ten fragment realizuje etap planu: {beat}\n"
+    return prompt + "Kontynuuj dalej w tym samym stylu i wątku. Dopisz kolejne akapity."
+
+
 def load_base_prompt(args: argparse.Namespace) -> str:
     if args.prompt_file:
         pf = Path(args.prompt_file).resolve()
@@ -140,33 +190,55 @@ def main() -> int:
     ap.add_argument("--outdir", default="")
     ap.add_argument("--prefix", default="")
 
+    ap.add_argument("--inflight", type=int, default=1,
+                    help="Ile chunków generować równolegle (1 = sekwencyjnie). Zatwierdzane zawsze po kolei.")
+    ap.add_argument("--max_regen", type=int, default=2, help="Ile razy ponowić chunk odrzucony przez kontrolę ciągłości.")
+    ap.add_argument("--outline_file", default="", help="Plan (UTF-8, jeden beat na linię) dla kolejnych chunków.")
+
+    ap.add_argument("--counter", choices=("native", "word"), default="native",
+                    help="native = books_wordcount (reguły Worda, przyrostowo); word = Word COM przez PowerShell.")
+    ap.add_argument("--wc_count_punct", action="store_true", help="Samodzielna interpunkcja (\"–\", \"...\") liczona jako słowo.")
+    ap.add_argument("--wc_split_dashes", action="store_true", help="Półpauza/pauza między słowami je rozdziela (\"tak—nie\" = 2).")
+    ap.add_argument("--wc_nbsp_joins", action="store_true", help="Twarda spacja (NBSP) nie rozdziela słów.")
+    ap.add_argument("--wc_join_digits", action="store_true", help="\"1 000 000\" liczone jako jedno słowo.")
+
     args = ap.parse_args()
 
     txt_path = resolve_output_path(args)
     base_prompt = load_base_prompt(args)
 
-    wc = word_count_via_word_com(txt_path)
+    wc = word_count(txt_path, args)
     print(f"START WORD_COUNT={wc} TARGET={args.target} FILE={txt_path} MODEL={args.model}")
 
     safety_iters = 200
-    it = 0
-    while wc < args.target and it < safety_iters:
-        it += 1
-
-        context = tail_text(txt_path, args.context_chars)
-        prompt = (
-            f"{base_prompt}\n\n"
-            f"=== OSTATNI FRAGMENT TEKSTU (kontekst, kontynuuj) ===\n"
-            f"{context}\n"
-            f"=== KONIEC KONTEKSTU ===\n\n"
-            f"Kontynuuj dalej w tym samym stylu i wątku. Dopisz kolejne akapity."
-        )
+    beats = load_outline(args)
 
-        chunk = generate_chunk(prompt, model=args.model, max_output_tokens=args.max_output_tokens)
-        append_utf8(txt_path, chunk)
+    def generate(spec: ChunkSpec) -> str:
+        prompt = build_prompt(base_prompt, spec.context, beat=spec.beat, ahead=spec.index - spec.committed)
+        return generate_chunk(prompt, model=args.model, max_output_tokens=args.max_output_tokens)
 
-        wc = word_count_via_word_com(txt_path)
-        print(f"ITER={it} WORD_COUNT={wc}")
+    def commit(spec: ChunkSpec, chunk: str) -> None:
+        nonlocal wc
+        append_utf8(txt_path, chunk)
+        wc = word_count(txt_path, args)
+        print(f"ITER={spec.index + 1} WORD_COUNT={wc}")
+
+    pipe = ChunkPipeline(
+        generate,
+        commit,
+        snapshot=lambda: tail_text(txt_path, args.context_chars),
+        # spekulatywny chunk vs faktycznie zatwierdzony ogon (z chunkami, ktorych nie widzial)
+        check=lambda spec, chunk: continuity_issue(tail_text(txt_path, args.context_chars), chunk),
+        beat=lambda i: beats[i] if i < len(beats) else "",
+        inflight=args.inflight,
+        max_regen=args.max_regen,
+    )
+    stats = pipe.run(n=safety_iters, done=lambda: wc >= args.target)
+    print(
+        f"PIPELINE mode={stats['mode']} inflight={stats['inflight']} wall={stats['wall_s']}s "
+        f"sequential_est={stats['sequential_est_s']}s speedup={stats['speedup']} "
+        f"regenerated={stats['regenerated']} discarded={stats['discarded']}"
+    )
 
     if wc >= args.target:
         print(f"DONE WORD_COUNT={wc} (>= {args.target})")
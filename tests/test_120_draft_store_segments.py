@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from books_draft_store import DraftStore
+
+
+class Test120DraftStoreSegments(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.master = Path(self._tmp.name) / "draft" / "master.txt"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_append_writes_segments_and_manifest(self):
+        st = DraftStore(self.master)
+        a = st.append("Ala ma kota.\n")
+        b = st.append("Kot ma Alę.\n")
+
+        self.assertEqual(self.master.read_text(encoding="utf-8"), "Ala ma kota.\nKot ma Alę.\n")
+        self.assertEqual(a["offset"], 0)
+        self.assertEqual(b["offset"], len("Ala ma kota.\n".encode("utf-8")))
+        self.assertEqual(b["total_words"], 6)
+
+        segs = [r for r in st.manifest() if r["kind"] == "segment"]
+        self.assertEqual([r["seq"] for r in segs], [a["seq"], b["seq"]])
+        self.assertTrue(all(len(r["sha256"]) == 64 for r in segs))
+
+    def test_recover_replays_torn_append(self):
+        st = DraftStore(self.master)
+        st.append("pierwszy\n")
+        st.append("drugi akapit\n")
+
+        # crash w trakcie dopisywania do master.txt (manifest juz zapisany)
+        with open(self.master, "r+b") as f:
+            f.truncate(len(b"pierwszy\n") + 3)
+
+        self.assertEqual(st.recover()["action"], "replayed")
+        self.assertEqual(self.master.read_text(encoding="utf-8"), "pierwszy\ndrugi akapit\n")
+
+    def test_external_rewrite_rebases(self):
+        st = DraftStore(self.master)
+        st.append("raz dwa\n")
+        self.master.write_text("zupelnie nowy tekst\n", encoding="utf-8")
+
+        out = st.append("dalej\n")
+        self.assertEqual(out["recovery"], "rebased")
+        self.assertEqual(out["total_words"], 4)
+        self.assertEqual(self.master.read_text(encoding="utf-8"), "zupelnie nowy tekst\ndalej\n")
+
+    def test_same_stem_files_keep_separate_segments(self):
+        md = self.master.with_suffix(".md")
+        txt, mdst = DraftStore(self.master), DraftStore(md)
+        self.assertNotEqual(txt.seg_dir, mdst.seg_dir)
+        txt.append("tekst\n")
+        mdst.append("# naglowek\n")
+        txt.append("dalej\n")
+        self.assertEqual((txt.recover()["action"], mdst.recover()["action"]), ("none", "none"))
+        self.assertEqual(self.master.read_text(encoding="utf-8"), "tekst\ndalej\n")
+        self.assertEqual(md.read_text(encoding="utf-8"), "# naglowek\n")
+
+    def test_legacy_stem_segments_dir_is_adopted(self):
+        st = DraftStore(self.master)
+        st.append("pierwszy\n")
+        st.append("drugi akapit\n")
+        legacy = self.master.parent / "segments" / "master"
+        st.seg_dir.rename(legacy)  # uklad sprzed segments/<name>/
+        with open(self.master, "r+b") as f:
+            f.truncate(len(b"pierwszy\n") + 3)
+
+        fresh = DraftStore(self.master)
+        self.assertFalse(legacy.exists())
+        self.assertEqual(fresh.recover()["action"], "replayed")
+        self.assertEqual(self.master.read_text(encoding="utf-8"), "pierwszy\ndrugi akapit\n")
+
+    def test_compact_folds_manifest(self):
+        st = DraftStore(self.master)
+        for i in range(5):
+            st.append(f"chunk {i}\n")
+
+        out = st.compact()
+        self.assertEqual(out["segments_folded"], 5)
+        self.assertEqual(out["total_words"], 10)
+
+        man = st.manifest()
+        self.assertEqual(len(man), 1)
+        self.assertEqual(man[0]["kind"], "base")
+        self.assertEqual(list(st.seg_dir.glob("*.txt")), [])
+        self.assertTrue(self.master.read_text(encoding="utf-8").endswith("chunk 4\n"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import books_core
+from books_core import read_tail_bytes, read_tail_text
+
+
+class Test121ReadTailText(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "master.txt"
+        paras = [f"Akapit {i}. Zażółć gęślą jaźń! Czy to już koniec?" for i in range(3000)]
+        self.text = "\n\n".join(paras) + "\n"
+        self.path.write_text(self.text, encoding="utf-8")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_chars_matches_full_read(self):
+        for n in (1, 7, 4000, 200_000):
+            self.assertEqual(read_tail_text(self.path, chars=n), self.text[-n:])
+
+    def test_bytes_never_split_utf8(self):
+        data = self.path.read_bytes()
+        for n in range(1, 40):
+            tail = read_tail_bytes(self.path, n)
+            self.assertTrue(data.endswith(tail))
+            tail.decode("utf-8")  # strict
+
+    def test_lines_sentences_paragraphs(self):
+        lines = read_tail_text(self.path, lines=5).splitlines()
+        self.assertEqual(lines[-5:], self.text.splitlines()[-5:])
+
+        sents = books_core._SENT_SPLIT_RE.split(read_tail_text(self.path, sentences=10).strip())
+        full = books_core._SENT_SPLIT_RE.split(self.text.strip())
+        self.assertEqual(sents[-10:], full[-10:])
+
+        paras = [p for p in read_tail_text(self.path, paragraphs=3).split("\n\n") if p.strip()]
+        self.assertEqual(paras[-3:], [p for p in self.text.split("\n\n") if p.strip()][-3:])
+
+    def test_small_window_covers_start_and_strips_bom(self):
+        p = Path(self._tmp.name) / "bom.txt"
+        p.write_text("\ufeffJedno zdanie.", encoding="utf-8")
+        self.assertEqual(read_tail_text(p, sentences=5), "Jedno zdanie.")
+        self.assertEqual(read_tail_text(Path(self._tmp.name) / "missing.txt", chars=10), "")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.uniqueness_index import UniquenessIndex, jaccard_estimate, minhash
+
+BASE = (
+    "Kamil zszedł na parking podziemny i zatrzymał się przy filarze numer siedem. "
+    "Światło migotało nad rzędem samochodów, a wentylacja buczała zbyt głośno jak na tę porę. "
+    "W kieszeni miał kartę dostępu z wytartym nadrukiem i telefon z pękniętym szkłem. "
+    "Wiedział, że kamera przy wjeździe łapie każdy ruch, więc szedł wolno, jakby szukał auta. "
+    "Ktoś zostawił na masce kopertę bez adresu. Nie dotknął jej od razu, tylko rozejrzał się dookoła."
+)
+
+
+class Test122UniquenessMinhashIndex(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "reg.jsonl"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+        os.environ.pop("UNIQUENESS_MAX_DOCS", None)
+        os.environ.pop("UNIQUENESS_RETENTION_DAYS", None)
+
+    def test_near_duplicate_scores_high_unrelated_low(self):
+        near = BASE.replace("numer siedem", "numer osiem").replace("wolno", "powoli")
+        other = "Przepis na zupę pomidorową: pomidory, bulion, śmietana, makaron i odrobina bazylii na koniec gotowania."
+
+        self.assertGreater(jaccard_estimate(minhash(BASE), minhash(near)), 0.5)
+        self.assertLess(jaccard_estimate(minhash(BASE), minhash(other)), 0.2)
+
+        idx = UniquenessIndex(self.path)
+        self.assertEqual(idx.check_and_add("bookA", BASE)["score"], 0.0)
+
+        r = idx.check_and_add("bookB", near)
+        self.assertGreater(r["score"], 0.5)
+        self.assertEqual(r["matches"][0]["book_id"], "bookA")
+        self.assertEqual(idx.check_and_add("bookC", other)["matches"], [])
+
+        # ten sam book nie jest porownywany sam ze soba
+        self.assertTrue(all(m["book_id"] != "bookA" for m in idx.check_and_add("bookA", BASE)["matches"]))
+
+    def test_registry_stores_no_full_text_and_reloads(self):
+        idx = UniquenessIndex(self.path)
+        idx.check_and_add("bookA", BASE)
+        raw = self.path.read_text(encoding="utf-8")
+        self.assertNotIn("rozejrzał się dookoła", raw)
+
+        fresh = UniquenessIndex(self.path)
+        self.assertEqual(fresh.check_and_add("bookB", BASE)["score"], 1.0)
+        # sygnatury w pamieci spakowane (NUM_PERM x uint32), nie krotki intow
+        self.assertEqual({(type(d["sig"]), len(d["sig"])) for d in fresh.docs.values()}, {(bytes, 256)})
+        self.assertEqual(fresh.query(minhash(BASE), "-")[0]["score"], 1.0)
+
+    def test_retention_compacts_registry(self):
+        os.environ["UNIQUENESS_MAX_DOCS"] = "10"
+        idx = UniquenessIndex(self.path)
+        for i in range(20):
+            idx.check_and_add(f"book{i}", f"{BASE} Wariant {i} z dopiskiem {i * 7}.")
+        self.assertLessEqual(len(idx.docs), 13)
+        lines = [ln for ln in self.path.read_text(encoding="utf-8").splitlines() if ln.strip()]
+        self.assertEqual(len(lines), len(idx.docs))
+
+    def test_retention_expiry_check_does_not_scan_docs(self):
+        os.environ["UNIQUENESS_RETENTION_DAYS"] = "1"
+        idx = UniquenessIndex(self.path)
+        for i in range(8):
+            idx.check_and_add(f"book{i}", f"{BASE} Wariant {i}.")
+        self.assertEqual(idx._expired_count(), 0)
+
+        class NoScan(dict):
+            def values(self):
+                raise AssertionError("scan")
+
+        idx.docs = NoScan(idx.docs)
+        idx._ts[:2] = [1.0, 2.0]  # dwa najstarsze sprzed okna retencji (ponizej progu kompakcji)
+        self.assertEqual(idx._expired_count(), 2)
+        idx.check_and_add("book9", f"{BASE} Wariant 9.")
+        self.assertEqual(len(idx.docs), 9)
+
+    def test_uniqueness_tool_accepts_zero_threshold(self):
+        from app import tools
+
+        os.environ["UNIQUENESS_REGISTRY_PATH"] = str(self.path)
+        try:
+            r = tools.tool_uniqueness({"book_id": "bookA", "text": BASE, "threshold": 0})
+        finally:
+            os.environ.pop("UNIQUENESS_REGISTRY_PATH", None)
+        self.assertEqual((r["payload"]["meta"]["threshold"], r["payload"]["UNIQ_DECISION"]), (0.0, "REVISE"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
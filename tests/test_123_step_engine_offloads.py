@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from app.step_engine import StepEngine
+
+
+def _sleepy(sec: float):
+    time.sleep(sec)
+    return threading.current_thread().name
+
+
+class Test123StepEngineOffloads(unittest.TestCase):
+    def test_different_books_run_in_parallel(self):
+        engine = StepEngine(kind="thread", workers=4, per_book=1)
+
+        async def go():
+            return await asyncio.gather(*[engine.run(f"book{i}", _sleepy, 0.3) for i in range(4)])
+
+        t0 = time.perf_counter()
+        names = asyncio.run(go())
+        dt = time.perf_counter() - t0
+        engine.shutdown()
+
+        self.assertLess(dt, 0.9, dt)
+        self.assertTrue(all(n.startswith("agent-step") for n in names), names)
+        self.assertEqual(engine.stats()["completed"], 4)
+
+    def test_same_book_is_serialized(self):
+        engine = StepEngine(kind="thread", workers=4, per_book=1)
+
+        async def go():
+            await asyncio.gather(*[engine.run("same", _sleepy, 0.2) for _ in range(3)])
+
+        t0 = time.perf_counter()
+        asyncio.run(go())
+        dt = time.perf_counter() - t0
+        engine.shutdown()
+        self.assertGreaterEqual(dt, 0.55, dt)
+
+    def test_event_loop_stays_responsive(self):
+        engine = StepEngine(kind="thread", workers=2, per_book=1)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.05)
+
+        async def go():
+            await asyncio.gather(engine.run("b", _sleepy, 0.4), ticker())
+
+        asyncio.run(go())
+        engine.shutdown()
+        self.assertEqual(len(ticks), 5)
+        self.assertLess(ticks[-1] - ticks[0], 0.35)
+
+    def test_errors_propagate(self):
+        engine = StepEngine(kind="thread", workers=1, per_book=1)
+
+        def boom():
+            raise ValueError("x")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(engine.run("b", boom))
+        engine.shutdown()
+        self.assertEqual(engine.stats()["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
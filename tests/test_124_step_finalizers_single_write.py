@@ -0,0 +1,64 @@
+import json
+import os
+import shutil
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import app.orchestrator_stub as orch
+from app.orchestrator_stub import HTTP_STEP_FINALIZERS, execute_stub, finalize_step_doc
+
+
+class Test124StepFinalizersSingleWrite(unittest.TestCase):
+    RUN_ID = "run_test_124_finalizers"
+
+    def setUp(self):
+        os.environ["AGENT_TEST_MODE"] = "1"
+
+    def tearDown(self):
+        shutil.rmtree(orch.ROOT / "runs" / self.RUN_ID, ignore_errors=True)
+        shutil.rmtree(orch.ROOT / "books" / "test_book_124", ignore_errors=True)
+
+    def test_one_write_per_step_and_docs_are_normalized(self):
+        with mock.patch.object(orch, "_atomic_write_json", wraps=orch._atomic_write_json) as w:
+            paths = execute_stub(run_id=self.RUN_ID, book_id="test_book_124", modes=["WRITE", "QUALITY"], payload={"input": "x"})
+
+        step_writes = [c.args[0] for c in w.call_args_list if Path(c.args[0]).parent.name == "steps"]
+        self.assertEqual(len(step_writes), len(paths) + 1)  # + 000_SEQUENCE.json
+
+        for p in paths:
+            doc = json.loads(Path(p).read_text(encoding="utf-8"))
+            self.assertEqual(doc["team"]["id"], doc["team"]["team_id"])
+            self.assertTrue(doc["team"]["policy_id"])
+            self.assertIn("model", doc["effective_policy"])
+            meta = doc["result"]["payload"]["meta"]
+            self.assertEqual(meta["requested_model"], doc["input"]["_requested_model"])
+            self.assertEqual(meta["team_id"], doc["team"]["id"])
+
+        q = json.loads(Path(paths[-1]).read_text(encoding="utf-8"))
+        self.assertNotIn("text", q["result"]["payload"])
+
+        seq = json.loads((orch.ROOT / "runs" / self.RUN_ID / "steps" / "000_SEQUENCE.json").read_text(encoding="utf-8"))
+        self.assertEqual(seq["team"]["policy_id"], "DEFAULT")
+
+    def test_http_finalizers_apply_quality_contract_and_force_reject(self):
+        doc = {
+            "mode": "QUALITY",
+            "team": {"id": "QA", "policy_id": "P"},
+            "input": {"force_reject": True},
+            "result": {"tool": "quality_stub", "payload": {"DECISION": "PASS", "text": "abc"}},
+        }
+        out = finalize_step_doc(doc, HTTP_STEP_FINALIZERS)
+        pl = out["result"]["payload"]
+        self.assertEqual(pl["DECISION"], "REJECT")
+        self.assertTrue(pl["FLAGS"]["force_reject"])
+        self.assertNotIn("text", pl)
+        self.assertEqual(out["result"]["tool"], "QUALITY")
+
+        plain = finalize_step_doc({"mode": "QUALITY", "result": {"payload": {"DECISION": "fail"}}}, ("quality_contract",))
+        self.assertEqual(plain["result"]["payload"]["DECISION"], "REJECT")
+        self.assertEqual(plain["result"]["payload"]["REASONS"], [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
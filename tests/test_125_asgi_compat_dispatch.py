@@ -0,0 +1,93 @@
+import re
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from app.asgi_dispatch import install_dispatch
+
+
+def _make_app():
+    app = FastAPI()
+    seen = {"bodies": []}
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.json()
+        seen["bodies"].append(body)
+        return {"body": body}
+
+    @app.get("/health")
+    def health():
+        return {"ok": True}
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse("plain")
+
+    reg = install_dispatch(app)
+    calls = []
+
+    @reg.request("/echo", methods="POST")
+    async def inner(ctx):
+        calls.append("inner")
+        body = ctx.json() or {}
+        body["inner"] = True
+        ctx.set_json(body)
+        return None
+
+    @reg.response("/echo")
+    def inner_resp(ctx, status, payload):
+        calls.append("inner_resp")
+        payload["trail"] = payload.get("trail", []) + ["inner"]
+        return status, payload
+
+    @reg.request(re.compile(r"/echo|/text"))
+    async def outer(ctx):
+        calls.append("outer")
+        if (ctx.json() or {}).get("short"):
+            return JSONResponse({"short": True}, status_code=202)
+        return None
+
+    @reg.response(re.compile(r"/echo|/text"))
+    def outer_resp(ctx, status, payload):
+        calls.append("outer_resp")
+        payload["trail"] = payload.get("trail", []) + ["outer"]
+        return status, payload
+
+    return app, seen, calls
+
+
+class Test125AsgiCompatDispatch(unittest.TestCase):
+    def test_layer_order_and_single_body_rewrite(self):
+        app, seen, calls = _make_app()
+        self.assertEqual(app.state.compat_dispatch.names(), ["outer_resp", "outer", "inner_resp", "inner"])
+
+        r = TestClient(app).post("/echo", json={"x": 1})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(seen["bodies"], [{"x": 1, "inner": True}])
+        self.assertEqual(r.json()["trail"], ["inner", "outer"])
+        self.assertEqual(int(r.headers["content-length"]), len(r.content))
+        self.assertEqual(calls, ["outer", "inner", "inner_resp", "outer_resp"])
+
+    def test_short_circuit_skips_inner_layers(self):
+        app, seen, calls = _make_app()
+        r = TestClient(app).post("/echo", json={"short": True})
+        self.assertEqual(r.status_code, 202)
+        self.assertEqual(r.json(), {"short": True, "trail": ["outer"]})
+        self.assertEqual(seen["bodies"], [])
+        self.assertEqual(calls, ["outer", "outer_resp"])
+
+    def test_unmatched_and_non_json_pass_through(self):
+        app, _, calls = _make_app()
+        c = TestClient(app)
+        self.assertEqual(c.get("/health").json(), {"ok": True})
+        self.assertEqual(calls, [])
+        r = c.get("/text")
+        self.assertEqual(r.text, "plain")
+        self.assertEqual(calls, ["outer"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
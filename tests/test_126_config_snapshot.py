@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import app.config_registry as cr
+
+
+class Test126ConfigSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        d = Path(self.tmp.name)
+        self.files = {
+            "APP_MODES_JSON": d / "modes.json",
+            "APP_PRESETS_JSON": d / "presets.json",
+            "CFG_MODE_TEAM_MAP_JSON": d / "mode_team_map.json",
+            "CFG_POLICIES_JSON": d / "policies.json",
+        }
+        self._write("APP_MODES_JSON", {"modes": [{"id": "PLAN"}, {"id": "WRITE"}]})
+        self._write("APP_PRESETS_JSON", {"presets": [{"id": "P1", "modes": ["plan", "write"], "steps": [{"mode": "PLAN"}, {"mode": "WRITE"}]}]})
+        self._write("CFG_MODE_TEAM_MAP_JSON", {"PLAN": "WRITER", "WRITE": "WRITER"})
+        self._write("CFG_POLICIES_JSON", {"teams": {"WRITER": {"policy_id": "POL_W", "model": "m1"}}})
+
+        self.patches = [mock.patch.object(cr, k, v) for k, v in self.files.items()]
+        self.patches.append(mock.patch.object(cr, "SNAPSHOT_CHECK_S", 0.0))
+        for p in self.patches:
+            p.start()
+        cr.reset_snapshot()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        cr.reset_snapshot()
+        self.tmp.cleanup()
+
+    def _write(self, key, obj, raw=None):
+        path = self.files[key]
+        path.write_text(raw if raw is not None else json.dumps(obj), encoding="utf-8")
+        # wymuszamy zmiane sygnatury niezaleznie od rozdzielczosci mtime
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10_000_000))
+
+    def test_lookups_and_snapshot_reuse(self):
+        s = cr.get_snapshot()
+        self.assertIs(cr.get_snapshot(), s)
+        self.assertEqual(s.mode_ids, frozenset({"PLAN", "WRITE"}))
+        self.assertEqual(s.team_for_mode("WRITE"), "WRITER")
+        self.assertEqual(s.policy_for_team("WRITER")["model"], "m1")
+        self.assertEqual(s.policy_for_team("NOPE"), {})
+        self.assertEqual(s.preset_modes["P1"], ("PLAN", "WRITE"))
+        self.assertEqual([x["mode"] for x in s.preset_steps("P1")], ["PLAN", "WRITE"])
+        self.assertIsNone(s.preset_steps("NOPE"))
+
+    def test_hot_reload_and_invalid_reload_keeps_last_good(self):
+        s1 = cr.get_snapshot()
+        self._write("CFG_POLICIES_JSON", {"teams": {"WRITER": {"policy_id": "POL_W", "model": "m2"}}})
+        s2 = cr.get_snapshot()
+        self.assertIsNot(s2, s1)
+        self.assertEqual(s2.policy_for_team("WRITER")["model"], "m2")
+
+        self._write("APP_MODES_JSON", None, raw="{broken")
+        s3 = cr.get_snapshot()
+        self.assertIs(s3, s2)
+        self.assertTrue(cr.reload_errors and "Invalid JSON" in cr.reload_errors[-1])
+
+        self._write("APP_MODES_JSON", {"modes": [{"id": "PLAN"}]})
+        self.assertEqual(cr.get_snapshot().mode_ids, frozenset({"PLAN"}))
+
+    def test_first_load_of_invalid_config_raises(self):
+        self._write("APP_PRESETS_JSON", {"presets": [{"id": "A"}, {"id": "A"}]})
+        cr.reset_snapshot()
+        with self.assertRaises(cr.ConfigError):
+            cr.get_snapshot()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
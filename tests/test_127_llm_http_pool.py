@@ -0,0 +1,112 @@
+import asyncio
+import os
+import socket
+import threading
+import unittest
+from unittest import mock
+
+import llm_client
+from app import llm_http
+from app.llm_fake_provider import FakeLLMProvider
+from app.llm_http import LLMHttpClient, LLMHttpError
+from app.team_runner import _openai_chat
+
+
+class Test127LlmHttpPool(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeLLMProvider().start()
+        self.client = LLMHttpClient(self.fake.base_url, "k", backoff_base=0.0, max_concurrency_per_model=2)
+        self.sleeps = []
+        self.client.sleep = self.sleeps.append
+
+    def tearDown(self):
+        self.client.close()
+        self.fake.stop()
+        llm_http.reset_clients()
+
+    def test_keep_alive_reuses_one_connection(self):
+        for i in range(10):
+            out = self.client.chat("m1", [{"role": "user", "content": f"hello {i}"}])
+            self.assertEqual(out["choices"][0]["message"]["content"], f"[fake:m1] hello {i}")
+        self.assertEqual(self.client.connections_opened, 1)
+        self.assertEqual(self.fake.connections, 1)
+
+    def test_retry_on_429_honors_retry_after(self):
+        self.fake.fail_next(429, count=2, retry_after="1.5")
+        out = self.client.responses("m1", "abc")
+        self.assertEqual(llm_http.response_output_text(out), "[fake:m1] abc")
+        self.assertEqual(self.sleeps, [1.5, 1.5])
+        self.assertEqual(self.client.stats["retries"], 2)
+
+        self.fake.fail_next(400)
+        with self.assertRaises(LLMHttpError) as cm:
+            self.client.chat("m1", [])
+        self.assertEqual(cm.exception.status, 400)
+
+        # 408/409: provider mogl juz przyjac request, bez ponawiania
+        for status in (408, 409):
+            self.fake.fail_next(status)
+            with self.assertRaises(LLMHttpError) as cm:
+                self.client.chat("m1", [])
+            self.assertEqual(cm.exception.status, status)
+        self.assertEqual(self.client.stats["retries"], 2)
+
+        self.fake.fail_next(503, count=self.client.max_retries + 1)
+        with self.assertRaises(LLMHttpError) as cm:
+            self.client.chat("m1", [])
+        self.assertEqual(cm.exception.status, 503)
+
+    def test_read_timeout_is_not_retried(self):
+        # provider przyjal request i liczy dluzej niz timeout: bez ponawiania (i ponownego naliczenia)
+        self.fake.delay_s = 0.5
+        client = LLMHttpClient(self.fake.base_url, "k", timeout=0.1, backoff_base=0.0)
+        client.sleep = self.sleeps.append
+        try:
+            with self.assertRaises(TimeoutError):
+                client.chat("slow", [{"role": "user", "content": "x"}])
+        finally:
+            client.close()
+        self.assertEqual(len(self.fake.requests), 1)
+        self.assertEqual((client.stats["retries"], self.sleeps), (0, []))
+
+    def test_connect_failure_is_retried(self):
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        s.close()
+        client = LLMHttpClient(f"http://127.0.0.1:{port}/v1", "k", max_retries=2, backoff_base=0.0)
+        client.sleep = self.sleeps.append
+        with self.assertRaises(ConnectionRefusedError):
+            client.chat("m1", [])
+        self.assertEqual((client.stats["requests"], client.stats["retries"]), (3, 2))
+
+    def test_bounded_concurrency_per_model_sync_and_async(self):
+        self.fake.delay_s = 0.05
+        threads = [threading.Thread(target=self.client.chat, args=("m2", [{"role": "user", "content": "x"}])) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.fake.peak_inflight["m2"], 2)
+
+        async def many():
+            return await asyncio.gather(*[self.client.achat("m3", [{"role": "user", "content": str(i)}]) for i in range(6)])
+
+        outs = asyncio.run(many())
+        self.assertEqual(len(outs), 6)
+        self.assertEqual(self.fake.peak_inflight["m3"], 2)
+        self.assertLessEqual(self.client.connections_opened, 2)
+
+    def test_callers_share_the_pooled_client(self):
+        env = {"OPENAI_BASE_URL": self.fake.base_url, "OPENAI_API_KEY": "k2"}
+        with mock.patch.dict(os.environ, env):
+            d = llm_client.generate_text("p1", model="gw", return_dict=True)
+            text, effective = _openai_chat("gc", "sys", "u1", 0.2, 50)
+        self.assertEqual(d["text"], "[fake:gw] p1")
+        self.assertEqual(d["model"], "gw")
+        self.assertEqual((text, effective), ("[fake:gc] u1", "gc"))
+        self.assertEqual(llm_http.get_client(self.fake.base_url, "k2").connections_opened, 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+import llm_client
+from app import llm_cache, llm_http
+from app.llm_fake_provider import FakeLLMProvider
+from app.team_runner import run_team_llm
+
+
+class Test128LlmResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fake = FakeLLMProvider().start()
+        self.env = mock.patch.dict(os.environ, {"OPENAI_BASE_URL": self.fake.base_url, "OPENAI_API_KEY": "k", "LLM_CACHE": "1"})
+        self.env.start()
+        self.cache = llm_cache.reset_cache(root=self.tmp)
+
+    def tearDown(self):
+        self.env.stop()
+        self.fake.stop()
+        llm_http.reset_clients()
+        llm_cache.reset_cache()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_generate_text_caches_only_deterministic_calls(self):
+        a = llm_client.generate_text("same prompt", model="m", temperature=0, return_dict=True)
+        b = llm_client.generate_text("same prompt", model="m", temperature=0, return_dict=True)
+        self.assertEqual(a["text"], b["text"])
+        self.assertTrue(b["cached"])
+        self.assertEqual(len(self.fake.requests), 1)
+
+        llm_client.generate_text("same prompt", model="m", temperature=0.8)
+        llm_client.generate_text("same prompt", model="m", temperature=0.8)
+        self.assertEqual(len(self.fake.requests), 3)
+
+        llm_client.generate_text("same prompt", model="m", temperature=0, max_output_tokens=10)
+        self.assertEqual(len(self.fake.requests), 4)
+
+        # nowa instancja (np. po restarcie) czyta wpisy z dysku
+        fresh = llm_cache.reset_cache(root=self.tmp)
+        llm_client.generate_text("same prompt", model="m", temperature=0)
+        self.assertEqual(len(self.fake.requests), 4)
+        self.assertEqual(fresh.stats()["hits"], 1)
+
+    def test_run_team_llm_uses_cache_for_deterministic_policy(self):
+        with mock.patch.dict(os.environ, {"AGENT_TEST_MODE": "1"}):
+            first = run_team_llm(mode="WRITE", payload={"text": "scena 1"})
+            second = run_team_llm(mode="WRITE", payload={"text": "scena 1"})
+        self.assertEqual(first["text"], second["text"])
+        self.assertEqual((first["meta"]["llm_cache"], second["meta"]["llm_cache"]), ("miss", "hit"))
+        self.assertEqual(len(self.fake.requests), 1)
+
+        from app.main import app
+        st = TestClient(app).get("/llm/cache/stats").json()
+        self.assertEqual((st["hits"], st["misses"], st["entries"]), (1, 1, 1))
+
+    def test_run_team_llm_reports_bypass_for_non_deterministic_calls(self):
+        with mock.patch.dict(os.environ, {"AGENT_TEST_MODE": "0"}):
+            first = run_team_llm(mode="WRITE", payload={"text": "scena 2"})
+            second = run_team_llm(mode="WRITE", payload={"text": "scena 2"})
+        self.assertEqual((first["meta"]["llm_cache"], second["meta"]["llm_cache"]), ("bypass", "bypass"))
+        self.assertEqual(len(self.fake.requests), 2)
+        self.assertEqual(self.cache.stats()["misses"], 0)
+
+    def test_lru_eviction_by_size(self):
+        c = llm_cache.LLMResponseCache(root=self.tmp, max_bytes=300)
+        for i in range(5):
+            c.put(f"{i:02d}" + "0" * 62, {"value": {"text": "x" * 100}})
+        c.get("03" + "0" * 62)
+        c.put("05" + "0" * 62, {"value": {"text": "x" * 100}})
+        st = c.stats()
+        self.assertLessEqual(st["bytes"], 300)
+        self.assertIsNotNone(c.get("03" + "0" * 62))
+        self.assertIsNone(c.get("04" + "0" * 62))
+        self.assertGreater(st["evictions"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
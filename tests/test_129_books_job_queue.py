@@ -0,0 +1,275 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import books_job_queue as bq
+from app import llm_http
+from app.llm_fake_provider import FakeLLMProvider
+
+BOOK = "test_book_129"
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Test129BooksJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = Path(self.tmp) / "q.sqlite3"
+
+    def tearDown(self):
+        bq.reset(Path(self.tmp) / "idle.sqlite3").stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        for b in (BOOK, BOOK + "_b"):
+            shutil.rmtree(ROOT / "books" / b, ignore_errors=True)
+
+    def test_priority_per_book_serialization_and_lease_recovery(self):
+        q = bq.JobQueue(self.db, max_attempts=2)
+        q.enqueue("k", "A", {"n": 1}, job_id="a1")
+        q.enqueue("k", "A", {"n": 2}, job_id="a2", priority=5)
+        q.enqueue("k", "B", {"n": 3}, job_id="b1")
+        q.enqueue("k", "A", {"n": 1}, job_id="a1")  # idempotentny import
+
+        first = q.claim("w1", lease_s=30)
+        self.assertEqual(first["job_id"], "a2")
+        self.assertEqual(first["payload"], {"n": 2})
+        # ksiazka A zajeta -> nastepny tylko z B
+        self.assertEqual(q.claim("w2", lease_s=30)["job_id"], "b1")
+        self.assertIsNone(q.claim("w3", lease_s=30))
+        self.assertTrue(q.is_book_busy("A"))
+        self.assertTrue(q.finish("a2", "w1"))
+        self.assertFalse(q.finish("b1", "not-owner"))
+
+        # crash workera: lease wygasa, job wraca do kolejki, po max_attempts konczy jako FAILED
+        j = q.claim("w4", lease_s=0.01)
+        self.assertEqual((j["job_id"], j["attempts"]), ("a1", 1))
+        time.sleep(0.03)
+        j = q.claim("w5", lease_s=0.01)
+        self.assertEqual((j["job_id"], j["attempts"]), ("a1", 2))
+        time.sleep(0.03)
+        self.assertIsNone(q.claim("w6", lease_s=30, book="A"))
+        self.assertEqual(q.get("a1")["status"], bq.FAILED)
+
+        q.enqueue("k", "C", {}, job_id="c1")
+        self.assertTrue(q.cancel("c1"))
+        m = q.metrics()
+        self.assertEqual(m["by_status"], {bq.DONE: 1, bq.RUNNING: 1, bq.FAILED: 1, bq.CANCELLED: 1})
+        self.assertEqual(m["depth"], 0)
+        self.assertEqual(m["sample"], 2)  # DONE + FAILED; CANCELLED nigdy nie wystartowal
+
+    def test_pool_runs_books_in_parallel_but_each_book_serially(self):
+        pool = bq.reset(self.db, workers=3, lease_s=5)
+        spans = []
+        lock = threading.Lock()
+
+        def handler(job):
+            t0 = time.perf_counter()
+            time.sleep(0.05)
+            with lock:
+                spans.append((job["book"], t0, time.perf_counter()))
+
+        pool.register("slow", handler)
+        q = bq.get_queue()
+        for i in range(3):
+            q.enqueue("slow", "A", {"i": i})
+            q.enqueue("slow", "B", {"i": i})
+        pool.start()
+        deadline = time.time() + 10
+        while pool.done < 6 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(pool.done, 6)
+
+        for book in ("A", "B"):
+            s = sorted(x[1:] for x in spans if x[0] == book)
+            self.assertTrue(all(a[1] <= b[0] for a, b in zip(s, s[1:])), book)
+        a = [x for x in spans if x[0] == "A"]
+        b = [x for x in spans if x[0] == "B"]
+        self.assertTrue(any(x[1] < y[2] and y[1] < x[2] for x in a for y in b))
+
+    def test_loop_write_job_and_worker_once_use_the_queue(self):
+        bq.reset(self.db, workers=2, lease_s=5)
+        import books_agent_jobs_api as jobs_api
+        import books_agent_step_api as step_api
+        import books_agent_worker_api as worker_api
+
+        app = FastAPI()
+        for r in (jobs_api.router, step_api.router, worker_api.router):
+            app.include_router(r)
+
+        with TestClient(app) as c, FakeLLMProvider() as fake, mock.patch.dict(
+            os.environ, {"OPENAI_BASE_URL": fake.base_url, "OPENAI_API_KEY": "k"}
+        ):
+            r = c.post("/books/agent/loop_write_job", json={"book": BOOK, "n": 2, "do_proof": False, "do_stylist": False}).json()
+            deadline = time.time() + 20
+            st = {}
+            while time.time() < deadline:
+                st = c.get(f"/books/agent/job/{r['job_id']}", params={"book": BOOK}).json()
+                if st.get("status") not in ("QUEUED", "RUNNING"):
+                    break
+                time.sleep(0.05)
+            self.assertEqual(st["status"], "SUCCESS")
+            self.assertEqual(len(st["steps"]), 2)
+
+            s = c.post("/books/agent/step", json={"book": BOOK + "_b", "intent": "next"})
+            self.assertEqual(s.status_code, 200, s.text)
+            w = c.post("/books/agent/worker/once", json={"book": BOOK + "_b"}).json()
+            self.assertEqual((w["status"], w["job_id"], w["wrote_to"]), ("SUCCESS", s.json()["job_id"], "buffer"))
+            self.assertEqual(c.post("/books/agent/worker/once", json={"book": BOOK + "_b"}).json()["status"], "NO_JOBS")
+
+            m = c.get("/books/agent/jobs/metrics").json()
+            self.assertEqual(m["queue"]["by_status"].get("DONE"), 2)
+        llm_http.reset_clients()
+
+
+    def test_failed_prompt_job_is_mirrored_and_can_be_retried(self):
+        import json
+
+        bq.reset(self.db, workers=1, lease_s=5)
+        import books_agent_worker_api as worker_api
+
+        book_dir = worker_api.ensure_book_scaffold(BOOK)
+        (book_dir / "prompt.txt").write_text("Pisz dalej.", encoding="utf-8")
+        job_p = book_dir / "jobs" / "j1.json"
+        job_p.write_text(json.dumps({"job_id": "j1", "prompt_file": f"books/{BOOK}/prompt.txt", "status": "QUEUED"}), encoding="utf-8")
+        app = FastAPI()
+        app.include_router(worker_api.router)
+        c = TestClient(app)
+
+        with mock.patch.object(worker_api, "stream_text", side_effect=RuntimeError("provider down")):
+            r = c.post("/books/agent/worker/once", json={"book": BOOK}).json()
+        self.assertEqual(r["status"], "ERROR")
+        job = json.loads(job_p.read_text(encoding="utf-8"))
+        self.assertEqual(job["status"], "FAILED")
+        self.assertIn("provider down", job["error"])
+        self.assertEqual(bq.get_queue().get("j1")["status"], bq.FAILED)
+        # drugi przebieg: porazka widoczna w pliku, job nie wisi jako QUEUED
+        self.assertEqual(c.post("/books/agent/worker/once", json={"book": BOOK}).json()["status"], "NO_JOBS")
+
+        # reczne ponowienie: plik z powrotem QUEUED -> job wraca do kolejki
+        job["status"] = "QUEUED"
+        job_p.write_text(json.dumps(job), encoding="utf-8")
+        with FakeLLMProvider() as fake, mock.patch.dict(os.environ, {"OPENAI_BASE_URL": fake.base_url, "OPENAI_API_KEY": "k"}):
+            r = c.post("/books/agent/worker/once", json={"book": BOOK}).json()
+        self.assertEqual((r["status"], r["job_id"]), ("SUCCESS", "j1"))
+        self.assertFalse(job_p.exists())
+        self.assertEqual(bq.get_queue().get("j1")["status"], bq.DONE)
+        llm_http.reset_clients()
+
+        # porazka zapisana tylko w kolejce (np. wygasly lease po crashu workera) tez trafia do pliku
+        j2 = book_dir / "jobs" / "j2.json"
+        j2.write_text(json.dumps({"job_id": "j2", "prompt_file": f"books/{BOOK}/prompt.txt", "status": "QUEUED"}), encoding="utf-8")
+        q = bq.get_queue()
+        self.assertEqual(worker_api.import_file_jobs(BOOK, book_dir / "jobs"), 1)
+        self.assertEqual(q.claim("dead-worker", lease_s=30, book=BOOK)["job_id"], "j2")
+        q.finish("j2", "dead-worker", bq.FAILED, "LEASE_EXPIRED")
+        self.assertEqual(worker_api.import_file_jobs(BOOK, book_dir / "jobs"), 0)
+        self.assertEqual(json.loads(j2.read_text(encoding="utf-8"))["error"], "LEASE_EXPIRED")
+
+    def test_failing_loop_job_is_retried_then_failed(self):
+        pool = bq.reset(self.db, workers=1, lease_s=5)
+        import books_agent_jobs_api as jobs_api
+
+        app = FastAPI()
+        app.include_router(jobs_api.router)
+        calls = []
+
+        def boom(req):
+            calls.append(1)
+            raise RuntimeError("architect down")
+
+        with TestClient(app) as c, mock.patch.object(jobs_api, "architect_brief", side_effect=boom):
+            r = c.post("/books/agent/loop_write_job", json={"book": BOOK, "n": 2, "do_proof": False, "do_stylist": False}).json()
+            q = bq.get_queue()
+            deadline = time.time() + 20
+            while q.get(r["job_id"])["status"] != bq.FAILED and time.time() < deadline:
+                time.sleep(0.02)
+            st = c.get(f"/books/agent/job/{r['job_id']}", params={"book": BOOK}).json()
+
+        qjob = q.get(r["job_id"])
+        self.assertEqual((qjob["status"], qjob["attempts"]), (bq.FAILED, q.max_attempts))
+        self.assertIn("architect down", qjob["error"])
+        self.assertEqual((len(calls), pool.failed, pool.done), (q.max_attempts, q.max_attempts, 0))
+        self.assertEqual(st["status"], "FAILED")
+        self.assertIn("architect down", st["error"])
+
+    def test_loop_job_stops_writing_when_lease_is_lost(self):
+        import books_agent_jobs_api as jobs_api
+        from books_core import make_run_id, safe_book_root
+
+        q = bq.JobQueue(self.db)
+        book_root = safe_book_root(BOOK)
+        req = jobs_api.LoopWriteJobReq(book=BOOK, n=3, do_proof=False, do_stylist=False).model_dump()
+        jobs_api._write_job(book_root, "j1", {"job_id": "j1", "status": "QUEUED", "req": req})
+        q.enqueue(jobs_api.JOB_KIND, BOOK, {}, job_id="j1")
+        q.claim("w1", lease_s=30)
+        lease = bq.Heartbeat(q, "j1", "w1", 30)
+
+        real_writer = jobs_api.writer_generate
+
+        def writer_then_stall(wreq):
+            out = real_writer(wreq)
+            # po pierwszym kroku worker "zamarza": lease wygasa i job przejmuje w2
+            q.heartbeat("j1", "w1", -1)
+            self.assertEqual(q.claim("w2", lease_s=30)["job_id"], "j1")
+            return out
+
+        payload = {"book": BOOK, "job_id": "j1", "req": req, "job_run_id": make_run_id("loopwritejob")}
+        with mock.patch.object(jobs_api, "writer_generate", side_effect=writer_then_stall):
+            with self.assertRaises(bq.LeaseLost):
+                jobs_api._run_job(payload, lease=lease)
+
+        st = jobs_api._read_job(book_root, "j1")
+        self.assertEqual((st["status"], len(st["steps"])), ("RUNNING", 1))
+        self.assertFalse(q.fail("j1", "w1", "LeaseLost"))
+        self.assertEqual(q.get("j1")["lease_owner"], "w2")
+
+    def test_import_file_jobs_globs_only_after_directory_change(self):
+        import json
+
+        bq.reset(self.db, workers=1, lease_s=5)
+        import books_agent_worker_api as worker_api
+
+        jobs_dir = worker_api.ensure_book_scaffold(BOOK) / "jobs"
+        q = bq.get_queue()
+
+        def write_job(name, status="QUEUED"):
+            (jobs_dir / f"{name}.json").write_text(json.dumps({"prompt_file": "x.txt", "status": status}), encoding="utf-8")
+
+        def settle():
+            old = time.time() - 10
+            os.utime(jobs_dir, (old, old))
+
+        write_job("p1")
+        write_job("p2", status="FAILED")
+        (jobs_dir / "loop.json").write_text(json.dumps({"status": "SUCCESS"}), encoding="utf-8")
+        settle()
+        self.assertEqual(worker_api.import_file_jobs(BOOK, jobs_dir), 1)
+
+        with mock.patch.object(Path, "glob", side_effect=AssertionError("glob")):
+            self.assertEqual(worker_api.import_file_jobs(BOOK, jobs_dir), 0)
+            # porazka p1 tylko w kolejce: plik dalej odbity bez skanu katalogu
+            self.assertEqual(q.claim("w", lease_s=30, book=BOOK)["job_id"], "p1")
+            q.finish("p1", "w", bq.FAILED, "LEASE_EXPIRED")
+            self.assertEqual(worker_api.import_file_jobs(BOOK, jobs_dir), 0)
+            self.assertEqual(json.loads((jobs_dir / "p1.json").read_text(encoding="utf-8"))["status"], "FAILED")
+
+        # odbicie porazki to tmp+rename, czyli zmiana katalogu: jeden pelny skan
+        settle()
+        self.assertEqual(worker_api.import_file_jobs(BOOK, jobs_dir), 0)
+        with mock.patch.object(Path, "glob", side_effect=AssertionError("glob")):
+            # reczne ponowienie edycja w miejscu (katalog bez zmian)
+            write_job("p2")
+            self.assertEqual(worker_api.import_file_jobs(BOOK, jobs_dir), 1)
+            self.assertEqual(q.get("p2")["status"], bq.QUEUED)
+
+        write_job("p3")  # nowy plik zmienia katalog -> pelny skan
+        self.assertEqual(worker_api.import_file_jobs(BOOK, jobs_dir), 1)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,122 @@
+import json
+import shutil
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import books_runs_catalog as rc
+from books_core import write_run
+
+ROOT = Path(__file__).resolve().parents[1]
+BOOK = "test_book_130"
+
+
+class Test130RunsCatalog(unittest.TestCase):
+    def setUp(self):
+        self.root = ROOT / "books" / BOOK
+        shutil.rmtree(self.root, ignore_errors=True)
+        rc.reset_catalogs()
+        import books_runs_api
+        import books_runs_query_api
+
+        app = FastAPI()
+        app.include_router(books_runs_query_api.router)
+        app.include_router(books_runs_api.router)
+        self.c = TestClient(app)
+
+    def tearDown(self):
+        rc.reset_catalogs()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, i, role="PISARZ", status="SUCCESS", preview=""):
+        meta = {"created_at": f"2026-01-01T00:00:{i:02d}Z"}
+        write_run(self.root, f"run_{i:03d}", "tool", f"Rozdzial {i}", status, role, {}, {"preview": preview}, meta)
+
+    def test_write_run_feeds_catalog_and_keyset_pages_cover_everything(self):
+        for i in range(25):
+            self._write(i, role="KRYTYK" if i % 5 == 0 else "PISARZ", preview=f"scena z lasem {i}" if i == 7 else "")
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 10} | ({"cursor": cursor} if cursor else {})
+            r = self.c.get(f"/books/book/{BOOK}/runs", params=params).json()
+            self.assertEqual(r["total"], 25)
+            seen += [x["run_id"] for x in r["items"]]
+            cursor = r["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [f"run_{i:03d}" for i in reversed(range(25))])
+
+        off = self.c.get(f"/books/book/{BOOK}/runs", params={"limit": 5, "offset": 5}).json()
+        self.assertEqual([x["run_id"] for x in off["items"]], seen[5:10])
+
+        # /runs_query (books_runs_query_api): role bez wielkosci liter, q = podciag role/title/preview
+        r = self.c.get(f"/books/book/{BOOK}/runs_query", params={"role": "krytyk"}).json()
+        self.assertEqual([x["run_id"] for x in r["items"]], ["run_020", "run_015", "run_010", "run_005", "run_000"])
+        r = self.c.get(f"/books/book/{BOOK}/runs_query", params={"q": "z las"}).json()
+        self.assertEqual((r["total"], r["items"][0]["preview"]), (1, "scena z lasem 7"))
+        r = self.c.get(f"/books/book/{BOOK}/runs_query", params={"q": "ozdzial 1", "limit": 3}).json()
+        self.assertEqual(r["total"], 11)  # 1, 10..19
+        self.assertEqual(r["items"][0]["paths"]["meta"], "runs/run_019/meta.json")
+        self.assertEqual(self.c.get(f"/books/book/{BOOK}/runs_query", params={"cursor": "x"}).status_code, 422)
+
+    @mock.patch.dict("os.environ", {"RUN_JOURNAL": "0"})  # runy jako foldery runs/<id>/ (bez dziennika)
+    def test_sync_picks_up_foreign_writes_and_deletes_and_rebuild_backfills(self):
+        self._write(1)
+        self._write(2)
+        self.assertEqual(self.c.get(f"/books/book/{BOOK}/runs").json()["total"], 2)
+
+        # run zapisany z pominieciem write_run + usuniety folder
+        d = self.root / "runs" / "manual_run"
+        d.mkdir()
+        (d / "meta.json").write_text(json.dumps({"role": "ARCHITEKT", "title": "reczny", "created_at": "2026-02-01T00:00:00Z"}), encoding="utf-8")
+        shutil.rmtree(self.root / "runs" / "run_001")
+        r = self.c.get(f"/books/book/{BOOK}/runs").json()
+        self.assertEqual([x["run_id"] for x in r["items"]], ["manual_run", "run_002"])
+
+        # folder bez meta.json (zapis w toku) jest dopisywany, gdy meta sie pojawi
+        late = self.root / "runs" / "late_run"
+        late.mkdir()
+        self.assertEqual(self.c.get(f"/books/book/{BOOK}/runs").json()["total"], 2)
+        (late / "meta.json").write_text(json.dumps({"title": "late", "created_at": "2026-03-01T00:00:00Z"}), encoding="utf-8")
+        self.assertEqual(self.c.get(f"/books/book/{BOOK}/runs").json()["items"][0]["run_id"], "late_run")
+
+        rc.reset_catalogs()
+        (self.root / rc.CATALOG_NAME).unlink()
+        self.assertEqual(rc.main(["rebuild", BOOK]), 0)
+        self.assertEqual(rc.get_catalog(self.root).query(limit=None)["total"], 3)
+
+    def test_runs_query_orders_by_run_id_and_lists_runs_without_meta(self):
+        write_run(self.root, "run_b", "tool", "b", "SUCCESS", "PISARZ", {}, {}, {"created_at": "2026-01-01T00:00:00Z"})
+        write_run(self.root, "run_a", "tool", "a", "SUCCESS", "PISARZ", {}, {}, {"created_at": "2026-05-01T00:00:00Z"})
+        (self.root / "runs" / "run_c").mkdir(parents=True)
+
+        r = self.c.get(f"/books/book/{BOOK}/runs_query").json()
+        self.assertEqual(([x["run_id"] for x in r["items"]], r["total"]), (["run_c", "run_b", "run_a"], 3))
+        bare = r["items"][0]
+        self.assertEqual([bare[k] for k in ("role", "title", "status", "model", "created_at")], [None] * 5)
+        self.assertEqual((bare["preview"], bare["paths"]), ("", {}))
+
+        seen, cursor = [], None
+        while True:
+            page = self.c.get(f"/books/book/{BOOK}/runs_query", params={"limit": 1} | ({"cursor": cursor} if cursor else {})).json()
+            seen += [x["run_id"] for x in page["items"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, ["run_c", "run_b", "run_a"])
+
+        # /runs (books_runs_api) jak dawniej: po created_at, tylko runy z meta.json
+        self.assertEqual([x["run_id"] for x in self.c.get(f"/books/book/{BOOK}/runs").json()["items"]], ["run_a", "run_b"])
+        # meta dopisana pozniej zastepuje wiersz zastepczy
+        (self.root / "runs" / "run_c" / "meta.json").write_text(json.dumps({"role": "KRYTYK", "created_at": "2026-03-01T00:00:00Z"}), encoding="utf-8")
+        r = self.c.get(f"/books/book/{BOOK}/runs_query", params={"role": "krytyk"}).json()
+        self.assertEqual([x["run_id"] for x in r["items"]], ["run_c"])
+        self.assertEqual([x["run_id"] for x in self.c.get(f"/books/book/{BOOK}/runs").json()["items"]], ["run_a", "run_c", "run_b"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app import resume_index, run_index
+from app.orchestrator_stub import execute_stub
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Test131RunIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.runs = self.tmp / "runs"
+        self.runs.mkdir()
+
+    def tearDown(self):
+        run_index.reset_index(self.tmp / "idle_runs", self.tmp / "idle.sqlite3")
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _mkrun(self, run_id):
+        (self.runs / run_id / "steps").mkdir(parents=True)
+        return run_id
+
+    def test_latest_for_book_pagination_and_sync(self):
+        idx = run_index.RunIndex(self.runs)
+        for i, book in enumerate(["a", "b", "a", "b", "a"]):
+            rid = self._mkrun(f"run_{i}")
+            idx.record_start(rid, book, "P", 3)
+            idx.record_finish(rid, "DONE", 3)
+            time.sleep(0.002)
+
+        self.assertEqual(idx.latest_for_book("a"), "run_4")
+        self.assertEqual(idx.latest_for_book("b"), "run_3")
+        self.assertIsNone(idx.latest_for_book("zzz"))
+
+        # folder najnowszego runu usuniety -> poprzedni run tej ksiazki
+        shutil.rmtree(self.runs / "run_4")
+        self.assertEqual(idx.latest_for_book("a"), "run_2")
+
+        # run zapisany bez indeksu (np. starsza wersja) -> sync() dopisuje go z 000_SEQUENCE.json
+        self._mkrun("run_9")
+        (self.runs / "run_9" / "steps" / "000_SEQUENCE.json").write_text(json.dumps({"book_id": "a", "preset_id": "X", "queue_initial": [{}, {}]}), encoding="utf-8")
+        (self.runs / "run_9" / "steps" / "001_PLAN.json").write_text("{}", encoding="utf-8")
+        self.assertEqual(idx.latest_for_book("a"), "run_9")
+        row = idx.get("run_9")
+        self.assertEqual((row["preset_id"], row["total_steps"], row["completed_steps"], row["status"]), ("X", 2, 1, run_index.UNKNOWN))
+
+        seen, cursor = [], None
+        while True:
+            page = idx.list_runs(limit=2, cursor=cursor)
+            seen += [r["run_id"] for r in page["runs"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, ["run_9", "run_3", "run_2", "run_1", "run_0"])
+        self.assertEqual([r["run_id"] for r in idx.list_runs(book_id="b")["runs"]], ["run_3", "run_1"])
+
+    def test_check_reports_and_repairs_drift(self):
+        idx = run_index.RunIndex(self.runs)
+        rid = self._mkrun("run_1")
+        idx.record_start(rid, "a", None, 2)
+        (self.runs / rid / "state.json").write_text(json.dumps({"status": "DONE", "completed_steps": 2}), encoding="utf-8")
+        idx.record_start("run_ghost", "a")
+        self._mkrun("run_2")
+
+        res = idx.check()
+        self.assertFalse(res["ok"])
+        self.assertEqual((res["missing"], res["orphaned"]), (["run_2"], ["run_ghost"]))
+        self.assertEqual(res["mismatched"][0]["fields"]["status"], {"index": "RUNNING", "disk": "DONE"})
+
+        self.assertTrue(idx.check(repair=True)["repaired"])
+        self.assertTrue(idx.check()["ok"])
+        self.assertEqual(idx.get("run_1")["completed_steps"], 2)
+
+    def test_execute_stub_feeds_index_used_by_resume_lookup(self):
+        os.environ["AGENT_TEST_MODE"] = "1"
+        run_index.reset_index(ROOT / "runs", self.tmp / "index.sqlite3")
+        run_id, book = "run_test_131", "test_book_131"
+        try:
+            execute_stub(run_id=run_id, book_id=book, modes=["PLAN", "WRITE"], payload={"input": "x"})
+            row = run_index.get_index().get(run_id)
+            self.assertEqual((row["book_id"], row["status"], row["completed_steps"], row["total_steps"]), (book, "DONE", 2, 2))
+            self.assertEqual(resume_index._scan_runs_latest(book), run_id)
+        finally:
+            shutil.rmtree(ROOT / "runs" / run_id, ignore_errors=True)
+            shutil.rmtree(ROOT / "books" / book, ignore_errors=True)
+
+    def test_latest_run_prefix_is_filtered_in_query(self):
+        run_index.reset_index(self.runs, self.tmp / "prefix.sqlite3")
+        idx = run_index.get_index()
+        for rid in ("run_1", "job_2", "job_3"):  # najnowsze runy ksiazki nie sa run_*
+            idx.record_start(self._mkrun(rid), "a")
+            time.sleep(0.002)
+        self.assertEqual(idx.latest_for_book("a"), "job_3")
+        self.assertEqual(resume_index._scan_runs_latest("a"), "run_1")
+
+    def test_runs_endpoint_keeps_run_id_order_and_state_fields(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from app import runs_api
+
+        run_index.reset_index(ROOT / "runs", self.tmp / "api.sqlite3")
+        idx = run_index.get_index()
+        old, new = "zzzz_131_a", "zzzz_131_b"
+        try:
+            # created_at odwrotnie niz run_id: kolejnosc nadal po run_id
+            for rid in (new, old):
+                (ROOT / "runs" / rid).mkdir(parents=True)
+                idx.record_start(rid, "test_book_131")
+                time.sleep(0.002)
+            (ROOT / "runs" / old / "state.json").write_text(json.dumps({"status": "DONE", "completed_steps": 2, "total_steps": 2, "updated_ts": 123.5}), encoding="utf-8")
+
+            app = FastAPI()
+            app.include_router(runs_api.router)
+            c = TestClient(app)
+            page = c.get("/runs", params={"limit": 1}).json()
+            self.assertEqual(page["runs"][0]["run_id"], new)
+            self.assertEqual({k: page["runs"][0][k] for k in ("status", "completed_steps", "total_steps", "updated_ts")}, dict.fromkeys(("status", "completed_steps", "total_steps", "updated_ts")))
+            r = c.get("/runs", params={"limit": 1, "cursor": page["next_cursor"]}).json()["runs"][0]
+            self.assertEqual((r["run_id"], r["status"], r["completed_steps"], r["updated_ts"]), (old, "DONE", 2, 123.5))
+        finally:
+            for rid in (old, new):
+                shutil.rmtree(ROOT / "runs" / rid, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,82 @@
+import time
+import unittest
+from unittest import mock
+
+import books_critic_api
+import books_proof_api
+from app import text_analysis as ta
+from app.quality_rules import evaluate_quality
+
+SAMPLE = "Ala ma ma kota .  \r\n– Tak!!\r\nkot\nKot biega\t\n\nNowy akapit… koniec"
+
+
+class Test132TextAnalysis(unittest.TestCase):
+    def test_proof_rules_keep_line_by_line_semantics(self):
+        # "kot\nKot" to nie REPEAT_WORD: reguly nie przechodza przez koniec linii
+        issues = books_proof_api._proof_issues(SAMPLE, 80)
+        self.assertEqual(
+            [(i["type"], i["line"]) for i in issues],
+            [
+                ("TRAILING_WS", 1),
+                ("DOUBLE_SPACE", 1),
+                ("SPACE_BEFORE_PUNCT", 1),
+                ("REPEAT_WORD", 1),
+                ("MULTI_PUNCT", 2),
+                ("TRAILING_WS", 4),
+                ("TAB_CHAR", 0),
+            ],
+        )
+        self.assertEqual(issues[3]["message"], "Repeated word: 'ma'")
+        self.assertEqual(issues[5]["snippet"], "Kot biega\t")
+        self.assertEqual(len(books_proof_api._proof_issues(SAMPLE, 3)), 3)
+
+    def test_critic_metrics(self):
+        self.assertEqual(
+            books_critic_api._metrics(SAMPLE),
+            {
+                "chars": 64,
+                "lines": 6,
+                "paragraphs": 2,
+                "sentences": 3,
+                "words": 11,
+                "avg_sentence_words": 3.67,
+                "avg_paragraph_words": 5.5,
+                "exclamations": 2,
+                "questions": 0,
+                "dialogue_lines": 1,
+            },
+        )
+
+    def test_quality_findings(self):
+        out = evaluate_quality("TODO\n- jeden\n- dwa <tag> jako model językowy", min_words=3)
+        self.assertEqual(out["decision"], "REJECT")
+        self.assertEqual(out["stats"]["words"], 7)
+        self.assertEqual(
+            [m["id"] for m in out["must_fix"]], ["META_AI", "PLACEHOLDER_TODO", "PLACEHOLDER_TAGS", "LISTS_IN_PROSE"]
+        )
+
+    def test_tools_on_the_same_text_tokenize_once(self):
+        text = SAMPLE + " unikalny-132"
+        words = mock.Mock(wraps=ta._WORD_RE)
+        with mock.patch.object(ta, "_WORD_RE", words):
+            books_proof_api._proof_issues(text, 80)
+            books_critic_api._metrics(text)
+            ta.analyze(text, ["critic_v2", "humanity"])
+        self.assertEqual(words.finditer.call_count, 1)
+        self.assertIs(ta.document_for(text), ta.document_for(text))
+
+    def test_analyze_all_and_unknown_tool(self):
+        out = ta.analyze(SAMPLE)
+        self.assertEqual(set(out), {"proof", "critic", "critic_v2", "humanity", "quality"})
+        with self.assertRaises(ValueError):
+            ta.analyze(SAMPLE, ["nope"])
+
+    def test_long_unpunctuated_text_is_linear(self):
+        text = "słowo " * 200_000
+        t0 = time.perf_counter()
+        self.assertEqual(ta.analyze(text, ["critic"])["critic"]["sentences"], 0)
+        self.assertLess(time.perf_counter() - t0, 5)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
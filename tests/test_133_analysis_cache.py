@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import books_analysis_cache as bac
+from app import text_analysis as ta
+from books_proof_api import ProofCheckReq, proof_check
+
+BOOK = "test_book_133"
+ROOT = Path(__file__).resolve().parents[1]
+TOOLS = list(ta.INCREMENTAL_TOOLS)
+
+
+def _para(i: int) -> str:
+    return f"Akapit {i} ma  kilka zdań. Który to już raz?  \nDruga linia – dialog {i}!!"
+
+
+class Test133AnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        bac.reset_caches()
+
+    def tearDown(self):
+        bac.reset_caches()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        shutil.rmtree(ROOT / "books" / BOOK, ignore_errors=True)
+
+    def test_incremental_reports_match_full_analysis(self):
+        cache, cps = {}, {}
+        texts = [
+            "",
+            "\n\n" + _para(0),
+            "\n\n" + _para(0) + "\r\n \t\r\n" + _para(1),
+            "\n\n" + _para(0) + "\r\n \t\r\n" + _para(1) + " ciąg dalszy bez kropki\n\n\n\n" + _para(2) + "\n",
+            _para(0) + "\n\nto jest wpis do master " + _para(3),  # edycja w srodku: brak wznowienia
+        ]
+        for text in texts:
+            for mi in (2, 80):
+                opts = {"proof": {"max_issues": mi}, "critic_v2": {"max_points": 5}}
+                self.assertEqual(ta.analyze(text, TOOLS, **opts), ta.analyze_incremental(text, TOOLS, cache=cache, checkpoints=cps, **opts))
+
+    def test_growing_text_analyses_only_new_paragraphs_and_persists(self):
+        cache = bac.get_cache(self.tmp)
+        text = "\n\n".join(_para(i) for i in range(50))
+        cache.analyze(text, TOOLS)
+        self.assertEqual(cache.misses, 50)
+
+        text += "\n\n" + _para(50)
+        cache.analyze(text, TOOLS)
+        # tylko dopisany akapit; poprzednie (z ostatnim wlacznie) to trafienia
+        self.assertEqual(cache.misses, 51)
+
+        bac.reset_caches()
+        fresh = bac.get_cache(self.tmp)
+        self.assertEqual(fresh.analyze(text, TOOLS), ta.analyze(text, TOOLS))
+        self.assertEqual((fresh.hits, fresh.misses), (51, 0))
+
+    def test_rule_change_invalidates_cached_paragraphs(self):
+        text = "\n\n".join(_para(i) for i in range(5))
+        bac.get_cache(self.tmp).analyze(text, TOOLS)
+        bac.reset_caches()
+        with mock.patch.object(bac, "RULES_FINGERPRINT", "other-rules"):
+            c = bac.get_cache(self.tmp)
+            c.analyze(text, TOOLS)
+            self.assertEqual((c.hits, c.misses), (0, 5))
+
+    def test_proof_check_uses_book_cache(self):
+        master = ROOT / "books" / BOOK / "draft" / "master.txt"
+        master.parent.mkdir(parents=True, exist_ok=True)
+        master.write_text("\n\n".join(_para(i) for i in range(10)), encoding="utf-8")
+        proof_check(ProofCheckReq(book=BOOK))
+        with master.open("a", encoding="utf-8") as f:
+            f.write("\n\n" + _para(10))
+        r = proof_check(ProofCheckReq(book=BOOK))
+        self.assertTrue(r["ok"])
+        c = bac.get_cache(ROOT / "books" / BOOK)
+        self.assertEqual(c.misses, 11)
+        self.assertTrue((ROOT / "books" / BOOK / bac.CACHE_NAME).exists())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+import unittest
+from pathlib import Path
+
+from app import canon_index as ci
+from app.canon_check import canon_check
+from app.canon_store import save_canon
+from app.tools import tool_canon_check, tool_continuity
+
+BOOK = "test_book_134"
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Test134CanonIndex(unittest.TestCase):
+    def setUp(self):
+        ci.reset_compiled_canons()
+        self.d = ROOT / "books" / BOOK
+        self.d.mkdir(parents=True, exist_ok=True)
+        bible = {
+            "canon": {"characters": [{"name": "Adam Kruk", "aliases": ["Kruk"]}, {"name": "Ewa"}]},
+            "continuity_rules": {"flag_unknown_entities": True},
+        }
+        (self.d / "book_bible.json").write_text(json.dumps(bible, ensure_ascii=False), encoding="utf-8")
+
+    def tearDown(self):
+        ci.reset_compiled_canons()
+        shutil.rmtree(self.d, ignore_errors=True)
+
+    def test_automaton_finds_overlapping_matches_case_insensitive(self):
+        ac = ci.AhoCorasick([("he", 1), ("she", 2), ("hers", 3), ("his", 4)])
+        self.assertEqual(sorted(ac.iter_matches("uSHErs his")), [(1, 4, 2), (2, 4, 1), (2, 6, 3), (7, 10, 4)])
+
+    def test_mentions_with_offsets_names_whole_words_only(self):
+        cc = ci.CompiledCanon(canon={"ledger": [{"id": "tx_7", "amount": 5}]}, bible=json.loads((self.d / "book_bible.json").read_text("utf-8")))
+        text = "Adam Kruk i Ewa; Krukowski nie. TX_7 za 5, Ewa."
+        got = [(m["kind"], m["key"], m["start"]) for m in cc.mentions(text)]
+        self.assertEqual(
+            got,
+            [("name", "Adam Kruk", 0), ("name", "Adam Kruk", 5), ("name", "Ewa", 12), ("ledger", "tx_7", 32), ("name", "Ewa", 43)],
+        )
+        self.assertEqual(cc.name_counts(text), {"Adam Kruk": 2, "Ewa": 2})
+
+    def test_compiled_canon_is_cached_until_files_change(self):
+        a = ci.get_compiled_canon(BOOK)
+        self.assertIs(ci.get_compiled_canon(BOOK), a)
+        save_canon(None, {"ledger": [{"id": "tx_1", "amount": 10}]}, book_id=BOOK)
+        b = ci.get_compiled_canon(BOOK)
+        self.assertIsNot(b, a)
+        self.assertEqual(b.ledger_ids, {"tx_1"})
+
+        bible = self.d / "book_bible.json"
+        bible.write_text(json.dumps({"canon": {"characters": [{"name": "Zenon"}]}}), encoding="utf-8")
+        st = bible.stat()
+        os.utime(bible, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        self.assertEqual(ci.get_compiled_canon(BOOK).known, {"zenon"})
+
+    def test_canon_check_and_tools_use_book_canon(self):
+        save_canon(None, {"ledger": [{"id": "tx_1", "amount": 10}]}, book_id=BOOK)
+        text = "Przelew tx_1 na 12 zł, potem tx_2."
+        rep = canon_check(text, ci.get_compiled_canon(BOOK).canon)
+        self.assertEqual(
+            [(i["type"], i["tx_id"]) for i in rep["issues"]], [("ledger_amount_mismatch", "tx_1"), ("ledger_unknown_tx", "tx_2")]
+        )
+        self.assertEqual(tool_canon_check({"book_id": BOOK, "text": text})["payload"]["issues"], rep["issues"])
+
+        out = tool_continuity({"text": "Kruk spotkał Zenona. Ewa patrzyła.", "_book_id": BOOK})["payload"]
+        self.assertEqual(out["UNKNOWN_ENTITIES"], ["Zenona"])
+        self.assertEqual(out["MENTIONS"], {"Adam Kruk": 1, "Ewa": 1})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
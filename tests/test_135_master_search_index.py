@@ -0,0 +1,90 @@
+import shutil
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import books_search_index as bsi
+from books_files_api import MasterSearchRequest, master_search
+
+BOOK = "test_book_135"
+ROOT = Path(__file__).resolve().parents[1]
+
+TEXT = "Żółw szedł powoli.\r\n\r\nKot i pies. Żółwie nie.\n\n\n  \n\nPies szczeka na kota w ogrodzie, kota nie widać."
+
+
+class Test135MasterSearchIndex(unittest.TestCase):
+    def setUp(self):
+        bsi.reset_search_indexes()
+        self.master = ROOT / "books" / BOOK / "draft" / "master.txt"
+        self.master.parent.mkdir(parents=True, exist_ok=True)
+        self.master.write_text(TEXT, encoding="utf-8")
+
+    def tearDown(self):
+        bsi.reset_search_indexes()
+        shutil.rmtree(ROOT / "books" / BOOK, ignore_errors=True)
+
+    def _search(self, q, **kw):
+        return master_search(BOOK, MasterSearchRequest(q=q, **kw))
+
+    def test_terms_fold_polish_diacritics_and_prefix(self):
+        r = self._search("zolw")
+        self.assertEqual((r.total_hits, [h.para_index for h in r.hits]), (1, [1]))
+        self.assertEqual(r.hits[0].excerpt, "Żółw szedł powoli.")
+
+        r = self._search("żółw*")
+        self.assertEqual(sorted(h.para_index for h in r.hits), [1, 2])
+        self.assertEqual(r.hits[[h.para_index for h in r.hits].index(2)].match_index, 12)
+
+    def test_phrase_multi_term_and_ranking(self):
+        r = self._search('"na kota"')
+        self.assertEqual([(h.para_index, h.match_index) for h in r.hits], [(3, 13)])
+
+        r = self._search("pies kot*")
+        self.assertEqual(r.total_hits, 2)
+        # krotszy akapit z tymi samymi termami wyzej (normalizacja dlugosci BM25)
+        self.assertEqual([h.para_index for h in r.hits], [2, 3])
+        self.assertGreater(r.hits[0].score, r.hits[1].score)
+
+        self.assertEqual(self._search('pies "w ogrodzie" zolw').total_hits, 0)
+        self.assertEqual(self._search("Kot", case_sensitive=True).total_hits, 1)
+
+        r = self._search("pies", in_paragraphs=False)
+        self.assertEqual([(h.para_index, h.match_index) for h in r.hits], [(2, 28), (3, 52)])
+
+    def test_case_sensitive_match_position_and_prefix_cap(self):
+        self.master.write_text("kot spi w kuchni. Potem Kot wstal.\n\nNa kocu lezy Kot Filemon, a kot sasiada nie.", encoding="utf-8")
+        r = self._search("Kot", case_sensitive=True)
+        self.assertEqual(sorted((h.para_index, h.match_index) for h in r.hits), [(1, 24), (2, 13)])
+        r = self._search('"Kot Filemon"', case_sensitive=True)
+        self.assertEqual([(h.para_index, h.match_index) for h in r.hits], [(2, 13)])
+        self.assertEqual(self._search('"kot Filemon"', case_sensitive=True).total_hits, 0)
+        self.assertEqual(self._search("Kot,", case_sensitive=True).total_hits, 2)  # interpunkcja z brzegu pomijana
+
+        self.assertFalse(self._search("ko*").truncated)
+        with mock.patch.object(bsi, "MAX_PREFIX_TERMS", 1):
+            r = self._search("ko*")
+        self.assertTrue(r.truncated)
+
+    def test_append_updates_index_without_rebuild(self):
+        idx = bsi.get_search_index(self.master)
+        self._search("kot")
+        with self.master.open("a", encoding="utf-8") as f:
+            f.write(" Dalej o kocie.\n\nNowy akapit: żółw i łódź.")
+        r = self._search("lodz")
+        self.assertEqual([h.para_index for h in r.hits], [4])
+        self.assertEqual(self._search('"widac dalej"').total_hits, 1)
+        self.assertEqual((idx.builds, idx.appends), (1, 1))
+
+        self.master.write_text("Inny tekst o łodzi.", encoding="utf-8")
+        self.assertEqual(self._search("lodz").total_hits, 0)
+        self.assertEqual(self._search("lodzi").total_hits, 1)
+        self.assertEqual(idx.builds, 2)
+
+    def test_punctuation_query_falls_back_to_scan(self):
+        self.assertEqual(self._search(", ").total_hits, 1)
+        r = self._search("?!")
+        self.assertEqual(r.total_hits, 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+import books_agent_worker_api as worker
+from app import lock_manager as lm
+from app.run_lock import LockError, acquire_book_lock, acquire_book_lock_async
+
+
+class Test136LockManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.mgr = lm.LockManager(self.tmp / "locks")
+        lm.reset_lock_manager(self.mgr)
+
+    def tearDown(self):
+        lm.reset_lock_manager(None)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_release_hands_over_to_waiters_in_fifo_order(self):
+        first = self.mgr.acquire("book_x")
+        order, got_at = [], {}
+
+        def wait(tag):
+            with self.mgr.acquire("book_x", owner=tag):
+                got_at[tag] = time.perf_counter()
+                order.append(tag)
+
+        threads = []
+        for tag in ("a", "b", "c"):
+            t = threading.Thread(target=wait, args=(tag,))
+            t.start()
+            threads.append(t)
+            while len(self.mgr._entries["book_x"].waiters) < len(threads):
+                time.sleep(0.001)
+        released = time.perf_counter()
+        first.release()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(order, ["a", "b", "c"])
+        self.assertLess(got_at["a"] - released, 0.05)
+        self.assertEqual(self.mgr.handovers, 3)
+        self.assertIsNone(self.mgr.holder("book_x"))
+
+    def test_async_acquire_waits_without_blocking_the_loop(self):
+        holder = self.mgr.acquire("book_y")
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.005)
+
+            tk = asyncio.create_task(ticker())
+            with self.assertRaises(lm.LockTimeout):
+                await self.mgr.acquire_async("book_y", timeout=0.05)
+            asyncio.get_running_loop().call_later(0.05, holder.release)
+            lease = await self.mgr.acquire_async("book_y", owner="async", timeout=2)
+            tk.cancel()
+            self.assertEqual(lease.owner, "async")
+            lease.release()
+            return ticks
+
+        self.assertGreater(asyncio.run(scenario()), 5)
+
+    def test_lease_expiry_and_keepalive(self):
+        stale = self.mgr.acquire("job_1", ttl=0.1)
+        lease = self.mgr.acquire("job_1", timeout=2)
+        self.assertFalse(stale.held)
+        self.assertFalse(stale.release())
+        lease.release()
+
+        kept = self.mgr.acquire("job_2", ttl=0.1, keepalive=True)
+        self.assertIsNone(self.mgr.try_acquire("job_2"))
+        time.sleep(0.3)
+        self.assertIsNone(self.mgr.try_acquire("job_2"))
+        self.assertTrue(kept.held)
+        kept.release()
+
+    def test_excl_backend_takes_over_lock_of_dead_process(self):
+        mgr = lm.LockManager(self.tmp / "excl", backend="excl")
+        mgr.locks_dir.mkdir(parents=True)
+        p = subprocess.Popen([sys.executable, "-c", "pass"])
+        p.wait()
+        mgr.path("book_z").write_text(json.dumps({"pid": p.pid, "owner": "dead"}), encoding="utf-8")
+        lease = mgr.try_acquire("book_z")
+        self.assertIsNotNone(lease)
+        self.assertEqual(json.loads(mgr.path("book_z").read_text())["pid"], lease.info()["pid"])
+        lease.release()
+        self.assertFalse(mgr.path("book_z").exists())
+
+        mgr.path("book_z").write_text(json.dumps({"pid": os.getppid()}), encoding="utf-8")  # zywy proces
+        self.assertIsNone(mgr.try_acquire("book_z"))
+
+    @unittest.skipIf(lm.fcntl is None, "fcntl not available")
+    def test_flock_held_by_other_process_is_reported_and_freed_on_exit(self):
+        code = (
+            "import fcntl, os, sys, time\n"
+            "fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)\n"
+            "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+            "os.write(fd, b'{\"owner\": \"other\"}')\n"
+            "print('locked', flush=True)\n"
+            "sys.stdin.readline()\n"
+        )
+        self.mgr.locks_dir.mkdir(parents=True)
+        p = subprocess.Popen([sys.executable, "-c", code, str(self.mgr.path("book_p"))], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            self.assertEqual(p.stdout.readline().strip(), "locked")
+            self.assertIsNone(self.mgr.try_acquire("book_p"))
+            self.assertEqual(self.mgr.holder("book_p")["owner"], "other")
+            self.assertEqual([r["name"] for r in self.mgr.snapshot()], ["book_p"])
+
+            threading.Timer(0.1, lambda: p.stdin.close()).start()
+            lease = self.mgr.acquire("book_p", timeout=5)
+            self.assertTrue(lease.held)
+            lease.release()
+        finally:
+            p.kill()
+            p.wait()
+
+    def test_book_lock_worker_lock_and_locks_endpoint(self):
+        with acquire_book_lock("b1") as path:
+            self.assertEqual(path, self.mgr.path("book_b1"))
+            with self.assertRaises(LockError):
+                with acquire_book_lock("b1", timeout_sec=0):
+                    pass
+
+        async def use_async():
+            async with acquire_book_lock_async("b1", timeout_sec=1):
+                return self.mgr.holder("book_b1") is not None
+
+        self.assertTrue(asyncio.run(use_async()))
+
+        book_dir = self.tmp / "books" / "b2"
+        book_dir.mkdir(parents=True)
+        self.assertEqual(worker.acquire_book_lock(book_dir), (True, "LOCKED"))
+        got, msg = worker.acquire_book_lock(book_dir)
+        self.assertFalse(got)
+        self.assertTrue(msg.startswith("LOCK_EXISTS"))
+        self.assertTrue((book_dir / ".lock").exists())
+
+        from app.main import app
+
+        client = TestClient(app)
+        r = client.get("/locks")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([x["name"] for x in r.json()["locks"]], ["worker_b2"])
+        self.assertTrue(client.get("/locks/worker_b2").json()["locked"])
+
+        worker.release_book_lock(book_dir)
+        self.assertFalse((book_dir / ".lock").exists())
+        self.assertFalse(client.get("/locks/worker_b2").json()["locked"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,122 @@
+import json
+import shutil
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import books_wordcount
+from books_wordcount import WordCountRules, count_file_words, count_words, state_path
+from grow_to_wordcount import append_utf8
+
+ROOT = Path(__file__).resolve().parents[1]
+BOOK = "test_book_137"
+RECORDED = ROOT / "tests" / "data" / "word_counts.json"
+
+# (tekst, liczba slow wg regul Worda: separatorem jest bialy znak, sama interpunkcja sie nie liczy)
+WORD_CASES = [
+    ("Ala ma kota.", 3),
+    ("– Nie wiem – powiedziała cicho. – Może jutro.", 6),
+    ("— Tak — odparł.\n— Nie.", 3),
+    ("e-mail, biało-czerwony, tak—nie, tak–nie, a/b, itd.", 6),
+    ("Czekał... i czekał . . . aż do 12:30.", 6),
+    ("„Cytat” i «inny» oraz »jeszcze inny«.", 6),
+    ("1 000 000 zł, 3,14 oraz 2024-05-01.", 7),
+    ("1\u00a0000 zł i 20\u00a0%.", 5),
+    ("?! ... – — - * #", 0),
+    ("Żółć gęślą jaźń.\tTabulator\n\nnowy akapit", 6),
+    ("słowo_z_podkreśleniem __ _", 1),
+    ("", 0),
+]
+
+
+class Test137WordCount(unittest.TestCase):
+    def setUp(self):
+        self.path = ROOT / "books" / BOOK / "book_text.txt"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(ROOT / "books" / BOOK, ignore_errors=True)
+
+    def test_word_rules(self):
+        for text, expected in WORD_CASES:
+            with self.subTest(text=text):
+                self.assertEqual(count_words(text), expected)
+
+    def test_recorded_word_parity(self):
+        if not RECORDED.exists():
+            self.skipTest("no recorded Word counts (tools/record_word_counts.py on Windows)")
+        for row in json.loads(RECORDED.read_text(encoding="utf-8")):
+            with self.subTest(text=row["text"][:60]):
+                self.assertEqual(count_words(row["text"]), row["words"])
+
+    def test_configurable_rules(self):
+        text = "– Tak—nie, 1\u00a0000 000 zł."
+        self.assertEqual(count_words(text), 5)
+        self.assertEqual(count_words(text, WordCountRules(count_punctuation=True)), 6)
+        self.assertEqual(count_words(text, WordCountRules(split_dashes=True)), 6)
+        self.assertEqual(count_words(text, WordCountRules(join_digit_groups=True)), 3)
+        self.assertEqual(count_words(text, WordCountRules(nbsp_separates=False)), 4)
+
+    def test_running_count_counts_only_appended_chunk(self):
+        self.path.write_text("\ufeffPierwszy akapit – bez końca", encoding="utf-8")
+        r = count_file_words(self.path)
+        self.assertEqual((r.words, r.mode), (4, "full"))
+        self.assertTrue(state_path(self.path).exists())
+        self.assertEqual(count_file_words(self.path).mode, "cached")
+
+        # dopisanie w srodku slowa ("końca" + "mi") nie moze dac dodatkowego slowa
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write("mi.\n")
+        r = count_file_words(self.path)
+        self.assertEqual((r.words, r.mode), (4, "incremental"))
+
+        chunks = ["Drugi akapit, e-mail i tak—nie.", "– Trzeci.\n\n– Czwarty " * 50]
+        for chunk in chunks:
+            append_utf8(self.path, chunk)
+            r = count_file_words(self.path)
+            self.assertEqual(r.mode, "incremental")
+            self.assertLess(r.counted_bytes, len(chunk.encode("utf-8")) + 8)
+            self.assertEqual(r.words, count_file_words(self.path, persist=False).words)
+
+        text = self.path.read_text(encoding="utf-8-sig")
+        self.assertEqual(r.words, count_words(text))
+
+        # nadpisanie pliku (nie tylko dopisanie) = pelne przeliczenie; inne reguly = osobny stan
+        self.path.write_text("Całkiem inny tekst o podobnej długości i treści " * 10, encoding="utf-8")
+        r = count_file_words(self.path)
+        self.assertEqual((r.words, r.mode), (80, "full"))
+        r = count_file_words(self.path, WordCountRules(count_punctuation=True))
+        self.assertEqual((r.words, r.mode), (80, "full"))
+
+    def test_in_place_middle_edit_is_caught_by_periodic_full_recount(self):
+        self.path.write_text("Pierwsza linia tekstu.\n" + "Srodek ksiazki ma cztery.\n" * 400 + "Koniec.\n", encoding="utf-8")
+        self.assertEqual(count_file_words(self.path).mode, "full")
+
+        # edycja w miejscu poza hashowanymi oknami (ten sam rozmiar i inode) + dopisanie: licznik odplywa...
+        line = b"Srodek ksiazki ma cztery.\n"
+        at = self.path.read_bytes().index(line, 5000)
+        with self.path.open("r+b") as f:
+            f.seek(at)
+            f.write(b"Srodek-ksiazki-ma-cztery.\n")  # 4 slowa -> 1, ta sama dlugosc
+        with mock.patch.object(books_wordcount, "FULL_RECOUNT_EVERY", 2):
+            append_utf8(self.path, "Dalej.\n")
+            r = count_file_words(self.path)
+            self.assertEqual(r.mode, "incremental")
+            self.assertNotEqual(r.words, count_file_words(self.path, persist=False).words)
+
+            # ...najwyzej do pelnego przeliczenia co FULL_RECOUNT_EVERY przyrostowych
+            append_utf8(self.path, "Jeszcze.\n")
+            self.assertEqual(count_file_words(self.path).mode, "incremental")
+            append_utf8(self.path, "I jeszcze.\n")
+            r = count_file_words(self.path)
+            self.assertEqual((r.mode, r.words), ("full", count_file_words(self.path, persist=False).words))
+
+        # przepisanie przez tmp+rename (nowy inode) = pelne przeliczenie, nawet gdy plik tylko urosl
+        tmp = self.path.with_name("master.tmp")
+        tmp.write_bytes(self.path.read_bytes() + "Nowe zdanie.\n".encode("utf-8"))
+        tmp.replace(self.path)
+        self.assertEqual(count_file_words(self.path).mode, "full")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,131 @@
+import json
+import shutil
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import books_agent_jobs_api as jobs
+from books_chunk_pipeline import ChunkPipeline, continuity_issue
+from books_core import make_run_id
+from books_run_journal import get_journal, materialize_path
+
+BOOK = "test_book_138"
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Test138ChunkPipeline(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree(ROOT / "books" / BOOK, ignore_errors=True)
+
+    def _pipe(self, inflight, latency=0.05, check=None):
+        committed = []
+        active = {"now": 0, "max": 0}
+        lock = threading.Lock()
+
+        def generate(spec):
+            with lock:
+                active["now"] += 1
+                active["max"] = max(active["max"], active["now"])
+            # pozniejsze chunki koncza szybciej: kolejnosc commitow nie moze od tego zalezec
+            time.sleep(latency * (1.0 if spec.index % 2 == 0 else 0.4))
+            with lock:
+                active["now"] -= 1
+            return f"chunk {spec.index} na kontekscie {spec.context}, proba {spec.attempt}"
+
+        pipe = ChunkPipeline(
+            generate,
+            lambda spec, out: committed.append((spec.index, out)),
+            snapshot=lambda: len(committed),
+            check=check,
+            inflight=inflight,
+        )
+        return pipe, committed, active
+
+    def test_ordered_commit_and_speedup(self):
+        seq, seq_committed, _ = self._pipe(1)
+        s1 = seq.run(n=8)
+        pipe, committed, active = self._pipe(4)
+        s4 = pipe.run(n=8)
+
+        self.assertEqual([i for i, _ in committed], list(range(8)))
+        self.assertEqual([out.split(" na ")[0] for _, out in committed], [out.split(" na ")[0] for _, out in seq_committed])
+        self.assertEqual((s1["mode"], s4["mode"], active["max"]), ("sequential", "pipelined", 4))
+        self.assertLess(s4["wall_s"] * 2, s1["wall_s"])
+        self.assertGreater(s4["speedup"], 2)
+
+    def test_stale_chunks_are_checked_and_regenerated(self):
+        # odrzucamy kazdy chunk, ktory nie widzial wszystkich zatwierdzonych (tylko pierwsza proba)
+        def check(spec, out):
+            return None if spec.attempt else f"stale by {spec.index - spec.committed}"
+
+        pipe, committed, _ = self._pipe(3, latency=0.01, check=check)
+        stats = pipe.run(n=5, start=10, done=lambda: len(committed) >= 4)
+        self.assertEqual([i for i, _ in committed], [10, 11, 12, 13])
+        for pos, (i, out) in enumerate(committed):
+            # commit zawsze na kontekscie z faktycznie zatwierdzonymi chunkami
+            self.assertIn(f"na kontekscie {pos},", out)
+        self.assertEqual((stats["committed"], stats["regenerated"], stats["forced"]), (4, 3, []))
+        self.assertGreaterEqual(stats["discarded"], 1)
+
+    def test_continuity_issue(self):
+        tail = "Deszcz padał od rana nad miastem. Stał przy oknie i czekał na telefon."
+        self.assertIsNone(continuity_issue(tail, "Telefon zadzwonił po północy. Odebrał bez słowa, słuchając ciszy."))
+        self.assertIn("opening", continuity_issue(tail, "Stał przy oknie i czekał na telefon. Potem wyszedł z domu na deszcz."))
+
+    def test_loop_write_job_pipelined(self):
+        book_root = ROOT / "books" / BOOK
+        job_id = make_run_id("job")
+        req = jobs.LoopWriteJobReq(book=BOOK, n=4, do_proof=False, do_stylist=False, inflight=3).model_dump()
+        jobs._write_job(book_root, job_id, {"job_id": job_id, "status": "QUEUED", "req": req})
+
+        jobs._run_job({"book": BOOK, "job_id": job_id, "req": req, "job_run_id": make_run_id("loopwritejob")})
+
+        st = jobs._read_job(book_root, job_id)
+        self.assertEqual(st["status"], "SUCCESS", st.get("error"))
+        self.assertEqual([s["i"] for s in st["steps"]], [1, 2, 3, 4])
+        self.assertEqual((st["pipeline"]["mode"], st["pipeline"]["committed"]), ("pipelined", 4))
+        master = (book_root / "draft" / "master.txt").read_text(encoding="utf-8")
+        for s in st["steps"]:
+            self.assertIn(s["fingerprint"]["hook"], master)
+        fps = json.loads((book_root / "memory" / "scene_fingerprints.json").read_text(encoding="utf-8"))
+        self.assertEqual([it["i"] for it in fps["items"]][-4:], [1, 2, 3, 4])
+
+    def test_loop_write_job_persists_only_committed_architect_runs(self):
+        book_root = ROOT / "books" / BOOK
+        job_id = make_run_id("job")
+        req = jobs.LoopWriteJobReq(book=BOOK, n=3, do_proof=False, do_stylist=False, inflight=3).model_dump()
+        jobs._write_job(book_root, job_id, {"job_id": job_id, "status": "QUEUED", "req": req})
+
+        clashes = iter(["clash", "clash"])  # dwa pierwsze spekulatywne chunki odrzucone -> regeneracja
+        with mock.patch.object(jobs, "_fingerprint_clash", lambda meta, committed: next(clashes, None)):
+            jobs._run_job({"book": BOOK, "job_id": job_id, "req": req, "job_run_id": make_run_id("loopwritejob")})
+
+        st = jobs._read_job(book_root, job_id)
+        self.assertEqual(st["status"], "SUCCESS", st.get("error"))
+        self.assertGreater(st["pipeline"]["generated"], st["pipeline"]["committed"])
+        # run architekta (z raportem i latest) tylko dla zatwierdzonych chunkow, w kolejnosci commitow
+        arch_runs = [r for r in get_journal(book_root).run_ids() if r.startswith("architect_")]
+        self.assertEqual(sorted(arch_runs), sorted(s["architect_run_id"] for s in st["steps"]))
+        self.assertTrue(materialize_path(book_root, "analysis/architect_latest.json"))
+        latest = json.loads((book_root / "analysis" / "architect_latest.json").read_text(encoding="utf-8"))
+        self.assertEqual(latest["run_id"], st["steps"][-1]["architect_run_id"])
+
+    def test_offline_chunk_reaches_word_target_past_all_micro_sentences(self):
+        # tekst bazowy + 8 mikro-zdan to ~110 slow: wiecej (np. domyslne 220) wymaga kolejnych rund
+        avoid = {k: set() for k in ("places", "props", "dialogs", "hooks", "p2", "p3")}
+        out = {}
+        t = threading.Thread(target=lambda: out.update(chunk=jobs._offline_chunk("brief", "run", 0, 400, avoid, set())[0]), daemon=True)
+        t.start()
+        t.join(10)
+        self.assertFalse(t.is_alive(), "_offline_chunk nie konczy sie")
+        self.assertGreaterEqual(len(out["chunk"].split()), 400)
+        # rundy: zadne mikro-zdanie nie wraca, zanim nie padna wszystkie
+        counts = [out["chunk"].count(s) for s in ("Wiedział, że to zostawi ślad.", "Coś kliknęło cicho, zbyt blisko.", "Zrobił krok w bok i od razu pożałował.")]
+        self.assertLessEqual(max(counts) - min(counts), 1)
+        self.assertGreater(min(counts), 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import books_job_queue as bq
+import llm_client
+from app import llm_cache, llm_http
+from app.llm_fake_provider import FakeLLMProvider
+from app.team_runner import run_team_llm
+from books_draft_store import STREAM_PART, DraftStore
+
+BOOK = "test_book_139"
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Test139LlmStreaming(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fake = FakeLLMProvider(stream_delay_s=0.005).start()
+        self.env = mock.patch.dict(os.environ, {"OPENAI_BASE_URL": self.fake.base_url, "OPENAI_API_KEY": "k", "LLM_CACHE": "1"})
+        self.env.start()
+        llm_cache.reset_cache(root=Path(self.tmp) / "cache")
+        llm_http.reset_stream_metrics()
+
+    def tearDown(self):
+        self.env.stop()
+        self.fake.stop()
+        llm_http.reset_clients()
+        llm_cache.reset_cache()
+        bq.reset(Path(self.tmp) / "idle.sqlite3").stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        shutil.rmtree(ROOT / "books" / BOOK, ignore_errors=True)
+
+    def test_stream_deltas_ttft_async_and_retry_before_first_byte(self):
+        self.fake.fail_next(503, retry_after="0")
+        st = llm_client.stream_text("ala ma kota", model="m")
+        deltas = list(st)
+        self.assertEqual(deltas, ["[fake:m] ", "ala ", "ma ", "kota"])
+        self.assertEqual((st.text, st.model, st.usage["input_tokens"]), ("[fake:m] ala ma kota", "m", 3))
+        self.assertIsNotNone(st.ttft_ms)
+        self.assertLessEqual(st.ttft_ms, st.total_ms)
+        self.assertEqual(llm_http.get_client().stats["retries"], 1)
+
+        async def consume():
+            return [d async for d in llm_client.stream_text("async", model="m")]
+
+        self.assertEqual("".join(asyncio.run(consume())), "[fake:m] async")
+        self.assertEqual(llm_http.stream_metrics()["streams"], 2)
+
+        # deterministycznie: drugi stream z cache (jedna delta, bez requestu), wspolny z generate_text
+        a = llm_client.stream_text("x y", model="m", temperature=0).read()
+        n = len(self.fake.requests)
+        b = llm_client.stream_text("x y", model="m", temperature=0)
+        self.assertEqual((list(b), b.cached, len(self.fake.requests)), ([a], True, n))
+        self.assertTrue(llm_client.generate_text("x y", model="m", temperature=0, return_dict=True)["cached"])
+
+    def test_async_consumer_break_closes_upstream(self):
+        self.fake.stream_delay_s = 0.05
+        client = llm_http.LLMHttpClient(self.fake.base_url, "k")
+        words = " ".join(f"w{i}" for i in range(60))  # ~3 s pelnego streamu
+        done = []
+
+        async def first_delta():
+            st = client.responses_stream("m", words)
+            st.on_complete = done.append
+            async for d in st:
+                return d, st
+
+        t0 = time.perf_counter()
+        d, st = asyncio.run(first_delta())
+        self.assertEqual(d, "[fake:m] ")
+        self.assertLess(time.perf_counter() - t0, 1.0)  # pump nie doczytuje streamu do konca
+        self.assertTrue(st.closed)
+        self.assertEqual((done, st.done), ([], False))
+        time.sleep(0.2)
+        self.assertLess(self.fake.stream_events_sent, 10)  # provider przestal wysylac
+
+        # zerwane polaczenie nie wraca do puli; nastepne wywolanie dziala na nowym
+        self.assertEqual(client.chat("m", [{"role": "user", "content": "ok"}])["choices"][0]["message"]["content"], "[fake:m] ok")
+        self.assertEqual(client.connections_opened, 2)
+        client.close()
+
+    def test_run_team_llm_on_delta(self):
+        got = []
+        out = run_team_llm(mode="WRITE", payload={"text": "scena 2"}, on_delta=got.append)
+        self.assertGreater(len(got), 2)
+        self.assertEqual("".join(got).strip(), out["text"])
+        self.assertEqual(out["meta"]["llm_cache"], "miss")
+        self.assertIsNotNone(out["meta"]["ttft_ms"])
+        self.assertTrue(self.fake.requests[-1]["body"]["stream"])
+
+    def test_draft_stream_commit_rollback_and_crash_recovery(self):
+        path = ROOT / "books" / BOOK / "draft" / "buffer.txt"
+        store = DraftStore(path)
+        store.append("base\n")
+        with store.stream() as st:
+            st.write("Ala ")
+            self.assertEqual(path.read_text(encoding="utf-8"), "base\nAla ")  # widoczne w trakcie
+            st.write("ma kota\n")
+        self.assertEqual((st.result["mode"], st.result["words"], store.total_words()), ("stream_append", 3, 4))
+
+        with self.assertRaises(RuntimeError):
+            with store.stream() as st:
+                st.write("urwany chunk")
+                raise RuntimeError("LLM connection dropped")
+        self.assertEqual(path.read_text(encoding="utf-8"), "base\nAla ma kota\n")
+
+        # crash procesu w trakcie streamu: zostaje stream.part i nadmiarowe bajty w pliku
+        (store.seg_dir / STREAM_PART).write_bytes(b"niedoko")
+        with path.open("ab") as f:
+            f.write(b"niedoko")
+        self.assertEqual(store.recover()["action"], "stream_rolled_back")
+        self.assertEqual(path.read_text(encoding="utf-8"), "base\nAla ma kota\n")
+        self.assertFalse((store.seg_dir / STREAM_PART).exists())
+        store.append("dalej\n")
+        self.assertEqual(store.total_words(), 5)
+
+    def test_worker_stream_sse_endpoint(self):
+        bq.reset(Path(self.tmp) / "q.sqlite3", workers=0)
+        import books_agent_worker_api as worker_api
+
+        book_dir = worker_api.ensure_book_scaffold(BOOK)
+        (book_dir / "prompt.txt").write_text("Pisz dalej.", encoding="utf-8")
+        job = {"job_id": "job_sse_1", "prompt_file": f"books/{BOOK}/prompt.txt", "mode": "buffer", "status": "QUEUED"}
+        (book_dir / "jobs" / "job_sse_1.json").write_text(json.dumps(job), encoding="utf-8")
+
+        app = FastAPI()
+        app.include_router(worker_api.router)
+        events = []
+        with TestClient(app) as c:
+            with c.stream("POST", "/books/agent/worker/stream", json={"book": BOOK}) as r:
+                self.assertEqual(r.headers["content-type"].split(";")[0], "text/event-stream")
+                ev = None
+                for line in r.iter_lines():
+                    if line.startswith("event: "):
+                        ev = line[7:]
+                    elif line.startswith("data: "):
+                        events.append((ev, json.loads(line[6:])))
+            metrics = c.get("/books/agent/worker/stream/metrics").json()["llm_stream"]
+
+        kinds = [e for e, _ in events]
+        self.assertEqual((kinds[0], kinds[-1]), ("job", "done"))
+        self.assertGreater(kinds.count("delta"), 3)
+        done = events[-1][1]
+        self.assertEqual((done["status"], done["job_id"], done["wrote_to"]), ("SUCCESS", "job_sse_1", "buffer"))
+        self.assertIsNotNone(done["ttft_ms"])
+        streamed = "".join(d["text"] for e, d in events if e == "delta")
+        self.assertEqual((book_dir / "draft" / "buffer.txt").read_text(encoding="utf-8"), "\n" + streamed + "\n")
+        self.assertTrue(streamed.startswith("[fake:"))
+        self.assertEqual(metrics["streams"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
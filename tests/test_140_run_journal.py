@@ -0,0 +1,138 @@
+import json
+import shutil
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import books_run_journal as rj
+import books_runs_catalog as rc
+
+ROOT = Path(__file__).resolve().parents[1]
+BOOK = "test_book_140"
+
+
+class Test140RunJournal(unittest.TestCase):
+    def setUp(self):
+        self.root = ROOT / "books" / BOOK
+        shutil.rmtree(self.root, ignore_errors=True)
+        (self.root / "draft").mkdir(parents=True)
+        (self.root / "draft" / "master.txt").write_text("Ala ma kota. Ala ma kota.\n", encoding="utf-8")
+        rc.reset_catalogs()
+        rj.reset_journals()
+        import books_artifacts_api
+        import books_critic_api
+        import books_proof_api
+        import books_runs_api
+        import books_runs_details_api
+        import books_runs_manage_api
+
+        app = FastAPI()
+        for m in (books_proof_api, books_critic_api, books_runs_api, books_runs_details_api, books_runs_manage_api, books_artifacts_api):
+            app.include_router(m.router)
+        self.c = TestClient(app)
+
+    def tearDown(self):
+        rc.reset_catalogs()
+        rj.reset_journals()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_tool_run_is_one_append_and_materializes_on_read(self):
+        j = rj.get_journal(self.root)
+        r = self.c.post("/books/proof/check", json={"book": BOOK}).json()
+        run_id = r["run_id"]
+        self.assertEqual((r["status"], j.appends), ("SUCCESS", 1))
+        self.assertEqual(r["writes"]["run"]["journal"]["mode"], "journal_append")
+        # nic poza dziennikiem: ani folderu runu, ani raportow/latest
+        self.assertFalse((self.root / "runs" / run_id).exists())
+        self.assertFalse((self.root / "analysis").exists())
+
+        self.c.post("/books/critic/check", json={"book": BOOK})
+        items = self.c.get(f"/books/book/{BOOK}/runs").json()["items"]
+        self.assertEqual(sorted(x["role"] for x in items), ["CRITIC", "PROOF"])
+        self.assertEqual(j.appends, 2)
+
+        d = self.c.get(f"/books/book/{BOOK}/runs/{run_id}").json()
+        self.assertEqual((d["meta"]["tool"], d["input"]["book"]), ("proof_check", BOOK))
+        meta = json.loads((self.root / "runs" / run_id / "meta.json").read_text(encoding="utf-8"))
+        self.assertEqual(meta["paths"]["output"], f"runs/{run_id}/output.json")
+        self.assertTrue((self.root / r["paths"]["report_md"]).exists())  # raport nalezy tylko do tego runu
+
+        latest = self.c.get(f"/books/book/{BOOK}/artifacts/latest", params={"kind": "proof"}).json()
+        self.assertIn(run_id, latest["md"])
+        self.assertEqual(latest["json_data"]["tool"], "proof")
+        rep = self.c.get(f"/books/book/{BOOK}/artifacts/read", params={"path": r["paths"]["report_json"]}).json()
+        self.assertEqual(json.loads(rep["content"])["stats"]["source"], "draft/master.txt")
+
+        # nowszy proof -> latest z dysku zostaje nadpisany przy nastepnym odczycie
+        r2 = self.c.post("/books/proof/check", json={"book": BOOK, "text": "Inny tekst."}).json()
+        latest = self.c.get(f"/books/book/{BOOK}/artifacts/latest", params={"kind": "proof"}).json()
+        self.assertIn(r2["run_id"], latest["md"])
+
+        self.assertTrue(self.c.post(f"/books/book/{BOOK}/runs/{r2['run_id']}/delete").json()["deleted"])
+        self.assertNotIn(r2["run_id"], rj.get_journal(self.root).run_ids())
+        self.assertEqual(self.c.get(f"/books/book/{BOOK}/runs").json()["total"], 2)
+        self.assertEqual(self.c.get(f"/books/book/{BOOK}/runs/{r2['run_id']}").status_code, 404)
+
+    def test_rotation_index_reload_and_torn_tail(self):
+        j = rj.RunJournal(self.root, segment_bytes=2048)
+        for i in range(30):
+            j.append_run(f"run_{i:03d}", {"run_id": f"run_{i:03d}", "title": f"t{i}"}, {"i": i}, {"preview": "x" * 100})
+        j.forget("run_005")
+        segs = sorted(p.name for p in j.dir.glob("*.seg"))
+        self.assertGreater(len(segs), 2)
+        self.assertEqual(len(list(j.dir.glob("*.idx"))), len(segs) - 1)
+
+        # ucieta ramka na koncu aktywnego segmentu (crash w trakcie os.write)
+        active = j.dir / segs[-1]
+        good = active.stat().st_size
+        with active.open("ab") as f:
+            f.write(b"RJ01\xff\x00\x00\x00garbage")
+
+        k = rj.RunJournal(self.root, segment_bytes=2048)
+        self.assertEqual(active.stat().st_size, good)
+        self.assertEqual(len(k.run_ids()), 29)
+        self.assertNotIn("run_005", k.run_ids())
+        self.assertEqual(k.read_run("run_017")["input"], {"i": 17})
+
+        # zapis z "innego procesu" (k) jest widoczny w j po refresh
+        k.append_run("run_late", {"run_id": "run_late"}, {}, {})
+        self.assertIn("run_late", j.run_ids())
+
+        rc.get_catalog(self.root).rebuild()
+        self.assertEqual(rc.get_catalog(self.root).query(limit=None)["total"], 30)
+
+    def test_concurrent_processes_index_their_own_offsets(self):
+        # 4 procesy dopisuja do jednego dziennika (z rotacja); kazdy czyta swoje runy przez indeks w pamieci
+        code = (
+            "import sys\n"
+            "from pathlib import Path\n"
+            "sys.path.insert(0, sys.argv[3])\n"
+            "import books_run_journal as rj\n"
+            "j = rj.RunJournal(Path(sys.argv[1]), segment_bytes=8192)\n"
+            "tag, bad = sys.argv[2], 0\n"
+            "for i in range(150):\n"
+            "    j.append_run(f'{tag}_{i}', {'i': i}, {'tag': tag}, {'pad': 'x' * (i % 40)})\n"
+            "for i in range(150):\n"
+            "    r = j.read_run(f'{tag}_{i}')\n"
+            "    bad += r is None or r['meta'] != {'i': i} or r['input'] != {'tag': tag}\n"
+            "print(bad)\n"
+        )
+        procs = [
+            subprocess.Popen([sys.executable, "-c", code, str(self.root), f"p{k}", str(ROOT)], stdout=subprocess.PIPE, text=True)
+            for k in range(4)
+        ]
+        outs = [p.communicate(timeout=120)[0].strip() for p in procs]
+        self.assertEqual(outs, ["0"] * 4)
+
+        fresh = rj.RunJournal(self.root, segment_bytes=8192)
+        self.assertEqual(len(fresh.run_ids()), 600)
+        self.assertGreater(fresh.stats()["segments"], 1)
+        self.assertEqual(fresh.read_run("p3_149")["meta"], {"i": 149})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import books_agent_worker_api as worker_api
+from books_draft_store import DraftStore, accept_buffer, accept_intent_path, recover_accept
+
+BOOK = "test_book_141"
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Test141AcceptJournal(unittest.TestCase):
+    def setUp(self):
+        self.book_dir = worker_api.ensure_book_scaffold(BOOK)
+        self.master = self.book_dir / "draft" / "master.txt"
+        self.buffer = self.book_dir / "draft" / "buffer.txt"
+        app = FastAPI()
+        app.include_router(worker_api.router)
+        self.c = TestClient(app)
+
+    def tearDown(self):
+        shutil.rmtree(ROOT / "books" / BOOK, ignore_errors=True)
+
+    def test_accept_appends_in_place_and_clears_buffer(self):
+        base = "Stary rozdział. " * 20000 + "\n"
+        DraftStore(self.master).append(base)
+        DraftStore(self.buffer).append("Nowa scena.\n")
+        ino = self.master.stat().st_ino
+
+        r = self.c.post("/books/agent/accept", json={"book": BOOK}).json()
+        self.assertEqual((r["status"], r["added_chars"], r["recovery"]), ("SUCCESS", 12, None))
+        self.assertEqual(self.master.read_text(encoding="utf-8"), base + "\nNowa scena.\n")
+        self.assertEqual(self.master.stat().st_ino, ino)  # dopisany, nie przepisany
+        self.assertEqual(self.buffer.read_bytes(), b"")
+        self.assertFalse(accept_intent_path(self.master).exists())
+
+        # bufor dalej dziala jako DraftStore, a do pustego master nie idzie separator
+        self.assertEqual(self.c.post("/books/agent/accept", json={"book": BOOK}).json()["status"], "BUFFER_EMPTY")
+        DraftStore(self.buffer).append("dalej")
+        self.assertEqual(DraftStore(self.buffer).total_words(), 1)
+        other = self.book_dir / "draft" / "other.txt"
+        self.assertEqual(accept_buffer(other, self.buffer)["bytes"], 5)
+        self.assertEqual(other.read_text(encoding="utf-8"), "dalej")
+
+    def test_crash_between_steps_rolls_forward(self):
+        DraftStore(self.master).append("A.")
+        DraftStore(self.buffer).append("B.")
+
+        # crash po intencji, przed appendem do master
+        with mock.patch.object(DraftStore, "append", side_effect=OSError("power lost")):
+            with self.assertRaises(OSError):
+                accept_buffer(self.master, self.buffer)
+        self.assertTrue(accept_intent_path(self.master).exists())
+        self.assertEqual(recover_accept(self.master, self.buffer)["action"], "rolled_forward")
+        self.assertEqual((self.master.read_text(encoding="utf-8"), self.buffer.read_bytes()), ("A.\nB.", b""))
+
+        # crash po appendzie, przed wyczyszczeniem bufora: accept przez API konczy poprzedni i nie dubluje
+        DraftStore(self.buffer).append("C.")
+        with mock.patch.object(DraftStore, "consume", side_effect=OSError("power lost")):
+            with self.assertRaises(OSError):
+                accept_buffer(self.master, self.buffer)
+        self.assertEqual(self.buffer.read_bytes(), b"C.")
+        r = self.c.post("/books/agent/accept", json={"book": BOOK}).json()
+        self.assertEqual((r["status"], r["recovery"]), ("BUFFER_EMPTY", "completed"))
+        self.assertEqual(self.master.read_text(encoding="utf-8"), "A.\nB.\nC.")
+        self.assertEqual(DraftStore(self.master).total_words(), 3)
+
+    def test_fact_gate_scans_only_new_tail(self):
+        DraftStore(self.buffer).append("Zwykła proza bez problemów. " * 2000)
+        fc = self.c.post("/books/agent/fact_check", json={"book": BOOK}).json()
+        self.assertTrue(fc["ok"])
+        self.assertEqual(fc["scanned_bytes"], self.buffer.stat().st_size)
+
+        DraftStore(self.buffer).append(" Jeszcze jedno zdanie.")
+        fc = self.c.post("/books/agent/fact_check", json={"book": BOOK}).json()
+        self.assertLessEqual(fc["scanned_bytes"], worker_api._GATE_OVERLAP + len(" Jeszcze jedno zdanie.".encode("utf-8")))
+        self.assertEqual(fc["checked_chars"], len(self.buffer.read_text(encoding="utf-8")))
+
+        # fraza przecieta granica poprzedniego sprawdzenia tez jest wykryta
+        DraftStore(self.buffer).append(" Nie mogę kon")
+        self.c.post("/books/agent/fact_check", json={"book": BOOK})
+        DraftStore(self.buffer).append("tynuować.")
+        r = self.c.post("/books/agent/accept", json={"book": BOOK}).json()
+        self.assertEqual(r["status"], "FACT_GATE_BLOCKED")
+
+        # rewrite bufora (inny inode) = pelny skan od nowa
+        worker_api.atomic_write_text(self.buffer, "Czysto.")
+        gate = worker_api.fast_gate(self.buffer)
+        self.assertEqual((gate["meta"], gate["incremental"], gate["chars"]), (False, False, 7))
+        state = json.loads((self.buffer.parent / "buffer.txt.gate.json").read_text(encoding="utf-8"))
+        self.assertEqual(state["bytes"], os.path.getsize(self.buffer))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,145 @@
+import json
+import shutil
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import books_memory_api as memory_api
+from books_notes_log import NotesLog, get_notes_log, reset_notes_logs
+
+ROOT = Path(__file__).resolve().parents[1]
+BOOK = "test_book_142"
+
+
+class Test142NotesLog(unittest.TestCase):
+    def setUp(self):
+        self.root = memory_api.BOOKS_ROOT / BOOK
+        self.mem = self.root / "memory"
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.mem.mkdir(parents=True)
+        reset_notes_logs()
+        app = FastAPI()
+        app.include_router(memory_api.router)
+        self.c = TestClient(app)
+        self.url = f"/books/book/{BOOK}/memory/notes"
+
+    def tearDown(self):
+        reset_notes_logs()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _add(self, text, **kw):
+        r = self.c.post(self.url + "/add", params={"view": "note"}, json={"type": "canon", "text": text, **kw})
+        self.assertEqual(r.status_code, 200, r.text)
+        return r.json()["data"]
+
+    def test_crud_appends_to_log_and_keeps_snapshot(self):
+        self.c.post(self.url, json={"notes": [{"id": "n0", "type": "canon", "severity": "SOFT", "scope": "GLOBAL", "text": "Startowa", "created_utc": "x", "updated_utc": "x"}]})
+        snap = (self.mem / "notes.json").stat().st_mtime_ns
+
+        a = self._add("Bohater ma niebieskie oczy", tags=["postac", "wyglad"], severity="HARD")
+        b = self._add("Miasto nad rzeka", tags=["miejsce"], scope="LOCAL")
+        self.assertEqual(len(self.c.post(self.url + "/add", json={"type": "style", "text": "Trzecia"}).json()["data"]), 4)  # view=all jak dawniej
+
+        u = self.c.post(f"{self.url}/{a['id']}/update", params={"view": "note"}, json={"text": "Bohater ma zielone oczy"}).json()["data"]
+        self.assertEqual((u["text"], u["severity"], u["tags"]), ("Bohater ma zielone oczy", "HARD", ["postac", "wyglad"]))
+        self.assertEqual(self.c.post(f"{self.url}/nope/update", json={"text": "x"}).status_code, 404)
+
+        d = self.c.post(f"{self.url}/{b['id']}/delete", params={"view": "note"}).json()["data"]
+        self.assertEqual(d, {"id": b["id"], "deleted": True})
+
+        # zadna operacja nie przepisala notes.json: wszystko jest w logu
+        self.assertEqual((self.mem / "notes.json").stat().st_mtime_ns, snap)
+        ops = [json.loads(x)["op"] for x in (self.mem / "notes.log.jsonl").read_text(encoding="utf-8").splitlines()]
+        self.assertEqual(ops, ["add", "add", "add", "update", "delete"])
+
+        # swiezy proces: snapshot + replay logu daje ten sam stan
+        reset_notes_logs()
+        notes = self.c.get(self.url).json()["data"]
+        self.assertEqual([n["text"] for n in notes], ["Startowa", "Bohater ma zielone oczy", "Trzecia"])
+
+        bulk = self.c.get(f"/books/book/{BOOK}/memory/bulk").json()
+        self.assertEqual(len(bulk["notes"]["data"]), 3)
+
+    def test_filters_and_pagination(self):
+        for i in range(12):
+            self._add(f"Notatka {i}", tags=["even" if i % 2 == 0 else "odd", "all"], severity="HARD" if i < 4 else "SOFT")
+        r = self.c.get(self.url, params={"tag": "even", "severity": "HARD"}).json()
+        self.assertEqual([n["text"] for n in r["data"]], ["Notatka 0", "Notatka 2"])
+        self.assertEqual(r["total"], 2)
+
+        r = self.c.get(self.url, params={"tag": "all", "limit": 5, "offset": 10}).json()
+        self.assertEqual(([n["text"] for n in r["data"]], r["total"]), (["Notatka 10", "Notatka 11"], 12))
+        self.assertEqual(self.c.get(self.url, params={"q": "NOTATKA 1"}).json()["total"], 3)  # 1, 10, 11
+        self.assertEqual(self.c.get(self.url, params={"tag": "missing"}).json()["data"], [])
+
+        # usuniecie zdejmuje notatke z indeksow
+        first = self.c.get(self.url, params={"tag": "even", "limit": 1}).json()["data"][0]
+        self.c.post(f"{self.url}/{first['id']}/delete")
+        self.assertEqual(self.c.get(self.url, params={"tag": "even"}).json()["total"], 5)
+
+    def test_background_compaction_and_torn_tail(self):
+        log = NotesLog(self.mem, compact_every=10)
+        ids = [log.add({"text": f"n{i}", "tags": ["t"]})["id"] for i in range(25)]
+        log.wait_compaction(5)
+        log.update(ids[0], {"text": "zmieniona"})
+        log.delete(ids[1])
+        log.wait_compaction(5)
+        self.assertGreaterEqual(log.compactions, 1)
+        self.assertLess(log.stats()["log_events"], 10)
+
+        # crash w trakcie zapisu ostatniej linii
+        with open(self.mem / "notes.log.jsonl", "ab") as f:
+            f.write(b'{"op": "add", "note": {"id": "pol')
+        fresh = NotesLog(self.mem, compact_every=0)
+        self.assertEqual(len(fresh.all()), 24)
+        self.assertEqual(fresh.get(ids[0])["text"], "zmieniona")
+        self.assertTrue((self.mem / "notes.log.jsonl").read_bytes().endswith(b"\n") or fresh.stats()["log_bytes"] == 0)
+
+        # zapis z innej instancji (inny proces) jest widoczny po refresh
+        fresh.add({"id": "late", "text": "pozna"})
+        self.assertEqual(log.get("late")["text"], "pozna")
+        self.assertIs(get_notes_log(self.mem), get_notes_log(Path(str(self.mem))))
+
+    def test_corrupt_snapshot_is_reported(self):
+        (self.mem / "notes.json").write_text('{"not": "a list"}', encoding="utf-8")
+        r = self.c.get(self.url)
+        self.assertEqual((r.status_code, r.json()["detail"]["code"]), (500, "NOTES_CORRUPT"))
+
+        # cala, ale nieczytelna linia logu = blad, nie cicho pominiete zdarzenie
+        (self.mem / "notes.json").write_text("[]", encoding="utf-8")
+        (self.mem / "notes.log.jsonl").write_bytes(b'{"op": "add", "note": {"id": "a"}}\n{zepsute\n')
+        reset_notes_logs()
+        r = self.c.get(self.url)
+        self.assertEqual((r.status_code, r.json()["detail"]["code"]), (500, "NOTES_CORRUPT"))
+
+    def test_concurrent_processes_do_not_lose_notes(self):
+        # 4 procesy dodaja notatki do jednego logu, z czesta kompakcja w tle
+        code = (
+            "import sys\n"
+            "from pathlib import Path\n"
+            "sys.path.insert(0, sys.argv[3])\n"
+            "from books_notes_log import NotesLog\n"
+            "log = NotesLog(Path(sys.argv[1]), compact_every=25)\n"
+            "tag = sys.argv[2]\n"
+            "for i in range(150):\n"
+            "    log.add({'id': f'{tag}_{i}', 'text': 'x', 'tags': [tag]})\n"
+            "log.wait_compaction(10)\n"
+            "print(len(log.query(tag=tag)['items']))\n"
+        )
+        procs = [
+            subprocess.Popen([sys.executable, "-c", code, str(self.mem), f"p{k}", str(ROOT)], stdout=subprocess.PIPE, text=True)
+            for k in range(4)
+        ]
+        outs = [p.communicate(timeout=120)[0].strip() for p in procs]
+        self.assertEqual(outs, ["150"] * 4)
+
+        fresh = NotesLog(self.mem, compact_every=0)
+        self.assertEqual(len(fresh.all()), 600)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
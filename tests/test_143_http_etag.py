@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import time
+import unittest
+from email.utils import formatdate
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import books_files_api as files_api
+import books_memory_api as memory_api
+from books_notes_log import reset_notes_logs
+
+ROOT = Path(__file__).resolve().parents[1]
+BOOK = "test_book_143"
+
+
+class Test143HttpEtag(unittest.TestCase):
+    def setUp(self):
+        self.root = ROOT / "books" / BOOK
+        shutil.rmtree(self.root, ignore_errors=True)
+        (self.root / "draft").mkdir(parents=True)
+        (self.root / "memory").mkdir()
+        self.master = self.root / "draft" / "master.txt"
+        self.master.write_text("Pierwszy akapit.\n", encoding="utf-8")
+        reset_notes_logs()
+        app = FastAPI()
+        app.include_router(files_api.router)
+        app.include_router(memory_api.router)
+        self.c = TestClient(app)
+
+    def tearDown(self):
+        reset_notes_logs()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_master_304_without_reading_file(self):
+        url = f"/books/book/{BOOK}/master"
+        r = self.c.get(url)
+        etag = r.headers["etag"]
+        self.assertEqual((r.status_code, r.headers["cache-control"]), (200, "no-cache"))
+
+        with mock.patch.object(files_api, "_read_text_file", side_effect=AssertionError("read")):
+            r = self.c.get(url, headers={"If-None-Match": f'W/"x", {etag}'})
+        self.assertEqual((r.status_code, r.content, r.headers["etag"]), (304, b"", etag))
+
+        # inny wariant (tail_lines) = inny ETag
+        self.assertNotEqual(self.c.get(url, params={"tail_lines": 1}).headers["etag"], etag)
+
+        with self.master.open("a", encoding="utf-8") as f:
+            f.write("Drugi.\n")
+        r = self.c.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json()["content"].endswith("Drugi.\n"))
+
+        # If-Modified-Since (bez If-None-Match)
+        old = time.time() - 3600
+        os.utime(self.master, (old, old))
+        r = self.c.get(url, headers={"If-Modified-Since": formatdate(old + 10, usegmt=True)})
+        self.assertEqual(r.status_code, 304)
+        r = self.c.get(url, headers={"If-Modified-Since": formatdate(old - 10, usegmt=True)})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers["last-modified"], formatdate(old, usegmt=True))
+
+        # plik zmieniony w biezacej sekundzie: bez Last-Modified, a IMS z tej sekundy nie daje 304
+        self.master.write_text("Trzeci.\n", encoding="utf-8")
+        r = self.c.get(url)
+        self.assertNotIn("last-modified", r.headers)
+        r = self.c.get(url, headers={"If-Modified-Since": formatdate(time.time(), usegmt=True)})
+        self.assertEqual(r.status_code, 200)
+
+    def test_bulk_per_section_etags(self):
+        url = f"/books/book/{BOOK}/memory/bulk"
+        (self.root / "memory" / "canon.json").write_text(json.dumps({"bohater": "Ala"}), encoding="utf-8")
+        r = self.c.get(url)
+        etag = r.headers["etag"]
+        sections = {k: v["meta"]["etag"] for k, v in r.json().items()}
+        self.assertTrue(all(sections.values()))
+
+        with mock.patch.object(memory_api, "_bulk_read", side_effect=AssertionError("read")):
+            self.assertEqual(self.c.get(url, headers={"If-None-Match": etag}).status_code, 304)
+
+        # nowa notatka (1 linia w logu) zmienia ETag calosci i sekcji notes, reszta bez zmian
+        self.c.post(f"/books/book/{BOOK}/memory/notes/add", json={"type": "canon", "text": "x"})
+        r = self.c.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r.headers["etag"], etag)
+        after = {k: v["meta"]["etag"] for k, v in r.json().items()}
+        self.assertNotEqual(after["notes"], sections["notes"])
+        self.assertEqual(after["canon"], sections["canon"])
+
+    def test_canon_and_bible_conditional_get(self):
+        from app.main import app
+
+        c = TestClient(app)
+        (self.root / "book_bible.json").write_text(json.dumps({"characters": ["Ala"]}), encoding="utf-8")
+        r = c.get(f"/canon/{BOOK}")
+        self.assertEqual((r.status_code, r.json()["canon"]), (200, {"characters": ["Ala"]}))
+        etag = r.headers["etag"]
+        r = c.get(f"/canon/{BOOK}", headers={"If-None-Match": etag})
+        self.assertEqual((r.status_code, r.content), (304, b""))
+
+        url = f"/books/{BOOK}/bible"
+        c.patch(url + "/characters", json={"add": [{"name": "Ola"}], "remove_names": []})
+        etag = c.get(url).headers["etag"]
+        self.assertEqual(c.get(url, headers={"If-None-Match": etag}).status_code, 304)
+        c.patch(url + "/characters", json={"add": [{"name": "Ela"}], "remove_names": []})
+        r = c.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(sorted(x["name"] for x in r.json()["bible"]["characters"]), ["Ela", "Ola"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
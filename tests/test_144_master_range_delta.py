@@ -0,0 +1,98 @@
+import shutil
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import books_files_api as files_api
+from books_draft_store import DraftStore
+from books_search_index import get_search_index, reset_search_indexes
+
+ROOT = Path(__file__).resolve().parents[1]
+BOOK = "test_book_144"
+
+
+class Test144MasterRangeDelta(unittest.TestCase):
+    def setUp(self):
+        self.root = ROOT / "books" / BOOK
+        shutil.rmtree(self.root, ignore_errors=True)
+        (self.root / "draft").mkdir(parents=True)
+        self.master = self.root / "draft" / "master.txt"
+        DraftStore(self.master).append("Akapit pierwszy.\n\nAkapit drugi.\n")
+        reset_search_indexes()
+        app = FastAPI()
+        app.include_router(files_api.router)
+        self.c = TestClient(app)
+        self.url = f"/books/book/{BOOK}/master"
+
+    def tearDown(self):
+        reset_search_indexes()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_byte_range(self):
+        raw = self.master.read_bytes()
+        r = self.c.get(self.url, headers={"Range": "bytes=0-5"})
+        self.assertEqual((r.status_code, r.content), (206, raw[:6]))
+        self.assertEqual(r.headers["content-range"], f"bytes 0-5/{len(raw)}")
+        self.assertEqual(self.c.get(self.url, headers={"Range": "bytes=-6"}).content, raw[-6:])
+        self.assertEqual(self.c.get(self.url, headers={"Range": "bytes=18-"}).content, raw[18:])
+
+        r = self.c.get(self.url, headers={"Range": f"bytes={len(raw)}-"})
+        self.assertEqual((r.status_code, r.headers["content-range"]), (416, f"bytes */{len(raw)}"))
+        # multi-range / nieaktualny If-Range -> caly plik
+        self.assertEqual(self.c.get(self.url, headers={"Range": "bytes=0-1,4-5"}).status_code, 200)
+        etag = self.c.get(self.url).headers["etag"]
+        self.assertEqual(self.c.get(self.url, headers={"Range": "bytes=0-1", "If-Range": '"old"'}).status_code, 200)
+        self.assertEqual(self.c.get(self.url, headers={"Range": "bytes=0-1", "If-Range": etag}).status_code, 206)
+
+    def test_delta_follows_appends_and_detects_rewrite(self):
+        d = self.c.get(self.url + "/delta").json()
+        self.assertEqual((d["offset"], d["content"], d["reset"]), (0, "Akapit pierwszy.\n\nAkapit drugi.\n", False))
+        cursor = d["cursor"]
+
+        # nic nowego: pusta delta, ten sam kursor, bez czytania calego pliku
+        with mock.patch.object(files_api, "_read_text_file", side_effect=AssertionError("full read")):
+            d = self.c.get(self.url + "/delta", params={"since": cursor}).json()
+        self.assertEqual((d["content"], d["cursor"]), ("", cursor))
+
+        DraftStore(self.master).append("\nŻółć i gęś.")
+        d = self.c.get(self.url + "/delta", params={"since": cursor}).json()
+        self.assertEqual((d["content"], d["more"]), ("\nŻółć i gęś.", False))
+        self.assertEqual(d["end"], self.master.stat().st_size)
+
+        # max_bytes przecina wielobajtowy znak: dostajemy caly znak, kolejne wywolanie dokancza
+        d1 = self.c.get(self.url + "/delta", params={"since": cursor, "max_bytes": 2}).json()
+        self.assertEqual((d1["content"], d1["more"]), ("\nŻ", True))
+        d2 = self.c.get(self.url + "/delta", params={"since": d1["cursor"]}).json()
+        self.assertEqual(d1["content"] + d2["content"], "\nŻółć i gęś.")
+
+        # przepisanie pliku (inna tresc przed kursorem) -> reset i tresc od poczatku
+        end_cursor = d2["cursor"]
+        self.master.write_text("Nowa wersja ksiazki, zupelnie inna i dluzsza niz poprzednio.\n", encoding="utf-8")
+        d = self.c.get(self.url + "/delta", params={"since": end_cursor}).json()
+        self.assertTrue(d["reset"])
+        self.assertEqual(d["offset"], 0)
+        self.assertTrue(d["content"].startswith("Nowa wersja"))
+        self.assertEqual(self.c.get(self.url + "/delta", params={"since": "x.y"}).status_code, 400)
+
+    def test_paragraph_range_from_index(self):
+        for i in range(3, 8):
+            DraftStore(self.master).append(f"\nAkapit {i}.\n")
+        r = self.c.get(self.url + "/paragraphs", params={"start": 2, "count": 3}).json()
+        self.assertEqual(r["total"], 7)
+        self.assertEqual([p["para_index"] for p in r["items"]], [2, 3, 4])
+        self.assertEqual(r["items"][0]["text"], "Akapit drugi.")
+
+        idx = get_search_index(self.master)
+        builds = idx.builds
+        DraftStore(self.master).append("\nAkapit 8.")
+        r = self.c.get(self.url + "/paragraphs", params={"start": 8}).json()
+        self.assertEqual((r["total"], r["items"][0]["text"]), (8, "Akapit 8."))
+        self.assertEqual(idx.builds, builds)  # dopisanie = tylko ogon, bez przebudowy
+        self.assertEqual(self.c.get(self.url + "/paragraphs", params={"start": 50}).json()["items"], [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
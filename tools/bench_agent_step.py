@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+# Benchmark przepustowosci /agent/step przez StepEngine.
+#
+#   python tools/bench_agent_step.py --requests 32 --books 8 --workers 1,2,4,8 --llm_ms 200
+#
+# Kazdy request to pelny krok WRITE+CRITIC+QUALITY (execute_stub w AGENT_TEST_MODE) dla innego booka;
+# --llm_ms dokleja symulowany round-trip do LLM (sleep), bo to on dominuje w produkcji.
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("AGENT_TEST_MODE", "1")
+
+from app.main import AgentStepRequest, _agent_step_sync  # noqa: E402
+from app.step_engine import reset_engine  # noqa: E402
+
+
+def _step_with_llm(req: AgentStepRequest, llm_ms: int):
+    if llm_ms > 0:
+        time.sleep(llm_ms / 1000.0)
+    return _agent_step_sync(req)
+
+
+async def _round(n: int, books: int, llm_ms: int, workers: int, kind: str, prefix: str) -> float:
+    engine = reset_engine(kind=kind, workers=workers, per_book=1)
+    reqs = []
+    for i in range(n):
+        book = f"{prefix}_{i % books}"
+        reqs.append((book, AgentStepRequest(modes=["WRITE", "CRITIC", "QUALITY"], payload={"book_id": book, "input": f"bench {i}", "run_id": f"run_{prefix}_{workers}_{i:04d}"})))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[engine.run(b, _step_with_llm, r, llm_ms) for b, r in reqs])
+    dt = time.perf_counter() - t0
+    engine.shutdown()
+    return dt
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=32)
+    ap.add_argument("--books", type=int, default=8)
+    ap.add_argument("--workers", default="1,2,4,8")
+    ap.add_argument("--executor", choices=["thread", "process"], default="thread")
+    ap.add_argument("--llm_ms", type=int, default=200)
+    args = ap.parse_args()
+
+    prefix = f"bench_{os.getpid()}"
+    base = None
+    print(f"requests={args.requests} books={args.books} executor={args.executor} llm_ms={args.llm_ms}")
+    try:
+        for w in [int(x) for x in args.workers.split(",") if x.strip()]:
+            dt = asyncio.run(_round(args.requests, args.books, args.llm_ms, w, args.executor, prefix))
+            rps = args.requests / dt
+            base = base or rps
+            print(f"workers={w:<3} wall={dt:7.3f}s  steps/s={rps:8.2f}  speedup={rps / base:5.2f}x")
+    finally:
+        for d in (ROOT / "runs").glob(f"run_{prefix}_*"):
+            shutil.rmtree(d, ignore_errors=True)
+        for d in (ROOT / "books").glob(f"{prefix}_*"):
+            shutil.rmtree(d, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+# Benchmark books_chunk_pipeline: sekwencyjnie (inflight=1) vs potokowo, z symulowanym opoznieniem LLM.
+#
+#   python tools/bench_chunk_pipeline.py --target 3000 --chunk_words 300 --latency 1.5 --inflight 4
+#
+# Petla jak w grow_to_wordcount: chunk -> append_utf8 -> count_file_words, az do --target slow.
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from books_chunk_pipeline import ChunkPipeline, ChunkSpec, continuity_issue  # noqa: E402
+from books_core import read_tail_text  # noqa: E402
+from books_wordcount import count_file_words  # noqa: E402
+from grow_to_wordcount import append_utf8  # noqa: E402
+
+_WORDS = "noc miasto deszcz okno cisza kroki drzwi światło cień głos ręka twarz list klucz most rzeka".split()
+
+
+def _run(inflight: int, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "book_text.txt"
+        path.write_text("", encoding="utf-8")
+        wc = 0
+
+        def generate(spec: ChunkSpec) -> str:
+            rng = random.Random(spec.index * 100 + spec.attempt)
+            time.sleep(args.latency * rng.uniform(0.7, 1.3))
+            return " ".join(rng.choice(_WORDS) for _ in range(args.chunk_words)) + "."
+
+        def commit(spec: ChunkSpec, chunk: str) -> None:
+            nonlocal wc
+            append_utf8(path, chunk)
+            wc = count_file_words(path).words
+
+        pipe = ChunkPipeline(
+            generate,
+            commit,
+            snapshot=lambda: read_tail_text(path, chars=2500),
+            check=lambda spec, chunk: continuity_issue(read_tail_text(path, chars=2500), chunk),
+            inflight=inflight,
+        )
+        return pipe.run(n=200, done=lambda: wc >= args.target)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--target", type=int, default=3000)
+    ap.add_argument("--chunk_words", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=1.5, help="sekundy na jedno wywolanie LLM")
+    ap.add_argument("--inflight", type=int, default=4)
+    args = ap.parse_args()
+
+    seq = _run(1, args)
+    par = _run(args.inflight, args)
+    for s in (seq, par):
+        print(
+            f"{s['mode']:10} inflight={s['inflight']} wall={s['wall_s']:7.2f}s committed={s['committed']} "
+            f"generated={s['generated']} regenerated={s['regenerated']} discarded={s['discarded']}"
+        )
+    print(f"wall-clock speedup vs sequential: {seq['wall_s'] / par['wall_s']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+# Benchmark pollingu GET /memory/bulk: pelna odpowiedz vs warunkowy GET (If-None-Match -> 304).
+#
+#   python tools/bench_http_etag.py --polls 300 --notes 2000
+
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import books_memory_api as memory_api  # noqa: E402
+from books_notes_log import reset_notes_logs  # noqa: E402
+
+BOOK = "bench_http_etag"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--polls", type=int, default=300)
+    ap.add_argument("--notes", type=int, default=2000)
+    args = ap.parse_args()
+
+    mem = ROOT / "books" / BOOK / "memory"
+    shutil.rmtree(mem.parent, ignore_errors=True)
+    mem.mkdir(parents=True)
+    canon = {f"postac_{i}": {"opis": "x" * 200} for i in range(500)}
+    (mem / "canon.json").write_text(json.dumps(canon, ensure_ascii=False), encoding="utf-8")
+    (mem / "summary.md").write_text("Streszczenie rozdzialu.\n" * 2000, encoding="utf-8")
+    notes = [
+        {"id": str(i), "type": "canon", "severity": "SOFT", "scope": "GLOBAL", "text": "n" * 100, "tags": [], "created_utc": "", "updated_utc": ""}
+        for i in range(args.notes)
+    ]
+    (mem / "notes.json").write_text(json.dumps(notes), encoding="utf-8")
+
+    app = FastAPI()
+    app.include_router(memory_api.router)
+    c = TestClient(app)
+    url = f"/books/book/{BOOK}/memory/bulk"
+    try:
+        etag = c.get(url).headers["etag"]
+        res = {}
+        for mode, headers in (("full", {}), ("304", {"If-None-Match": etag})):
+            t0 = time.perf_counter()
+            for _ in range(args.polls):
+                r = c.get(url, headers=headers)
+            res[mode] = time.perf_counter() - t0
+            print(f"{mode:5} polls={args.polls} status={r.status_code} bytes={len(r.content):8d} per_poll={res[mode] * 1000 / args.polls:7.3f}ms")
+        print(f"speedup: {res['full'] / res['304']:.1f}x")
+    finally:
+        reset_notes_logs()
+        shutil.rmtree(mem.parent, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
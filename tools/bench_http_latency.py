@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+# Benchmark latencji warstwy HTTP (middleware + routing) dla /health, /config/validate i /agent/step.
+#
+#   python tools/bench_http_latency.py --n 300
+#   P20_4_FORCE_FASTPATH=0 python tools/bench_http_latency.py --n 50     # pelna sciezka /agent/step
+#
+# Requesty ida bezposrednio przez ASGI (bez sieci i bez TestClienta), wiec mierzymy narzut aplikacji.
+# Sprzatamy tylko runs/<run_id>, ktore benchmark dostal w odpowiedziach (inne runy w repo zostaja).
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Set, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("AGENT_TEST_MODE", "1")
+
+from app.main import app  # noqa: E402
+
+
+async def _call(method: str, path: str, body: bytes = b"") -> Tuple[int, bytes]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+    sent = False
+    status = {"code": 0}
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status["code"], b"".join(chunks)
+
+
+def _run_id(body: bytes) -> Optional[str]:
+    try:
+        rid = json.loads(body).get("run_id")
+    except Exception:
+        return None
+    return rid if isinstance(rid, str) and rid and "/" not in rid and "\\" not in rid and rid not in (".", "..") else None
+
+
+async def _measure(n: int, method: str, path: str, body_fn, run_ids: Set[str]) -> dict:
+    lat = []
+    codes = {}
+    for i in range(n):
+        body = body_fn(i) if body_fn else b""
+        t0 = time.perf_counter()
+        try:
+            code, resp = await _call(method, path, body)
+            rid = _run_id(resp)
+            if rid:
+                run_ids.add(rid)
+        except Exception as e:
+            code = type(e).__name__
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        codes[code] = codes.get(code, 0) + 1
+    lat.sort()
+    return {
+        "p50_ms": round(statistics.median(lat), 3),
+        "p95_ms": round(lat[int(len(lat) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.mean(lat), 3),
+        "codes": codes,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=300)
+    args = ap.parse_args()
+
+    book = f"bench_http_{os.getpid()}"
+
+    def step_body(i: int) -> bytes:
+        return json.dumps({"mode": "WRITE", "book_id": book, "payload": {"book_id": book, "topic": f"bench {i}", "run_id": f"run_{book}_{i:05d}"}}).encode("utf-8")
+
+    cases = [
+        ("GET /health", "GET", "/health", None),
+        ("GET /config/validate", "GET", "/config/validate", None),
+        ("POST /agent/step", "POST", "/agent/step", step_body),
+    ]
+    print(f"n={args.n} P20_4_FORCE_FASTPATH={os.getenv('P20_4_FORCE_FASTPATH', '1')}")
+    run_ids: Set[str] = set()
+    try:
+        for label, method, path, body_fn in cases:
+            asyncio.run(_measure(5, method, path, body_fn, run_ids))
+            r = asyncio.run(_measure(args.n, method, path, body_fn, run_ids))
+            print(f"{label:<22} p50={r['p50_ms']:8.3f}ms  p95={r['p95_ms']:8.3f}ms  mean={r['mean_ms']:8.3f}ms  codes={r['codes']}")
+    finally:
+        # fastpath sam nadaje run_id: usuwamy dokladnie te, ktore zwrocily nasze requesty
+        for rid in run_ids:
+            shutil.rmtree(ROOT / "runs" / rid, ignore_errors=True)
+        shutil.rmtree(ROOT / "books" / book, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
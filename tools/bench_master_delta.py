@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+# Benchmark sledzenia pisanej ksiazki: pelny GET /master po kazdym dopisaniu vs GET /master/delta?since=<cursor>.
+#
+#   python tools/bench_master_delta.py --mb 20 --appends 100
+
+import argparse
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import books_files_api as files_api  # noqa: E402
+from books_draft_store import DraftStore  # noqa: E402
+
+BOOK = "bench_master_delta"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=20.0)
+    ap.add_argument("--appends", type=int, default=100)
+    args = ap.parse_args()
+
+    master = ROOT / "books" / BOOK / "draft" / "master.txt"
+    shutil.rmtree(master.parent.parent, ignore_errors=True)
+    master.parent.mkdir(parents=True)
+    para = "Zdanie w akapicie, ktore sie powtarza. " * 20 + "\n\n"
+    master.write_text(para * int(args.mb * 1024 * 1024 / len(para.encode("utf-8"))), encoding="utf-8")
+
+    app = FastAPI()
+    app.include_router(files_api.router)
+    c = TestClient(app)
+    url = f"/books/book/{BOOK}/master"
+    try:
+        res = {}
+        for mode in ("full", "delta"):
+            cursor = c.get(url + "/delta", params={"since": master.stat().st_size}).json()["cursor"]
+            got = 0
+            t0 = time.perf_counter()
+            for i in range(args.appends):
+                DraftStore(master).append(f"Nowy akapit {i}.\n\n")
+                if mode == "full":
+                    got += len(c.get(url).content)
+                else:
+                    r = c.get(url + "/delta", params={"since": cursor}).json()
+                    cursor = r["cursor"]
+                    got += len(r["content"])
+            res[mode] = time.perf_counter() - t0
+            print(f"{mode:5} appends={args.appends} per_poll={res[mode] * 1000 / args.appends:8.3f}ms transferred={got:12d}B")
+        print(f"speedup: {res['full'] / res['delta']:.1f}x")
+    finally:
+        shutil.rmtree(master.parent.parent, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+# Benchmark POST /books/book/{book}/master/search: indeks (books_search_index) vs dotychczasowy skan pliku.
+#
+#   python tools/bench_master_search.py --words 1000000 --queries 50
+#
+# Mierzymy: budowe indeksu (pierwsze zapytanie), zapytania na cieplym indeksie, dopisanie chunku do
+# master.txt (aktualizacja przyrostowa) oraz ten sam zestaw zapytan jako pelny skan (_scan_search).
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from books_files_api import MasterSearchRequest, _scan_search  # noqa: E402
+from books_search_index import MasterSearchIndex  # noqa: E402
+
+_WORDS = (
+    "noc miasto deszcz okno cisza kroki drzwi światło cień głos ręka twarz list klucz most rzeka żółw "
+    "który patrzył czekał powiedział wrócił zamknął otworzył szedł stał milczał pamiętał wiedział łódź"
+).split()
+_QUERIES = ["deszcz", "zolw", "lodz most", '"zamknął drzwi"', "pamięt*", "cisza klucz rzeka", "swiatlo*"]
+
+
+def _paragraph(rng: random.Random) -> str:
+    n = rng.randint(40, 160)
+    s = " ".join(rng.choice(_WORDS) for _ in range(n))
+    return s[:1].upper() + s[1:] + "."
+
+
+def _text(rng: random.Random, words: int) -> str:
+    paras, n = [], 0
+    while n < words:
+        p = _paragraph(rng)
+        paras.append(p)
+        n += p.count(" ") + 1
+    return "\n\n".join(paras)
+
+
+def _ms(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--words", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--chunk_words", type=int, default=1200)
+    args = ap.parse_args()
+
+    rng = random.Random(11)
+    tmp = ROOT / "books" / f"bench_search_{os.getpid()}"
+    master = tmp / "draft" / "master.txt"
+    master.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        master.write_text(_text(rng, args.words), encoding="utf-8")
+        idx = MasterSearchIndex(master)
+        print(f"words={args.words} chars={master.stat().st_size}")
+        print(f"index build        {_ms(lambda: idx.search('deszcz')):9.1f} ms")
+
+        warm = []
+        for i in range(args.queries):
+            q = _QUERIES[i % len(_QUERIES)]
+            warm.append(_ms(lambda: idx.search(q, limit=10)))
+        print(f"indexed query      {statistics.median(warm):9.2f} ms median, {max(warm):.2f} ms max")
+
+        with master.open("a", encoding="utf-8") as f:
+            f.write("\n\n" + _text(rng, args.chunk_words))
+        print(f"append + query     {_ms(lambda: idx.search('deszcz')):9.2f} ms (appends={idx.appends}, builds={idx.builds})")
+
+        scan = []
+        for i in range(min(args.queries, 10)):
+            q = _QUERIES[i % len(_QUERIES)].strip('"').rstrip("*")
+            req = MasterSearchRequest(q=q, limit=10)
+            scan.append(_ms(lambda: _scan_search(master, master.read_text(encoding="utf-8"), q, req)))
+        print(f"full scan query    {statistics.median(scan):9.2f} ms median")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+# Benchmark dodawania notatek: legacy (czytaj notes.json, dopisz, przepisz caly plik) vs log notatek (1 linia).
+#
+#   python tools/bench_notes_log.py --notes 5000 --adds 500
+
+import argparse
+import json
+import shutil
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from books_notes_log import NotesLog  # noqa: E402
+
+BOOK = "bench_notes_log"
+
+
+def _note(i: int) -> dict:
+    return {"id": str(uuid.uuid4()), "type": "canon", "severity": "SOFT", "scope": "GLOBAL", "text": f"Notatka {i} " * 8, "tags": [f"t{i % 20}"]}
+
+
+def _legacy(mem: Path, adds: int) -> float:
+    p = mem / "notes.json"
+    t0 = time.perf_counter()
+    for i in range(adds):
+        notes = json.loads(p.read_text(encoding="utf-8"))
+        notes.append(_note(i))
+        tmp = p.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(notes, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        tmp.replace(p)
+    return time.perf_counter() - t0
+
+
+def _log(mem: Path, adds: int) -> float:
+    log = NotesLog(mem)
+    t0 = time.perf_counter()
+    for i in range(adds):
+        log.add(_note(i))
+    wall = time.perf_counter() - t0
+    log.wait_compaction()
+    return wall
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--notes", type=int, default=5000, help="notatki juz zapisane w notes.json")
+    ap.add_argument("--adds", type=int, default=500)
+    args = ap.parse_args()
+
+    mem = ROOT / "books" / BOOK / "memory"
+    res = {}
+    try:
+        for mode, fn in (("legacy", _legacy), ("log", _log)):
+            shutil.rmtree(mem.parent, ignore_errors=True)
+            mem.mkdir(parents=True)
+            seed = [_note(i) for i in range(args.notes)]
+            (mem / "notes.json").write_text(json.dumps(seed, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            res[mode] = fn(mem, args.adds)
+            print(f"{mode:7} notes={args.notes} adds={args.adds} wall={res[mode]:7.3f}s per_add={res[mode] * 1000 / args.adds:7.3f}ms")
+    finally:
+        shutil.rmtree(mem.parent, ignore_errors=True)
+    print(f"speedup: {res['legacy'] / res['log']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
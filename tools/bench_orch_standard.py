@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+# Benchmark finalizacji artefaktow krokow na presecie ORCH_STANDARD.
+#
+#   python tools/bench_orch_standard.py --runs 20
+#
+# Kazdy run to pelny _agent_step_sync (PLAN, WRITE, CRITIC, EDIT, QUALITY) w AGENT_TEST_MODE.
+# Liczymy steps/s oraz zapisy plikow w runs/<id>/steps na krok (write_text + atomowy replace).
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("AGENT_TEST_MODE", "1")
+
+from app.main import AgentStepRequest, _agent_step_sync  # noqa: E402
+
+_WRITES = {"n": 0}
+
+
+def _count_step_writes() -> None:
+    orig_write_text = Path.write_text
+    orig_replace = Path.replace
+
+    def write_text(self, *a, **kw):
+        if self.parent.name == "steps" and self.suffix == ".json":
+            _WRITES["n"] += 1
+        return orig_write_text(self, *a, **kw)
+
+    def replace(self, target):
+        t = Path(target)
+        if t.parent.name == "steps" and t.suffix == ".json":
+            _WRITES["n"] += 1
+        return orig_replace(self, target)
+
+    Path.write_text = write_text
+    Path.replace = replace
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--preset", default="ORCH_STANDARD")
+    args = ap.parse_args()
+
+    _count_step_writes()
+    prefix = f"bench_orch_{os.getpid()}"
+    book = f"{prefix}_book"
+    steps = 0
+    try:
+        t0 = time.perf_counter()
+        for i in range(args.runs):
+            req = AgentStepRequest(preset=args.preset, payload={"book_id": book, "topic": f"bench {i}", "run_id": f"run_{prefix}_{i:04d}"})
+            out = _agent_step_sync(req)
+            steps += len(out.get("artifact_paths") or [])
+        dt = time.perf_counter() - t0
+    finally:
+        for d in (ROOT / "runs").glob(f"run_{prefix}_*"):
+            shutil.rmtree(d, ignore_errors=True)
+        shutil.rmtree(ROOT / "books" / book, ignore_errors=True)
+
+    print(f"preset={args.preset} runs={args.runs} steps={steps} wall={dt:.3f}s")
+    print(f"steps/s={steps / dt:.2f}  step_file_writes/step={_WRITES['n'] / max(1, steps):.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
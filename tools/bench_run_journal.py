@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+# Benchmark zapisu runow narzedzi: legacy (8 plikow tmp+rename na wywolanie) vs dziennik runow (1 append).
+#
+#   python tools/bench_run_journal.py --runs 300
+#
+# Kazda iteracja to pelne POST /books/proof/check na malym tekscie (analiza z cache, wiec mierzy glownie zapis).
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import books_run_journal as rj  # noqa: E402
+import books_runs_catalog as rc  # noqa: E402
+from books_proof_api import ProofCheckReq, proof_check  # noqa: E402
+
+BOOK = "bench_run_journal"
+
+
+def _run(journal: bool, n: int) -> dict:
+    book_root = ROOT / "books" / BOOK
+    shutil.rmtree(book_root, ignore_errors=True)
+    os.environ["RUN_JOURNAL"] = "1" if journal else "0"
+    rc.reset_catalogs()
+    rj.reset_journals()
+    try:
+        req = ProofCheckReq(book=BOOK, text="Ala ma kota. Kot ma Ale.\n" * 20)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            proof_check(req)
+        wall = time.perf_counter() - t0
+        files = sum(len(fs) for _, _, fs in os.walk(book_root))
+        return {"mode": "journal" if journal else "legacy", "wall_s": wall, "per_run_ms": wall * 1000 / n, "files": files}
+    finally:
+        rc.reset_catalogs()
+        rj.reset_journals()
+        shutil.rmtree(book_root, ignore_errors=True)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=300)
+    args = ap.parse_args()
+
+    legacy = _run(False, args.runs)
+    journal = _run(True, args.runs)
+    for s in (legacy, journal):
+        print(f"{s['mode']:8} runs={args.runs} wall={s['wall_s']:7.3f}s per_run={s['per_run_ms']:6.2f}ms files_on_disk={s['files']}")
+    print(f"speedup: {legacy['wall_s'] / journal['wall_s']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
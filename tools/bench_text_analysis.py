@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+# Benchmark analizy master.txt w petli loop_write_job: koszt jednego kroku (dopisany chunk + proof, critic,
+# critic_v2, humanity na calym tekscie) w funkcji dlugosci ksiazki, pelna analiza vs cache akapitow.
+#
+#   python tools/bench_text_analysis.py --max_words 500000 --points 10 --chunk_words 1200
+#
+# Przy kazdym punkcie pomiaru: cache jest cieply po poprzednim kroku, dopisujemy chunk i mierzymy krok.
+# Z cache koszt kroku powinien byc ~plaski (analiza tylko nowych akapitow + scalanie), bez cache rosnie liniowo.
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.text_analysis import analyze  # noqa: E402
+from books_analysis_cache import get_cache, reset_caches  # noqa: E402
+
+TOOLS = ["proof", "critic", "critic_v2", "humanity"]
+_WORDS = (
+    "noc miasto deszcz okno cisza kroki drzwi światło cień głos ręka twarz list klucz most rzeka "
+    "który patrzył czekał powiedział wrócił zamknął otworzył szedł stał milczał pamiętał wiedział"
+).split()
+
+
+def _paragraph(rng: random.Random) -> str:
+    sents = []
+    for _ in range(rng.randint(3, 9)):
+        n = rng.randint(6, 22)
+        s = " ".join(rng.choice(_WORDS) for _ in range(n))
+        sents.append(s[:1].upper() + s[1:] + rng.choice([".", ".", ".", "?", "!", "…"]))
+    para = " ".join(sents)
+    return ("– " + para) if rng.random() < 0.2 else para
+
+
+def _chunk(rng: random.Random, words: int) -> str:
+    paras, n = [], 0
+    while n < words:
+        p = _paragraph(rng)
+        paras.append(p)
+        n += len(p.split())
+    return "\n\n".join(paras)
+
+
+def _step(fn, text: str) -> float:
+    t0 = time.perf_counter()
+    fn(text)
+    return time.perf_counter() - t0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max_words", type=int, default=500_000)
+    ap.add_argument("--points", type=int, default=10)
+    ap.add_argument("--chunk_words", type=int, default=1200)
+    args = ap.parse_args()
+
+    rng = random.Random(7)
+    book_root = ROOT / "books" / f"bench_analysis_{os.getpid()}"
+    book_root.mkdir(parents=True, exist_ok=True)
+    reset_caches()
+    cache = get_cache(book_root)
+
+    def full(text: str) -> None:
+        analyze(text, TOOLS, proof={"max_issues": 80})
+
+    def incremental(text: str) -> None:
+        cache.analyze(text, TOOLS, proof={"max_issues": 80})
+
+    print(f"chunk_words={args.chunk_words} tools={','.join(TOOLS)}")
+    print(f"{'words':>9} {'chars':>10} {'full ms':>9} {'cached ms':>10} {'analysed':>9}")
+    try:
+        text = ""
+        step = args.max_words // max(1, args.points)
+        for target in range(step, args.max_words + 1, step):
+            while len(text.split()) < target - args.chunk_words:
+                text += ("\n\n" if text else "") + _chunk(rng, 20_000)
+            incremental(text)  # cache cieply po poprzednim kroku
+            text += "\n\n" + _chunk(rng, args.chunk_words)
+            misses = cache.misses
+            t_inc = _step(incremental, text)
+            analysed = cache.misses - misses
+            t_full = _step(full, text)
+            print(f"{len(text.split()):>9} {len(text):>10} {t_full * 1000:>9.1f} {t_inc * 1000:>10.1f} {analysed:>9}")
+    finally:
+        reset_caches()
+        shutil.rmtree(book_root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+# Nagrywa referencyjne liczby slow z Microsoft Worda (COM) dla testu zgodnosci books_wordcount.
+# Tylko Windows z zainstalowanym Wordem:
+#
+#   python tools/record_word_counts.py                 # probki ponizej -> tests/data/word_counts.json
+#   python tools/record_word_counts.py --file a.txt    # dopisuje tez caly plik jako probke
+#
+# tests/test_137_wordcount.py porownuje count_words() z kazdym nagranym wpisem (jesli plik istnieje).
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from books_wordcount import count_words  # noqa: E402
+from grow_to_wordcount import word_count_via_word_com  # noqa: E402
+
+OUT = ROOT / "tests" / "data" / "word_counts.json"
+
+SAMPLES = [
+    "Ala ma kota.",
+    "– Nie wiem – powiedziała cicho. – Może jutro.",
+    "— Tak — odparł.\n— Nie.",
+    "e-mail, biało-czerwony, tak—nie, tak–nie, a/b, itd.",
+    "Czekał... i czekał . . . aż do 12:30.",
+    "„Cytat” i «inny» oraz »jeszcze inny«.",
+    "1 000 000 zł, 3,14 oraz 2024-05-01.",
+    "1\u00a0000 zł i 20\u00a0%.",
+    "(np. w nawiasie) [przypis] {klamra}",
+    "?! ... – — - * #",
+    "Żółć gęślą jaźń.\tTabulator\n\nnowy akapit",
+    "słowo_z_podkreśleniem __ _",
+]
+
+
+def _word_count(text: str) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        p = Path(tmp) / "sample.txt"
+        p.write_text(text, encoding="utf-8-sig")
+        return word_count_via_word_com(p)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", action="append", default=[])
+    ap.add_argument("--out", default=str(OUT))
+    args = ap.parse_args()
+
+    texts = SAMPLES + [Path(f).read_text(encoding="utf-8", errors="replace") for f in args.file]
+    rows = []
+    for text in texts:
+        words = _word_count(text)
+        native = count_words(text)
+        rows.append({"text": text, "words": words})
+        print(f"{'OK ' if native == words else 'DIFF'} word={words} native={native} {text[:60]!r}")
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"saved {len(rows)} -> {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())